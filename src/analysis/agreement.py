@@ -0,0 +1,275 @@
+import warnings
+from typing import Literal, TypedDict
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .runs import EvaluationRuns
+
+# Krippendorff's alpha の距離の定義。
+AlphaMetric = Literal["nominal", "interval"]
+
+
+class ConfidenceInterval(TypedDict):
+    """平均値とその信頼区間。"""
+
+    mean: float
+    low: float
+    high: float
+
+
+class AgreementSummary(TypedDict):
+    """評価結果全体の一致度と、score_rate・criteria_pass_rate の信頼区間。"""
+
+    run_count: int
+    item_count: int
+    subjective_fleiss_kappa: float
+    subjective_krippendorff_alpha: float
+    general_fleiss_kappa: float
+    general_krippendorff_alpha: float
+    rubric_fleiss_kappa: float
+    rubric_krippendorff_alpha: float
+    mean_flip_rate: float
+    score_rate: ConfidenceInterval
+    criteria_pass_rate: ConfidenceInterval
+
+
+def nan_mean_and_variance(values: NDArray[np.float64]) -> tuple[NDArray[np.float64], NDArray[np.float64]]:
+    """
+    第 1 軸（試行）に沿った平均と不偏分散を計算する。NaN は欠損として除く。
+
+    有効な値が 0 件の場合の平均、1 件以下の場合の分散は NaN。
+
+    Args:
+        values: (試行, ...) の配列
+
+    Returns:
+        (平均, 不偏分散)。いずれも values.shape[1:] の配列
+    """
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    total = np.where(valid, values, 0.0).sum(axis=0)
+    mean = np.divide(total, count, out=np.full(count.shape, np.nan), where=count > 0)
+    squared = np.where(valid, (values - mean) ** 2, 0.0).sum(axis=0)
+    variance = np.divide(squared, count - 1, out=np.full(count.shape, np.nan), where=count > 1)
+    return mean, variance
+
+
+def rating_statistics(runs: EvaluationRuns) -> dict[str, tuple[NDArray[np.float64], NDArray[np.float64]]]:
+    """
+    評価手法ごとに、データ項目ごとの点数の平均と不偏分散を計算する。
+
+    Returns:
+        {"subjective": (平均, 分散), "general": (平均, 分散)}。平均・分散は (データ項目,) の配列
+    """
+    return {
+        "subjective": nan_mean_and_variance(runs.subjective_ratings),
+        "general": nan_mean_and_variance(runs.general_ratings),
+    }
+
+
+def flip_rates(criteria_met: NDArray[np.bool_], observed: NDArray[np.bool_]) -> NDArray[np.float64]:
+    """
+    ルーブリック項目ごとに、異なる 2 試行の criteria_met が食い違う確率を計算する。
+
+    m 試行中 k 試行で適合と判定された場合は 2k(m - k) / (m(m - 1))。常に同じ判定なら 0、半々に分かれると最大になる。
+
+    Args:
+        criteria_met: (試行, ...) の適合判定
+        observed: criteria_met と同じ形の、判定結果があるかどうか
+
+    Returns:
+        criteria_met.shape[1:] の配列。判定結果が 2 件未満の位置は NaN
+    """
+    count = observed.sum(axis=0)
+    met = (criteria_met & observed).sum(axis=0)
+    pairs = count * (count - 1)
+    rates: NDArray[np.float64] = np.divide(
+        2 * met * (count - met), pairs, out=np.full(count.shape, np.nan), where=pairs > 0
+    )
+    return rates
+
+
+def category_counts(
+    values: NDArray[np.float64], categories: NDArray[np.float64] | None = None
+) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+    """
+    (試行, 対象) の値を、対象ごとのカテゴリ別の件数に変換する。NaN は欠損として数えない。
+
+    Args:
+        values: (試行, 対象) の配列
+        categories: カテゴリの値（指定しない場合は values に現れる値）
+
+    Returns:
+        ((対象, カテゴリ) の件数, カテゴリの値)
+    """
+    valid = ~np.isnan(values)
+    if categories is None:
+        categories = np.unique(values[valid])
+    matches = (values[:, :, np.newaxis] == categories) & valid[:, :, np.newaxis]
+    return matches.sum(axis=0).astype(np.int64), categories
+
+
+def verdict_counts(criteria_met: NDArray[np.bool_], observed: NDArray[np.bool_]) -> NDArray[np.int64]:
+    """(試行, ...) の適合判定を、対象ごとの (不適合, 適合) の件数に変換する。"""
+    count = observed.reshape(observed.shape[0], -1).sum(axis=0)
+    met = (criteria_met & observed).reshape(observed.shape[0], -1).sum(axis=0)
+    return np.stack([count - met, met], axis=1).astype(np.int64)
+
+
+def fleiss_kappa(counts: NDArray[np.int64]) -> float:
+    """
+    Fleiss' kappa を計算する（試行を評価者、判定の対象を被験者とみなす）。
+
+    対象ごとに評価者数が異なってもよい（評価者が 2 人未満の対象は除く）。
+    全員が同じカテゴリのみを選んでいる場合など、偶然の一致率が 1 のときは NaN。
+
+    Args:
+        counts: (対象, カテゴリ) の件数
+
+    Returns:
+        Fleiss' kappa
+    """
+    raters = counts.sum(axis=1)
+    counts = counts[raters >= 2]
+    raters = raters[raters >= 2]
+    if len(raters) == 0:
+        return float("nan")
+    observed_agreement = ((counts * (counts - 1)).sum(axis=1) / (raters * (raters - 1))).mean()
+    proportions = counts.sum(axis=0) / raters.sum()
+    expected_agreement = float((proportions**2).sum())
+    if np.isclose(expected_agreement, 1.0):
+        return float("nan")
+    return float((observed_agreement - expected_agreement) / (1.0 - expected_agreement))
+
+
+def krippendorff_alpha(
+    counts: NDArray[np.int64], categories: NDArray[np.float64] | None = None, metric: AlphaMetric = "nominal"
+) -> float:
+    """
+    Krippendorff's alpha を一致行列（coincidence matrix）から計算する。
+
+    欠損値を含む（対象ごとに評価者数が異なる）場合にも使える。値が 1 種類しかない場合は NaN。
+
+    Args:
+        counts: (対象, カテゴリ) の件数
+        categories: カテゴリの値（metric が "interval" の場合に必要）
+        metric: 値の距離の定義（"nominal": 一致なら 0、不一致なら 1。"interval": 差の 2 乗）
+
+    Returns:
+        Krippendorff's alpha
+    """
+    raters = counts.sum(axis=1)
+    pairable = counts[raters >= 2].astype(np.float64)
+    weights = 1.0 / (raters[raters >= 2] - 1)
+    # o[c, k] = Σ_u n_uc (n_uk - [c == k]) / (n_u - 1)
+    coincidence = (pairable * weights[:, np.newaxis]).T @ pairable
+    coincidence -= np.diag((pairable * weights[:, np.newaxis]).sum(axis=0))
+    marginals = coincidence.sum(axis=1)
+    total = marginals.sum()
+    if total <= 1:
+        return float("nan")
+
+    if metric == "nominal":
+        distance = 1.0 - np.eye(len(marginals))
+    else:
+        if categories is None:
+            raise ValueError("categories is required for the interval metric")
+        distance = np.subtract.outer(categories, categories) ** 2
+    observed_disagreement = float((coincidence * distance).sum())
+    expected_disagreement = float((np.outer(marginals, marginals) * distance).sum() / (total - 1))
+    if np.isclose(expected_disagreement, 0.0):
+        return float("nan")
+    return 1.0 - observed_disagreement / expected_disagreement
+
+
+def bootstrap_mean_ci(
+    values: NDArray[np.float64],
+    resample_count: int = 2000,
+    confidence: float = 0.95,
+    seed: int | None = None,
+) -> tuple[NDArray[np.float64], NDArray[np.float64], NDArray[np.float64]]:
+    """
+    試行を復元抽出するブートストラップで、第 1 軸（試行）に沿った平均の信頼区間（パーセンタイル法）を計算する。
+
+    リサンプルは試行ごとの出現回数の重み（多項分布）として表し、全リサンプルの平均を 1 回の行列積で求める。
+    NaN は欠損として除く。
+
+    Args:
+        values: (試行, ...) の配列
+        resample_count: リサンプル回数
+        confidence: 信頼水準
+        seed: 乱数のシード
+
+    Returns:
+        (平均, 下限, 上限)。いずれも values.shape[1:] の配列
+    """
+    run_count = values.shape[0]
+    if run_count == 0:
+        empty = np.full(values.shape[1:], np.nan)
+        return empty, empty.copy(), empty.copy()
+    flat = values.reshape(run_count, -1)
+    valid = ~np.isnan(flat)
+    filled = np.where(valid, flat, 0.0)
+
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(run_count, np.full(run_count, 1.0 / run_count), size=resample_count).astype(np.float64)
+    sums = weights @ filled
+    counts = weights @ valid.astype(np.float64)
+    means = np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+
+    tail = (1.0 - confidence) / 2
+    with warnings.catch_warnings():
+        # 有効な値が 1 件もない位置は NaN のままにする。
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, high = np.nanquantile(means, [tail, 1.0 - tail], axis=0)
+    mean, _ = nan_mean_and_variance(flat)
+    shape = values.shape[1:]
+    return mean.reshape(shape), low.reshape(shape), high.reshape(shape)
+
+
+def _overall_ci(
+    per_run_item: NDArray[np.float64], resample_count: int, confidence: float, seed: int | None
+) -> ConfidenceInterval:
+    """(試行, データ項目) の値から、試行ごとのデータ項目平均について信頼区間を計算する。"""
+    per_run, _ = nan_mean_and_variance(per_run_item.T)
+    mean, low, high = bootstrap_mean_ci(per_run[:, np.newaxis], resample_count, confidence, seed)
+    return {"mean": float(mean[0]), "low": float(low[0]), "high": float(high[0])}
+
+
+def summarize_agreement(
+    runs: EvaluationRuns,
+    resample_count: int = 2000,
+    confidence: float = 0.95,
+    seed: int | None = None,
+) -> AgreementSummary:
+    """
+    評価結果全体について、試行間の一致度と score_rate・criteria_pass_rate の信頼区間をまとめる。
+
+    Args:
+        runs: 評価結果の配列
+        resample_count: ブートストラップのリサンプル回数
+        confidence: 信頼水準
+        seed: 乱数のシード
+
+    Returns:
+        一致度と信頼区間
+    """
+    subjective_counts, subjective_categories = category_counts(runs.subjective_ratings)
+    general_counts, general_categories = category_counts(runs.general_ratings)
+    mask = runs.rubric_mask
+    rubric_counts = verdict_counts(runs.criteria_met[:, mask], runs.observed[:, mask])
+    flips = flip_rates(runs.criteria_met[:, mask], runs.observed[:, mask])
+    return {
+        "run_count": runs.run_count,
+        "item_count": runs.item_count,
+        "subjective_fleiss_kappa": fleiss_kappa(subjective_counts),
+        "subjective_krippendorff_alpha": krippendorff_alpha(subjective_counts, subjective_categories, "interval"),
+        "general_fleiss_kappa": fleiss_kappa(general_counts),
+        "general_krippendorff_alpha": krippendorff_alpha(general_counts, general_categories, "interval"),
+        "rubric_fleiss_kappa": fleiss_kappa(rubric_counts),
+        "rubric_krippendorff_alpha": krippendorff_alpha(rubric_counts),
+        "mean_flip_rate": float(np.nanmean(flips)) if np.any(~np.isnan(flips)) else float("nan"),
+        "score_rate": _overall_ci(runs.score_rates(), resample_count, confidence, seed),
+        "criteria_pass_rate": _overall_ci(runs.criteria_pass_rates(), resample_count, confidence, seed),
+    }
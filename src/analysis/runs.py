@@ -0,0 +1,192 @@
+from pathlib import Path
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ..data.result_store import (
+    DEFAULT_OUTPUT_ROOT,
+    GENERAL_EVALUATION_STEM,
+    RUBRIC_EVALUATION_STEM,
+    SUBJECTIVE_EVALUATION_STEM,
+    content_hash,
+    find_result_file,
+    load_rating_results_by_item,
+    load_verdict_table,
+)
+from ..types import EvaluationDatasetItem, PromptItem, RubricItem
+
+
+def _conversation_key(prompts: list[PromptItem], llm_response_text: str) -> str:
+    """会話の内容からデータ項目を識別するキーを計算する。"""
+    return content_hash({"prompts": prompts, "llm_response_text": llm_response_text})
+
+
+class EvaluationRuns:
+    """
+    複数の試行（run）の評価結果を、試行 × データ項目 × ルーブリック項目の列指向の配列として保持する。
+
+    - subjective_ratings / general_ratings: (試行, データ項目) の点数。結果がない場合は NaN
+    - criteria_met: (試行, データ項目, ルーブリック項目) の適合判定
+    - observed: criteria_met に判定結果があるかどうか（評価に失敗した項目やルーブリック数の差を埋めた部分は False）
+    - points: (データ項目, ルーブリック項目) の配点。ルーブリック数の差を埋めた部分は 0
+    """
+
+    def __init__(
+        self,
+        run_dirs: list[Path],
+        subjective_ratings: NDArray[np.float64],
+        general_ratings: NDArray[np.float64],
+        criteria_met: NDArray[np.bool_],
+        observed: NDArray[np.bool_],
+        points: NDArray[np.int64],
+    ) -> None:
+        self.run_dirs = run_dirs
+        self.subjective_ratings = subjective_ratings
+        self.general_ratings = general_ratings
+        self.criteria_met = criteria_met
+        self.observed = observed
+        self.points = points
+
+    @property
+    def run_count(self) -> int:
+        """試行数。"""
+        return len(self.run_dirs)
+
+    @property
+    def item_count(self) -> int:
+        """データ項目数。"""
+        return int(self.points.shape[0])
+
+    @property
+    def rubric_mask(self) -> NDArray[np.bool_]:
+        """(データ項目, ルーブリック項目) のうち実在するルーブリック項目の位置。"""
+        return np.not_equal(self.points, 0)
+
+    @property
+    def completed(self) -> NDArray[np.bool_]:
+        """(試行, データ項目) のうち、すべてのルーブリック項目の判定が揃っているもの。"""
+        return np.all(self.observed | ~self.rubric_mask, axis=2) & self.rubric_mask.any(axis=1)
+
+    def score_rates(self) -> NDArray[np.float64]:
+        """
+        (試行, データ項目) ごとの score_rate（EvaluationOutput.score_rate と同じ定義）。
+
+        判定が揃っていない組は NaN。
+        """
+        total = np.where(self.criteria_met & self.observed, self.points, 0).sum(axis=2)
+        theoretical = np.where(self.points > 0, self.points, 0).sum(axis=1)
+        rates = np.divide(total, theoretical, out=np.zeros(total.shape), where=theoretical > 0)
+        return np.where(self.completed, rates, np.nan)
+
+    def criteria_pass_rates(self) -> NDArray[np.float64]:
+        """
+        (試行, データ項目) ごとの criteria_pass_rate（EvaluationOutput.criteria_pass_rate と同じ定義）。
+
+        判定が揃っていない組は NaN。
+        """
+        passed = np.where(self.points > 0, self.criteria_met, ~self.criteria_met) & self.rubric_mask
+        rubric_count = self.rubric_mask.sum(axis=1)
+        rates = np.divide(passed.sum(axis=2), rubric_count, out=np.zeros(passed.shape[:2]), where=rubric_count > 0)
+        return np.where(self.completed, rates, np.nan)
+
+
+def find_run_dirs(output_root: Path = DEFAULT_OUTPUT_ROOT) -> list[Path]:
+    """output_root 配下の評価結果ディレクトリ（いずれかの結果ファイルを含むもの）を名前順に列挙する。"""
+    if not output_root.exists():
+        return []
+    stems = (SUBJECTIVE_EVALUATION_STEM, GENERAL_EVALUATION_STEM, RUBRIC_EVALUATION_STEM)
+    return sorted(
+        path
+        for path in output_root.iterdir()
+        if path.is_dir() and any(find_result_file(path, stem) is not None for stem in stems)
+    )
+
+
+def load_evaluation_runs(
+    output_root: Path = DEFAULT_OUTPUT_ROOT,
+    input_data: list[EvaluationDatasetItem] | None = None,
+    run_dirs: list[Path] | None = None,
+) -> EvaluationRuns:
+    """
+    評価結果ディレクトリを読み込み、試行 × データ項目 × ルーブリック項目の配列に変換する。
+
+    ルーブリック評価の結果は会話の内容でデータ項目に対応付けるため、評価に失敗した項目があっても位置がずれない。
+    評価対象データに同じ会話のデータ項目が複数ある場合は、そのすべてに対応付ける。
+    主観評価・自由記述評価の結果は load_rating_results_by_item で対応付ける。
+
+    Args:
+        output_root: 評価結果の保存先
+        input_data: 評価対象データ（指定しない場合は、結果ファイルに現れた順にデータ項目を並べる）
+        run_dirs: 読み込む評価結果ディレクトリ（指定しない場合は output_root 配下のすべて）
+
+    Returns:
+        試行 × データ項目 × ルーブリック項目の配列
+    """
+    dirs = find_run_dirs(output_root) if run_dirs is None else run_dirs
+    # 会話の内容 → データ項目の番号（評価対象データに同じ会話が複数ある場合はそのすべて）。
+    item_keys: dict[str, list[int]] = {}
+    item_rubrics: list[list[RubricItem]] = []
+    if input_data is not None:
+        for data in input_data:
+            item_keys.setdefault(_conversation_key(data["prompts"], data["llm_response_text"]), []).append(
+                len(item_rubrics)
+            )
+            item_rubrics.append(data["rubrics"])
+
+    # 試行ごとの判定結果を (試行, データ項目, 判定の配列) として集め、最後にまとめて配列に詰める。
+    verdicts: list[tuple[int, int, NDArray[np.bool_]]] = []
+    for run_index, run_dir in enumerate(dirs):
+        path = find_result_file(run_dir, RUBRIC_EVALUATION_STEM)
+        if path is None:
+            continue
+        # EvaluationOutput を経由せず、判定を列指向の表として読み込む。
+        table = load_verdict_table(path)
+        all_met = np.frombuffer(bytes(table.criteria_met), dtype=np.bool_)
+        rubrics = table.rubrics.rubrics
+        for i in range(len(table)):
+            start, end = table.offsets[i], table.offsets[i + 1]
+            key = _conversation_key(table.prompts[i], table.llm_response_texts[i])
+            item_indices = item_keys.get(key)
+            if item_indices is None:
+                if input_data is not None:
+                    # 評価対象データに含まれない会話の結果は無視する。
+                    continue
+                item_indices = item_keys[key] = [len(item_rubrics)]
+                item_rubrics.append([rubrics[table.rubric_ids[row]] for row in range(start, end)])
+            for item_index in item_indices:
+                if end - start == len(item_rubrics[item_index]):
+                    verdicts.append((run_index, item_index, all_met[start:end]))
+
+    run_count, item_count = len(dirs), len(item_rubrics)
+    rubric_count = max((len(rubrics) for rubrics in item_rubrics), default=0)
+    points = np.zeros((item_count, rubric_count), dtype=np.int64)
+    for item_index, rubrics in enumerate(item_rubrics):
+        points[item_index, : len(rubrics)] = [r["points"] for r in rubrics]
+
+    criteria_met = np.zeros((run_count, item_count, rubric_count), dtype=np.bool_)
+    observed = np.zeros((run_count, item_count, rubric_count), dtype=np.bool_)
+    for run_index, item_index, met in verdicts:
+        criteria_met[run_index, item_index, : len(met)] = met
+        observed[run_index, item_index, : len(met)] = True
+
+    return EvaluationRuns(
+        run_dirs=list(dirs),
+        subjective_ratings=_load_ratings(dirs, SUBJECTIVE_EVALUATION_STEM, item_count),
+        general_ratings=_load_ratings(dirs, GENERAL_EVALUATION_STEM, item_count),
+        criteria_met=criteria_met,
+        observed=observed,
+        points=points,
+    )
+
+
+def _load_ratings(run_dirs: list[Path], stem: str, item_count: int) -> NDArray[np.float64]:
+    """評価手法の点数を (試行, データ項目) の配列として読み込む。結果がない場合は NaN。"""
+    ratings = np.full((len(run_dirs), item_count), np.nan)
+    for run_index, run_dir in enumerate(run_dirs):
+        path = find_result_file(run_dir, stem)
+        if path is None:
+            continue
+        for item_index, result in enumerate(load_rating_results_by_item(path, item_count)):
+            if result is not None:
+                ratings[run_index, item_index] = result["rating"]
+    return ratings
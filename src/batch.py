@@ -0,0 +1,490 @@
+from __future__ import annotations
+
+import importlib
+import json
+import uuid
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal, Protocol, TypedDict, cast
+
+from .models import (
+    TransportRetryError,
+    _build_json_claude_kwargs,
+    _is_claude_model,
+    generate,
+    get_vertex_settings,
+    load_vertex_credentials,
+)
+from .structured_output import parse_json_object
+
+if TYPE_CHECKING:
+    # 型のみ。SDK はバッチジョブのクライアントを生成するときに読み込む。
+    from anthropic import Anthropic
+    from google import genai
+
+# バッチジョブの状態（プロバイダーごとの状態をこの 3 つにまとめる）。
+BatchJobState = Literal["running", "succeeded", "failed"]
+
+# バッチの入出力ファイルの形式。
+BatchWireFormat = Literal["vertex", "anthropic"]
+
+BATCH_PROVIDER_NAMES = ("vertex", "anthropic", "local")
+
+# Vertex AI で Claude のバッチ予測に指定する anthropic_version。
+VERTEX_ANTHROPIC_VERSION = "vertex-2023-10-16"
+
+# Anthropic の Message Batches API の 1 バッチあたりのリクエスト数の上限。
+ANTHROPIC_MAX_BATCH_REQUESTS = 100_000
+
+# ローカルのバッチジョブの保存先のデフォルト値。
+DEFAULT_LOCAL_BATCH_ROOT = Path("src/data/batch_jobs")
+
+# バッチジョブに送った入力ファイルの控えのファイル名（submit の job_dir 直下）。
+BATCH_INPUT_FILENAME = "batch_input.jsonl"
+
+_VERTEX_SUCCEEDED_STATES = frozenset({"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"})
+_VERTEX_FAILED_STATES = frozenset({"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"})
+
+
+class BatchRequest(TypedDict):
+    """バッチジョブに含める 1 件の JSON 生成リクエスト。"""
+
+    # 応答を元のリクエストに対応付けるための ID（英数字・"-"・"_" のみ、64 文字以内）。
+    custom_id: str
+    model_name: str
+    prompt: str
+    schema: dict[str, Any]
+    temperature: float | None
+    max_tokens: int | None
+
+
+def _claude_params(request: BatchRequest) -> dict[str, Any]:
+    """Claude の messages.create に渡す引数を構築する（対話的な呼び出しと同じプロンプトになる）。"""
+    return _build_json_claude_kwargs(
+        request["model_name"], request["prompt"], request["schema"], request["temperature"], request["max_tokens"]
+    )
+
+
+def to_vertex_line(request: BatchRequest) -> dict[str, Any]:
+    """
+    Vertex AI のバッチ予測の入力（JSONL の 1 行）に変換する。
+
+    Gemini では GenerateContentRequest の labels に custom_id を入れ、出力に含まれるリクエストから対応付ける。
+    Claude では custom_id と Anthropic の Messages API の引数を並べた形式になる。
+    """
+    if _is_claude_model(request["model_name"]):
+        params = _claude_params(request)
+        del params["model"]
+        return {
+            "custom_id": request["custom_id"],
+            "request": {**params, "anthropic_version": VERTEX_ANTHROPIC_VERSION},
+        }
+    generation_config: dict[str, Any] = {
+        "responseMimeType": "application/json",
+        "responseSchema": request["schema"],
+    }
+    if request["temperature"] is not None:
+        generation_config["temperature"] = request["temperature"]
+    if request["max_tokens"] is not None:
+        generation_config["maxOutputTokens"] = request["max_tokens"]
+    return {
+        "request": {
+            "contents": [{"role": "user", "parts": [{"text": request["prompt"]}]}],
+            "generationConfig": generation_config,
+            "labels": {"custom_id": request["custom_id"]},
+        }
+    }
+
+
+def to_anthropic_request(request: BatchRequest) -> dict[str, Any]:
+    """Anthropic の Message Batches API のリクエスト（requests 配列の 1 要素）に変換する。"""
+    return {"custom_id": request["custom_id"], "params": _claude_params(request)}
+
+
+def _message_text(message: dict[str, Any]) -> str | None:
+    """Anthropic の Message（辞書）から最初のテキストブロックを取り出す。"""
+    for block in message.get("content") or []:
+        if block.get("type") == "text":
+            return cast(str, block.get("text"))
+    return None
+
+
+def _candidate_text(response: dict[str, Any]) -> str | None:
+    """Gemini の GenerateContentResponse（辞書）から最初の候補のテキストを取り出す。"""
+    candidates = response.get("candidates") or []
+    if not candidates:
+        return None
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts) or None
+
+
+def parse_vertex_line(record: dict[str, Any]) -> tuple[str | None, dict[str, Any] | None]:
+    """
+    Vertex AI のバッチ予測の出力（JSONL の 1 行）から (custom_id, 生成された JSON) を取り出す。
+
+    リクエストが失敗した行や、応答を JSON として解釈できない行は JSON を None とする。
+    custom_id を特定できない行は custom_id を None とする。
+    """
+    request = record.get("request") or {}
+    custom_id = record.get("custom_id") or (request.get("labels") or {}).get("custom_id")
+    response = record.get("response")
+    if record.get("status") or not isinstance(response, dict):
+        return custom_id, None
+    text = _candidate_text(response) if "candidates" in response else _message_text(response)
+    return custom_id, parse_json_object(text)
+
+
+def parse_anthropic_result(record: dict[str, Any]) -> tuple[str | None, dict[str, Any] | None]:
+    """Anthropic の Message Batches API の結果（JSONL の 1 行）から (custom_id, 生成された JSON) を取り出す。"""
+    result = record.get("result") or {}
+    if result.get("type") != "succeeded":
+        return record.get("custom_id"), None
+    return record.get("custom_id"), parse_json_object(_message_text(result.get("message") or {}))
+
+
+def _collect_results(
+    pairs: Iterable[tuple[str | None, dict[str, Any] | None]],
+) -> dict[str, dict[str, Any] | None]:
+    """(custom_id, 生成された JSON) の組を辞書にまとめる。同じ ID が複数ある場合は解釈できたものを優先する。"""
+    results: dict[str, dict[str, Any] | None] = {}
+    for custom_id, result in pairs:
+        if custom_id is not None and results.get(custom_id) is None:
+            results[custom_id] = result
+    return results
+
+
+def _write_jsonl(path: Path, records: Iterable[dict[str, Any]]) -> None:
+    """レコードを JSONL ファイルに書き込む。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _read_jsonl(lines: Iterable[str]) -> Iterable[dict[str, Any]]:
+    """JSONL の各行を読み込む（空行と解釈できない行は読み飛ばす）。"""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+def _single_model(requests: Sequence[BatchRequest]) -> str:
+    """
+    リクエストのモデル名を返す。
+
+    Raises:
+        ValueError: リクエストが空の場合、または複数のモデルが含まれる場合
+    """
+    model_names = {request["model_name"] for request in requests}
+    if len(model_names) != 1:
+        raise ValueError(f"A batch job must contain requests for exactly one model, got {sorted(model_names)}")
+    return model_names.pop()
+
+
+class BatchProvider(Protocol):
+    """
+    プロバイダーのバッチ API。
+
+    submit でリクエストをまとめて送り、get_state で完了を待ち、fetch_results で custom_id ごとの結果を取得する。
+    バッチジョブは 1 つのモデルに対するリクエストのみを含む。
+    """
+
+    name: str
+
+    def submit(self, requests: Sequence[BatchRequest], job_dir: Path) -> str:
+        """リクエストを送ってバッチジョブを作成し、ジョブ ID を返す。送った入力の控えを job_dir に保存する。"""
+        ...
+
+    def get_state(self, job_id: str) -> BatchJobState:
+        """バッチジョブの状態を返す。"""
+        ...
+
+    def fetch_results(self, job_id: str) -> dict[str, dict[str, Any] | None]:
+        """完了したバッチジョブの結果を custom_id ごとに返す（失敗したリクエストは None）。"""
+        ...
+
+    def describe(self) -> dict[str, Any]:
+        """create_batch_provider でプロバイダーを作り直すための設定を返す。"""
+        ...
+
+
+class VertexBatchProvider:
+    """
+    Vertex AI のバッチ予測（Gemini / Claude）。
+
+    入力は gcs_prefix/<ジョブ名>/input.jsonl にアップロードし、出力は gcs_prefix/<ジョブ名>/output/ 配下に書き出される。
+    Cloud Storage の読み書きには google-cloud-storage が必要（uv sync --extra batch）。
+    """
+
+    name = "vertex"
+
+    def __init__(self, gcs_prefix: str) -> None:
+        """
+        Args:
+            gcs_prefix: 入出力ファイルを置く Cloud Storage のパス（"gs://bucket/path"）
+
+        Raises:
+            ValueError: gcs_prefix が gs:// で始まらない場合
+        """
+        if not gcs_prefix.startswith("gs://"):
+            raise ValueError(f"gcs_prefix must start with gs://, got {gcs_prefix}")
+        self.gcs_prefix = gcs_prefix.rstrip("/")
+        self._client: genai.Client | None = None
+        self._storage_client: Any = None
+
+    @property
+    def client(self) -> genai.Client:
+        """バッチ予測のジョブを管理するクライアント（Claude のジョブも genai.Client で作成する）。"""
+        if self._client is None:
+            from .providers.gemini import create_client
+
+            self._client = create_client(get_vertex_settings())
+        return self._client
+
+    @property
+    def storage_client(self) -> Any:
+        """
+        Cloud Storage のクライアント。
+
+        Raises:
+            ImportError: google-cloud-storage がインストールされていない場合
+        """
+        if self._storage_client is None:
+            try:
+                storage: Any = importlib.import_module("google.cloud.storage")
+            except ImportError as error:
+                raise ImportError(
+                    "VertexBatchProvider requires the 'google-cloud-storage' package (uv sync --extra batch)"
+                ) from error
+            settings = get_vertex_settings()
+            self._storage_client = storage.Client(
+                project=settings.project_id, credentials=load_vertex_credentials(settings)
+            )
+        return self._storage_client
+
+    @staticmethod
+    def _split_uri(uri: str) -> tuple[str, str]:
+        """gs://bucket/path を (bucket, path) に分ける。"""
+        bucket, _, path = uri.removeprefix("gs://").partition("/")
+        return bucket, path
+
+    def submit(self, requests: Sequence[BatchRequest], job_dir: Path) -> str:
+        model_name = _single_model(requests)
+        input_path = job_dir / BATCH_INPUT_FILENAME
+        _write_jsonl(input_path, (to_vertex_line(request) for request in requests))
+
+        job_name = f"llm-judge-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        input_uri = f"{self.gcs_prefix}/{job_name}/input.jsonl"
+        bucket, path = self._split_uri(input_uri)
+        self.storage_client.bucket(bucket).blob(path).upload_from_filename(str(input_path))
+
+        from google.genai import types
+
+        model = f"publishers/anthropic/models/{model_name}" if _is_claude_model(model_name) else model_name
+        job = self.client.batches.create(
+            model=model,
+            src=input_uri,
+            config=types.CreateBatchJobConfig(display_name=job_name, dest=f"{self.gcs_prefix}/{job_name}/output"),
+        )
+        assert job.name is not None
+        return job.name
+
+    def get_state(self, job_id: str) -> BatchJobState:
+        state = self.client.batches.get(name=job_id).state
+        if state is not None and state.value in _VERTEX_SUCCEEDED_STATES:
+            return "succeeded"
+        if state is not None and state.value in _VERTEX_FAILED_STATES:
+            return "failed"
+        return "running"
+
+    def fetch_results(self, job_id: str) -> dict[str, dict[str, Any] | None]:
+        job = self.client.batches.get(name=job_id)
+        output_uri = (job.output_info.gcs_output_directory if job.output_info else None) or (
+            job.dest.gcs_uri if job.dest else None
+        )
+        if output_uri is None:
+            return {}
+        bucket, prefix = self._split_uri(output_uri)
+        lines: list[str] = []
+        for blob in self.storage_client.list_blobs(bucket, prefix=prefix):
+            if blob.name.endswith(".jsonl"):
+                lines.extend(blob.download_as_text(encoding="utf-8").splitlines())
+        return _collect_results(parse_vertex_line(record) for record in _read_jsonl(lines))
+
+    def describe(self) -> dict[str, Any]:
+        return {"gcs_prefix": self.gcs_prefix}
+
+
+class AnthropicBatchProvider:
+    """
+    Anthropic の Message Batches API（Claude のみ）。
+
+    Anthropic API に直接送るため、モデル名は Anthropic API の名前（"claude-sonnet-4-5" など）を指定し、
+    ANTHROPIC_API_KEY を設定しておく必要がある。
+    """
+
+    name = "anthropic"
+
+    def __init__(self, client: Anthropic | None = None) -> None:
+        """
+        Args:
+            client: Anthropic のクライアント（指定しない場合は環境変数の設定で生成する）
+        """
+        self._client = client
+
+    @property
+    def client(self) -> Anthropic:
+        """Anthropic のクライアント。"""
+        if self._client is None:
+            from anthropic import Anthropic
+
+            self._client = Anthropic()
+        return self._client
+
+    def submit(self, requests: Sequence[BatchRequest], job_dir: Path) -> str:
+        _single_model(requests)
+        if len(requests) > ANTHROPIC_MAX_BATCH_REQUESTS:
+            raise ValueError(
+                f"Anthropic message batches accept at most {ANTHROPIC_MAX_BATCH_REQUESTS} requests, got {len(requests)}"
+            )
+        batch_requests = [to_anthropic_request(request) for request in requests]
+        _write_jsonl(job_dir / BATCH_INPUT_FILENAME, batch_requests)
+        batch = self.client.messages.batches.create(requests=cast(Any, batch_requests))
+        return batch.id
+
+    def get_state(self, job_id: str) -> BatchJobState:
+        batch = self.client.messages.batches.retrieve(job_id)
+        if batch.processing_status != "ended":
+            return "running"
+        # 終了したバッチでも個々のリクエストは失敗・期限切れになりうるため、結果ごとに判定する。
+        return "succeeded" if batch.request_counts.succeeded > 0 else "failed"
+
+    def fetch_results(self, job_id: str) -> dict[str, dict[str, Any] | None]:
+        return _collect_results(
+            parse_anthropic_result(entry.model_dump(mode="json"))
+            for entry in self.client.messages.batches.results(job_id)
+        )
+
+    def describe(self) -> dict[str, Any]:
+        return {}
+
+
+class LocalBatchProvider:
+    """
+    ファイルを使ったバッチ API の代替（動作確認用）。
+
+    ジョブは root/<ジョブ ID>/ に保存し、最初に状態を確認したときに models.generate でまとめて処理する。
+    入出力は wire_format のプロバイダーと同じ形式で読み書きするため、変換と対応付けの処理を API なしで確認できる。
+    モックのバックエンド（mock_backend.install_mock_backend）と組み合わせて使う。
+    """
+
+    name = "local"
+
+    def __init__(self, root: Path = DEFAULT_LOCAL_BATCH_ROOT, wire_format: BatchWireFormat = "vertex") -> None:
+        """
+        Args:
+            root: ジョブの保存先
+            wire_format: 入出力ファイルの形式
+        """
+        self.root = root
+        self.wire_format: BatchWireFormat = wire_format
+
+    def _encode_request(self, request: BatchRequest) -> dict[str, Any]:
+        """リクエストを wire_format の入力の形式に変換する。"""
+        return to_vertex_line(request) if self.wire_format == "vertex" else to_anthropic_request(request)
+
+    def _encode_result(self, request: BatchRequest, result: dict[str, Any] | None) -> dict[str, Any]:
+        """生成結果を wire_format の出力の形式に変換する。"""
+        text = json.dumps(result, ensure_ascii=False) if result is not None else None
+        message = {"role": "assistant", "content": [{"type": "text", "text": text}], "stop_reason": "end_turn"}
+        if self.wire_format == "anthropic":
+            if text is None:
+                return {"custom_id": request["custom_id"], "result": {"type": "errored"}}
+            return {"custom_id": request["custom_id"], "result": {"type": "succeeded", "message": message}}
+        line = to_vertex_line(request)
+        if text is None:
+            return {**line, "status": "generation failed"}
+        if _is_claude_model(request["model_name"]):
+            return {**line, "response": message, "status": ""}
+        candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}
+        return {**line, "response": {"candidates": [candidate]}, "status": ""}
+
+    def submit(self, requests: Sequence[BatchRequest], job_dir: Path) -> str:
+        _single_model(requests)
+        job_id = f"local-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        _write_jsonl(self.root / job_id / "requests.jsonl", (dict(request) for request in requests))
+        _write_jsonl(job_dir / BATCH_INPUT_FILENAME, (self._encode_request(request) for request in requests))
+        return job_id
+
+    def _run(self, job_id: str) -> None:
+        """ジョブのリクエストをすべて処理し、結果を output.jsonl に書き出す。"""
+        job_dir = self.root / job_id
+        with open(job_dir / "requests.jsonl", encoding="utf-8") as f:
+            requests = [cast(BatchRequest, record) for record in _read_jsonl(f)]
+        records: list[dict[str, Any]] = []
+        for request in requests:
+            try:
+                generated = generate(
+                    request["model_name"],
+                    prompt=request["prompt"],
+                    schema=request["schema"],
+                    temperature=request["temperature"],
+                    max_tokens=request["max_tokens"],
+                    cache_mode="bypass",
+                )
+            except TransportRetryError:
+                generated = None
+            result = generated if isinstance(generated, dict) else None
+            records.append(self._encode_result(request, result))
+        # 書き込み途中で中断されても未完了と判定されるよう、書き終えてから名前を変える。
+        _write_jsonl(job_dir / "output.jsonl.tmp", records)
+        (job_dir / "output.jsonl.tmp").replace(job_dir / "output.jsonl")
+
+    def get_state(self, job_id: str) -> BatchJobState:
+        job_dir = self.root / job_id
+        if not (job_dir / "requests.jsonl").exists():
+            return "failed"
+        if not (job_dir / "output.jsonl").exists():
+            self._run(job_id)
+        return "succeeded"
+
+    def fetch_results(self, job_id: str) -> dict[str, dict[str, Any] | None]:
+        parse = parse_vertex_line if self.wire_format == "vertex" else parse_anthropic_result
+        with open(self.root / job_id / "output.jsonl", encoding="utf-8") as f:
+            return _collect_results(parse(record) for record in _read_jsonl(f))
+
+    def describe(self) -> dict[str, Any]:
+        return {"root": str(self.root), "wire_format": self.wire_format}
+
+
+def create_batch_provider(name: str, options: dict[str, Any] | None = None) -> BatchProvider:
+    """
+    名前と設定（BatchProvider.describe の戻り値）からバッチ API のプロバイダーを作成する。
+
+    Args:
+        name: プロバイダーの名前（"vertex" / "anthropic" / "local"）
+        options: プロバイダーの設定
+
+    Returns:
+        プロバイダー
+
+    Raises:
+        ValueError: 未知のプロバイダー名が指定された場合、または必要な設定がない場合
+    """
+    options = options or {}
+    if name == "vertex":
+        if "gcs_prefix" not in options:
+            raise ValueError("The vertex batch provider requires gcs_prefix")
+        return VertexBatchProvider(options["gcs_prefix"])
+    if name == "anthropic":
+        return AnthropicBatchProvider()
+    if name == "local":
+        return LocalBatchProvider(
+            Path(options.get("root", DEFAULT_LOCAL_BATCH_ROOT)), options.get("wire_format", "vertex")
+        )
+    raise ValueError(f"Unknown batch provider: {name}. Supported providers: {', '.join(BATCH_PROVIDER_NAMES)}")
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import threading
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable, Sequence
+from functools import partial
+from typing import Any, Literal, TypedDict
+
+from .cache import JudgmentCache
+from .data import get_evaluation_dataset
+from .evaluator.evaluator import (
+    arun_batched_rubric_evaluation,
+    arun_general_evaluation,
+    arun_rubric_evaluation,
+    arun_subjective_evaluation,
+    build_conversation,
+)
+from .instrumentation import CallRecord, add_sink, percentile, remove_sink
+from .mock_backend import MockBackend, fixed_latency, install_mock_backend, lognormal_latency, uninstall_mock_backend
+from .models import (
+    get_cache,
+    get_cached_token_ratio,
+    get_token_usage,
+    reset_token_usage,
+    set_cache,
+    set_max_concurrency,
+)
+from .types import EvaluationDatasetItem
+
+# ベンチマークの対象となる評価手法。
+BenchmarkPath = Literal["subjective", "general", "rubric"]
+
+BENCHMARK_PATHS: tuple[BenchmarkPath, ...] = ("subjective", "general", "rubric")
+
+# ベンチマークで使用するモデル名（モックのバックエンドが応答する）。
+DEFAULT_BENCHMARK_MODEL = "mock-judge"
+
+
+class BenchmarkResult(TypedDict):
+    """1 つの評価手法のベンチマーク結果。"""
+
+    path: BenchmarkPath
+    label: str
+    evaluations: int
+    failures: int
+    backend_calls: int
+    duration_seconds: float
+    calls_per_second: float
+    latency_p50_seconds: float
+    latency_p99_seconds: float
+    # レート制限や通信エラーで実際に行ったリトライの回数（計測結果の transport_retries の合計）。
+    transport_retries: int
+    # 不正な結果のため評価手法が呼び出しをやり直した回数（attempt が 2 以上の呼び出しの数）。
+    parse_retries: int
+    cache_hits: int
+    input_tokens: int
+    # 入力トークンのうち、コンテキストキャッシュから読み込んだものの割合。
+    cached_token_ratio: float
+    peak_memory_bytes: int
+
+
+class _RetryCounter:
+    """
+    計測結果から、パイプラインが実際に行ったリトライの回数を数える出力先。
+
+    モックが注入した障害の数ではなく、通信エラーのリトライ（transport_retries）と、
+    不正な結果による再試行（attempt が 2 以上の呼び出し）を数える。計測結果は保持しない。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.transport_retries = 0
+        self.parse_retries = 0
+
+    def emit(self, record: CallRecord) -> None:
+        with self._lock:
+            self.transport_retries += record["transport_retries"]
+            if record["attempt"] > 1:
+                self.parse_retries += 1
+
+
+def _build_jobs(
+    path: BenchmarkPath,
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    iterations: int,
+    batched_rubrics: bool,
+) -> list[Callable[[], Awaitable[Any]]]:
+    """評価手法の 1 回分の評価（データ項目 × 試行）を呼び出す関数の一覧を作る。"""
+    jobs: list[Callable[[], Awaitable[Any]]] = []
+    for sample_index in range(iterations):
+        for data in input_data:
+            conversation = build_conversation(data)
+            if path == "subjective":
+                jobs.append(partial(arun_subjective_evaluation, conversation, model_name, sample_index))
+            elif path == "general":
+                jobs.append(partial(arun_general_evaluation, conversation, model_name, sample_index))
+            elif batched_rubrics:
+                jobs.append(partial(arun_batched_rubric_evaluation, data, model_name, sample_index=sample_index))
+            else:
+                jobs.append(partial(arun_rubric_evaluation, data, model_name, sample_index=sample_index))
+    return jobs
+
+
+async def arun_benchmark(
+    path: BenchmarkPath,
+    backend: MockBackend,
+    input_data: list[EvaluationDatasetItem],
+    model_name: str = DEFAULT_BENCHMARK_MODEL,
+    iterations: int = 10,
+    batched_rubrics: bool = False,
+    label: str = "",
+    verbose: bool = False,
+) -> BenchmarkResult:
+    """
+    1 つの評価手法を、データ項目 × iterations 回の評価をすべて並行して実行し、スループットなどを計測する。
+
+    メモリ使用量のピークは tracemalloc で計測するため、計測中は実行速度がやや低下する。
+
+    Args:
+        path: 評価手法
+        backend: model_name に応答するモックのバックエンド（呼び出し回数などの計測に使う）
+        input_data: 評価対象データ
+        model_name: 評価に使用するモデル名
+        iterations: 試行回数
+        batched_rubrics: ルーブリック評価を 1 データ項目につき 1 回の呼び出しでまとめて行うか
+        label: 結果に付けるラベル（キャッシュの cold / warm など）
+        verbose: 評価中のリトライなどのメッセージを表示するか
+
+    Returns:
+        ベンチマーク結果
+    """
+    jobs = _build_jobs(path, input_data, model_name, iterations, batched_rubrics)
+    latencies: list[float] = []
+
+    async def timed(job: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.perf_counter()
+        result = await job()
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    backend.reset()
+    reset_token_usage()
+    cache = get_cache()
+    hits_before = cache.stats["hits"] if cache is not None else 0
+    retries = _RetryCounter()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    add_sink(retries)
+    tracemalloc.start()
+    try:
+        with output:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(timed(job) for job in jobs))
+            duration = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        remove_sink(retries)
+
+    stats = backend.stats
+    usage = get_token_usage()
+    return {
+        "path": path,
+        "label": label,
+        "evaluations": len(jobs),
+        "failures": sum(1 for result in results if result is None),
+        "backend_calls": stats["calls"],
+        "duration_seconds": duration,
+        "calls_per_second": stats["calls"] / duration if duration > 0 else float("nan"),
+        "latency_p50_seconds": percentile(latencies, 50),
+        "latency_p99_seconds": percentile(latencies, 99),
+        "transport_retries": retries.transport_retries,
+        "parse_retries": retries.parse_retries,
+        "cache_hits": (cache.stats["hits"] if cache is not None else 0) - hits_before,
+        "input_tokens": usage["input_tokens"],
+        "cached_token_ratio": get_cached_token_ratio(usage),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def _format_result(result: BenchmarkResult) -> str:
+    """ベンチマーク結果を 1 行の表の形式にする。"""
+    name = f"{result['path']}" + (f" ({result['label']})" if result["label"] else "")
+    return (
+        f"{name:<20} {result['evaluations']:>6} {result['failures']:>6} {result['backend_calls']:>7} "
+        f"{result['calls_per_second']:>10.1f} {result['latency_p50_seconds'] * 1000:>9.1f} "
+        f"{result['latency_p99_seconds'] * 1000:>9.1f} {result['transport_retries']:>8} "
+        f"{result['parse_retries']:>8} {result['cache_hits']:>7} {result['input_tokens']:>10} "
+        f"{result['cached_token_ratio']:>8.1%} {result['peak_memory_bytes'] / 1024 / 1024:>9.2f}"
+    )
+
+
+_HEADER = (
+    f"{'path':<20} {'evals':>6} {'failed':>6} {'calls':>7} {'calls/s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+    f"{'tr.retry':>8} {'ps.retry':>8} {'hits':>7} {'in tokens':>10} {'cached':>8} {'peak MiB':>9}"
+)
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    """コマンドライン引数を解析する。"""
+    parser = argparse.ArgumentParser(
+        description="モックのバックエンドで評価を実行し、評価手法ごとのスループットとレイテンシを計測する。"
+    )
+    parser.add_argument("--paths", nargs="+", choices=BENCHMARK_PATHS, default=list(BENCHMARK_PATHS))
+    parser.add_argument("--iterations", type=int, default=20, help="試行回数")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="API 呼び出しの同時実行数の上限")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="1 回の呼び出しの待ち時間の中央値（ミリ秒）")
+    parser.add_argument(
+        "--latency-sigma", type=float, default=0.5, help="待ち時間の対数正規分布の sigma（0 の場合は固定）"
+    )
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="レート制限（429）を返す確率")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="サーバーエラー（503）を返す確率")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="解釈できない JSON を返す確率")
+    parser.add_argument(
+        "--batched-rubrics", action="store_true", help="ルーブリック評価を 1 回の呼び出しでまとめて行う"
+    )
+    parser.add_argument(
+        "--cache", action="store_true", help="メモリ上のキャッシュを使い、同じ評価を 2 回（cold / warm）実行する"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    parser.add_argument("--verbose", action="store_true", help="評価中のリトライなどのメッセージを表示する")
+    return parser.parse_args(argv)
+
+
+async def _amain(args: argparse.Namespace) -> list[BenchmarkResult]:
+    """ベンチマークを実行する。"""
+    latency_seconds = args.latency_ms / 1000
+    latency = (
+        lognormal_latency(latency_seconds, args.latency_sigma)
+        if args.latency_sigma > 0
+        else fixed_latency(latency_seconds)
+    )
+    backend = install_mock_backend(
+        MockBackend(
+            latency=latency,
+            rate_limit_rate=args.rate_limit_rate,
+            server_error_rate=args.server_error_rate,
+            malformed_rate=args.malformed_rate,
+            seed=args.seed,
+        )
+    )
+    set_max_concurrency(args.max_concurrency)
+    input_data = get_evaluation_dataset()
+    previous_cache = get_cache()
+    results: list[BenchmarkResult] = []
+    try:
+        for path in args.paths:
+            if args.cache:
+                cache = JudgmentCache(":memory:")
+                set_cache(cache)
+                for label in ("cold", "warm"):
+                    results.append(
+                        await arun_benchmark(
+                            path,
+                            backend,
+                            input_data,
+                            iterations=args.iterations,
+                            batched_rubrics=args.batched_rubrics,
+                            label=label,
+                            verbose=args.verbose,
+                        )
+                    )
+                cache.close()
+            else:
+                set_cache(None)
+                results.append(
+                    await arun_benchmark(
+                        path,
+                        backend,
+                        input_data,
+                        iterations=args.iterations,
+                        batched_rubrics=args.batched_rubrics,
+                        verbose=args.verbose,
+                    )
+                )
+    finally:
+        set_cache(previous_cache)
+        uninstall_mock_backend()
+    return results
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """コンソールスクリプト llm-judge-benchmark のエントリーポイント。"""
+    args = _parse_args(argv)
+    results = asyncio.run(_amain(args))
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    print(_HEADER)
+    for result in results:
+        print(_format_result(result))
+
+
+if __name__ == "__main__":
+    main()
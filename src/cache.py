@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, TypedDict, cast
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), "data", "cache", "judgments.sqlite3")
+
+# 上限件数を超えたときに、上限の何割まで削減するか（書き込みのたびに削除が走らないようにするため）。
+_EVICTION_TARGET_RATIO = 0.9
+# 参照時刻の更新をまとめて書き込む件数（put・close の際にも書き込む）
+_MAX_PENDING_ACCESSES = 1000
+
+
+class CacheStats(TypedDict):
+    """キャッシュのヒット・ミスなどの回数。"""
+
+    hits: int
+    misses: int
+    writes: int
+    evictions: int
+
+
+def make_cache_key(
+    model_name: str,
+    prompt: str,
+    schema: dict[str, Any],
+    temperature: float | None,
+    max_tokens: int | None,
+    sample_index: int = 0,
+) -> str:
+    """
+    リクエストの内容からキャッシュキー（SHA-256）を生成する。
+
+    Args:
+        model_name: モデル名
+        prompt: プロンプト
+        schema: JSON スキーマ
+        temperature: 温度パラメータ
+        max_tokens: 生成する最大トークン数
+        sample_index: 同じリクエストを複数回サンプリングする場合の通し番号（0 始まり）
+
+    Returns:
+        16 進数文字列のキャッシュキー
+    """
+    payload = json.dumps(
+        [model_name, prompt, schema, temperature, max_tokens, sample_index],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JudgmentCache:
+    """
+    LLM の判定結果（JSON）を SQLite ファイルに永続化するキャッシュ。
+
+    キーはリクエストの内容のハッシュ（make_cache_key）で、値は生成された JSON オブジェクト。
+    件数の上限を超えた場合は最終参照時刻が古いものから、TTL を過ぎたものは参照時に削除する。
+    スレッドセーフ。
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: int | None = 100_000,
+        ttl_seconds: float | None = None,
+    ) -> None:
+        """
+        Args:
+            path: SQLite ファイルのパス（":memory:" でメモリ上に作成する）
+            max_entries: 保持する最大件数（None の場合は無制限）
+            ttl_seconds: 書き込みからの有効期間（秒）（None の場合は無期限）
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._stats: CacheStats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        # ヒット時の最終参照時刻は毎回書き込まず、ここに溜めてまとめて書き込む。
+        self._pending_accesses: dict[str, float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # キャッシュは失っても再計算できるため、WAL モードで安全な範囲で同期を減らす。
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS judgments ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS judgments_accessed_at ON judgments (accessed_at)")
+        self._conn.commit()
+        self._size = int(self._conn.execute("SELECT COUNT(*) FROM judgments").fetchone()[0])
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """キャッシュから値を取得する。存在しない、または有効期限切れの場合は None を返す。"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM judgments WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM judgments WHERE key = ?", (key,))
+                self._conn.commit()
+                self._pending_accesses.pop(key, None)
+                self._size -= 1
+                self._stats["evictions"] += 1
+                row = None
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._pending_accesses[key] = now
+            if len(self._pending_accesses) >= _MAX_PENDING_ACCESSES:
+                self._flush_accesses_locked()
+                self._conn.commit()
+            self._stats["hits"] += 1
+            return cast(dict[str, Any], json.loads(row[0]))
+
+    def put(self, key: str, value: dict[str, Any]) -> None:
+        """キャッシュに値を書き込む。同じキーの値が存在する場合は上書きする。"""
+        now = time.time()
+        with self._lock:
+            self._flush_accesses_locked()
+            existed = self._conn.execute("SELECT 1 FROM judgments WHERE key = ?", (key,)).fetchone() is not None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judgments (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            if not existed:
+                self._size += 1
+            self._stats["writes"] += 1
+            if self.max_entries is not None and self._size > self.max_entries:
+                self._evict_locked(int(self.max_entries * _EVICTION_TARGET_RATIO))
+            self._conn.commit()
+
+    def evict_expired(self) -> int:
+        """
+        有効期限切れのエントリを削除する。
+
+        Returns:
+            削除した件数
+        """
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM judgments WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+            self._size -= cursor.rowcount
+            self._stats["evictions"] += cursor.rowcount
+            return cursor.rowcount
+
+    def _flush_accesses_locked(self) -> None:
+        """溜めている最終参照時刻の更新を書き込む（ロック取得済みで呼び出し、コミットは呼び出し元で行う）。"""
+        if not self._pending_accesses:
+            return
+        self._conn.executemany(
+            "UPDATE judgments SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._pending_accesses.items()],
+        )
+        self._pending_accesses.clear()
+
+    def _evict_locked(self, target_size: int) -> None:
+        """最終参照時刻が古いものから target_size 件になるまで削除する（ロック取得済みで呼び出す）。"""
+        excess = self._size - target_size
+        if excess <= 0:
+            return
+        cursor = self._conn.execute(
+            "DELETE FROM judgments WHERE key IN (SELECT key FROM judgments ORDER BY accessed_at LIMIT ?)",
+            (excess,),
+        )
+        self._size -= cursor.rowcount
+        self._stats["evictions"] += cursor.rowcount
+
+    def clear(self) -> None:
+        """すべてのエントリを削除する。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM judgments")
+            self._conn.commit()
+            self._pending_accesses.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def stats(self) -> CacheStats:
+        """このインスタンスを生成してからのヒット・ミスなどの回数。"""
+        with self._lock:
+            return cast(CacheStats, dict(self._stats))
+
+    def close(self) -> None:
+        """溜めている最終参照時刻の更新を書き込み、SQLite の接続を閉じる。"""
+        with self._lock:
+            self._flush_accesses_locked()
+            self._conn.commit()
+            self._conn.close()
@@ -1,8 +1,11 @@
 import json
 import os
+from collections.abc import Iterable
+from pathlib import Path
 from typing import cast
 
 from ..types import EvaluationDatasetItem, GenerationDatasetItem, RubricItem
+from .dataset_store import iter_evaluation_dataset
 
 DATA_DIR = os.path.dirname(__file__)
 EVALUATION_DATASET_PATH = os.path.join(DATA_DIR, "evaluation_dataset.json")
@@ -16,6 +19,20 @@ def get_evaluation_dataset() -> list[EvaluationDatasetItem]:
         return cast(list[EvaluationDatasetItem], json.load(f))
 
 
+def load_evaluation_dataset(path: Path) -> list[EvaluationDatasetItem]:
+    """
+    評価対象データをファイルから読み込む。
+
+    JSON ファイル（evaluation_dataset.json と同じ形式）はそのまま読み込み、それ以外（JSONL ファイルや
+    シャードのディレクトリ）は iter_evaluation_dataset で読み込む。
+    同じルーブリックセットを参照するデータ項目は 1 つのリストを共有する。
+    """
+    if path.suffix == ".json":
+        with open(path, encoding="utf-8") as f:
+            return cast(list[EvaluationDatasetItem], json.load(f))
+    return list(iter_evaluation_dataset(path))
+
+
 def get_generation_dataset() -> list[GenerationDatasetItem]:
     """生成用データ（プロンプトとシステム指示）を取得する。"""
     with open(GENERATION_DATASET_PATH, encoding="utf-8") as f:
@@ -28,12 +45,23 @@ def get_rubrics() -> list[RubricItem]:
         return cast(list[RubricItem], json.load(f))
 
 
-def save_evaluation_dataset(data: list[EvaluationDatasetItem]) -> None:
+def save_evaluation_dataset(data: Iterable[EvaluationDatasetItem]) -> int:
     """
     評価対象データを保存する。
 
+    data はイテレーターでよい（1 件ずつ書き込み、json.dump(list(data), indent=2) と同じ内容になる）。
+
     Args:
         data: 保存する評価対象データ
+
+    Returns:
+        保存したデータ項目数
     """
+    count = 0
     with open(EVALUATION_DATASET_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+        for item in data:
+            f.write(",\n  " if count else "[\n  ")
+            f.write(json.dumps(item, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            count += 1
+        f.write("\n]" if count else "[]")
+    return count
@@ -0,0 +1,230 @@
+import json
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import IO, Any, Literal, cast
+
+from ..types import EvaluationDatasetItem, GenerationDatasetItem, RubricItem
+from .result_store import _iter_records, _open_text, content_hash
+
+# シャードのファイル名（番号は 0 始まりの連番）。
+SHARD_FILENAME_TEMPLATE = "part-{index:05d}.{suffix}"
+
+# ルーブリックセットを保存するファイル名（データセットのディレクトリ直下）。
+RUBRIC_SETS_FILENAME = "rubric_sets.jsonl"
+
+# 1 シャードあたりのデータ項目数のデフォルト値。
+DEFAULT_SHARD_SIZE = 10_000
+
+# シャードの保存形式。
+ShardFormat = Literal["jsonl", "jsonl.gz", "jsonl.zst"]
+
+_SHARD_SUFFIXES = (".jsonl", ".jsonl.gz", ".jsonl.zst")
+
+
+def rubric_set_id(rubrics: list[RubricItem]) -> str:
+    """ルーブリックセットの内容から ID を計算する。"""
+    return "rs-" + content_hash(rubrics)[:16]
+
+
+class RubricSetStore:
+    """
+    ルーブリックセット（ルーブリック項目のリスト）を ID をキーとして 1 回だけ保存する追記専用のストア。
+
+    データセットの各データ項目は ID のみを保存し、読み込み時は同じ ID のデータ項目が 1 つのリストを共有する。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._sets: dict[str, list[RubricItem]] = {}
+        # put に同じリストが繰り返し渡された場合にハッシュを計算し直さないよう、id() から ID を引く。
+        # リストが解放されて id() が再利用されないよう、リスト自体も保持する。
+        self._ids_by_object: dict[int, tuple[list[RubricItem], str]] = {}
+        if path.exists():
+            for record in _iter_records(path):
+                self._sets[record["rubric_set_id"]] = record["rubrics"]
+        self._file: IO[str] | None = None
+
+    def put(self, rubrics: list[RubricItem]) -> str:
+        """ルーブリックセットを保存して ID を返す。保存済みの場合は何もしない。"""
+        cached = self._ids_by_object.get(id(rubrics))
+        if cached is not None and cached[0] is rubrics:
+            return cached[1]
+        key = rubric_set_id(rubrics)
+        if key not in self._sets:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps({"rubric_set_id": key, "rubrics": rubrics}, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._sets[key] = rubrics
+        self._ids_by_object[id(rubrics)] = (rubrics, key)
+        return key
+
+    def get(self, key: str) -> list[RubricItem]:
+        """
+        ID からルーブリックセットを取得する。
+
+        Raises:
+            KeyError: ルーブリックセットが保存されていない場合
+        """
+        return self._sets[key]
+
+    def close(self) -> None:
+        """ファイルを閉じる。"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def dataset_shards(path: Path) -> list[Path]:
+    """
+    データセットのファイルを列挙する。
+
+    path がディレクトリの場合は直下の JSONL ファイル（.jsonl / .jsonl.gz / .jsonl.zst）を名前順に返し、
+    ファイルの場合はそのファイルのみを返す。
+    """
+    if not path.is_dir():
+        return [path]
+    return sorted(
+        shard for shard in path.iterdir() if shard.name != RUBRIC_SETS_FILENAME and shard.name.endswith(_SHARD_SUFFIXES)
+    )
+
+
+def _default_rubric_sets(path: Path) -> RubricSetStore | None:
+    """データセットのディレクトリ（ファイルの場合はその親）にあるルーブリックセットのストアを開く。"""
+    store_path = (path if path.is_dir() else path.parent) / RUBRIC_SETS_FILENAME
+    return RubricSetStore(store_path) if store_path.exists() else None
+
+
+def iter_evaluation_dataset(path: Path, rubric_sets: RubricSetStore | None = None) -> Iterator[EvaluationDatasetItem]:
+    """
+    評価対象データを JSONL ファイル（またはシャードのディレクトリ）から 1 件ずつ読み込む。
+
+    メモリに保持するのは読み込み中の 1 件とルーブリックセットのみ。各行は rubric_set_id でルーブリックセットを
+    参照するか、rubrics を直接含む。同じ rubric_set_id のデータ項目は 1 つのリストを共有する。
+
+    Args:
+        path: JSONL ファイル、またはシャードのディレクトリ
+        rubric_sets: ルーブリックセットのストア（指定しない場合はデータセットと同じディレクトリの
+            rubric_sets.jsonl を使う）
+
+    Raises:
+        KeyError: 参照しているルーブリックセットが見つからない場合
+    """
+    store = rubric_sets or _default_rubric_sets(path)
+    for shard in dataset_shards(path):
+        for record in _iter_records(shard):
+            if "rubric_set_id" in record:
+                if store is None:
+                    raise KeyError(f"Rubric set {record['rubric_set_id']} not found for {shard}")
+                # JSON 形式から読み込んだ場合と同じ形にするため、ID はデータ項目に残さない。
+                record["rubrics"] = store.get(record.pop("rubric_set_id"))
+            yield cast(EvaluationDatasetItem, record)
+
+
+def iter_generation_dataset(path: Path) -> Iterator[GenerationDatasetItem]:
+    """生成用データを JSONL ファイル（またはシャードのディレクトリ）から 1 件ずつ読み込む。"""
+    for shard in dataset_shards(path):
+        for record in _iter_records(shard):
+            yield cast(GenerationDatasetItem, record)
+
+
+class DatasetWriter:
+    """
+    データセットを shard_size 件ごとのシャード（output_dir/part-00000.jsonl, ...）に書き込む。
+
+    評価対象データのルーブリックは output_dir/rubric_sets.jsonl に 1 回だけ保存し、
+    各行には rubric_set_id のみを書き込む。
+    """
+
+    def __init__(
+        self, output_dir: Path, shard_size: int = DEFAULT_SHARD_SIZE, shard_format: ShardFormat = "jsonl"
+    ) -> None:
+        """
+        Args:
+            output_dir: 出力先のディレクトリ（存在しない場合は作成する）
+            shard_size: 1 シャードあたりのデータ項目数
+            shard_format: シャードの保存形式
+
+        Raises:
+            ValueError: shard_size が 1 未満の場合、または output_dir にシャードが既にある場合
+        """
+        if shard_size < 1:
+            raise ValueError(f"shard_size must be at least 1: {shard_size}")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if dataset_shards(output_dir):
+            raise ValueError(f"Dataset shards already exist in {output_dir}")
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.shard_format: ShardFormat = shard_format
+        self.rubric_sets = RubricSetStore(output_dir / RUBRIC_SETS_FILENAME)
+        self.count = 0
+        self._file: IO[str] | None = None
+
+    def _write(self, record: dict[str, Any]) -> None:
+        if self._file is None or self.count % self.shard_size == 0:
+            if self._file is not None:
+                self._file.close()
+            name = SHARD_FILENAME_TEMPLATE.format(index=self.count // self.shard_size, suffix=self.shard_format)
+            self._file = _open_text(self.output_dir / name, "w")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def write_evaluation_item(self, item: EvaluationDatasetItem) -> None:
+        """評価対象データ項目を 1 件書き込む（ルーブリックは rubric_set_id で参照する）。"""
+        record: dict[str, Any] = {key: value for key, value in item.items() if key != "rubrics"}
+        record["rubric_set_id"] = self.rubric_sets.put(item["rubrics"])
+        self._write(record)
+
+    def write_generation_item(self, item: GenerationDatasetItem) -> None:
+        """生成用データ項目を 1 件書き込む。"""
+        self._write(dict(item))
+
+    def close(self) -> None:
+        """ファイルを閉じる。"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.rubric_sets.close()
+
+
+def write_evaluation_dataset(
+    items: Iterable[EvaluationDatasetItem],
+    output_dir: Path,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    shard_format: ShardFormat = "jsonl",
+) -> int:
+    """
+    評価対象データをシャードに書き込む。items はイテレーターでよい（1 件ずつ書き込む）。
+
+    Returns:
+        書き込んだデータ項目数
+    """
+    writer = DatasetWriter(output_dir, shard_size, shard_format)
+    try:
+        for item in items:
+            writer.write_evaluation_item(item)
+    finally:
+        writer.close()
+    return writer.count
+
+
+def write_generation_dataset(
+    items: Iterable[GenerationDatasetItem],
+    output_dir: Path,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    shard_format: ShardFormat = "jsonl",
+) -> int:
+    """
+    生成用データをシャードに書き込む。items はイテレーターでよい（1 件ずつ書き込む）。
+
+    Returns:
+        書き込んだデータ項目数
+    """
+    writer = DatasetWriter(output_dir, shard_size, shard_format)
+    try:
+        for item in items:
+            writer.write_generation_item(item)
+    finally:
+        writer.close()
+    return writer.count
@@ -0,0 +1,441 @@
+import gzip
+import hashlib
+import importlib
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import IO, Any, Literal, cast
+
+from ..types import EvaluationOutput, EvaluationResultByRubric, PromptItem, RatingResult, RubricItem, RubricResult
+from .verdict_table import VerdictTable
+
+# 評価結果の保存先のデフォルト値。
+DEFAULT_OUTPUT_ROOT = Path("src/data/evaluation_result")
+
+# 評価結果の保存形式。
+# - "json": 評価手法ごとに結果の配列を 1 つの JSON ファイルに保存する（従来の形式）。
+# - "jsonl": 結果を 1 件 1 行で追記する。会話とルーブリックは内容のハッシュで参照し、1 回だけ保存する。
+# - "jsonl.gz" / "jsonl.zst": "jsonl" を gzip / zstd で圧縮する。
+ResultFormat = Literal["json", "jsonl", "jsonl.gz", "jsonl.zst"]
+
+RESULT_FORMATS: tuple[ResultFormat, ...] = ("json", "jsonl", "jsonl.gz", "jsonl.zst")
+
+# 評価手法ごとの結果ファイル名（拡張子を除く）。
+SUBJECTIVE_EVALUATION_STEM = "01_subjective_evaluation"
+GENERAL_EVALUATION_STEM = "02_general_evaluation"
+RUBRIC_EVALUATION_STEM = "03_rubric_evaluation"
+
+# 会話とルーブリックを保存するファイル名（評価結果の保存先の直下に置き、全試行で共有する）。
+CONVERSATION_STORE_FILENAME = "conversations.jsonl"
+
+
+def _open_text(path: Path, mode: Literal["r", "a", "w"]) -> IO[str]:
+    """拡張子（.gz / .zst）に応じて圧縮ファイルをテキストモードで開く。"""
+    if path.suffix == ".gz":
+        return cast(IO[str], gzip.open(path, mode + "t", encoding="utf-8"))
+    if path.suffix == ".zst":
+        # Python 3.14 以降は標準ライブラリの compression.zstd、それ以前は zstandard パッケージを使う。
+        try:
+            zstd: Any = importlib.import_module("compression.zstd")
+            return cast(IO[str], zstd.open(path, mode + "t", encoding="utf-8"))
+        except ImportError:
+            pass
+        try:
+            zstandard: Any = importlib.import_module("zstandard")
+        except ImportError as error:
+            raise ImportError("zstd compression requires Python 3.14+ or the 'zstandard' package") from error
+        return cast(IO[str], zstandard.open(path, mode + "t", encoding="utf-8"))
+    return open(path, mode, encoding="utf-8")
+
+
+def content_hash(value: Any) -> str:
+    """JSON に変換可能な値の内容から SHA-256 ハッシュを計算する。"""
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _conversation_value(output: EvaluationOutput) -> dict[str, Any]:
+    """EvaluationOutput から会話（プロンプトと評価対象の応答）を取り出す。"""
+    return {"prompts": output.prompts, "llm_response_text": output.llm_response_text}
+
+
+class ConversationStore:
+    """
+    会話とルーブリックを内容のハッシュをキーとして 1 回だけ保存する追記専用のストア。
+
+    各試行の結果ファイルはハッシュのみを参照するため、同じ会話を何度評価しても本文は 1 回しか保存されない。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._values: dict[str, Any] = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 書き込み途中で中断された行は無視する。
+                        continue
+                    self._values[record["hash"]] = record["value"]
+        self._file: IO[str] | None = None
+
+    def put(self, value: Any) -> str:
+        """値を保存してハッシュを返す。保存済みの場合は何もしない。"""
+        key = content_hash(value)
+        if key not in self._values:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps({"hash": key, "value": value}, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._values[key] = value
+        return key
+
+    def get(self, key: str) -> Any:
+        """
+        ハッシュから値を取得する。
+
+        Raises:
+            KeyError: 値が保存されていない場合
+        """
+        return self._values[key]
+
+    def close(self) -> None:
+        """ファイルを閉じる。"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JsonlResultWriter:
+    """
+    評価結果を 1 件 1 行の JSONL 形式で書き込む。
+
+    会話とルーブリックは conversation_store に保存してハッシュで参照する。
+    conversation_store を指定しない場合は、同じファイル内に 1 回だけ書き込む。
+    """
+
+    def __init__(self, path: Path, conversation_store: ConversationStore | None = None) -> None:
+        self.path = path
+        self._file = _open_text(path, "w")
+        self._store = conversation_store
+        self._inline_hashes: set[str] = set()
+
+    def _put(self, value: Any) -> str:
+        """会話またはルーブリックを保存してハッシュを返す。"""
+        if self._store is not None:
+            return self._store.put(value)
+        key = content_hash(value)
+        if key not in self._inline_hashes:
+            self._write({"type": "content", "hash": key, "value": value})
+            self._inline_hashes.add(key)
+        return key
+
+    def _write(self, record: dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def write_rating(self, item_index: int, result: RatingResult) -> None:
+        """主観評価・自由記述評価の結果を書き込む。"""
+        self._write({"type": "rating", "item_index": item_index, **result})
+        self._file.flush()
+
+    def write_evaluation_output(self, item_index: int, output: EvaluationOutput) -> None:
+        """ルーブリック評価の結果を書き込む。"""
+        rubrics = [r.rubric for r in output.result_by_rubrics]
+        self._write(
+            {
+                "type": "rubric_evaluation",
+                "item_index": item_index,
+                "prompt_id": output.prompt_id,
+                "conversation": self._put(_conversation_value(output)),
+                "rubrics": self._put(rubrics),
+                "results": [_rubric_result_record(r) for r in output.result_by_rubrics],
+            }
+        )
+        self._file.flush()
+
+    def close(self) -> None:
+        """ファイルを閉じる。"""
+        self._file.close()
+
+
+def _rubric_result_record(result: EvaluationResultByRubric) -> dict[str, Any]:
+    """
+    ルーブリック項目 1 件分の判定結果のレコードを作る。
+
+    decided_by はカスケード評価、judges はアンサンブル評価の場合のみ含める。
+    """
+    record: dict[str, Any] = {"explanation": result.explanation, "criteria_met": result.criteria_met}
+    if result.decided_by is not None:
+        record["decided_by"] = result.decided_by
+    if result.judges is not None:
+        record["judges"] = result.judges
+    return record
+
+
+def _iter_records(path: Path) -> Iterator[dict[str, Any]]:
+    """JSONL ファイルのレコードを順に読み込む。書き込み途中で中断された末尾の行は無視する。"""
+    with _open_text(path, "r") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        except EOFError:
+            # 圧縮ファイルが書き込み途中で中断された場合は、読み込めたところまでを返す。
+            return
+
+
+def _default_conversation_store(path: Path) -> ConversationStore | None:
+    """結果ファイルの保存先（<output_root>/<timestamp>/）に対応する会話ストアを開く。"""
+    store_path = path.parent.parent / CONVERSATION_STORE_FILENAME
+    return ConversationStore(store_path) if store_path.exists() else None
+
+
+def _rating_result(record: dict[str, Any]) -> RatingResult:
+    """
+    主観評価・自由記述評価の結果のレコードから RatingResult を復元する。
+
+    decided_by（カスケード評価）と judges（アンサンブル評価）は含まれている場合のみ復元する。
+    """
+    result: RatingResult = {"explanation": record["explanation"], "rating": record["rating"]}
+    if "decided_by" in record:
+        result["decided_by"] = record["decided_by"]
+    if "judges" in record:
+        result["judges"] = record["judges"]
+    return result
+
+
+def iter_rating_results(path: Path) -> Iterator[RatingResult]:
+    """主観評価・自由記述評価の結果ファイル（JSONL）を読み込む。"""
+    for record in _iter_records(path):
+        if record["type"] == "rating":
+            yield _rating_result(record)
+
+
+def iter_evaluation_outputs(
+    path: Path, conversation_store: ConversationStore | None = None
+) -> Iterator[EvaluationOutput]:
+    """
+    ルーブリック評価の結果ファイル（JSONL）を読み込み、EvaluationOutput を復元する。
+
+    Args:
+        path: 結果ファイルのパス
+        conversation_store: 会話とルーブリックのストア（指定しない場合は <output_root>/conversations.jsonl を使う）
+    """
+    store = conversation_store or _default_conversation_store(path)
+    inline: dict[str, Any] = {}
+
+    def resolve(key: str) -> Any:
+        if key in inline:
+            return inline[key]
+        if store is None:
+            raise KeyError(f"Content {key} not found in {path}")
+        return store.get(key)
+
+    for record in _iter_records(path):
+        if record["type"] == "content":
+            inline[record["hash"]] = record["value"]
+        elif record["type"] == "rubric_evaluation":
+            conversation = resolve(record["conversation"])
+            rubrics: list[RubricItem] = resolve(record["rubrics"])
+            prompts: list[PromptItem] = conversation["prompts"]
+            yield EvaluationOutput(
+                prompt_id=record["prompt_id"],
+                prompts=prompts,
+                llm_response_text=conversation["llm_response_text"],
+                result_by_rubrics=[
+                    EvaluationResultByRubric(
+                        rubric=rubric,
+                        explanation=result["explanation"],
+                        criteria_met=result["criteria_met"],
+                        decided_by=result.get("decided_by"),
+                        judges=result.get("judges"),
+                    )
+                    for rubric, result in zip(rubrics, record["results"], strict=True)
+                ],
+            )
+
+
+class _OrderedSink:
+    """
+    完了した順に届く結果をデータ項目の番号順に並べ替えて書き込む。
+
+    番号の小さい結果がすべて揃った分だけ書き込み、残りのみを保持する。評価に失敗した項目（None）は読み飛ばす。
+    """
+
+    def __init__(self, write: Any) -> None:
+        self._write = write
+        self._next_index = 0
+        self._pending: dict[int, Any] = {}
+
+    def put(self, item_index: int, value: Any) -> None:
+        self._pending[item_index] = value
+        while self._next_index in self._pending:
+            ready = self._pending.pop(self._next_index)
+            if ready is not None:
+                self._write(self._next_index, ready)
+            self._next_index += 1
+
+
+class IterationResultWriter:
+    """
+    1 試行分の評価結果を output_dir 配下に評価手法ごとのファイルとして書き込む。
+
+    結果はデータ項目ごとに完了した順に渡してよく、ファイルにはデータ項目の番号順に書き込まれる。
+    "json" 形式では close 時に従来と同じ JSON 配列を書き込み、JSONL 形式では結果が揃い次第 1 行ずつ追記する。
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        result_format: ResultFormat = "json",
+        conversation_store: ConversationStore | None = None,
+    ) -> None:
+        """
+        Args:
+            output_dir: 出力ディレクトリ
+            result_format: 保存形式
+            conversation_store: JSONL 形式で会話とルーブリックを保存するストア（指定しない場合は各ファイルに保存する）
+        """
+        self.output_dir = output_dir
+        self.result_format = result_format
+        self._subjective: list[RatingResult] = []
+        self._general: list[RatingResult] = []
+        # ルーブリック評価の結果は列指向の表に溜め、close 時に点数をまとめて計算して書き込む。
+        self._rubric = VerdictTable()
+        self._writers: list[JsonlResultWriter] = []
+
+        if result_format == "json":
+            self._subjective_sink = _OrderedSink(lambda _, r: self._subjective.append(r))
+            self._general_sink = _OrderedSink(lambda _, r: self._general.append(r))
+            self._rubric_sink = _OrderedSink(lambda _, r: self._rubric.append_output(r))
+        else:
+            suffix = "." + result_format
+            subjective = self._open(output_dir / (SUBJECTIVE_EVALUATION_STEM + suffix), conversation_store)
+            general = self._open(output_dir / (GENERAL_EVALUATION_STEM + suffix), conversation_store)
+            rubric = self._open(output_dir / (RUBRIC_EVALUATION_STEM + suffix), conversation_store)
+            self._subjective_sink = _OrderedSink(subjective.write_rating)
+            self._general_sink = _OrderedSink(general.write_rating)
+            self._rubric_sink = _OrderedSink(rubric.write_evaluation_output)
+
+    def _open(self, path: Path, conversation_store: ConversationStore | None) -> JsonlResultWriter:
+        writer = JsonlResultWriter(path, conversation_store)
+        self._writers.append(writer)
+        return writer
+
+    def write_subjective(self, item_index: int, result: RatingResult | None) -> None:
+        """主観評価の結果を書き込む（評価に失敗した場合は None）。"""
+        self._subjective_sink.put(item_index, result)
+
+    def write_general(self, item_index: int, result: RatingResult | None) -> None:
+        """自由記述評価の結果を書き込む（評価に失敗した場合は None）。"""
+        self._general_sink.put(item_index, result)
+
+    def write_rubric(self, item_index: int, output: EvaluationOutput | None) -> None:
+        """ルーブリック評価の結果を書き込む（評価に失敗した場合は None）。"""
+        self._rubric_sink.put(item_index, output)
+
+    def close(self) -> None:
+        """ファイルを閉じる。"json" 形式の場合はここで結果を書き込む（結果が空の評価手法は書き込まない）。"""
+        if self.result_format == "json":
+            # ルーブリック評価は EvaluationOutput.model_dump(exclude_none=True) と同じ形式で書き込む
+            # （decided_by はカスケード評価、judges はアンサンブル評価の場合のみ含まれ、従来の形式と同じになる）。
+            for stem, results in (
+                (SUBJECTIVE_EVALUATION_STEM, self._subjective),
+                (GENERAL_EVALUATION_STEM, self._general),
+                (RUBRIC_EVALUATION_STEM, list(self._rubric.records())),
+            ):
+                if results:
+                    with open(self.output_dir / (stem + ".json"), "w", encoding="utf-8") as f:
+                        json.dump(results, f, ensure_ascii=False, indent=2)
+        for writer in self._writers:
+            writer.close()
+
+
+def load_rating_results(path: Path) -> list[RatingResult]:
+    """主観評価・自由記述評価の結果ファイルを保存形式（拡張子）に応じて読み込む。"""
+    if path.suffix == ".json":
+        with open(path, encoding="utf-8") as f:
+            return cast(list[RatingResult], json.load(f))
+    return list(iter_rating_results(path))
+
+
+def load_rating_results_by_item(path: Path, item_count: int) -> list[RatingResult | None]:
+    """
+    主観評価・自由記述評価の結果ファイルを読み込み、データ項目の番号の位置に並べる（結果がない項目は None）。
+
+    JSONL 形式はレコードの item_index で並べる。"json" 形式には番号が保存されていないため、
+    件数が item_count と一致する場合のみ先頭から順に対応付け、一致しない場合（評価に失敗した項目がある場合）は
+    すべて None とする。
+    """
+    aligned: list[RatingResult | None] = [None] * item_count
+    if path.suffix == ".json":
+        results = load_rating_results(path)
+        if len(results) == item_count:
+            aligned = list(results)
+        return aligned
+    for record in _iter_records(path):
+        if record["type"] == "rating" and 0 <= record["item_index"] < item_count:
+            aligned[record["item_index"]] = _rating_result(record)
+    return aligned
+
+
+def load_evaluation_outputs(path: Path) -> list[EvaluationOutput]:
+    """ルーブリック評価の結果ファイルを保存形式（拡張子）に応じて読み込む。"""
+    if path.suffix == ".json":
+        with open(path, encoding="utf-8") as f:
+            return [EvaluationOutput.model_validate(item) for item in json.load(f)]
+    return list(iter_evaluation_outputs(path))
+
+
+def load_verdict_table(path: Path, table: VerdictTable | None = None) -> VerdictTable:
+    """
+    ルーブリック評価の結果ファイルを、EvaluationOutput を経由せずに列指向の表として読み込む。
+
+    Args:
+        path: 結果ファイルのパス（保存形式は拡張子で判定する）
+        table: 追加先の表（複数のファイルを 1 つの表に読み込む場合に指定する）
+    """
+    table = table if table is not None else VerdictTable()
+    if path.suffix == ".json":
+        with open(path, encoding="utf-8") as f:
+            for record in json.load(f):
+                table.append_record(record)
+        return table
+
+    store = _default_conversation_store(path)
+    inline: dict[str, Any] = {}
+
+    def resolve(key: str) -> Any:
+        if key in inline:
+            return inline[key]
+        if store is None:
+            raise KeyError(f"Content {key} not found in {path}")
+        return store.get(key)
+
+    for record in _iter_records(path):
+        if record["type"] == "content":
+            inline[record["hash"]] = record["value"]
+        elif record["type"] == "rubric_evaluation":
+            conversation = resolve(record["conversation"])
+            rubrics: list[RubricItem] = resolve(record["rubrics"])
+            table.append(
+                record["prompt_id"],
+                conversation["prompts"],
+                conversation["llm_response_text"],
+                rubrics,
+                cast(list[RubricResult], record["results"]),
+            )
+    return table
+
+
+def find_result_file(output_dir: Path, stem: str) -> Path | None:
+    """出力ディレクトリから評価手法の結果ファイルを探す（保存形式は問わない）。"""
+    for result_format in RESULT_FORMATS:
+        path = output_dir / f"{stem}.{result_format}"
+        if path.exists():
+            return path
+    return None
@@ -0,0 +1,265 @@
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any, NamedTuple, cast
+
+from ..types import (
+    EvaluationOutput,
+    EvaluationResultByRubric,
+    JudgeTier,
+    JudgeVerdict,
+    PromptItem,
+    RubricItem,
+    RubricResult,
+)
+
+# decided_by を 1 バイトで保持するための符号（位置が符号、0 はカスケード評価以外）。
+_JUDGE_TIERS: tuple[JudgeTier | None, ...] = (None, "fast", "strong")
+_JUDGE_TIER_CODES: dict[JudgeTier | None, int] = {tier: code for code, tier in enumerate(_JUDGE_TIERS)}
+
+_ZERO_POINTS_MESSAGE = "Rubric の points は正の数または負の数である必要があります。"
+
+
+class RubricTable:
+    """
+    ルーブリック項目を内容ごとに 1 回だけ保持し、番号で参照する表。
+
+    同じ内容のルーブリック項目は同じ番号になり、最初に渡された辞書を共有する。
+    """
+
+    def __init__(self) -> None:
+        self.rubrics: list[RubricItem] = []
+        self.points: array[int] = array("q")
+        self._ids: dict[tuple[str, int], int] = {}
+
+    def intern(self, rubric: RubricItem) -> int:
+        """ルーブリック項目の番号を返す（初めての内容の場合は追加する）。"""
+        key = (rubric["criterion"], rubric["points"])
+        rubric_id = self._ids.get(key)
+        if rubric_id is None:
+            rubric_id = self._ids[key] = len(self.rubrics)
+            self.rubrics.append(rubric)
+            self.points.append(rubric["points"])
+        return rubric_id
+
+    def __len__(self) -> int:
+        return len(self.rubrics)
+
+
+class ScoreColumns(NamedTuple):
+    """評価結果ごとの点数（EvaluationOutput の同名の computed_field と同じ定義）を列として並べたもの。"""
+
+    total_score: array[int]
+    theoretical_score: array[int]
+    score_rate: array[float]
+    criteria_pass_rate: array[float]
+
+
+class VerdictTable:
+    """
+    ルーブリック評価の結果を列指向で保持する表。
+
+    判定（ルーブリック項目ごとの結果）は 1 行あたり、ルーブリック表の番号・適合判定・decided_by の符号を
+    配列に、説明をリストに持つ。アンサンブル評価の判定モデルごとの判定は、それを持つ行のみ辞書に持つ。
+    ルーブリック項目の辞書は RubricTable で共有し、行ごとには複製しない。
+    点数は scores でまとめて 1 回だけ計算し、追加された評価結果の分のみを計算し足す。
+    EvaluationOutput との相互変換（output / append_output）では内容は失われない。
+    """
+
+    def __init__(self, rubrics: RubricTable | None = None) -> None:
+        """
+        Args:
+            rubrics: ルーブリック表（複数の表で共有する場合に指定する）
+        """
+        self.rubrics = rubrics or RubricTable()
+        # 評価結果ごとの列。
+        self.prompt_ids: list[str] = []
+        self.prompts: list[list[PromptItem]] = []
+        self.llm_response_texts: list[str] = []
+        # 評価結果 i の判定は offsets[i] 行目から offsets[i + 1] 行目の手前まで。
+        self.offsets: array[int] = array("q", [0])
+        # 判定ごとの列。
+        self.rubric_ids: array[int] = array("I")
+        self.criteria_met = bytearray()
+        self.decided_by = bytearray()
+        self.explanations: list[str] = []
+        # 行番号 → アンサンブル評価の判定モデルごとの判定（アンサンブル評価の行のみ）。
+        self.judges: dict[int, list[JudgeVerdict]] = {}
+        self._scores = ScoreColumns(array("q"), array("q"), array("d"), array("d"))
+
+    def __len__(self) -> int:
+        return len(self.prompt_ids)
+
+    @property
+    def verdict_count(self) -> int:
+        """判定の行数。"""
+        return len(self.explanations)
+
+    def append(
+        self,
+        prompt_id: str,
+        prompts: list[PromptItem],
+        llm_response_text: str,
+        rubrics: Sequence[RubricItem],
+        results: Sequence[RubricResult],
+    ) -> None:
+        """
+        1 データ項目のルーブリック評価の結果を追加する。
+
+        Raises:
+            ValueError: rubrics と results の長さが異なる場合
+        """
+        if len(rubrics) != len(results):
+            raise ValueError(f"Expected {len(rubrics)} rubric results, got {len(results)}")
+        for rubric, result in zip(rubrics, results, strict=True):
+            self.rubric_ids.append(self.rubrics.intern(rubric))
+            self.criteria_met.append(result["criteria_met"])
+            self.decided_by.append(_JUDGE_TIER_CODES[result.get("decided_by")])
+            judges = result.get("judges")
+            if judges is not None:
+                self.judges[len(self.explanations)] = judges
+            self.explanations.append(result["explanation"])
+        self.prompt_ids.append(prompt_id)
+        self.prompts.append(prompts)
+        self.llm_response_texts.append(llm_response_text)
+        self.offsets.append(len(self.explanations))
+
+    def append_output(self, output: EvaluationOutput) -> None:
+        """EvaluationOutput を追加する。"""
+        for r in output.result_by_rubrics:
+            self.rubric_ids.append(self.rubrics.intern(r.rubric))
+            self.criteria_met.append(r.criteria_met)
+            self.decided_by.append(_JUDGE_TIER_CODES[r.decided_by])
+            if r.judges is not None:
+                self.judges[len(self.explanations)] = r.judges
+            self.explanations.append(r.explanation)
+        self.prompt_ids.append(output.prompt_id)
+        self.prompts.append(output.prompts)
+        self.llm_response_texts.append(output.llm_response_text)
+        self.offsets.append(len(self.explanations))
+
+    def append_record(self, record: dict[str, Any]) -> None:
+        """EvaluationOutput.model_dump() と同じ形式の辞書（"json" 形式の結果ファイルの要素）を追加する。"""
+        results = record["result_by_rubrics"]
+        self.append(
+            record["prompt_id"],
+            record["prompts"],
+            record["llm_response_text"],
+            [r["rubric"] for r in results],
+            cast(list[RubricResult], results),
+        )
+
+    @classmethod
+    def from_outputs(cls, outputs: Iterable[EvaluationOutput], rubrics: RubricTable | None = None) -> "VerdictTable":
+        """EvaluationOutput の列から表を作る。"""
+        table = cls(rubrics)
+        for output in outputs:
+            table.append_output(output)
+        return table
+
+    def rubric_results(self, index: int) -> list[RubricResult]:
+        """評価結果 index の判定を RubricResult のリストとして返す。"""
+        results: list[RubricResult] = []
+        for row in range(self.offsets[index], self.offsets[index + 1]):
+            result: RubricResult = {"explanation": self.explanations[row], "criteria_met": bool(self.criteria_met[row])}
+            tier = _JUDGE_TIERS[self.decided_by[row]]
+            if tier is not None:
+                result["decided_by"] = tier
+            judges = self.judges.get(row)
+            if judges is not None:
+                result["judges"] = judges
+            results.append(result)
+        return results
+
+    def output(self, index: int) -> EvaluationOutput:
+        """評価結果 index を EvaluationOutput に変換する。"""
+        rubrics = self.rubrics.rubrics
+        return EvaluationOutput(
+            prompt_id=self.prompt_ids[index],
+            prompts=self.prompts[index],
+            llm_response_text=self.llm_response_texts[index],
+            result_by_rubrics=[
+                EvaluationResultByRubric(
+                    rubric=rubrics[self.rubric_ids[row]],
+                    explanation=self.explanations[row],
+                    criteria_met=bool(self.criteria_met[row]),
+                    decided_by=_JUDGE_TIERS[self.decided_by[row]],
+                    judges=self.judges.get(row),
+                )
+                for row in range(self.offsets[index], self.offsets[index + 1])
+            ],
+        )
+
+    def __iter__(self) -> Iterator[EvaluationOutput]:
+        return (self.output(i) for i in range(len(self)))
+
+    def scores(self) -> ScoreColumns:
+        """
+        評価結果ごとの点数を返す。前回の呼び出し以降に追加された評価結果の分のみを計算する。
+
+        Raises:
+            ValueError: 配点が 0 のルーブリック項目がある場合（EvaluationResultByRubric.is_criteria_passed と同じ）
+        """
+        totals, theoreticals, score_rates, pass_rates = self._scores
+        points = self.rubrics.points
+        for index in range(len(totals), len(self)):
+            start, end = self.offsets[index], self.offsets[index + 1]
+            total = theoretical = passed = 0
+            for row in range(start, end):
+                rubric_points = points[self.rubric_ids[row]]
+                met = self.criteria_met[row]
+                if rubric_points > 0:
+                    theoretical += rubric_points
+                    passed += met
+                elif rubric_points < 0:
+                    passed += not met
+                else:
+                    raise ValueError(_ZERO_POINTS_MESSAGE)
+                if met:
+                    total += rubric_points
+            totals.append(total)
+            theoreticals.append(theoretical)
+            score_rates.append(total / theoretical if theoretical > 0 else 0.0)
+            pass_rates.append(passed / (end - start) if end > start else 0.0)
+        return self._scores
+
+    def records(self) -> Iterator[dict[str, Any]]:
+        """
+        評価結果を EvaluationOutput.model_dump(exclude_none=True) と同じ辞書として返す。
+
+        pydantic のモデルを経由せず、点数は scores の計算結果を使う。
+
+        Raises:
+            ValueError: 配点が 0 のルーブリック項目がある場合
+        """
+        scores = self.scores()
+        rubrics = self.rubrics.rubrics
+        points = self.rubrics.points
+        for index in range(len(self)):
+            verdicts: list[dict[str, Any]] = []
+            for row in range(self.offsets[index], self.offsets[index + 1]):
+                rubric_id = self.rubric_ids[row]
+                met = bool(self.criteria_met[row])
+                verdict: dict[str, Any] = {
+                    "rubric": rubrics[rubric_id],
+                    "explanation": self.explanations[row],
+                    "criteria_met": met,
+                }
+                tier = _JUDGE_TIERS[self.decided_by[row]]
+                if tier is not None:
+                    verdict["decided_by"] = tier
+                judges = self.judges.get(row)
+                if judges is not None:
+                    verdict["judges"] = judges
+                verdict["signed_score"] = points[rubric_id] if met else 0
+                verdict["is_criteria_passed"] = met if points[rubric_id] > 0 else not met
+                verdicts.append(verdict)
+            yield {
+                "prompt_id": self.prompt_ids[index],
+                "prompts": self.prompts[index],
+                "llm_response_text": self.llm_response_texts[index],
+                "result_by_rubrics": verdicts,
+                "total_score": scores.total_score[index],
+                "theoretical_score": scores.theoretical_score[index],
+                "score_rate": scores.score_rate[index],
+                "criteria_pass_rate": scores.criteria_pass_rate[index],
+            }
@@ -0,0 +1,348 @@
+import asyncio
+import json
+import math
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from statistics import NormalDist
+from typing import Any, TypedDict
+
+from ..types import EvaluationDatasetItem, RatingResult, RubricResult
+from .evaluator import (
+    arun_general_evaluation,
+    arun_rubric_item_evaluation,
+    arun_subjective_evaluation,
+    build_conversation,
+)
+from .journal import EvaluationMethod, JudgmentKey, RunJournal
+from .runner import _ajournaled
+
+# 推定の単位（セル）: (評価手法, データ項目の番号, ルーブリック項目の番号)。
+# ルーブリック項目の番号はルーブリック評価以外では None。
+CellKey = tuple[EvaluationMethod, int, int | None]
+
+# 適応的な試行の推定結果の保存先（ジャーナルと同じディレクトリ内）。
+ADAPTIVE_ESTIMATES_FILENAME = "adaptive_estimates.json"
+
+
+class RunningStat:
+    """Welford の方法で、値を 1 件ずつ加えながら平均と不偏分散を計算する。"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        """値を 1 件加える。"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def squared_deviations(self) -> float:
+        """平均からの偏差の二乗和。"""
+        return self._m2
+
+    @property
+    def variance(self) -> float:
+        """不偏分散（値が 1 件以下の場合は NaN）。"""
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+
+def wilson_interval(successes: float, count: int, z: float) -> tuple[float, float]:
+    """
+    二項比率の Wilson スコア信頼区間を計算する。
+
+    全件が同じ判定でも幅が 0 にならないため、少ない試行数で打ち切られにくい。
+
+    Args:
+        successes: 成功（適合）の件数
+        count: 試行数
+        z: 信頼係数に対応する標準正規分布の分位点（95% の場合は約 1.96）
+
+    Returns:
+        (下限, 上限)。count が 0 の場合は (0, 1)
+    """
+    if count == 0:
+        return 0.0, 1.0
+    rate = successes / count
+    denominator = 1 + z * z / count
+    center = (rate + z * z / (2 * count)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / count + z * z / (4 * count * count)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def mean_interval(stat: RunningStat, z: float, prior_variance: float = 0.0) -> tuple[float, float]:
+    """
+    平均値の正規近似の信頼区間を計算する。
+
+    prior_variance が正の場合は、分散が prior_variance の擬似的な観測 1 件分を分散の推定に加える。
+    すべて同じ値でも幅が 0 にならず（Wilson スコア区間と同様に）、判定回数が増えるほど観測した分散に近づく。
+
+    Args:
+        stat: 値の平均と分散
+        z: 信頼係数に対応する標準正規分布の分位点
+        prior_variance: 事前の分散（0 の場合は観測した分散のみを使う）
+
+    Returns:
+        (下限, 上限)。分散を推定できない場合（prior_variance が 0 で値が 1 件以下）は (-inf, inf)
+    """
+    pseudo_count = 1 if prior_variance > 0 else 0
+    if stat.count == 0 or stat.count + pseudo_count < 2:
+        return -math.inf, math.inf
+    variance = (stat.squared_deviations + prior_variance * pseudo_count) / (stat.count - 1 + pseudo_count)
+    margin = z * math.sqrt(variance / stat.count)
+    return stat.mean - margin, stat.mean + margin
+
+
+class CellEstimate(TypedDict):
+    """1 つのセルの推定結果。"""
+
+    method: EvaluationMethod
+    item_index: int
+    rubric_index: int | None
+    # 判定を試みた回数（失敗した判定を含む）。
+    samples: int
+    failures: int
+    # ルーブリック評価は適合と判定された割合、それ以外は点数の平均（成功した判定がない場合は None）。
+    mean: float | None
+    # 信頼区間（判定が少なく区間を推定できない場合は None）。
+    low: float | None
+    high: float | None
+    # 信頼区間の幅が目標に収まって打ち切ったかどうか（試行回数の上限・予算で止まった場合は False）。
+    converged: bool
+
+
+class AdaptiveSweepResult(TypedDict):
+    """適応的な試行の結果。"""
+
+    cells: list[CellEstimate]
+    # 判定を試みた回数の合計（ジャーナルから再利用した判定を含む）。
+    samples: int
+    # すべてのセルを試行回数の上限まで判定した場合の回数。
+    fixed_samples: int
+    rounds: int
+
+
+class AdaptiveConfig:
+    """
+    適応的な試行の設定。
+
+    各セル（データ項目 × 評価手法、データ項目 × ルーブリック項目）を min_samples 回判定した後、
+    信頼区間の半幅が目標以下になったセルから判定を打ち切り、残りの試行をまだ不安定なセルに回す。
+    ルーブリック評価は適合率の Wilson スコア区間、主観評価・自由記述評価は点数の平均の正規近似の区間を使う。
+    点数の分散には rating_prior_variance の擬似的な観測を加えるため、同じ点数が続いても min_samples 回で
+    打ち切られることはない（デフォルトの設定では 8 回で打ち切る）。
+    """
+
+    def __init__(
+        self,
+        min_samples: int = 5,
+        max_samples: int = 50,
+        rating_half_width: float = 0.25,
+        rate_half_width: float = 0.1,
+        confidence: float = 0.95,
+        budget: int | None = None,
+        step: int = 1,
+        rating_prior_variance: float = 1.0,
+    ) -> None:
+        """
+        Args:
+            min_samples: 打ち切りを判断する前に、各セルを判定する回数
+            max_samples: 各セルを判定する回数の上限（従来の試行回数に相当する）
+            rating_half_width: 主観評価・自由記述評価の点数の平均の信頼区間の半幅の目標
+            rate_half_width: ルーブリック評価の適合率の信頼区間の半幅の目標
+            confidence: 信頼係数
+            budget: 全セルで判定する回数の合計の上限（None の場合は上限なし）
+            step: min_samples 回以降、1 ラウンドで各セルを判定する回数
+            rating_prior_variance: 点数の分散の推定に加える事前の分散（デフォルトは点数 1 段階分）
+
+        Raises:
+            ValueError: min_samples が 1 未満、または max_samples より大きい場合、step が 1 未満の場合、
+                または rating_prior_variance が負の場合
+        """
+        if not 1 <= min_samples <= max_samples:
+            raise ValueError(f"min_samples must be between 1 and max_samples: {min_samples}")
+        if step < 1:
+            raise ValueError(f"step must be at least 1: {step}")
+        if rating_prior_variance < 0:
+            raise ValueError(f"rating_prior_variance must not be negative: {rating_prior_variance}")
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.rating_half_width = rating_half_width
+        self.rate_half_width = rate_half_width
+        self.confidence = confidence
+        self.budget = budget
+        self.step = step
+        self.rating_prior_variance = rating_prior_variance
+
+    @property
+    def z(self) -> float:
+        """信頼係数に対応する標準正規分布の分位点。"""
+        return NormalDist().inv_cdf(0.5 + self.confidence / 2)
+
+    def describe(self) -> dict[str, Any]:
+        """設定を JSON で保存できる辞書にする（ジャーナルの実行条件など）。"""
+        return {
+            "min_samples": self.min_samples,
+            "max_samples": self.max_samples,
+            "rating_half_width": self.rating_half_width,
+            "rate_half_width": self.rate_half_width,
+            "confidence": self.confidence,
+            "budget": self.budget,
+            "step": self.step,
+            "rating_prior_variance": self.rating_prior_variance,
+        }
+
+
+class _Cell:
+    """1 つのセルの判定状況。"""
+
+    def __init__(self, key: CellKey) -> None:
+        self.key = key
+        self.stat = RunningStat()
+        self.samples = 0
+        self.failures = 0
+
+    def interval(self, config: AdaptiveConfig) -> tuple[float, float]:
+        if self.key[0] == "rubric":
+            return wilson_interval(self.stat.mean * self.stat.count, self.stat.count, config.z)
+        return mean_interval(self.stat, config.z, config.rating_prior_variance)
+
+    def target(self, config: AdaptiveConfig) -> float:
+        return config.rate_half_width if self.key[0] == "rubric" else config.rating_half_width
+
+    def priority(self, config: AdaptiveConfig) -> float:
+        """信頼区間の半幅と目標の比（大きいほど不安定）。"""
+        low, high = self.interval(config)
+        return (high - low) / 2 / self.target(config)
+
+    def converged(self, config: AdaptiveConfig) -> bool:
+        return self.stat.count >= config.min_samples and self.priority(config) <= 1
+
+    def done(self, config: AdaptiveConfig) -> bool:
+        return self.samples >= config.max_samples or self.converged(config)
+
+    def estimate(self, config: AdaptiveConfig) -> CellEstimate:
+        method, item_index, rubric_index = self.key
+        low, high = self.interval(config)
+        return {
+            "method": method,
+            "item_index": item_index,
+            "rubric_index": rubric_index,
+            "samples": self.samples,
+            "failures": self.failures,
+            "mean": self.stat.mean if self.stat.count else None,
+            "low": low if math.isfinite(low) else None,
+            "high": high if math.isfinite(high) else None,
+            "converged": self.converged(config),
+        }
+
+
+def _plan_round(cells: list[_Cell], config: AdaptiveConfig, remaining: int | None) -> list[tuple[_Cell, int]]:
+    """次のラウンドで判定するセルと回数を、信頼区間が目標に対して広いセルから順に決める。"""
+    active = sorted((cell for cell in cells if not cell.done(config)), key=lambda c: c.priority(config), reverse=True)
+    plan: list[tuple[_Cell, int]] = []
+    for cell in active:
+        count = min(max(config.min_samples - cell.samples, config.step), config.max_samples - cell.samples)
+        if remaining is not None:
+            count = min(count, remaining)
+            if count <= 0:
+                break
+            remaining -= count
+        plan.append((cell, count))
+    return plan
+
+
+async def _arecorded[T: (RatingResult, RubricResult)](
+    journal: RunJournal | None, key: JudgmentKey, run: Callable[[], Awaitable[T | None]]
+) -> T | None:
+    """ジャーナルを指定した場合は記録済みの判定を再利用し、判定を記録する。"""
+    if journal is None:
+        return await run()
+    return await _ajournaled(journal, key, run)
+
+
+async def arun_adaptive_sweep(
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    config: AdaptiveConfig,
+    journal: RunJournal | None = None,
+    on_round_complete: Callable[[int, int], None] | None = None,
+) -> AdaptiveSweepResult:
+    """
+    各セルの判定のばらつきを推定しながら、必要なセルだけを繰り返し判定する。
+
+    1 ラウンドで判定するセルはすべて並行して実行する。セルの n 回目の判定は sample_index = n - 1 で実行し、
+    journal を指定した場合は (n, 評価手法, データ項目, ルーブリック項目) のキーで記録するため、
+    中断しても記録済みの判定を再利用して再開できる。
+
+    Args:
+        input_data: 評価対象データ
+        model_name: 評価に使用するモデル名
+        config: 適応的な試行の設定
+        journal: 判定を記録するジャーナル
+        on_round_complete: ラウンドが終わるたびに (ラウンド番号（1 始まり）, 判定を続けるセルの数) で呼び出される
+
+    Returns:
+        セルごとの推定結果と判定回数
+    """
+    conversations = [build_conversation(data) for data in input_data]
+    cells: list[_Cell] = []
+    for j, data in enumerate(input_data):
+        cells.append(_Cell(("subjective", j, None)))
+        cells.append(_Cell(("general", j, None)))
+        cells.extend(_Cell(("rubric", j, k)) for k in range(len(data["rubrics"])))
+
+    async def sample(key: CellKey, sample_index: int) -> float | None:
+        """セルを 1 回判定し、適合判定（1 / 0）または点数を返す。"""
+        method, item_index, rubric_index = key
+        judgment_key: JudgmentKey = (sample_index + 1, method, item_index, rubric_index)
+        conversation = conversations[item_index]
+        if rubric_index is not None:
+            rubric_item = input_data[item_index]["rubrics"][rubric_index]
+            verdict = await _arecorded(
+                journal,
+                judgment_key,
+                lambda: arun_rubric_item_evaluation(conversation, rubric_item, model_name, sample_index=sample_index),
+            )
+            return None if verdict is None else float(verdict["criteria_met"])
+        evaluate = arun_subjective_evaluation if method == "subjective" else arun_general_evaluation
+        rating = await _arecorded(
+            journal, judgment_key, lambda: evaluate(conversation, model_name, sample_index=sample_index)
+        )
+        return None if rating is None else float(rating["rating"])
+
+    remaining = config.budget
+    rounds = 0
+    while plan := _plan_round(cells, config, remaining):
+        jobs = [(cell, cell.samples + i) for cell, count in plan for i in range(count)]
+        results = await asyncio.gather(*(sample(cell.key, sample_index) for cell, sample_index in jobs))
+        # 並行実行の完了順によらず同じ推定になるよう、sample_index の順に加える。
+        for (cell, _), result in zip(jobs, results, strict=True):
+            cell.samples += 1
+            if result is None:
+                cell.failures += 1
+            else:
+                cell.stat.add(result)
+        if remaining is not None:
+            remaining -= len(jobs)
+        rounds += 1
+        if on_round_complete is not None:
+            on_round_complete(rounds, sum(1 for cell in cells if not cell.done(config)))
+
+    return {
+        "cells": [cell.estimate(config) for cell in cells],
+        "samples": sum(cell.samples for cell in cells),
+        "fixed_samples": len(cells) * config.max_samples,
+        "rounds": rounds,
+    }
+
+
+def save_adaptive_result(result: AdaptiveSweepResult, run_dir: Path) -> Path:
+    """適応的な試行の結果を run_dir/adaptive_estimates.json に保存する（NaN・Infinity を含まない JSON）。"""
+    path = run_dir / ADAPTIVE_ESTIMATES_FILENAME
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2, allow_nan=False)
+    return path
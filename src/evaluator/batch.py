@@ -0,0 +1,279 @@
+import json
+import time
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+from typing import Any, NotRequired, TypedDict, cast
+
+from ..batch import BatchJobState, BatchProvider, BatchRequest
+from ..structured_output import SchemaValidationError, validate_json
+from ..types import EvaluationDatasetItem
+from .evaluator import (
+    RATING_SCHEMA,
+    RUBRIC_SCHEMA,
+    _build_rubric_prompt_prefix,
+    _build_rubric_prompt_suffix,
+    build_conversation,
+)
+from .journal import EvaluationMethod, JudgmentKey, RunJournal
+from .runner import canonical_item_indices
+from .templates import GENERAL_PROMPT, SUBJECTIVE_PROMPT
+
+# バッチジョブの情報を保存するファイル名（ジャーナルと同じディレクトリ内）。
+BATCH_MANIFEST_FILENAME = "batch_job.json"
+
+# 対話的な評価（models.generate）と同じ生成パラメータ。
+BATCH_TEMPERATURE = 0.0
+BATCH_MAX_TOKENS = 8192
+
+_METHOD_SCHEMAS: dict[EvaluationMethod, dict[str, Any]] = {
+    "subjective": RATING_SCHEMA,
+    "general": RATING_SCHEMA,
+    "rubric": RUBRIC_SCHEMA,
+}
+
+
+class BatchManifest(TypedDict):
+    """投入したバッチジョブの情報。"""
+
+    provider: str
+    # create_batch_provider でプロバイダーを作り直すための設定。
+    provider_options: dict[str, Any]
+    job_id: str
+    model_name: str
+    iteration_count: int
+    request_count: int
+    submitted_at: str
+    collected_at: NotRequired[str]
+
+
+class BatchCollection(TypedDict):
+    """バッチジョブの結果をジャーナルに記録した件数。"""
+
+    requests: int
+    recorded: int
+    # 失敗した・期待通りの JSON でなかった・結果がなかったリクエストの件数（対話的な評価で実行し直す）。
+    failed: int
+
+
+def encode_custom_id(key: JudgmentKey) -> str:
+    """判定のキーをバッチのリクエストの custom_id（"<試行番号>-<評価手法>-<データ項目>-<ルーブリック|x>"）にする。"""
+    iteration, method, item_index, rubric_index = key
+    return f"{iteration}-{method}-{item_index}-{'x' if rubric_index is None else rubric_index}"
+
+
+def decode_custom_id(custom_id: str) -> JudgmentKey:
+    """
+    custom_id を判定のキーに戻す。
+
+    Raises:
+        ValueError: encode_custom_id の形式でない場合
+    """
+    try:
+        iteration, method, item_index, rubric_index = custom_id.split("-")
+        if method not in _METHOD_SCHEMAS:
+            raise ValueError(method)
+        return (
+            int(iteration),
+            method,
+            int(item_index),
+            None if rubric_index == "x" else int(rubric_index),
+        )
+    except ValueError as error:
+        raise ValueError(f"Invalid batch custom_id: {custom_id}") from error
+
+
+def build_sweep_requests(
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    iteration_count: int,
+    journal: RunJournal | None = None,
+) -> list[BatchRequest]:
+    """
+    iteration_count 回の試行 × 3 つの評価手法の判定を、バッチのリクエストの一覧にする。
+
+    プロンプトは対話的な評価と同じもの（ルーブリック評価は共通の前半と項目ごとの後半を連結したもの）。
+    journal を指定した場合、記録済みの判定と保存済みの試行は含めない。
+    内容が同じデータ項目は、対話的な評価と同じく最初のデータ項目の判定のみを含める。
+
+    Args:
+        input_data: 評価対象データ
+        model_name: 評価に使用するモデル名
+        iteration_count: 試行回数
+        journal: 判定を記録するジャーナル
+
+    Returns:
+        バッチのリクエストの一覧
+    """
+    prompts: list[tuple[EvaluationMethod, int, int | None, str]] = []
+    for j in sorted(set(canonical_item_indices(input_data))):
+        data = input_data[j]
+        conversation = build_conversation(data)
+        subjective_prompt = SUBJECTIVE_PROMPT.render(conversation=conversation)
+        general_prompt = GENERAL_PROMPT.render(conversation=conversation)
+        prompts.append(("subjective", j, None, subjective_prompt))
+        prompts.append(("general", j, None, general_prompt))
+        prefix = _build_rubric_prompt_prefix(conversation)
+        for k, rubric_item in enumerate(data["rubrics"]):
+            prompts.append(("rubric", j, k, prefix + _build_rubric_prompt_suffix(rubric_item)))
+
+    requests: list[BatchRequest] = []
+    for iteration in range(1, iteration_count + 1):
+        if journal is not None and journal.is_iteration_saved(iteration):
+            continue
+        for method, item_index, rubric_index, prompt in prompts:
+            key: JudgmentKey = (iteration, method, item_index, rubric_index)
+            if journal is not None and journal.get(key) is not None:
+                continue
+            requests.append(
+                {
+                    "custom_id": encode_custom_id(key),
+                    "model_name": model_name,
+                    "prompt": prompt,
+                    "schema": _METHOD_SCHEMAS[method],
+                    "temperature": BATCH_TEMPERATURE,
+                    "max_tokens": BATCH_MAX_TOKENS,
+                }
+            )
+    return requests
+
+
+def load_batch_manifest(run_dir: Path) -> BatchManifest | None:
+    """run_dir に保存したバッチジョブの情報を読み込む。保存されていない場合は None を返す。"""
+    path = run_dir / BATCH_MANIFEST_FILENAME
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return cast(BatchManifest, json.load(f))
+
+
+def _save_batch_manifest(run_dir: Path, manifest: BatchManifest) -> None:
+    """バッチジョブの情報を run_dir に保存する。"""
+    path = run_dir / BATCH_MANIFEST_FILENAME
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    tmp_path.replace(path)
+
+
+def submit_sweep(
+    provider: BatchProvider,
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    iteration_count: int,
+    journal: RunJournal,
+    run_dir: Path,
+) -> BatchManifest | None:
+    """
+    ジャーナルに記録されていない判定をまとめてバッチジョブとして投入し、ジョブの情報を run_dir に保存する。
+
+    Args:
+        provider: バッチ API のプロバイダー
+        input_data: 評価対象データ
+        model_name: 評価に使用するモデル名
+        iteration_count: 試行回数
+        journal: 判定を記録するジャーナル（run_dir に保存したもの）
+        run_dir: ジャーナルの保存先
+
+    Returns:
+        投入したバッチジョブの情報。未完了の判定がない場合は None
+
+    Raises:
+        ValueError: 結果を回収していないバッチジョブが run_dir にある場合
+    """
+    previous = load_batch_manifest(run_dir)
+    if previous is not None and "collected_at" not in previous:
+        raise ValueError(f"Batch job {previous['job_id']} in {run_dir} has not been collected yet")
+
+    requests = build_sweep_requests(input_data, model_name, iteration_count, journal)
+    if not requests:
+        return None
+    job_id = provider.submit(requests, run_dir)
+    manifest: BatchManifest = {
+        "provider": provider.name,
+        "provider_options": provider.describe(),
+        "job_id": job_id,
+        "model_name": model_name,
+        "iteration_count": iteration_count,
+        "request_count": len(requests),
+        "submitted_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    _save_batch_manifest(run_dir, manifest)
+    return manifest
+
+
+def wait_for_sweep(
+    provider: BatchProvider,
+    manifest: BatchManifest,
+    poll_interval: float = 60.0,
+    timeout: float | None = None,
+    on_poll: Callable[[BatchJobState], None] | None = None,
+) -> BatchJobState:
+    """
+    バッチジョブが終了するまで poll_interval 秒ごとに状態を確認する。
+
+    Args:
+        provider: バッチ API のプロバイダー
+        manifest: 投入したバッチジョブの情報
+        poll_interval: 状態を確認する間隔（秒）
+        timeout: 待つ時間の上限（秒、None の場合は終了するまで待つ）
+        on_poll: 状態を確認するたびに呼び出されるコールバック
+
+    Returns:
+        終了時の状態（"succeeded" または "failed"）
+
+    Raises:
+        TimeoutError: timeout 秒が経過しても終了しない場合
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        state = provider.get_state(manifest["job_id"])
+        if on_poll is not None:
+            on_poll(state)
+        if state != "running":
+            return state
+        if deadline is not None and time.monotonic() + poll_interval > deadline:
+            raise TimeoutError(f"Batch job {manifest['job_id']} did not finish within {timeout} seconds")
+        time.sleep(poll_interval)
+
+
+def collect_sweep(
+    provider: BatchProvider, manifest: BatchManifest, journal: RunJournal, run_dir: Path
+) -> BatchCollection:
+    """
+    終了したバッチジョブの結果をジャーナルに記録する。
+
+    スキーマに適合する結果のみを記録し、失敗したリクエストは記録しない。記録した後は、同じジャーナルで
+    runner.arun_journaled_iterations を実行すると、記録済みの判定から評価結果を保存し、
+    記録されていない判定のみを対話的に実行する。
+
+    Args:
+        provider: バッチ API のプロバイダー
+        manifest: 投入したバッチジョブの情報
+        journal: 判定を記録するジャーナル
+        run_dir: ジャーナルの保存先（回収した日時をバッチジョブの情報に記録する）
+
+    Returns:
+        記録した件数
+    """
+    results = provider.fetch_results(manifest["job_id"])
+    recorded = 0
+    for custom_id, result in results.items():
+        try:
+            key = decode_custom_id(custom_id)
+        except ValueError:
+            print(f"Warning: Ignoring batch result with unknown custom_id: {custom_id}")
+            continue
+        if result is None:
+            continue
+        try:
+            # 対話的な評価と同じく、型が違う・値が範囲外の結果は失敗として扱う。
+            validated = validate_json(result, _METHOD_SCHEMAS[key[1]])
+        except SchemaValidationError:
+            continue
+        if journal.get(key) is None:
+            journal.record(key, validated)
+        recorded += 1
+    manifest["collected_at"] = datetime.now().isoformat(timespec="seconds")
+    _save_batch_manifest(run_dir, manifest)
+    return {"requests": manifest["request_count"], "recorded": recorded, "failed": manifest["request_count"] - recorded}
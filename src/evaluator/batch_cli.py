@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+from collections.abc import Sequence
+from datetime import datetime
+from pathlib import Path
+
+from ..batch import BATCH_PROVIDER_NAMES, DEFAULT_LOCAL_BATCH_ROOT, BatchProvider, create_batch_provider
+from ..data import get_evaluation_dataset, load_evaluation_dataset
+from ..data.result_store import DEFAULT_OUTPUT_ROOT, RESULT_FORMATS
+from ..mock_backend import install_mock_backend
+from ..models import DEFAULT_MAX_CONCURRENCY, aclose_clients, set_max_concurrency
+from ..rate_limit import configure_rate_limits
+from ..types import EvaluationDatasetItem
+from .batch import collect_sweep, load_batch_manifest, submit_sweep, wait_for_sweep
+from .cli import DEFAULT_RUNS_ROOT, add_rate_limit_argument, dataset_digest
+from .journal import RunJournal
+from .runner import arun_journaled_iterations
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    """コマンドライン引数を解析する。"""
+    parser = argparse.ArgumentParser(
+        description=(
+            "評価データセットに対する全試行の判定を、プロバイダーのバッチ API でまとめて実行する。"
+            "submit で投入し、collect で結果を回収して評価結果を保存する。"
+        )
+    )
+    parser.add_argument("--mock", action="store_true", help="モックのバックエンドを登録する（local での動作確認用）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit = subparsers.add_parser("submit", help="未完了の判定をバッチジョブとして投入する")
+    submit.add_argument("--model", default="gemini-2.5-pro", help="評価に使用するモデル名")
+    submit.add_argument("--iterations", type=int, default=50, help="試行回数")
+    submit.add_argument("--dataset", type=Path, default=None, help="評価対象データ（llm-judge-evaluate と同じ）")
+    submit.add_argument("--provider", choices=BATCH_PROVIDER_NAMES, default="vertex", help="バッチ API のプロバイダー")
+    submit.add_argument("--gcs-prefix", default=None, help="vertex の入出力ファイルを置く Cloud Storage のパス")
+    submit.add_argument(
+        "--local-root", type=Path, default=DEFAULT_LOCAL_BATCH_ROOT, help="local のバッチジョブの保存先"
+    )
+    submit.add_argument(
+        "--local-format", choices=("vertex", "anthropic"), default="vertex", help="local の入出力ファイルの形式"
+    )
+    submit.add_argument(
+        "--run-dir",
+        type=Path,
+        default=None,
+        help="ジャーナルの保存先。既存のディレクトリを指定すると、記録済みの判定を除いて投入する",
+    )
+
+    status = subparsers.add_parser("status", help="バッチジョブの状態を表示する")
+    status.add_argument("--run-dir", type=Path, required=True, help="submit で使用したジャーナルの保存先")
+
+    collect = subparsers.add_parser(
+        "collect", help="バッチジョブの結果を回収し、失敗した判定を対話的に実行して評価結果を保存する"
+    )
+    collect.add_argument("--run-dir", type=Path, required=True, help="submit で使用したジャーナルの保存先")
+    collect.add_argument("--dataset", type=Path, default=None, help="submit で指定した評価対象データ")
+    collect.add_argument("--poll-interval", type=float, default=60.0, help="状態を確認する間隔（秒）")
+    collect.add_argument("--output-root", type=Path, default=DEFAULT_OUTPUT_ROOT, help="評価結果の保存先")
+    collect.add_argument(
+        "--format", choices=RESULT_FORMATS, default="json", help="評価結果の保存形式（llm-judge-evaluate と同じ）"
+    )
+    collect.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="失敗した判定を実行し直すときの API 呼び出しの同時実行数の上限",
+    )
+    add_rate_limit_argument(collect)
+    return parser.parse_args(argv)
+
+
+def _open_journal(run_dir: Path, model_name: str, input_data: list[EvaluationDatasetItem]) -> RunJournal:
+    """llm-judge-evaluate と同じ実行条件でジャーナルを開く（--run-dir で対話的に再開することもできる）。"""
+    return RunJournal(
+        run_dir,
+        metadata={"model_name": model_name, "batched_rubrics": False, "dataset_sha256": dataset_digest(input_data)},
+    )
+
+
+def _load_dataset(args: argparse.Namespace) -> list[EvaluationDatasetItem]:
+    """評価対象データを読み込む。"""
+    return load_evaluation_dataset(args.dataset) if args.dataset is not None else get_evaluation_dataset()
+
+
+def _create_provider(args: argparse.Namespace) -> BatchProvider:
+    """コマンドライン引数からバッチ API のプロバイダーを作成する。"""
+    if args.provider == "vertex":
+        return create_batch_provider("vertex", {"gcs_prefix": args.gcs_prefix} if args.gcs_prefix else None)
+    if args.provider == "local":
+        return create_batch_provider("local", {"root": str(args.local_root), "wire_format": args.local_format})
+    return create_batch_provider(args.provider)
+
+
+def _submit(args: argparse.Namespace) -> None:
+    """未完了の判定をバッチジョブとして投入する。"""
+    input_data = _load_dataset(args)
+    provider = _create_provider(args)
+    run_dir = args.run_dir or DEFAULT_RUNS_ROOT / datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    journal = _open_journal(run_dir, args.model, input_data)
+    try:
+        manifest = submit_sweep(provider, input_data, args.model, args.iterations, journal, run_dir)
+    finally:
+        journal.close()
+    if manifest is None:
+        print(f"Run directory: {run_dir} (all judgments are already recorded)")
+        return
+    print(f"Run directory: {run_dir}")
+    print(f"Submitted batch job {manifest['job_id']} ({manifest['request_count']} requests)")
+
+
+def _status(args: argparse.Namespace) -> None:
+    """バッチジョブの状態を表示する。"""
+    manifest = load_batch_manifest(args.run_dir)
+    if manifest is None:
+        raise SystemExit(f"No batch job in {args.run_dir}")
+    provider = create_batch_provider(manifest["provider"], manifest["provider_options"])
+    state = "collected" if "collected_at" in manifest else provider.get_state(manifest["job_id"])
+    print(f"Batch job {manifest['job_id']} ({manifest['request_count']} requests): {state}")
+
+
+async def _acollect(args: argparse.Namespace) -> None:
+    """バッチジョブの終了を待って結果を回収し、評価結果を保存する。"""
+    manifest = load_batch_manifest(args.run_dir)
+    if manifest is None:
+        raise SystemExit(f"No batch job in {args.run_dir}")
+    input_data = _load_dataset(args)
+    provider = create_batch_provider(manifest["provider"], manifest["provider_options"])
+    journal = _open_journal(args.run_dir, manifest["model_name"], input_data)
+    set_max_concurrency(args.max_concurrency)
+    configure_rate_limits(args.rate_limit)
+    try:
+        if "collected_at" not in manifest:
+            state = await asyncio.to_thread(
+                wait_for_sweep,
+                provider,
+                manifest,
+                args.poll_interval,
+                on_poll=lambda state: print(f"Batch job {manifest['job_id']}: {state}"),
+            )
+            if state == "succeeded":
+                collection = collect_sweep(provider, manifest, journal, args.run_dir)
+                print(f"Batch: {collection}")
+        # 記録済みの判定から評価結果を保存し、記録されていない判定のみを対話的に実行する。
+        await arun_journaled_iterations(
+            input_data,
+            model_name=manifest["model_name"],
+            iteration_count=manifest["iteration_count"],
+            journal=journal,
+            output_root=args.output_root,
+            on_iteration_complete=lambda iteration, output_dir: print(f"Saved iteration {iteration}: {output_dir}"),
+            result_format=args.format,
+        )
+    finally:
+        journal.close()
+        await aclose_clients()
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """コンソールスクリプト llm-judge-batch のエントリーポイント。"""
+    args = _parse_args(argv)
+    if args.mock:
+        install_mock_backend()
+    if args.command == "submit":
+        _submit(args)
+    elif args.command == "status":
+        _status(args)
+    else:
+        asyncio.run(_acollect(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+import asyncio
+import statistics
+import threading
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Literal, TypedDict, cast
+
+from ..instrumentation import call_context
+from ..types import EvaluationDatasetItem, EvaluationOutput, JudgeTier, RatingResult, RubricItem, RubricResult
+from .evaluator import (
+    RATING_SCHEMA,
+    RUBRIC_SCHEMA,
+    _agenerate_with_retry,
+    _build_rubric_prompt_prefix,
+    _build_rubric_prompt_suffix,
+    _generate_with_retry,
+    _print_rubric_failure,
+    arun_general_evaluation,
+    arun_rubric_item_evaluation,
+    build_conversation,
+    build_evaluation_output,
+    run_general_evaluation,
+)
+from .prompt import CONFIDENCE_INSTRUCTION
+from .templates import GENERAL_PROMPT
+
+# 判定の段階の選び方。
+# - "auto": 軽量なモデルで判定し、確信度が低い・サンプル間で食い違う場合のみ高性能なモデルに回す。
+# - "fast": 常に軽量なモデルの判定を採用する（軽量なモデルが失敗した場合のみ高性能なモデルに回す）。
+# - "strong": 常に高性能なモデルで判定する。
+TierPolicy = Literal["auto", "fast", "strong"]
+
+# 高性能なモデルに回した理由。
+EscalationReason = Literal["policy", "low_confidence", "disagreement", "fast_failed"]
+
+
+def _with_confidence(schema: dict[str, Any]) -> dict[str, Any]:
+    """出力スキーマに確信度（confidence）を加える。"""
+    return {
+        **schema,
+        "properties": {
+            **cast(dict[str, Any], schema["properties"]),
+            "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        },
+        "required": [*cast(list[str], schema["required"]), "confidence"],
+    }
+
+
+# 軽量なモデルの出力スキーマ（確信度を含む）。
+CASCADE_RATING_SCHEMA = _with_confidence(RATING_SCHEMA)
+CASCADE_RUBRIC_SCHEMA = _with_confidence(RUBRIC_SCHEMA)
+
+
+class CascadeStats(TypedDict):
+    """カスケード評価の判定を確定させた段階と、高性能なモデルに回した理由ごとの件数。"""
+
+    fast: int
+    strong: int
+    policy: int
+    low_confidence: int
+    disagreement: int
+    fast_failed: int
+
+
+class CascadeCalibration(TypedDict):
+    """カスケード評価と、すべてを高性能なモデルで判定した場合との一致度。"""
+
+    # 両方の段階で判定できたルーブリック項目の数。
+    rubric_count: int
+    # そのうち、軽量なモデルで判定が確定するものの数。
+    fast_decided: int
+    # 軽量なモデルで確定する判定のうち、高性能なモデルの判定と一致する割合。
+    fast_decided_agreement: float
+    # カスケード評価の最終的な判定が、高性能なモデルの判定と一致する割合。
+    cascade_agreement: float
+    # 高性能なモデルを呼び出す割合。
+    strong_call_ratio: float
+
+
+class CascadeConfig:
+    """
+    カスケード評価の設定。
+
+    軽量なモデル（fast）で fast_sample_count 回判定し、次のいずれかに当てはまる場合のみ
+    高性能なモデル（strong）で判定し直す。
+    - 自己申告の確信度の平均が min_confidence 未満
+    - サンプル間で判定が食い違う（ルーブリック評価は適合判定、自由記述評価は点数の差が rating_tolerance を超える）
+    - ルーブリック項目ごとの方針（rubric_policies）が "strong"
+
+    判定を確定させた段階と、高性能なモデルに回した理由の件数を stats で取得できる。
+    """
+
+    def __init__(
+        self,
+        fast_model_name: str,
+        strong_model_name: str,
+        fast_sample_count: int = 1,
+        fast_temperature: float | None = None,
+        min_confidence: float = 0.8,
+        rating_tolerance: int = 0,
+        rubric_policies: Mapping[str, TierPolicy] | None = None,
+        general_policy: TierPolicy = "auto",
+    ) -> None:
+        """
+        Args:
+            fast_model_name: 最初に判定する軽量なモデル名（"gemini-2.5-flash" など）
+            strong_model_name: 判定を回す高性能なモデル名（"gemini-2.5-pro" など）
+            fast_sample_count: 軽量なモデルで判定する回数（2 以上の場合はサンプル間の食い違いも確認する）
+            fast_temperature: 軽量なモデルの温度（None の場合は 1 回なら 0、複数回なら 1.0）
+            min_confidence: 軽量なモデルの判定を採用する確信度の下限
+            rating_tolerance: 自由記述評価でサンプル間の食い違いとみなさない点数の差
+            rubric_policies: ルーブリック項目の評価基準（criterion）ごとの方針（含まれない項目は "auto"）
+            general_policy: 自由記述評価の方針
+
+        Raises:
+            ValueError: fast_sample_count が 1 未満の場合
+        """
+        if fast_sample_count < 1:
+            raise ValueError(f"fast_sample_count must be at least 1: {fast_sample_count}")
+        self.fast_model_name = fast_model_name
+        self.strong_model_name = strong_model_name
+        self.fast_sample_count = fast_sample_count
+        self.fast_temperature = (
+            fast_temperature if fast_temperature is not None else (0.0 if fast_sample_count == 1 else 1.0)
+        )
+        self.min_confidence = min_confidence
+        self.rating_tolerance = rating_tolerance
+        self.rubric_policies = dict(rubric_policies or {})
+        self.general_policy = general_policy
+        self._lock = threading.Lock()
+        self._stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> CascadeStats:
+        return {"fast": 0, "strong": 0, "policy": 0, "low_confidence": 0, "disagreement": 0, "fast_failed": 0}
+
+    def rubric_policy(self, rubric_item: RubricItem) -> TierPolicy:
+        """ルーブリック項目の方針を取得する。"""
+        return self.rubric_policies.get(rubric_item["criterion"], "auto")
+
+    def describe(self) -> dict[str, Any]:
+        """設定を JSON で保存できる辞書にする（ジャーナルの実行条件など）。"""
+        return {
+            "fast_model_name": self.fast_model_name,
+            "strong_model_name": self.strong_model_name,
+            "fast_sample_count": self.fast_sample_count,
+            "fast_temperature": self.fast_temperature,
+            "min_confidence": self.min_confidence,
+            "rating_tolerance": self.rating_tolerance,
+            "rubric_policies": dict(sorted(self.rubric_policies.items())),
+            "general_policy": self.general_policy,
+        }
+
+    def record(self, reason: EscalationReason | None) -> None:
+        """判定を 1 件記録する（reason が None の場合は軽量なモデルで確定したもの）。"""
+        with self._lock:
+            if reason is None:
+                self._stats["fast"] += 1
+            else:
+                self._stats["strong"] += 1
+                self._stats[reason] += 1
+
+    @property
+    def stats(self) -> CascadeStats:
+        """判定を確定させた段階と、高性能なモデルに回した理由ごとの件数。"""
+        with self._lock:
+            return cast(CascadeStats, dict(self._stats))
+
+    def reset_stats(self) -> None:
+        """件数を 0 に戻す。"""
+        with self._lock:
+            self._stats = self._empty_stats()
+
+
+def _fast_sample_indices(config: CascadeConfig, sample_index: int) -> range:
+    """
+    軽量なモデルの各サンプルの sample_index。
+
+    試行ごとに重ならないように割り当てる（高性能なモデルは元の sample_index を使うため、
+    同じモデルでカスケードを使わずに評価した場合と判定結果のキャッシュを共有できる）。
+    """
+    start = sample_index * config.fast_sample_count
+    return range(start, start + config.fast_sample_count)
+
+
+def _confidence(sample: dict[str, Any]) -> float:
+    """自己申告の確信度を 0〜1 に丸めて取得する。数値でない場合は 0 とみなす。"""
+    value = sample.get("confidence")
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        return 0.0
+    return min(1.0, max(0.0, float(value)))
+
+
+def _decide_rubric(
+    samples: list[dict[str, Any] | None], config: CascadeConfig, policy: TierPolicy
+) -> tuple[RubricResult | None, EscalationReason | None]:
+    """
+    軽量なモデルのサンプルから判定を決める。
+
+    Returns:
+        (軽量なモデルの判定, 高性能なモデルに回す理由)。判定を採用する場合は理由が None、回す場合は判定が None
+    """
+    if policy == "strong":
+        return None, "policy"
+    valid = [sample for sample in samples if sample is not None]
+    if not valid:
+        return None, "fast_failed"
+    verdicts = [bool(sample["criteria_met"]) for sample in valid]
+    if policy == "auto":
+        if len(set(verdicts)) > 1:
+            return None, "disagreement"
+        if statistics.fmean(_confidence(sample) for sample in valid) < config.min_confidence:
+            return None, "low_confidence"
+    # 多数決（同数の場合は最初のサンプルの判定）。
+    met_count = sum(verdicts)
+    majority = verdicts[0] if met_count * 2 == len(verdicts) else met_count * 2 > len(verdicts)
+    chosen = next(sample for sample in valid if bool(sample["criteria_met"]) == majority)
+    return {"explanation": chosen["explanation"], "criteria_met": majority, "decided_by": "fast"}, None
+
+
+def _decide_rating(
+    samples: list[dict[str, Any] | None], config: CascadeConfig, policy: TierPolicy
+) -> tuple[RatingResult | None, EscalationReason | None]:
+    """_decide_rubric の自由記述評価版。複数のサンプルの点数は中央値（小さい方）を採用する。"""
+    if policy == "strong":
+        return None, "policy"
+    valid = [sample for sample in samples if sample is not None]
+    if not valid:
+        return None, "fast_failed"
+    ratings = [int(sample["rating"]) for sample in valid]
+    if policy == "auto":
+        if max(ratings) - min(ratings) > config.rating_tolerance:
+            return None, "disagreement"
+        if statistics.fmean(_confidence(sample) for sample in valid) < config.min_confidence:
+            return None, "low_confidence"
+    rating = statistics.median_low(ratings)
+    chosen = next(sample for sample in valid if int(sample["rating"]) == rating)
+    return {"explanation": chosen["explanation"], "rating": rating, "decided_by": "fast"}, None
+
+
+def _with_tier[T: (RatingResult, RubricResult)](result: T | None, tier: JudgeTier) -> T | None:
+    """判定結果に判定を確定させた段階を付ける。"""
+    if result is None:
+        return None
+    result["decided_by"] = tier
+    return result
+
+
+def _fast_rubric_prompt(rubric_item: RubricItem) -> str:
+    """軽量なモデル用のルーブリック評価のプロンプト（後半）を構築する。"""
+    return _build_rubric_prompt_suffix(rubric_item) + CONFIDENCE_INSTRUCTION
+
+
+def _fast_general_prompt(conversation: str) -> str:
+    """軽量なモデル用の自由記述評価のプロンプトを構築する。"""
+    return GENERAL_PROMPT.render(conversation=conversation) + CONFIDENCE_INSTRUCTION
+
+
+def run_cascade_rubric_evaluation(
+    data: EvaluationDatasetItem,
+    config: CascadeConfig,
+    prompt_id: str | None = None,
+    sample_index: int = 0,
+) -> EvaluationOutput | None:
+    """
+    ルーブリック評価をカスケード（軽量なモデル → 必要な場合のみ高性能なモデル）で実行する。
+
+    結果の形式は run_rubric_evaluation と同じで、各ルーブリック項目の decided_by に判定を確定させた段階を記録する。
+
+    Args:
+        data: 評価対象データ項目
+        config: カスケード評価の設定
+        prompt_id: プロンプト ID（指定されない場合は現在時刻から生成）
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+
+    Returns:
+        評価結果、または None（評価に失敗した場合）
+    """
+    if prompt_id is None:
+        prompt_id = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    conversation = build_conversation(data)
+    prompt_prefix = _build_rubric_prompt_prefix(conversation)
+
+    results: list[RubricResult] = []
+    for rubric_item in data["rubrics"]:
+        policy = config.rubric_policy(rubric_item)
+        samples: list[dict[str, Any] | None] = []
+        if policy != "strong":
+            with call_context(evaluator="rubric", rubric=rubric_item["criterion"]):
+                samples = [
+                    _generate_with_retry(
+                        model_name=config.fast_model_name,
+                        prompt=_fast_rubric_prompt(rubric_item),
+                        schema=CASCADE_RUBRIC_SCHEMA,
+                        show_available_keys=True,
+                        sample_index=fast_sample_index,
+                        prompt_prefix=prompt_prefix,
+                        temperature=config.fast_temperature,
+                    )
+                    for fast_sample_index in _fast_sample_indices(config, sample_index)
+                ]
+        result, reason = _decide_rubric(samples, config, policy)
+        if reason is not None:
+            with call_context(evaluator="rubric", rubric=rubric_item["criterion"]):
+                result = _with_tier(
+                    cast(
+                        RubricResult | None,
+                        _generate_with_retry(
+                            model_name=config.strong_model_name,
+                            prompt=_build_rubric_prompt_suffix(rubric_item),
+                            schema=RUBRIC_SCHEMA,
+                            show_available_keys=True,
+                            sample_index=sample_index,
+                            prompt_prefix=prompt_prefix,
+                        ),
+                    ),
+                    "strong",
+                )
+        if result is None:
+            _print_rubric_failure(rubric_item)
+            return None
+        config.record(reason)
+        results.append(result)
+
+    return build_evaluation_output(data, prompt_id, results)
+
+
+async def _afast_rubric_samples(
+    conversation: str, rubric_item: RubricItem, config: CascadeConfig, sample_index: int
+) -> list[dict[str, Any] | None]:
+    """軽量なモデルで 1 つのルーブリック項目を fast_sample_count 回、並行して判定する。"""
+    prompt_prefix = _build_rubric_prompt_prefix(conversation)
+    with call_context(evaluator="rubric", rubric=rubric_item["criterion"]):
+        return list(
+            await asyncio.gather(
+                *(
+                    _agenerate_with_retry(
+                        model_name=config.fast_model_name,
+                        prompt=_fast_rubric_prompt(rubric_item),
+                        schema=CASCADE_RUBRIC_SCHEMA,
+                        show_available_keys=True,
+                        sample_index=fast_sample_index,
+                        prompt_prefix=prompt_prefix,
+                        temperature=config.fast_temperature,
+                    )
+                    for fast_sample_index in _fast_sample_indices(config, sample_index)
+                )
+            )
+        )
+
+
+async def arun_cascade_rubric_item_evaluation(
+    conversation: str,
+    rubric_item: RubricItem,
+    config: CascadeConfig,
+    sample_index: int = 0,
+) -> RubricResult | None:
+    """
+    1 つのルーブリック項目に対する評価をカスケードで非同期に実行する（軽量なモデルの各サンプルは並行して実行する）。
+
+    Args:
+        conversation: 会話履歴（build_conversation で構築したもの）
+        rubric_item: ルーブリック項目
+        config: カスケード評価の設定
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+
+    Returns:
+        評価結果（decided_by に判定を確定させた段階を含む）、または None（評価に失敗した場合）
+    """
+    policy = config.rubric_policy(rubric_item)
+    samples = await _afast_rubric_samples(conversation, rubric_item, config, sample_index) if policy != "strong" else []
+    result, reason = _decide_rubric(samples, config, policy)
+    if reason is not None:
+        result = _with_tier(
+            await arun_rubric_item_evaluation(conversation, rubric_item, config.strong_model_name, sample_index),
+            "strong",
+        )
+    if result is not None:
+        config.record(reason)
+    return result
+
+
+async def arun_cascade_rubric_evaluation(
+    data: EvaluationDatasetItem,
+    config: CascadeConfig,
+    prompt_id: str | None = None,
+    sample_index: int = 0,
+) -> EvaluationOutput | None:
+    """run_cascade_rubric_evaluation の非同期版。各ルーブリック項目の評価は並行して実行する。"""
+    if prompt_id is None:
+        prompt_id = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    conversation = build_conversation(data)
+    results = await asyncio.gather(
+        *(
+            arun_cascade_rubric_item_evaluation(conversation, rubric_item, config, sample_index)
+            for rubric_item in data["rubrics"]
+        )
+    )
+    for rubric_item, result in zip(data["rubrics"], results, strict=True):
+        if result is None:
+            _print_rubric_failure(rubric_item)
+            return None
+    return build_evaluation_output(data, prompt_id, [result for result in results if result is not None])
+
+
+def run_cascade_general_evaluation(
+    conversation: str, config: CascadeConfig, sample_index: int = 0
+) -> RatingResult | None:
+    """
+    自由記述評価をカスケードで実行する。
+
+    Args:
+        conversation: 会話履歴（build_conversation で構築したもの）
+        config: カスケード評価の設定
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+
+    Returns:
+        評価結果（decided_by に判定を確定させた段階を含む）、または None（評価に失敗した場合）
+    """
+    samples: list[dict[str, Any] | None] = []
+    if config.general_policy != "strong":
+        with call_context(evaluator="general"):
+            samples = [
+                _generate_with_retry(
+                    model_name=config.fast_model_name,
+                    prompt=_fast_general_prompt(conversation),
+                    schema=CASCADE_RATING_SCHEMA,
+                    sample_index=fast_sample_index,
+                    temperature=config.fast_temperature,
+                )
+                for fast_sample_index in _fast_sample_indices(config, sample_index)
+            ]
+    result, reason = _decide_rating(samples, config, config.general_policy)
+    if reason is not None:
+        result = _with_tier(run_general_evaluation(conversation, config.strong_model_name, sample_index), "strong")
+    if result is not None:
+        config.record(reason)
+    return result
+
+
+async def arun_cascade_general_evaluation(
+    conversation: str, config: CascadeConfig, sample_index: int = 0
+) -> RatingResult | None:
+    """run_cascade_general_evaluation の非同期版。軽量なモデルの各サンプルは並行して実行する。"""
+    samples: list[dict[str, Any] | None] = []
+    if config.general_policy != "strong":
+        with call_context(evaluator="general"):
+            samples = list(
+                await asyncio.gather(
+                    *(
+                        _agenerate_with_retry(
+                            model_name=config.fast_model_name,
+                            prompt=_fast_general_prompt(conversation),
+                            schema=CASCADE_RATING_SCHEMA,
+                            sample_index=fast_sample_index,
+                            temperature=config.fast_temperature,
+                        )
+                        for fast_sample_index in _fast_sample_indices(config, sample_index)
+                    )
+                )
+            )
+    result, reason = _decide_rating(samples, config, config.general_policy)
+    if reason is not None:
+        result = _with_tier(
+            await arun_general_evaluation(conversation, config.strong_model_name, sample_index), "strong"
+        )
+    if result is not None:
+        config.record(reason)
+    return result
+
+
+async def arun_cascade_calibration(
+    input_data: list[EvaluationDatasetItem], config: CascadeConfig, sample_index: int = 0
+) -> CascadeCalibration:
+    """
+    全ルーブリック項目を両方の段階で判定し、カスケード評価による一致度の低下と高性能なモデルの呼び出しの削減量を測る。
+
+    判定は同じ sample_index のカスケード評価と同じキャッシュキーになるため、キャッシュが有効な場合は
+    続けて実行するカスケード評価でそのまま再利用される。config.stats には記録しない。
+
+    Args:
+        input_data: 評価対象データ（一部を抜き出したものでよい）
+        config: カスケード評価の設定
+        sample_index: 独立したサンプルを得るための通し番号
+
+    Returns:
+        一致度と高性能なモデルの呼び出しの割合
+    """
+
+    async def calibrate(conversation: str, rubric_item: RubricItem) -> tuple[RubricResult | None, RubricResult | None]:
+        policy = config.rubric_policy(rubric_item)
+        samples, strong = await asyncio.gather(
+            _afast_rubric_samples(conversation, rubric_item, config, sample_index),
+            arun_rubric_item_evaluation(conversation, rubric_item, config.strong_model_name, sample_index),
+        )
+        fast, _ = _decide_rubric(samples, config, policy)
+        return fast, strong
+
+    pairs = await asyncio.gather(
+        *(calibrate(build_conversation(data), rubric_item) for data in input_data for rubric_item in data["rubrics"])
+    )
+    judged = [(fast, strong) for fast, strong in pairs if strong is not None]
+    fast_decided = [(fast, strong) for fast, strong in judged if fast is not None]
+    fast_agreed = sum(1 for fast, strong in fast_decided if fast["criteria_met"] == strong["criteria_met"])
+    rubric_count = len(judged)
+    return {
+        "rubric_count": rubric_count,
+        "fast_decided": len(fast_decided),
+        "fast_decided_agreement": fast_agreed / len(fast_decided) if fast_decided else float("nan"),
+        "cascade_agreement": (
+            (fast_agreed + rubric_count - len(fast_decided)) / rubric_count if rubric_count else float("nan")
+        ),
+        "strong_call_ratio": (rubric_count - len(fast_decided)) / rubric_count if rubric_count else float("nan"),
+    }
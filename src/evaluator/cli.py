@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import hashlib
+import json
+from collections.abc import Sequence
+from datetime import datetime
+from pathlib import Path
+
+from tqdm import tqdm
+
+from ..cache import JudgmentCache
+from ..data import get_evaluation_dataset, load_evaluation_dataset
+from ..data.result_store import DEFAULT_OUTPUT_ROOT, RESULT_FORMATS
+from ..instrumentation import JsonlSink, MemorySink, add_sink, format_summary, remove_sink
+from ..models import (
+    DEFAULT_MAX_CONCURRENCY,
+    aclose_clients,
+    get_cached_token_ratio,
+    get_token_usage,
+    set_cache,
+    set_max_concurrency,
+)
+from ..rate_limit import RateLimitSpec, configure_rate_limits, describe_rate_limits, parse_rate_limit
+from .adaptive import AdaptiveConfig, arun_adaptive_sweep, save_adaptive_result
+from .cascade import CascadeConfig
+from .ensemble import ENSEMBLE_AGGREGATIONS, EnsembleConfig
+from .evaluator import configure_streaming_judgments, get_streaming_judgment_settings
+from .journal import RunJournal
+from .runner import arun_journaled_iterations
+from .templates import sum_prompt_tokens
+
+# ジャーナルの保存先のデフォルト値。
+DEFAULT_RUNS_ROOT = Path("src/data/evaluation_runs")
+
+# API 呼び出しごとの計測結果の保存先（ジャーナルと同じディレクトリ内）。
+CALL_TRACE_FILENAME = "calls.jsonl"
+
+# 実行後に表示する、呼び出し時間の合計が大きいルーブリック項目の件数。
+SLOWEST_RUBRIC_COUNT = 10
+
+
+def _rate_limit_argument(value: str) -> RateLimitSpec:
+    """--rate-limit の値を解析する。"""
+    try:
+        return parse_rate_limit(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error)) from error
+
+
+def add_rate_limit_argument(parser: argparse.ArgumentParser, help_suffix: str = "") -> None:
+    """モデルごとのレート制限（--rate-limit MODEL=RPM[:TPM]）を指定するコマンドライン引数を追加する。"""
+    parser.add_argument(
+        "--rate-limit",
+        nargs="+",
+        type=_rate_limit_argument,
+        default=[],
+        metavar="MODEL=RPM[:TPM]",
+        help=(
+            "モデルごとの 1 分あたりの最大リクエスト数と最大入力トークン数（RPM を空にするとトークン数のみ制限する）。"
+            "指定しないモデルはサーバーからの 429 にのみ従う" + help_suffix
+        ),
+    )
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    """コマンドライン引数を解析する。"""
+    parser = argparse.ArgumentParser(
+        description=(
+            "評価データセットに対して 3 つの評価手法を繰り返し実行する。"
+            "中断した場合は --run-dir に同じディレクトリを指定して再開できる。"
+        )
+    )
+    parser.add_argument("--model", default="gemini-2.5-pro", help="評価に使用するモデル名")
+    parser.add_argument("--iterations", type=int, default=50, help="試行回数")
+    parser.add_argument(
+        "--dataset",
+        type=Path,
+        default=None,
+        help="評価対象データ（JSON・JSONL ファイル、またはシャードのディレクトリ。指定しない場合は同梱のデータセット）",
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY, help="API 呼び出しの同時実行数の上限"
+    )
+    parser.add_argument(
+        "--run-dir",
+        type=Path,
+        default=None,
+        help="ジャーナルの保存先。既存のディレクトリを指定すると、完了済みの判定を読み飛ばして再開する",
+    )
+    parser.add_argument("--output-root", type=Path, default=DEFAULT_OUTPUT_ROOT, help="評価結果の保存先")
+    parser.add_argument(
+        "--batched-rubrics", action="store_true", help="ルーブリック評価を 1 回の呼び出しでまとめて行う"
+    )
+    parser.add_argument(
+        "--cascade-fast-model",
+        default=None,
+        help=(
+            "自由記述評価とルーブリック評価を、まずこの軽量なモデルで判定し、"
+            "確信度が低い・サンプル間で食い違う場合のみ --model で判定し直す"
+        ),
+    )
+    parser.add_argument("--cascade-samples", type=int, default=1, help="カスケード評価で軽量なモデルが判定する回数")
+    parser.add_argument(
+        "--cascade-min-confidence", type=float, default=0.8, help="カスケード評価で軽量なモデルの判定を採用する確信度"
+    )
+    parser.add_argument(
+        "--ensemble-models",
+        nargs="+",
+        default=None,
+        help="3 つの評価手法の各判定をこれらのモデルで並行して行い、集約する（--model の代わりに使う）",
+    )
+    parser.add_argument(
+        "--ensemble-aggregation",
+        choices=ENSEMBLE_AGGREGATIONS,
+        default="majority",
+        help="アンサンブル評価の判定の集約方法",
+    )
+    parser.add_argument(
+        "--ensemble-weights",
+        nargs="+",
+        type=float,
+        default=None,
+        help="--ensemble-aggregation weighted の場合の各モデルの重み（--ensemble-models と同じ順）",
+    )
+    parser.add_argument(
+        "--negative-rubric-aggregation",
+        choices=ENSEMBLE_AGGREGATIONS,
+        default=None,
+        help="配点が負のルーブリック項目の集約方法（unanimous の場合、全モデルが当てはまると判定した場合のみ減点する）",
+    )
+    parser.add_argument(
+        "--ensemble-min-judges",
+        type=int,
+        default=1,
+        help="アンサンブル評価で判定を集約するのに必要な、判定できたモデルの数",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help=(
+            "各セル（データ項目 × 評価手法・ルーブリック項目）の信頼区間が十分に狭くなったら判定を打ち切り、"
+            "不安定なセルのみを --iterations 回まで判定する（結果は試行ごとのディレクトリではなく推定値として保存する）"
+        ),
+    )
+    parser.add_argument(
+        "--adaptive-min-samples", type=int, default=5, help="打ち切りを判断する前に各セルを判定する回数"
+    )
+    parser.add_argument(
+        "--adaptive-rating-half-width", type=float, default=0.25, help="点数の平均の信頼区間の半幅の目標"
+    )
+    parser.add_argument(
+        "--adaptive-rate-half-width", type=float, default=0.1, help="ルーブリックの適合率の信頼区間の半幅の目標"
+    )
+    parser.add_argument("--adaptive-budget", type=int, default=None, help="全セルで判定する回数の合計の上限")
+    add_rate_limit_argument(parser)
+    parser.add_argument("--cache", action="store_true", help="判定結果のキャッシュを使用する")
+    parser.add_argument(
+        "--format",
+        choices=RESULT_FORMATS,
+        default="json",
+        help="評価結果の保存形式（jsonl 系の形式では結果を完了するたびに追記し、会話は 1 回だけ保存する）",
+    )
+    parser.add_argument(
+        "--stream-judgments",
+        action="store_true",
+        help="判定をストリーミングで生成し、応答の JSON を受け取りながら解釈する",
+    )
+    parser.add_argument(
+        "--verdict-first",
+        action="store_true",
+        help="ストリーミングで判定する場合に、判定を explanation より先に出力させる",
+    )
+    parser.add_argument(
+        "--no-explanations",
+        action="store_true",
+        help="ストリーミングで判定する場合に、判定が確定した時点で生成を打ち切る（explanation は空になる）",
+    )
+    args = parser.parse_args(argv)
+    if (args.verdict_first or args.no_explanations) and not args.stream_judgments:
+        parser.error("--verdict-first and --no-explanations require --stream-judgments")
+    if args.adaptive and (args.batched_rubrics or args.cascade_fast_model is not None):
+        parser.error("--adaptive cannot be combined with --batched-rubrics or --cascade-fast-model")
+    if args.adaptive and not 1 <= args.adaptive_min_samples <= args.iterations:
+        parser.error("--adaptive-min-samples must be between 1 and --iterations")
+    if args.ensemble_models is not None and (
+        args.adaptive or args.batched_rubrics or args.cascade_fast_model is not None
+    ):
+        parser.error("--ensemble-models cannot be combined with --adaptive, --batched-rubrics or --cascade-fast-model")
+    if args.ensemble_weights is not None and (
+        args.ensemble_models is None or len(args.ensemble_weights) != len(args.ensemble_models)
+    ):
+        parser.error("--ensemble-weights requires one weight per model in --ensemble-models")
+    return args
+
+
+def dataset_digest(input_data: object) -> str:
+    """評価対象データのハッシュ値を計算する（再開時に同じデータセットかどうかを確認するため）。"""
+    payload = json.dumps(input_data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _amain(args: argparse.Namespace) -> None:
+    """評価を実行する。"""
+    input_data = load_evaluation_dataset(args.dataset) if args.dataset is not None else get_evaluation_dataset()
+    cascade = (
+        CascadeConfig(
+            args.cascade_fast_model,
+            args.model,
+            fast_sample_count=args.cascade_samples,
+            min_confidence=args.cascade_min_confidence,
+        )
+        if args.cascade_fast_model is not None
+        else None
+    )
+    ensemble = (
+        EnsembleConfig(
+            args.ensemble_models,
+            aggregation=args.ensemble_aggregation,
+            weights=(
+                dict(zip(args.ensemble_models, args.ensemble_weights, strict=True))
+                if args.ensemble_weights is not None
+                else None
+            ),
+            negative_rubric_aggregation=args.negative_rubric_aggregation,
+            min_judges=args.ensemble_min_judges,
+        )
+        if args.ensemble_models is not None
+        else None
+    )
+    adaptive = (
+        AdaptiveConfig(
+            min_samples=args.adaptive_min_samples,
+            max_samples=args.iterations,
+            rating_half_width=args.adaptive_rating_half_width,
+            rate_half_width=args.adaptive_rate_half_width,
+            budget=args.adaptive_budget,
+        )
+        if args.adaptive
+        else None
+    )
+    configure_streaming_judgments(
+        args.stream_judgments, verdict_first=args.verdict_first, explanations=not args.no_explanations
+    )
+    streaming = get_streaming_judgment_settings()
+    run_dir = args.run_dir or DEFAULT_RUNS_ROOT / datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    journal = RunJournal(
+        run_dir,
+        metadata={
+            "model_name": args.model,
+            "batched_rubrics": args.batched_rubrics,
+            "dataset_sha256": dataset_digest(input_data),
+            **({"cascade": cascade.describe()} if cascade is not None else {}),
+            **({"adaptive": adaptive.describe()} if adaptive is not None else {}),
+            **({"ensemble": ensemble.describe()} if ensemble is not None else {}),
+            **({"streaming_judgments": streaming._asdict()} if streaming.enabled else {}),
+            **({"rate_limits": describe_rate_limits(args.rate_limit)} if args.rate_limit else {}),
+        },
+    )
+    print(f"Run directory: {run_dir} ({journal.judgment_count} judgments recorded)")
+    # プロンプトを描画せずに、コンパイル済みのテンプレートとルーブリックセットのトークン数から概算する。
+    prompt_tokens = sum_prompt_tokens(input_data)
+    rubric_tokens = prompt_tokens["rubric_batch"] if args.batched_rubrics else prompt_tokens["rubric_total"]
+    print(
+        f"Prompt tokens per iteration (estimated): subjective={prompt_tokens['subjective']}, "
+        f"general={prompt_tokens['general']}, rubric={rubric_tokens} "
+        f"(prefix={prompt_tokens['rubric_prefix']}, suffixes={prompt_tokens['rubric_suffixes']})"
+    )
+
+    cache = JudgmentCache() if args.cache else None
+    set_cache(cache)
+    set_max_concurrency(args.max_concurrency)
+    configure_rate_limits(args.rate_limit)
+
+    # API 呼び出しごとの計測結果をファイルに記録し、実行後に評価手法・ルーブリック項目ごとに集計して表示する。
+    trace_sink = JsonlSink(run_dir / CALL_TRACE_FILENAME)
+    memory_sink = MemorySink()
+    add_sink(trace_sink)
+    add_sink(memory_sink)
+
+    pbar = tqdm(total=args.iterations, desc="全体の進捗", unit="回")
+    pbar.update(sum(1 for i in range(1, args.iterations + 1) if journal.is_iteration_saved(i)))
+
+    def on_iteration_complete(iteration: int, output_dir: Path) -> None:
+        pbar.update(1)
+        pbar.set_postfix({"試行": iteration, "出力": str(output_dir)})
+
+    def on_round_complete(round_number: int, active_cells: int) -> None:
+        # ラウンド数は試行回数を超えないため、適応的な試行では進捗をラウンド数で表す。
+        pbar.n = round_number
+        pbar.set_postfix({"判定中のセル": active_cells})
+
+    try:
+        if adaptive is not None:
+            adaptive_result = await arun_adaptive_sweep(input_data, args.model, adaptive, journal, on_round_complete)
+            path = save_adaptive_result(adaptive_result, run_dir)
+            converged = sum(1 for cell in adaptive_result["cells"] if cell["converged"])
+            print(
+                f"Adaptive: {adaptive_result['samples']}/{adaptive_result['fixed_samples']} judgments, "
+                f"{converged}/{len(adaptive_result['cells'])} cells converged ({path})"
+            )
+        else:
+            await arun_journaled_iterations(
+                input_data,
+                model_name=args.model,
+                iteration_count=args.iterations,
+                journal=journal,
+                output_root=args.output_root,
+                batched_rubrics=args.batched_rubrics,
+                on_iteration_complete=on_iteration_complete,
+                result_format=args.format,
+                cascade=cascade,
+                ensemble=ensemble,
+            )
+    finally:
+        pbar.close()
+        journal.close()
+        await aclose_clients()
+        if cache is not None:
+            print(f"Cache: {cache.stats}")
+            cache.close()
+        if cascade is not None:
+            print(f"Cascade: {cascade.stats}")
+        if ensemble is not None:
+            print(f"Ensemble: {ensemble.stats}")
+        usage = get_token_usage()
+        print(f"Tokens: {usage} (cached input ratio: {get_cached_token_ratio(usage):.1%})")
+        remove_sink(trace_sink)
+        remove_sink(memory_sink)
+        trace_sink.close()
+        print(format_summary(memory_sink.summary("evaluator")))
+        print(format_summary(memory_sink.summary("rubric"), limit=SLOWEST_RUBRIC_COUNT))
+
+    if adaptive is None:
+        print(f"全 {args.iterations} 回の実行が完了しました")
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """コンソールスクリプト llm-judge-evaluate のエントリーポイント。"""
+    asyncio.run(_amain(_parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+import asyncio
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from pathlib import Path
+from typing import Any, NamedTuple, TypedDict, cast
+
+from ..data.result_store import DEFAULT_OUTPUT_ROOT, ResultFormat
+from ..types import EvaluationDatasetItem, RatingResult, RubricResult
+from .evaluator import (
+    arun_general_evaluation,
+    arun_rubric_item_evaluation,
+    arun_subjective_evaluation,
+    build_conversation,
+)
+from .journal import EvaluationMethod, JudgmentKey, RunJournal
+from .runner import arun_journaled_iterations, canonical_item_indices
+
+# 作業キューの保存先（ジャーナルと同じディレクトリ内）。
+QUEUE_FILENAME = "queue.sqlite3"
+
+# 作業単位の貸し出し期間のデフォルト値（秒）。期間内に完了も延長もされない作業単位は他のワーカーに貸し出す。
+DEFAULT_LEASE_SECONDS = 300.0
+
+# 1 回に貸し出す作業単位の数（シャードの大きさ）のデフォルト値。
+DEFAULT_LEASE_SIZE = 32
+
+# 作業単位ごとの最大試行回数のデフォルト値（ワーカーの異常終了による貸し出し期間切れも 1 回と数える）。
+DEFAULT_MAX_ATTEMPTS = 3
+
+# 他のワーカーに貸し出し中の作業単位しか残っていない場合に、貸し出しを再確認する間隔のデフォルト値（秒）。
+DEFAULT_POLL_INTERVAL = 5.0
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), metadata TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS units ("
+    "id INTEGER PRIMARY KEY, iteration INTEGER NOT NULL, method TEXT NOT NULL, item_index INTEGER NOT NULL, "
+    "rubric_index INTEGER, state TEXT NOT NULL DEFAULT 'pending', worker TEXT, lease_expires REAL, "
+    "attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, "
+    "UNIQUE (iteration, method, item_index, rubric_index))",
+    "CREATE INDEX IF NOT EXISTS units_state ON units (state, id)",
+)
+
+# 作業単位の状態。
+UNIT_STATES = ("pending", "leased", "done", "failed")
+
+
+class WorkUnit(NamedTuple):
+    """作業キューの 1 件の作業単位（1 回の判定）。"""
+
+    unit_id: int
+    key: JudgmentKey
+    # 貸し出し回数（この貸し出しを含む）。
+    attempts: int
+
+
+class SweepWorkerStats(TypedDict):
+    """ワーカーが処理した作業単位の件数。"""
+
+    leases: int
+    completed: int
+    failed: int
+
+
+class SweepQueue:
+    """
+    試行 × 評価手法 × データ項目 × ルーブリック項目の判定を作業単位として保持し、ワーカーに貸し出す SQLite のキュー。
+
+    作業単位は期限付きで貸し出し、期限までに完了しなかった作業単位（ワーカーが異常終了した場合など）は
+    他のワーカーに貸し出し直す。貸し出しは BEGIN IMMEDIATE のトランザクションで行うため、
+    同じファイルを開いた複数のプロセスが同じ作業単位を同時に受け取ることはない。
+    複数のマシンから使う場合は、ファイルロックが正しく動作する共有ファイルシステムに置くこと。
+    スレッドセーフ。
+    """
+
+    def __init__(self, run_dir: Path, timeout: float = 30.0) -> None:
+        """
+        Args:
+            run_dir: キューを保存するディレクトリ（存在しない場合は作成する）
+            timeout: 他のプロセスの書き込みの完了を待つ最大時間（秒）
+        """
+        run_dir.mkdir(parents=True, exist_ok=True)
+        self.path = run_dir / QUEUE_FILENAME
+        self._lock = threading.Lock()
+        # トランザクションを明示的に制御するため、自動でのトランザクション開始は無効にする。
+        self._conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    @property
+    def metadata(self) -> dict[str, Any] | None:
+        """記録済みの実行条件。initialize の前は None。"""
+        with self._lock:
+            row = self._conn.execute("SELECT metadata FROM meta WHERE id = 0").fetchone()
+        return None if row is None else cast(dict[str, Any], json.loads(row[0]))
+
+    def initialize(self, metadata: Mapping[str, Any], keys: Iterable[JudgmentKey]) -> int:
+        """
+        実行条件を記録し、作業単位を追加する（追加済みの作業単位は読み飛ばす）。
+
+        作業単位は keys の順に貸し出される。
+
+        Returns:
+            新しく追加した作業単位の数
+
+        Raises:
+            ValueError: 記録済みの実行条件と metadata が一致しない場合
+        """
+        with self._lock, self._transaction():
+            row = self._conn.execute("SELECT metadata FROM meta WHERE id = 0").fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO meta (id, metadata) VALUES (0, ?)", (json.dumps(dict(metadata), ensure_ascii=False),)
+                )
+            elif json.loads(row[0]) != dict(metadata):
+                raise ValueError(
+                    f"Sweep metadata mismatch in {self.path}: recorded {json.loads(row[0])}, requested {dict(metadata)}"
+                )
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO units (iteration, method, item_index, rubric_index) VALUES (?, ?, ?, ?)", keys
+            )
+            return self._conn.total_changes - before
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """BEGIN IMMEDIATE で書き込みロックを取得し、例外がなければコミット、あればロールバックする。"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def lease(self, worker: str, count: int, lease_seconds: float, max_attempts: int) -> list[WorkUnit]:
+        """
+        未完了の作業単位（未着手、または貸し出し期間が切れたもの）を最大 count 件まで worker に貸し出す。
+
+        貸し出し期間が切れた作業単位のうち、max_attempts 回貸し出し済みのものは失敗として扱う。
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE units SET state = 'failed', error = 'lease expired' "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, max_attempts),
+            )
+            rows = self._conn.execute(
+                "SELECT id, iteration, method, item_index, rubric_index, attempts FROM units "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) ORDER BY id LIMIT ?",
+                (now, count),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE units SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                [(worker, now + lease_seconds, row[0]) for row in rows],
+            )
+        return [
+            WorkUnit(unit_id, (iteration, cast(EvaluationMethod, method), item_index, rubric_index), attempts + 1)
+            for unit_id, iteration, method, item_index, rubric_index, attempts in rows
+        ]
+
+    def renew(self, worker: str, unit_ids: Iterable[int], lease_seconds: float) -> None:
+        """worker に貸し出し中の作業単位の貸し出し期間を延長する。"""
+        expires = time.time() + lease_seconds
+        with self._lock, self._transaction():
+            self._conn.executemany(
+                "UPDATE units SET lease_expires = ? WHERE id = ? AND state = 'leased' AND worker = ?",
+                [(expires, unit_id, worker) for unit_id in unit_ids],
+            )
+
+    def complete(self, unit_id: int, result: Mapping[str, Any]) -> None:
+        """
+        作業単位の判定結果を記録する。
+
+        貸し出し期間が切れて他のワーカーに貸し出された後でも、先に完了した結果を記録する。
+        """
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE units SET state = 'done', result = ?, lease_expires = NULL, error = NULL "
+                "WHERE id = ? AND state != 'done'",
+                (json.dumps(dict(result), ensure_ascii=False), unit_id),
+            )
+
+    def fail(self, worker: str, unit_id: int, error: str, max_attempts: int) -> None:
+        """
+        作業単位の判定に失敗したことを記録する。
+
+        max_attempts 回貸し出し済みの場合は失敗として確定し、それ以外は未着手に戻して貸し出し直す。
+        """
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE units SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "lease_expires = NULL, error = ? WHERE id = ? AND state = 'leased' AND worker = ?",
+                (max_attempts, error, unit_id, worker),
+            )
+
+    def counts(self) -> dict[str, int]:
+        """状態ごとの作業単位の数。"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM units GROUP BY state").fetchall()
+        counts = dict.fromkeys(UNIT_STATES, 0)
+        counts.update({state: count for state, count in rows})
+        return counts
+
+    def worker_counts(self) -> dict[str, int]:
+        """ワーカーごとの完了した作業単位の数。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker, COUNT(*) FROM units WHERE state = 'done' GROUP BY worker ORDER BY worker"
+            ).fetchall()
+        return {worker: count for worker, count in rows}
+
+    def iter_results(self) -> Iterator[tuple[JudgmentKey, dict[str, Any]]]:
+        """完了した作業単位の (キー, 判定結果) を作業単位の順に返す。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT iteration, method, item_index, rubric_index, result FROM units WHERE state = 'done' ORDER BY id"
+            ).fetchall()
+        for iteration, method, item_index, rubric_index, result in rows:
+            yield (iteration, cast(EvaluationMethod, method), item_index, rubric_index), json.loads(result)
+
+    def close(self) -> None:
+        """データベースを閉じる。"""
+        with self._lock:
+            self._conn.close()
+
+
+def sweep_metadata(model_name: str, iteration_count: int, dataset_sha256: str) -> dict[str, Any]:
+    """作業キューの実行条件（マージ時のジャーナルの実行条件に試行回数を加えたもの）。"""
+    return {
+        "model_name": model_name,
+        "batched_rubrics": False,
+        "dataset_sha256": dataset_sha256,
+        "iteration_count": iteration_count,
+    }
+
+
+def sweep_work_units(input_data: list[EvaluationDatasetItem], iteration_count: int) -> list[JudgmentKey]:
+    """
+    全試行の判定を作業単位のキーとして列挙する。
+
+    同じデータ項目の判定が続けて貸し出されるよう（共通の会話がコンテキストキャッシュから読み込まれるよう）、
+    データ項目、試行、評価手法の順に並べる。内容が同じデータ項目は最初のデータ項目でのみ判定する。
+    """
+    keys: list[JudgmentKey] = []
+    for j in sorted(set(canonical_item_indices(input_data))):
+        for iteration in range(1, iteration_count + 1):
+            keys.append((iteration, "subjective", j, None))
+            keys.append((iteration, "general", j, None))
+            keys.extend((iteration, "rubric", j, k) for k in range(len(input_data[j]["rubrics"])))
+    return keys
+
+
+def initialize_sweep(
+    queue: SweepQueue,
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    iteration_count: int,
+    dataset_sha256: str,
+) -> int:
+    """
+    全試行の判定を作業キューに追加する。
+
+    Returns:
+        新しく追加した作業単位の数
+
+    Raises:
+        ValueError: キューに記録済みの実行条件と一致しない場合
+    """
+    return queue.initialize(
+        sweep_metadata(model_name, iteration_count, dataset_sha256), sweep_work_units(input_data, iteration_count)
+    )
+
+
+async def _arun_work_unit(
+    key: JudgmentKey, input_data: list[EvaluationDatasetItem], conversation: str, model_name: str
+) -> RatingResult | RubricResult | None:
+    """作業単位の判定を 1 回実行する。"""
+    iteration, method, item_index, rubric_index = key
+    sample_index = iteration - 1
+    if rubric_index is not None:
+        rubric_item = input_data[item_index]["rubrics"][rubric_index]
+        return await arun_rubric_item_evaluation(conversation, rubric_item, model_name, sample_index=sample_index)
+    evaluate = arun_subjective_evaluation if method == "subjective" else arun_general_evaluation
+    return await evaluate(conversation, model_name, sample_index=sample_index)
+
+
+async def arun_sweep_worker(
+    queue: SweepQueue,
+    input_data: list[EvaluationDatasetItem],
+    worker: str,
+    lease_size: int = DEFAULT_LEASE_SIZE,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+) -> SweepWorkerStats:
+    """
+    作業キューから作業単位を lease_size 件ずつ借りて並行して判定し、結果をキューに記録する。
+
+    判定中は貸し出し期間を lease_seconds / 3 ごとに延長する。未着手の作業単位がなく、
+    他のワーカーに貸し出し中の作業単位しか残っていない場合は、poll_interval ごとに期間切れを確認する。
+    未完了の作業単位がなくなったら終了する。
+
+    Args:
+        queue: 作業キュー
+        input_data: 評価対象データ（キューを作成したときと同じもの）
+        worker: ワーカーの名前（ホスト名とプロセス ID など、ワーカーごとに一意なもの）
+        lease_size: 1 回に借りる作業単位の数
+        lease_seconds: 貸し出し期間（秒）
+        max_attempts: 作業単位ごとの最大試行回数
+        poll_interval: 貸し出しを再確認する間隔（秒）
+
+    Returns:
+        処理した作業単位の件数
+
+    Raises:
+        ValueError: キューが初期化されていない場合
+    """
+    metadata = queue.metadata
+    if metadata is None:
+        raise ValueError(f"Sweep queue {queue.path} is not initialized")
+    model_name: str = metadata["model_name"]
+    conversations: dict[int, str] = {}
+    stats: SweepWorkerStats = {"leases": 0, "completed": 0, "failed": 0}
+
+    async def run(unit: WorkUnit) -> None:
+        item_index = unit.key[2]
+        if item_index not in conversations:
+            conversations[item_index] = build_conversation(input_data[item_index])
+        try:
+            result = await _arun_work_unit(unit.key, input_data, conversations[item_index], model_name)
+        except Exception as error:
+            print(f"Error: Work unit {unit.key} failed - {error!r}")
+            await asyncio.to_thread(queue.fail, worker, unit.unit_id, repr(error), max_attempts)
+            stats["failed"] += 1
+            return
+        if result is None:
+            await asyncio.to_thread(queue.fail, worker, unit.unit_id, "no valid result", max_attempts)
+            stats["failed"] += 1
+            return
+        await asyncio.to_thread(queue.complete, unit.unit_id, result)
+        stats["completed"] += 1
+
+    async def heartbeat(unit_ids: list[int]) -> None:
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            await asyncio.to_thread(queue.renew, worker, unit_ids, lease_seconds)
+
+    while True:
+        units = await asyncio.to_thread(queue.lease, worker, lease_size, lease_seconds, max_attempts)
+        if not units:
+            if queue.counts()["leased"] == 0:
+                return stats
+            await asyncio.sleep(poll_interval)
+            continue
+        stats["leases"] += 1
+        renewal = asyncio.create_task(heartbeat([unit.unit_id for unit in units]))
+        try:
+            await asyncio.gather(*(run(unit) for unit in units))
+        finally:
+            renewal.cancel()
+
+
+async def amerge_sweep(
+    queue: SweepQueue,
+    input_data: list[EvaluationDatasetItem],
+    run_dir: Path,
+    output_root: Path = DEFAULT_OUTPUT_ROOT,
+    on_iteration_complete: Callable[[int, Path], None] | None = None,
+    result_format: ResultFormat = "json",
+) -> int:
+    """
+    作業キューの判定結果をジャーナルに記録し、試行ごとの評価結果を output_root/<timestamp>/ 配下に保存する。
+
+    失敗した作業単位や未完了の作業単位は、この中で対話的に判定する（llm-judge-evaluate と同じく、
+    記録されていない判定のみを実行する）。再実行すると保存済みの試行は読み飛ばす。
+
+    Returns:
+        新しくジャーナルに記録した判定の数
+
+    Raises:
+        ValueError: キューが初期化されていない場合、またはジャーナルの実行条件と一致しない場合
+    """
+    metadata = queue.metadata
+    if metadata is None:
+        raise ValueError(f"Sweep queue {queue.path} is not initialized")
+    journal_metadata = {key: value for key, value in metadata.items() if key != "iteration_count"}
+    journal = RunJournal(run_dir, journal_metadata)
+    try:
+        recorded = 0
+        for key, result in queue.iter_results():
+            if journal.get(key) is None:
+                journal.record(key, result)
+                recorded += 1
+        await arun_journaled_iterations(
+            input_data,
+            model_name=metadata["model_name"],
+            iteration_count=metadata["iteration_count"],
+            journal=journal,
+            output_root=output_root,
+            on_iteration_complete=on_iteration_complete,
+            result_format=result_format,
+        )
+    finally:
+        journal.close()
+    return recorded
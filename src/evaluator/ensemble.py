@@ -0,0 +1,297 @@
+import asyncio
+import statistics
+import threading
+from collections.abc import Awaitable, Callable, Mapping, Sequence
+from datetime import datetime
+from typing import Any, Literal, TypedDict, cast
+
+from ..types import EvaluationDatasetItem, EvaluationOutput, JudgeVerdict, RatingResult, RubricItem, RubricResult
+from .evaluator import (
+    _print_rubric_failure,
+    arun_general_evaluation,
+    arun_rubric_item_evaluation,
+    arun_subjective_evaluation,
+    build_conversation,
+    build_evaluation_output,
+)
+
+# 判定モデルの判定の集約方法。
+# - "majority": 多数決（同数の場合は最初の判定モデルの判定）。点数は中央値（小さい方）。
+# - "weighted": 判定モデルの重みによる多数決（同数の場合は最初の判定モデルの判定）。点数は重み付きの中央値。
+# - "unanimous": すべての判定モデルが適合と判定した場合のみ適合とする。点数は最小値。
+EnsembleAggregation = Literal["majority", "weighted", "unanimous"]
+
+ENSEMBLE_AGGREGATIONS: tuple[EnsembleAggregation, ...] = ("majority", "weighted", "unanimous")
+
+
+class EnsembleStats(TypedDict):
+    """アンサンブル評価の判定の件数（判定モデル間で一致したか）と、判定に失敗した件数。"""
+
+    # すべての判定モデルの判定が一致した判定。
+    unanimous: int
+    # 判定モデル間で判定が食い違った判定。
+    split: int
+    # 判定できた判定モデルが min_judges 未満だったため、失敗とした判定。
+    failed: int
+    # 判定に失敗した判定モデルの延べ数。
+    judge_failures: int
+
+
+class EnsembleConfig:
+    """
+    アンサンブル評価の設定。
+
+    各判定を model_names のすべての判定モデルで並行して行い、aggregation で 1 つの判定に集約する。
+    集約した判定の judges に判定モデルごとの判定を、explanation に集約した判定と同じ判定をした
+    最初の判定モデルの説明を記録する。判定モデル間で一致したかどうかの件数を stats で取得できる。
+    """
+
+    def __init__(
+        self,
+        model_names: Sequence[str],
+        aggregation: EnsembleAggregation = "majority",
+        weights: Mapping[str, float] | None = None,
+        negative_rubric_aggregation: EnsembleAggregation | None = None,
+        min_judges: int = 1,
+    ) -> None:
+        """
+        Args:
+            model_names: 判定モデル名（同数の場合に優先する順に並べる）
+            aggregation: 判定の集約方法
+            weights: "weighted" で集約する場合の判定モデルごとの重み（含まれない判定モデルは 1）
+            negative_rubric_aggregation: 配点が負のルーブリック項目の集約方法（None の場合は aggregation）。
+                "unanimous" にすると、すべての判定モデルが当てはまると判定した場合のみ減点する
+            min_judges: 判定を集約するのに必要な、判定できた判定モデルの数（これ未満の場合は評価に失敗したとみなす）
+
+        Raises:
+            ValueError: 判定モデルが指定されていない・重複している場合、重みが正でない場合、
+                min_judges が 1 から判定モデルの数の範囲にない場合
+        """
+        if not model_names:
+            raise ValueError("model_names must not be empty")
+        if len(set(model_names)) != len(model_names):
+            raise ValueError(f"model_names must not contain duplicates: {list(model_names)}")
+        if weights is not None and any(weight <= 0 for weight in weights.values()):
+            raise ValueError(f"weights must be positive: {dict(weights)}")
+        if not 1 <= min_judges <= len(model_names):
+            raise ValueError(f"min_judges must be between 1 and {len(model_names)}: {min_judges}")
+        self.model_names = list(model_names)
+        self.aggregation = aggregation
+        self.weights = dict(weights or {})
+        self.negative_rubric_aggregation = negative_rubric_aggregation
+        self.min_judges = min_judges
+        self._lock = threading.Lock()
+        self._stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> EnsembleStats:
+        return {"unanimous": 0, "split": 0, "failed": 0, "judge_failures": 0}
+
+    def weight(self, model_name: str) -> float:
+        """判定モデルの重みを取得する。"""
+        return self.weights.get(model_name, 1.0)
+
+    def rubric_aggregation(self, rubric_item: RubricItem) -> EnsembleAggregation:
+        """ルーブリック項目の集約方法を取得する。"""
+        if rubric_item["points"] < 0 and self.negative_rubric_aggregation is not None:
+            return self.negative_rubric_aggregation
+        return self.aggregation
+
+    def describe(self) -> dict[str, Any]:
+        """設定を JSON で保存できる辞書にする（ジャーナルの実行条件など）。"""
+        return {
+            "model_names": self.model_names,
+            "aggregation": self.aggregation,
+            "weights": dict(sorted(self.weights.items())),
+            "negative_rubric_aggregation": self.negative_rubric_aggregation,
+            "min_judges": self.min_judges,
+        }
+
+    def record(self, unanimous: bool | None, judge_failures: int) -> None:
+        """判定を 1 件記録する（unanimous が None の場合は失敗したもの）。"""
+        with self._lock:
+            if unanimous is None:
+                self._stats["failed"] += 1
+            else:
+                self._stats["unanimous" if unanimous else "split"] += 1
+            self._stats["judge_failures"] += judge_failures
+
+    @property
+    def stats(self) -> EnsembleStats:
+        """判定モデル間で一致した・食い違った判定、失敗した判定、失敗した判定モデルの件数。"""
+        with self._lock:
+            return cast(EnsembleStats, dict(self._stats))
+
+    def reset_stats(self) -> None:
+        """件数を 0 に戻す。"""
+        with self._lock:
+            self._stats = self._empty_stats()
+
+
+def _weighted_median_low(values: list[tuple[int, float]]) -> int:
+    """(値, 重み) の重み付きの中央値（重みの累積が半分に達した最初の値）を返す。"""
+    half = sum(weight for _, weight in values) / 2
+    cumulative = 0.0
+    for value, weight in sorted(values, key=lambda pair: pair[0]):
+        cumulative += weight
+        if cumulative >= half:
+            return value
+    return max(value for value, _ in values)
+
+
+def aggregate_rubric_verdicts(
+    verdicts: Sequence[JudgeVerdict], config: EnsembleConfig, aggregation: EnsembleAggregation
+) -> RubricResult:
+    """
+    判定モデルごとのルーブリック評価の判定を 1 つに集約する。
+
+    Args:
+        verdicts: 判定モデルごとの判定（1 件以上、model_names の順）
+        config: アンサンブル評価の設定
+        aggregation: 集約方法
+
+    Returns:
+        集約した判定（judges に判定モデルごとの判定を含む）
+    """
+    met = [bool(verdict["criteria_met"]) for verdict in verdicts]
+    if aggregation == "unanimous":
+        criteria_met = all(met)
+    else:
+        weights = [config.weight(verdict["model_name"]) if aggregation == "weighted" else 1.0 for verdict in verdicts]
+        met_weight = sum(weight for weight, verdict_met in zip(weights, met, strict=True) if verdict_met)
+        total_weight = sum(weights)
+        criteria_met = met[0] if met_weight * 2 == total_weight else met_weight * 2 > total_weight
+    chosen = next(verdict for verdict, verdict_met in zip(verdicts, met, strict=True) if verdict_met == criteria_met)
+    return {"explanation": chosen["explanation"], "criteria_met": criteria_met, "judges": list(verdicts)}
+
+
+def aggregate_rating_verdicts(
+    verdicts: Sequence[JudgeVerdict], config: EnsembleConfig, aggregation: EnsembleAggregation
+) -> RatingResult:
+    """aggregate_rubric_verdicts の主観評価・自由記述評価版。"""
+    ratings = [int(verdict["rating"]) for verdict in verdicts]
+    if aggregation == "unanimous":
+        rating = min(ratings)
+    elif aggregation == "weighted":
+        rating = _weighted_median_low(
+            [(value, config.weight(verdict["model_name"])) for value, verdict in zip(ratings, verdicts, strict=True)]
+        )
+    else:
+        rating = statistics.median_low(ratings)
+    chosen = next(verdict for verdict, value in zip(verdicts, ratings, strict=True) if value == rating)
+    return {"explanation": chosen["explanation"], "rating": rating, "judges": list(verdicts)}
+
+
+async def _agather_verdicts[T: (RatingResult, RubricResult)](
+    config: EnsembleConfig, run: Callable[[str], Awaitable[T | None]]
+) -> tuple[list[JudgeVerdict], int]:
+    """
+    すべての判定モデルで並行して判定する。
+
+    Returns:
+        (判定できた判定モデルの判定（model_names の順）, 判定に失敗した判定モデルの数)
+    """
+    results = await asyncio.gather(*(run(model_name) for model_name in config.model_names))
+    verdicts: list[JudgeVerdict] = []
+    for model_name, result in zip(config.model_names, results, strict=True):
+        if result is not None:
+            verdict = cast(JudgeVerdict, {"model_name": model_name, **result})
+            verdicts.append(verdict)
+    return verdicts, len(results) - len(verdicts)
+
+
+async def _arun_ensemble_rating(
+    config: EnsembleConfig, run: Callable[[str], Awaitable[RatingResult | None]]
+) -> RatingResult | None:
+    """主観評価・自由記述評価をすべての判定モデルで行い、集約する。"""
+    verdicts, judge_failures = await _agather_verdicts(config, run)
+    if len(verdicts) < config.min_judges:
+        config.record(None, judge_failures)
+        return None
+    config.record(len({verdict["rating"] for verdict in verdicts}) == 1, judge_failures)
+    return aggregate_rating_verdicts(verdicts, config, config.aggregation)
+
+
+async def arun_ensemble_subjective_evaluation(
+    conversation: str, config: EnsembleConfig, sample_index: int = 0
+) -> RatingResult | None:
+    """
+    主観評価をアンサンブル（すべての判定モデルで並行して判定し、集約する）で非同期に実行する。
+
+    各判定モデルは同じ sample_index で判定するため、判定結果のキャッシュは同じモデルで単独で評価した場合と共有される。
+
+    Args:
+        conversation: 会話履歴（build_conversation で構築したもの）
+        config: アンサンブル評価の設定
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+
+    Returns:
+        集約した評価結果（judges に判定モデルごとの判定を含む）、または None（評価に失敗した場合）
+    """
+    return await _arun_ensemble_rating(
+        config, lambda model_name: arun_subjective_evaluation(conversation, model_name, sample_index)
+    )
+
+
+async def arun_ensemble_general_evaluation(
+    conversation: str, config: EnsembleConfig, sample_index: int = 0
+) -> RatingResult | None:
+    """arun_ensemble_subjective_evaluation の自由記述評価版。"""
+    return await _arun_ensemble_rating(
+        config, lambda model_name: arun_general_evaluation(conversation, model_name, sample_index)
+    )
+
+
+async def arun_ensemble_rubric_item_evaluation(
+    conversation: str,
+    rubric_item: RubricItem,
+    config: EnsembleConfig,
+    sample_index: int = 0,
+) -> RubricResult | None:
+    """
+    1 つのルーブリック項目に対する評価をアンサンブルで非同期に実行する。
+
+    Args:
+        conversation: 会話履歴（build_conversation で構築したもの）
+        rubric_item: ルーブリック項目
+        config: アンサンブル評価の設定
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+
+    Returns:
+        集約した評価結果（judges に判定モデルごとの判定を含む）、または None（評価に失敗した場合）
+    """
+    verdicts, judge_failures = await _agather_verdicts(
+        config, lambda model_name: arun_rubric_item_evaluation(conversation, rubric_item, model_name, sample_index)
+    )
+    if len(verdicts) < config.min_judges:
+        config.record(None, judge_failures)
+        return None
+    config.record(len({verdict["criteria_met"] for verdict in verdicts}) == 1, judge_failures)
+    return aggregate_rubric_verdicts(verdicts, config, config.rubric_aggregation(rubric_item))
+
+
+async def arun_ensemble_rubric_evaluation(
+    data: EvaluationDatasetItem,
+    config: EnsembleConfig,
+    prompt_id: str | None = None,
+    sample_index: int = 0,
+) -> EvaluationOutput | None:
+    """
+    ルーブリック評価をアンサンブルで非同期に実行する。各ルーブリック項目・判定モデルの評価は並行して実行する。
+
+    結果の形式は arun_rubric_evaluation と同じで、各ルーブリック項目の judges に判定モデルごとの判定を記録する。
+    """
+    if prompt_id is None:
+        prompt_id = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    conversation = build_conversation(data)
+    results = await asyncio.gather(
+        *(
+            arun_ensemble_rubric_item_evaluation(conversation, rubric_item, config, sample_index)
+            for rubric_item in data["rubrics"]
+        )
+    )
+    for rubric_item, result in zip(data["rubrics"], results, strict=True):
+        if result is None:
+            _print_rubric_failure(rubric_item)
+            return None
+    return build_evaluation_output(data, prompt_id, [result for result in results if result is not None])
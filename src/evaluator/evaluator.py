@@ -1,17 +1,36 @@
+import asyncio
+from collections.abc import Iterable
 from datetime import datetime
-from typing import Any, cast
+from typing import Any, NamedTuple, cast
 
-from ..models import generate
+from ..instrumentation import call_context
+from ..models import (
+    DEFAULT_MAX_TRANSPORT_RETRIES,
+    CacheMode,
+    TransportRetryError,
+    agenerate,
+    astream_generate_json,
+    generate,
+)
+from ..structured_output import SchemaValidationError, validate_json
 from ..types import (
     EvaluationDatasetItem,
     EvaluationOutput,
     EvaluationResultByRubric,
     RatingResult,
+    RubricItem,
+    RubricResult,
 )
-from .prompt import (
-    GENERAL_EVALUATION_PROMPT_TEMPLATE,
-    RUBRIC_EVALUATION_PROMPT_TEMPLATE,
-    SUBJECTIVE_EVALUATION_PROMPT_TEMPLATE,
+from .prompt import VERDICT_FIRST_INSTRUCTION
+from .templates import (
+    GENERAL_PROMPT,
+    RUBRIC_BATCH_PROMPT,
+    SUBJECTIVE_PROMPT,
+    CompiledRubricSet,
+    compile_rubric_item,
+    compile_rubric_set,
+    render_item_conversation,
+    render_rubric_prefix,
 )
 
 # 評価の出力スキーマ。
@@ -19,7 +38,8 @@ RATING_SCHEMA = {
     "type": "object",
     "properties": {
         "explanation": {"type": "string"},
-        "rating": {"type": "integer"},
+        # プロンプトで指定した 1〜5 の範囲外の点数は、解釈できない応答と同じくリトライする。
+        "rating": {"type": "integer", "minimum": 1, "maximum": 5},
     },
     "required": ["explanation", "rating"],
 }
@@ -34,69 +54,345 @@ RUBRIC_SCHEMA = {
     "required": ["explanation", "criteria_met"],
 }
 
+# 複数のルーブリック項目を一括で評価する場合の出力スキーマ（RUBRIC_SCHEMA に rubric_index を加えた項目の配列）。
+RUBRIC_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "rubric_index": {"type": "integer", "minimum": 1},
+                    **cast(dict[str, Any], RUBRIC_SCHEMA["properties"]),
+                },
+                "required": ["rubric_index", *cast(list[str], RUBRIC_SCHEMA["required"])],
+            },
+        },
+    },
+    "required": ["results"],
+}
+
+# 同じプロンプトに対する複数の応答を一度に評価する場合の出力スキーマ（listwise.py）。
+LISTWISE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "response_index": {"type": "integer", "minimum": 1},
+                    **cast(dict[str, Any], RATING_SCHEMA["properties"]),
+                    "rank": {"type": "integer", "minimum": 1},
+                },
+                "required": ["response_index", *cast(list[str], RATING_SCHEMA["required"]), "rank"],
+            },
+        },
+    },
+    "required": ["results"],
+}
+
+# 一括評価の結果の各要素のスキーマ。
+_RUBRIC_BATCH_ITEM_SCHEMA = cast(
+    dict[str, Any], cast(dict[str, Any], RUBRIC_BATCH_SCHEMA['properties'])['results']['items']
+)
+
+
+
+class StreamingJudgmentSettings(NamedTuple):
+    """判定をストリーミングで生成する場合の設定（configure_streaming_judgments の引数と同じ）。"""
+    
+    enabled: bool
+    verdict_first: bool
+    explanations: bool
+
+
+_streaming_judgments = StreamingJudgmentSettings(False, False, True)
+
+# explanation 以外のフィールドを先に並べたスキーマ（id(元のスキーマ) → (元のスキーマ, 並べ替えたスキーマ)）。
+_verdict_first_schemas: dict[int, tuple[dict[str, Any], dict[str, Any]]] = {}
+
+
+def configure_streaming_judgments(
+    enabled: bool = True,
+    verdict_first: bool = False,
+    explanations: bool = True
+) -> None:
+    """
+    非同期の評価（arun_* とそれを使うカスケード評価・適応的な試行など）で、判定をストリーミングで生成するかを設定する。
+    
+    ストリーミングでは応答の JSON を受け取りながら解釈する（models.astream_generate_json）。
+    対象は explanation を持つ出力スキーマの評価で、一括評価と同期版の評価（run_*）は対象外。
+    
+    Args:
+        enabled: ストリーミングで生成するか
+        verdict_first: 判定（rating、criteria_met など）を explanation より先に出力させるか
+            （プロンプトに指示を加え、スキーマのフィールドの順序を変える）
+        explanations: False の場合、判定のフィールドが確定した時点で生成を打ち切り、explanation は空文字列にする
+            （verdict_first と組み合わせると、説明の待ち時間と出力トークンがかからない）
+    """
+    global _streaming_judgments
+    _streaming_judgments = StreamingJudgmentSettings(enabled, verdict_first, explanations)
+
+
+def get_streaming_judgment_settings() -> StreamingJudgmentSettings:
+    """現在のストリーミングの設定を返す。"""
+    return _streaming_judgments
+
+
+def _is_streamable(schema: dict[str, Any]) -> bool:
+    """ストリーミングで判定できる出力スキーマ（explanation を持つオブジェクト）かどうか。"""
+    return schema.get("type") == "object" and "explanation" in schema.get("properties", {})
+
+
+def _verdict_first_schema(schema: dict[str, Any]) -> dict[str, Any]:
+    """
+    explanation 以外のフィールドを先に、explanation を最後に並べたスキーマを返す（同じスキーマには同じオブジェクト）。
+    
+    propertyOrdering は Gemini の出力の順序を決める（Claude にはプロンプトに含めるスキーマの順序で伝わる）。
+    """
+    cached = _verdict_first_schemas.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+    properties = cast(dict[str, Any], schema["properties"])
+    order = [key for key in properties if key != "explanation"] + ["explanation"]
+    reordered = {**schema, "properties": {key: properties[key] for key in order}, "propertyOrdering": order}
+    _verdict_first_schemas[id(schema)] = (schema, reordered)
+    return reordered
+
+
+async def _astream_judgment(
+    model_name: str,
+    prompt: str,
+    schema: dict[str, Any],
+    cache_mode: CacheMode,
+    sample_index: int,
+    max_transport_retries: int,
+    prompt_prefix: str | None,
+    temperature: float
+) -> dict[str, Any] | None:
+    """
+    判定をストリーミングで生成する（_streaming_judgments の設定に従う）。
+    
+    explanations が False の場合は、explanation 以外の必須のフィールドが確定した時点で生成を打ち切る。
+    打ち切った結果に explanation がなければ空文字列にする。
+    """
+    settings = _streaming_judgments
+    if settings.verdict_first:
+        prompt = prompt + VERDICT_FIRST_INSTRUCTION
+        schema = _verdict_first_schema(schema)
+    verdict_fields = [key for key in cast(list[str], schema.get("required", [])) if key != "explanation"]
+    generated = await astream_generate_json(
+        model_name,
+        prompt,
+        schema,
+        stop_after=() if settings.explanations else verdict_fields,
+        temperature=temperature,
+        cache_mode=cache_mode,
+        sample_index=sample_index,
+        max_transport_retries=max_transport_retries,
+        prompt_prefix=prompt_prefix
+    )
+    if generated is not None and not settings.explanations:
+        generated.setdefault("explanation", "")
+    return generated
+
 
 def _generate_with_retry(
     model_name: str,
     prompt: str,
     schema: dict[str, Any],
-    required_keys: list[str],
     max_retries: int = 5,
-    show_available_keys: bool = False
+    show_available_keys: bool = False,
+    sample_index: int = 0,
+    max_transport_retries: int = DEFAULT_MAX_TRANSPORT_RETRIES,
+    prompt_prefix: str | None = None,
+    temperature: float = 0
 ) -> dict[str, Any] | None:
     """
-    指定されたスキーマに従った JSON を生成し、必要なキーが存在するまでリトライする。
+    指定されたスキーマに従った JSON を生成し、スキーマに適合するまでリトライする。
+    
+    結果はコンパイル済みのスキーマ（structured_output.compile_validator）で検証し、必要なキーがない場合に加えて、
+    型が違う場合や値が範囲外の場合（"5" や 7 の rating など）も不正な結果としてリトライする。
+    
+    不正な JSON のリトライ（max_retries）と、レート制限や通信エラーのリトライ（max_transport_retries）は
+    別々に数える。通信エラーのリトライは models.generate がバックオフしながら行う。
     
     Args:
         model_name: モデル名
         prompt: プロンプト
         schema: JSON スキーマ
-        required_keys: 結果に含まれる必要があるキーのリスト
         max_retries: 最大リトライ回数（デフォルト: 5）
         show_available_keys: キーが不足している場合に利用可能なキーを表示するか（デフォルト: False）
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる、デフォルト: 0）
+        max_transport_retries: 通信エラー時の最大リトライ回数
+        prompt_prefix: 複数のリクエストで共通するプロンプトの前半（prompt の前に連結される）
+        temperature: 温度パラメータ（デフォルト: 0。独立した複数のサンプルを得る場合に大きくする）
     
     Returns:
-        期待通りの JSON が取得できた場合は辞書、それ以外は None
+        期待通りの JSON が取得できた場合はスキーマで正規化した辞書（スキーマにないキーは除かれる）、それ以外は None
     """
-    result = None
+    result: dict[str, Any] | None = None
     for attempt in range(1, max_retries + 1):
-        result = generate(model_name, prompt=prompt, schema=schema, temperature=0)
-        
-        # 期待通りの JSON かどうかを確認する。
-        if result is not None and isinstance(result, dict):
-            if all(key in result for key in required_keys):
-                # 期待通りの JSON が取得できた。
-                break
-            else:
-                # 必要なキーが存在しない。
-                if attempt < max_retries:
-                    print(f"Warning: Attempt {attempt}/{max_retries} - Missing required keys in result. Retrying...")
-                    if show_available_keys:
-                        print(f"Available keys: {list(result.keys())}")
-                result = None
-        else:
-            # None または辞書型でない。
-            if attempt < max_retries:
-                print(f"Warning: Attempt {attempt}/{max_retries} - Failed to get valid result. Retrying...")
-            result = None
+        # リトライ時は不正な結果がキャッシュされている可能性があるため、キャッシュを読まずに再生成する。
+        try:
+            with call_context(attempt=attempt):
+                generated = generate(
+                    model_name,
+                    prompt=prompt,
+                    schema=schema,
+                    temperature=temperature,
+                    cache_mode="use" if attempt == 1 else "refresh",
+                    sample_index=sample_index,
+                    max_transport_retries=max_transport_retries,
+                    prompt_prefix=prompt_prefix
+                )
+        except TransportRetryError as error:
+            print(f"Error: Transport retries exhausted - {error}")
+            return None
+        result = _check_result(generated, schema, attempt, max_retries, show_available_keys)
+        if result is not None:
+            # 期待通りの JSON が取得できた。
+            break
+    
+    return result
+
+
+async def _agenerate_with_retry(
+    model_name: str,
+    prompt: str,
+    schema: dict[str, Any],
+    max_retries: int = 5,
+    show_available_keys: bool = False,
+    sample_index: int = 0,
+    max_transport_retries: int = DEFAULT_MAX_TRANSPORT_RETRIES,
+    prompt_prefix: str | None = None,
+    temperature: float = 0
+) -> dict[str, Any] | None:
+    """
+    _generate_with_retry の非同期版。引数と戻り値は _generate_with_retry と同じ。
+    
+    configure_streaming_judgments でストリーミングが有効な場合は、判定をストリーミングで生成する。
+    """
+    streaming = _streaming_judgments.enabled and _is_streamable(schema)
+    generated: str | dict[str, Any] | None
+    result: dict[str, Any] | None = None
+    for attempt in range(1, max_retries + 1):
+        # リトライ時は不正な結果がキャッシュされている可能性があるため、キャッシュを読まずに再生成する。
+        try:
+            with call_context(attempt=attempt):
+                if streaming:
+                    generated = await _astream_judgment(
+                        model_name,
+                        prompt,
+                        schema,
+                        cache_mode="use" if attempt == 1 else "refresh",
+                        sample_index=sample_index,
+                        max_transport_retries=max_transport_retries,
+                        prompt_prefix=prompt_prefix,
+                        temperature=temperature
+                    )
+                else:
+                    generated = await agenerate(
+                        model_name,
+                        prompt=prompt,
+                        schema=schema,
+                        temperature=temperature,
+                        cache_mode="use" if attempt == 1 else "refresh",
+                        sample_index=sample_index,
+                        max_transport_retries=max_transport_retries,
+                        prompt_prefix=prompt_prefix
+                    )
+        except TransportRetryError as error:
+            print(f"Error: Transport retries exhausted - {error}")
+            return None
+        result = _check_result(generated, schema, attempt, max_retries, show_available_keys)
+        if result is not None:
+            # 期待通りの JSON が取得できた。
+            break
     
-    # 最終的な結果が期待通りかどうかを確認する。
-    if result is not None and isinstance(result, dict) and all(key in result for key in required_keys):
-        return result
+    return result
+
+
+def _check_result(
+    result: str | dict[str, Any] | None,
+    schema: dict[str, Any],
+    attempt: int,
+    max_retries: int,
+    show_available_keys: bool
+) -> dict[str, Any] | None:
+    """
+    生成結果がスキーマに適合する JSON かどうかを確認し、適合しなければ警告を表示する。
+    
+    Returns:
+        適合する場合はスキーマで正規化した辞書、それ以外は None
+    """
+    # 期待通りの JSON かどうかを確認する。
+    if result is not None and isinstance(result, dict):
+        try:
+            return cast(dict[str, Any], validate_json(result, schema))
+        except SchemaValidationError as error:
+            # 必要なキーが存在しない、型が違う、または値が範囲外。
+            if attempt < max_retries:
+                print(f"Warning: Attempt {attempt}/{max_retries} - Invalid result ({error}). Retrying...")
+                if show_available_keys:
+                    print(f"Available keys: {list(result.keys())}")
+    else:
+        # None または辞書型でない。
+        if attempt < max_retries:
+            print(f"Warning: Attempt {attempt}/{max_retries} - Failed to get valid result. Retrying...")
     return None
 
 
+def build_conversation(data: EvaluationDatasetItem) -> str:
+    """
+    評価対象データ項目から評価プロンプトに埋め込む会話履歴の文字列を構築する。
+    
+    内容が同じ会話は、最初に構築した文字列を使い回す（templates.render_conversation でメモ化される）。
+    
+    Args:
+        data: 評価対象データ項目
+    
+    Returns:
+        "role: content" 形式で各ターンを改行区切りにした会話履歴
+    """
+    return render_item_conversation(data)
+
+
 def run_subjective_evaluation(
     conversation: str,
-    model_name: str
+    model_name: str,
+    sample_index: int = 0
 ) -> RatingResult | None:
     """主観評価を実行する。"""
-    prompt = SUBJECTIVE_EVALUATION_PROMPT_TEMPLATE.replace("<<conversation>>", conversation)
-    result = _generate_with_retry(
-        model_name=model_name,
-        prompt=prompt,
-        schema=RATING_SCHEMA,
-        required_keys=['explanation', 'rating']
-    )
+    prompt = SUBJECTIVE_PROMPT.render(conversation=conversation)
+    with call_context(evaluator='subjective'):
+        result = _generate_with_retry(
+            model_name=model_name,
+            prompt=prompt,
+            schema=RATING_SCHEMA,
+            sample_index=sample_index
+        )
+    if result is None:
+        return None
+    return cast(RatingResult, result)
+
+
+async def arun_subjective_evaluation(
+    conversation: str,
+    model_name: str,
+    sample_index: int = 0
+) -> RatingResult | None:
+    """主観評価を非同期に実行する。"""
+    prompt = SUBJECTIVE_PROMPT.render(conversation=conversation)
+    with call_context(evaluator='subjective'):
+        result = await _agenerate_with_retry(
+            model_name=model_name,
+            prompt=prompt,
+            schema=RATING_SCHEMA,
+            sample_index=sample_index
+        )
     if result is None:
         return None
     return cast(RatingResult, result)
@@ -104,26 +400,100 @@ def run_subjective_evaluation(
 
 def run_general_evaluation(
     conversation: str,
-    model_name: str
+    model_name: str,
+    sample_index: int = 0
 ) -> RatingResult | None:
     """自由記述評価を実行する。"""
-    prompt = GENERAL_EVALUATION_PROMPT_TEMPLATE.replace("<<conversation>>", conversation)
+    prompt = GENERAL_PROMPT.render(conversation=conversation)
     
-    result = _generate_with_retry(
-        model_name=model_name,
-        prompt=prompt,
-        schema=RATING_SCHEMA,
-        required_keys=['explanation', 'rating']
-    )
+    with call_context(evaluator='general'):
+        result = _generate_with_retry(
+            model_name=model_name,
+            prompt=prompt,
+            schema=RATING_SCHEMA,
+            sample_index=sample_index
+        )
     if result is None:
         return None
     return cast(RatingResult, result)
 
 
+async def arun_general_evaluation(
+    conversation: str,
+    model_name: str,
+    sample_index: int = 0
+) -> RatingResult | None:
+    """自由記述評価を非同期に実行する。"""
+    prompt = GENERAL_PROMPT.render(conversation=conversation)
+    
+    with call_context(evaluator='general'):
+        result = await _agenerate_with_retry(
+            model_name=model_name,
+            prompt=prompt,
+            schema=RATING_SCHEMA,
+            sample_index=sample_index
+        )
+    if result is None:
+        return None
+    return cast(RatingResult, result)
+
+
+def _build_rubric_prompt_prefix(conversation: str) -> str:
+    """ルーブリック評価のプロンプトのうち、全ルーブリック項目で共通の前半（指示と会話）を構築する（会話ごとにメモ化）。"""
+    return render_rubric_prefix(conversation)
+
+
+def _build_rubric_prompt_suffix(rubric_item: RubricItem) -> str:
+    """ルーブリック評価のプロンプトのうち、ルーブリック項目ごとに変わる後半を構築する（項目の内容ごとにメモ化）。"""
+    return compile_rubric_item(rubric_item).suffix
+
+
+def _print_rubric_failure(rubric_item: RubricItem) -> None:
+    """リトライ後も期待通りの JSON が取得できなかったルーブリック項目を表示する。"""
+    print(
+        f"Error: Failed to get valid result after specified number of attempts for criterion: "
+        f"{rubric_item['criterion']}"
+    )
+
+
+def build_evaluation_output(
+    data: EvaluationDatasetItem,
+    prompt_id: str,
+    results: list[RubricResult]
+) -> EvaluationOutput:
+    """
+    ルーブリックごとの評価結果から EvaluationOutput を構築する。
+    
+    Args:
+        data: 評価対象データ項目
+        prompt_id: プロンプト ID
+        results: ルーブリックごとの評価結果（data['rubrics'] と同じ順序）
+    
+    Returns:
+        評価結果
+    """
+    return EvaluationOutput(
+        prompt_id=prompt_id,
+        prompts=data['prompts'],
+        llm_response_text=data['llm_response_text'],
+        result_by_rubrics=[
+            EvaluationResultByRubric(
+                rubric=rubric_item,
+                explanation=result['explanation'],
+                criteria_met=result['criteria_met'],
+                decided_by=result.get('decided_by'),
+                judges=result.get('judges')
+            )
+            for rubric_item, result in zip(data['rubrics'], results, strict=True)
+        ]
+    )
+
+
 def run_rubric_evaluation(
     data: EvaluationDatasetItem,
     model_name: str,
-    prompt_id: str | None = None
+    prompt_id: str | None = None,
+    sample_index: int = 0
 ) -> EvaluationOutput | None:
     """
     ルーブリック評価を実行して EvaluationOutput を返す。
@@ -132,6 +502,7 @@ def run_rubric_evaluation(
         data: 評価対象データ項目
         model_name: 評価に使用するモデル名
         prompt_id: プロンプト ID（指定されない場合は現在時刻から生成）
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
     
     Returns:
         評価結果、または None（評価に失敗した場合）
@@ -139,49 +510,265 @@ def run_rubric_evaluation(
     if prompt_id is None:
         prompt_id = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
     
-    # 会話履歴の構築
-    conversation = ""
-    for p in data['prompts']:
-        conversation += f"{p['role']}: {p['content']}\n"
-    conversation += f"assistant: {data['llm_response_text']}"
-    
-    # 各ルーブリックに対して評価を実行する。
-    result_by_rubrics: list[EvaluationResultByRubric] = []
-    for rubric_item in data['rubrics']:
-        # criterionWithPoints の形式: "[points] criterion"
-        criterion_text = f"[{rubric_item['points']}] {rubric_item['criterion']}"
+    prompt_prefix = _build_rubric_prompt_prefix(build_conversation(data))
+    
+    # 各ルーブリックに対して評価を実行する（プロンプトの前半は全ルーブリックで共通、後半はコンパイル済みのもの）。
+    results: list[RubricResult] = []
+    for compiled in compile_rubric_set(data['rubrics']).items:
+        rubric_item = compiled.rubric
+        with call_context(evaluator='rubric', rubric=rubric_item['criterion']):
+            result = _generate_with_retry(
+                model_name=model_name,
+                prompt=compiled.suffix,
+                schema=RUBRIC_SCHEMA,
+                show_available_keys=True,
+                sample_index=sample_index,
+                prompt_prefix=prompt_prefix
+            )
         
-        prompt = RUBRIC_EVALUATION_PROMPT_TEMPLATE.replace("<<conversation>>", conversation) \
-            .replace("<<rubric_item>>", criterion_text)
+        # リトライ後も期待通りの JSON が取得できなかった場合。
+        if result is None:
+            _print_rubric_failure(rubric_item)
+            return None
         
-        result = _generate_with_retry(
+        results.append(cast(RubricResult, result))
+    
+    return build_evaluation_output(data, prompt_id, results)
+
+
+async def arun_rubric_item_evaluation(
+    conversation: str,
+    rubric_item: RubricItem,
+    model_name: str,
+    sample_index: int = 0
+) -> RubricResult | None:
+    """
+    1 つのルーブリック項目に対する評価を非同期に実行する。
+    
+    Args:
+        conversation: 会話履歴（build_conversation で構築したもの）
+        rubric_item: ルーブリック項目
+        model_name: 評価に使用するモデル名
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+    
+    Returns:
+        評価結果、または None（評価に失敗した場合）
+    """
+    with call_context(evaluator='rubric', rubric=rubric_item['criterion']):
+        result = await _agenerate_with_retry(
             model_name=model_name,
-            prompt=prompt,
+            prompt=_build_rubric_prompt_suffix(rubric_item),
             schema=RUBRIC_SCHEMA,
-            required_keys=['explanation', 'criteria_met'],
-            show_available_keys=True
+            show_available_keys=True,
+            sample_index=sample_index,
+            prompt_prefix=_build_rubric_prompt_prefix(conversation)
         )
-        
-        # リトライ後も期待通りの JSON が取得できなかった場合。
+    if result is None:
+        return None
+    return cast(RubricResult, result)
+
+
+async def arun_rubric_evaluation(
+    data: EvaluationDatasetItem,
+    model_name: str,
+    prompt_id: str | None = None,
+    sample_index: int = 0
+) -> EvaluationOutput | None:
+    """
+    ルーブリック評価を非同期に実行して EvaluationOutput を返す。
+    
+    各ルーブリック項目の評価は並行して実行され、結果は data['rubrics'] と同じ順序で格納される。
+    同時実行数は models.set_max_concurrency で設定した上限に制限される。
+    
+    Args:
+        data: 評価対象データ項目
+        model_name: 評価に使用するモデル名
+        prompt_id: プロンプト ID（指定されない場合は現在時刻から生成）
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+    
+    Returns:
+        評価結果、または None（評価に失敗した場合）
+    """
+    if prompt_id is None:
+        prompt_id = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    
+    conversation = build_conversation(data)
+    
+    # 各ルーブリックに対して並行して評価を実行する。
+    results = await asyncio.gather(*(
+        arun_rubric_item_evaluation(conversation, rubric_item, model_name, sample_index=sample_index)
+        for rubric_item in data['rubrics']
+    ))
+    
+    # リトライ後も期待通りの JSON が取得できなかった場合。
+    for rubric_item, result in zip(data['rubrics'], results, strict=True):
         if result is None:
-            print(
-                f"Error: Failed to get valid result after specified number of attempts for criterion: "
-                f"{rubric_item['criterion']}"
-            )
+            _print_rubric_failure(rubric_item)
             return None
-        
-        result_by_rubrics.append(
-            EvaluationResultByRubric(
-                rubric=rubric_item,
-                explanation=result['explanation'],
-                criteria_met=result['criteria_met']
-            )
+    
+    return build_evaluation_output(data, prompt_id, [result for result in results if result is not None])
+
+
+def _build_rubric_batch_prompt(conversation: str, rubric_set: CompiledRubricSet, indices: Iterable[int]) -> str:
+    """
+    複数のルーブリック項目をまとめて評価するプロンプトを構築する。
+    
+    各行（"番号. [points] criterion"）はコンパイル済みのルーブリックセットのものを使い、描画し直さない。
+    
+    Args:
+        conversation: 会話履歴
+        rubric_set: 評価対象データ項目のルーブリックセット
+        indices: 評価するルーブリック項目の番号（1 始まり）
+    """
+    return RUBRIC_BATCH_PROMPT.render(conversation=conversation, rubric_items=rubric_set.batch_rubric_items(indices))
+
+
+def _collect_batch_results(
+    generated: str | dict[str, Any] | None,
+    pending: dict[int, RubricItem]
+) -> dict[int, RubricResult]:
+    """
+    一括評価の結果から、未評価のルーブリック項目に対する正しい形式の評価結果を取り出す。
+    
+    Args:
+        generated: 生成結果
+        pending: 未評価のルーブリック項目（番号 → 項目）
+    
+    Returns:
+        番号 → 評価結果。欠落している、または形式が不正な項目は含まれない。
+    """
+    collected: dict[int, RubricResult] = {}
+    if not isinstance(generated, dict) or not isinstance(generated.get('results'), list):
+        return collected
+    for item in generated['results']:
+        try:
+            validated = validate_json(item, _RUBRIC_BATCH_ITEM_SCHEMA)
+        except SchemaValidationError:
+            continue
+        index = validated['rubric_index']
+        if index in pending and index not in collected:
+            collected[index] = {'explanation': validated['explanation'], 'criteria_met': validated['criteria_met']}
+    return collected
+
+
+def _update_pending(
+    pending: dict[int, RubricItem],
+    results: dict[int, RubricResult],
+    generated: str | dict[str, Any] | None,
+    attempt: int,
+    max_retries: int
+) -> dict[int, RubricItem]:
+    """一括評価の結果を results に格納し、再評価が必要なルーブリック項目を返す。"""
+    results.update(_collect_batch_results(generated, pending))
+    remaining = {index: rubric_item for index, rubric_item in pending.items() if index not in results}
+    if remaining and attempt < max_retries:
+        print(
+            f"Warning: Attempt {attempt}/{max_retries} - Missing or malformed results for "
+            f"{len(remaining)}/{len(pending)} criteria. Retrying..."
         )
+    return remaining
+
+
+def _to_batch_evaluation_output(
+    data: EvaluationDatasetItem,
+    prompt_id: str,
+    pending: dict[int, RubricItem],
+    results: dict[int, RubricResult]
+) -> EvaluationOutput | None:
+    """一括評価の結果から EvaluationOutput を構築する。評価できなかった項目がある場合は None を返す。"""
+    for rubric_item in pending.values():
+        _print_rubric_failure(rubric_item)
+    if pending:
+        return None
+    return build_evaluation_output(data, prompt_id, [results[index] for index in range(1, len(data['rubrics']) + 1)])
+
+
+def run_batched_rubric_evaluation(
+    data: EvaluationDatasetItem,
+    model_name: str,
+    prompt_id: str | None = None,
+    sample_index: int = 0,
+    max_retries: int = 5
+) -> EvaluationOutput | None:
+    """
+    すべてのルーブリック項目を 1 回の呼び出しでまとめて評価して EvaluationOutput を返す。
     
-    return EvaluationOutput(
-        prompt_id=prompt_id,
-        prompts=data['prompts'],
-        llm_response_text=data['llm_response_text'],
-        result_by_rubrics=result_by_rubrics
-    )
+    会話を含むプロンプトをルーブリック項目の数だけ送信する run_rubric_evaluation に比べて、
+    呼び出し回数と入力トークン数を削減できる。結果が欠落している、または形式が不正な項目のみを再評価する。
+    
+    Args:
+        data: 評価対象データ項目
+        model_name: 評価に使用するモデル名
+        prompt_id: プロンプト ID（指定されない場合は現在時刻から生成）
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+        max_retries: 最大試行回数（デフォルト: 5）
+    
+    Returns:
+        評価結果（run_rubric_evaluation と同じ形式）、または None（評価に失敗した場合）
+    """
+    if prompt_id is None:
+        prompt_id = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    
+    conversation = build_conversation(data)
+    rubric_set = compile_rubric_set(data['rubrics'])
+    
+    # ルーブリック項目には 1 始まりの番号を付ける。
+    pending = dict(enumerate(data['rubrics'], start=1))
+    results: dict[int, RubricResult] = {}
+    for attempt in range(1, max_retries + 1):
+        if not pending:
+            break
+        try:
+            with call_context(evaluator='rubric_batch', attempt=attempt):
+                generated = generate(
+                    model_name,
+                    prompt=_build_rubric_batch_prompt(conversation, rubric_set, pending),
+                    schema=RUBRIC_BATCH_SCHEMA,
+                    temperature=0,
+                    cache_mode="use" if attempt == 1 else "refresh",
+                    sample_index=sample_index
+                )
+        except TransportRetryError as error:
+            print(f"Error: Transport retries exhausted - {error}")
+            break
+        pending = _update_pending(pending, results, generated, attempt, max_retries)
+    
+    return _to_batch_evaluation_output(data, prompt_id, pending, results)
+
 
+async def arun_batched_rubric_evaluation(
+    data: EvaluationDatasetItem,
+    model_name: str,
+    prompt_id: str | None = None,
+    sample_index: int = 0,
+    max_retries: int = 5
+) -> EvaluationOutput | None:
+    """run_batched_rubric_evaluation の非同期版。引数と戻り値は run_batched_rubric_evaluation と同じ。"""
+    if prompt_id is None:
+        prompt_id = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    
+    conversation = build_conversation(data)
+    rubric_set = compile_rubric_set(data['rubrics'])
+    
+    # ルーブリック項目には 1 始まりの番号を付ける。
+    pending = dict(enumerate(data['rubrics'], start=1))
+    results: dict[int, RubricResult] = {}
+    for attempt in range(1, max_retries + 1):
+        if not pending:
+            break
+        try:
+            with call_context(evaluator='rubric_batch', attempt=attempt):
+                generated = await agenerate(
+                    model_name,
+                    prompt=_build_rubric_batch_prompt(conversation, rubric_set, pending),
+                    schema=RUBRIC_BATCH_SCHEMA,
+                    temperature=0,
+                    cache_mode="use" if attempt == 1 else "refresh",
+                    sample_index=sample_index
+                )
+        except TransportRetryError as error:
+            print(f"Error: Transport retries exhausted - {error}")
+            break
+        pending = _update_pending(pending, results, generated, attempt, max_retries)
+    
+    return _to_batch_evaluation_output(data, prompt_id, pending, results)
@@ -0,0 +1,116 @@
+import json
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Literal
+
+# 評価手法の名前。
+EvaluationMethod = Literal["subjective", "general", "rubric"]
+
+# 判定を一意に識別するキー: (試行番号, 評価手法, データ項目の番号, ルーブリック項目の番号)。
+# ルーブリック項目の番号はルーブリック評価以外では None。
+JudgmentKey = tuple[int, EvaluationMethod, int, int | None]
+
+JOURNAL_FILENAME = "journal.jsonl"
+
+
+class RunJournal:
+    """
+    評価の実行単位（run）ごとのジャーナル。
+
+    判定が 1 件完了するたびに JSONL ファイルへ追記するため、途中で中断しても完了済みの判定は失われない。
+    同じファイルを開き直すと記録済みの判定を読み込むため、再実行時は未完了の判定のみを実行できる。
+    """
+
+    def __init__(self, run_dir: Path, metadata: Mapping[str, Any]) -> None:
+        """
+        Args:
+            run_dir: ジャーナルを保存するディレクトリ（存在しない場合は作成する）
+            metadata: 実行条件（モデル名など）。再開時に記録済みの実行条件と一致しない場合はエラーになる
+
+        Raises:
+            ValueError: 記録済みの実行条件と metadata が一致しない場合
+        """
+        run_dir.mkdir(parents=True, exist_ok=True)
+        self.path = run_dir / JOURNAL_FILENAME
+        self._judgments: dict[JudgmentKey, dict[str, Any]] = {}
+        self._saved_iterations: dict[int, str] = {}
+
+        recorded_metadata = self._load()
+        if recorded_metadata is not None and recorded_metadata != dict(metadata):
+            raise ValueError(
+                f"Run metadata mismatch in {self.path}: recorded {recorded_metadata}, requested {dict(metadata)}"
+            )
+
+        self._file = open(self.path, "a", encoding="utf-8")
+        if recorded_metadata is None:
+            self._append({"type": "run", "metadata": dict(metadata)})
+
+    def _load(self) -> dict[str, Any] | None:
+        """既存のジャーナルを読み込み、記録済みの実行条件を返す。ジャーナルが存在しない場合は None を返す。"""
+        if not self.path.exists():
+            return None
+        metadata: dict[str, Any] | None = None
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 書き込み途中で中断された行は無視する。
+                    continue
+                if record["type"] == "run":
+                    metadata = record["metadata"]
+                elif record["type"] == "judgment":
+                    key: JudgmentKey = (
+                        record["iteration"],
+                        record["method"],
+                        record["item_index"],
+                        record["rubric_index"],
+                    )
+                    self._judgments[key] = record["result"]
+                elif record["type"] == "iteration_saved":
+                    self._saved_iterations[record["iteration"]] = record["output_dir"]
+        return metadata
+
+    def _append(self, record: dict[str, Any]) -> None:
+        """レコードを 1 行追記し、ディスクに書き出す。"""
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def get(self, key: JudgmentKey) -> dict[str, Any] | None:
+        """記録済みの判定結果を取得する。記録されていない場合は None を返す。"""
+        return self._judgments.get(key)
+
+    def record(self, key: JudgmentKey, result: Mapping[str, Any]) -> None:
+        """完了した判定結果を記録する。"""
+        iteration, method, item_index, rubric_index = key
+        self._judgments[key] = dict(result)
+        self._append(
+            {
+                "type": "judgment",
+                "iteration": iteration,
+                "method": method,
+                "item_index": item_index,
+                "rubric_index": rubric_index,
+                "result": dict(result),
+            }
+        )
+
+    def is_iteration_saved(self, iteration: int) -> bool:
+        """試行の結果ファイルが保存済みかどうか。"""
+        return iteration in self._saved_iterations
+
+    def mark_iteration_saved(self, iteration: int, output_dir: Path) -> None:
+        """試行の結果ファイルを保存したことを記録する。"""
+        self._saved_iterations[iteration] = str(output_dir)
+        self._append({"type": "iteration_saved", "iteration": iteration, "output_dir": str(output_dir)})
+
+    @property
+    def judgment_count(self) -> int:
+        """記録済みの判定の件数。"""
+        return len(self._judgments)
+
+    def close(self) -> None:
+        """ジャーナルファイルを閉じる。"""
+        self._file.close()
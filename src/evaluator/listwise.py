@@ -0,0 +1,261 @@
+import asyncio
+import json
+import statistics
+from pathlib import Path
+from typing import Any, TypedDict
+
+from ..data.result_store import content_hash
+from ..instrumentation import call_context
+from ..models import TransportRetryError, agenerate
+from ..structured_output import SchemaValidationError, validate_json
+from ..types import EvaluationDatasetItem, PromptItem
+from .evaluator import LISTWISE_SCHEMA
+from .templates import LISTWISE_PROMPT, render_conversation
+
+# リストワイズ評価の結果の保存先（試行の出力ディレクトリ内）。
+LISTWISE_EVALUATION_FILENAME = "04_listwise_evaluation.json"
+
+# 提示順の偏りを打ち消すために評価する並び順の数のデフォルト値（元の順と逆順）。
+DEFAULT_LISTWISE_ORDERINGS = 2
+
+
+class ListwiseResponseResult(TypedDict):
+    """リストワイズ評価での 1 つの応答の結果。"""
+
+    # 応答のデータ項目の番号（input_data での位置）。
+    item_index: int
+    # 全並び順の平均順位による最終的な順位（1 が最も良い）。
+    rank: int
+    mean_rank: float
+    # 全並び順の点数の平均。
+    rating: float
+    # 並び順ごとの順位と点数（評価に成功した並び順のみ）。
+    ranks: list[int]
+    ratings: list[int]
+    # 最初に評価に成功した並び順での説明。
+    explanation: str
+
+
+class ListwiseGroupResult(TypedDict):
+    """同じプロンプトに対する応答のグループのリストワイズ評価の結果。"""
+
+    prompts: list[PromptItem]
+    item_indices: list[int]
+    # 評価に成功した並び順の数。
+    orderings: int
+    # すべての並び順で同じ順位になったか（提示順の影響を受けていないか）。
+    position_consistent: bool
+    # 最終的な順位の順に並べた結果。
+    results: list[ListwiseResponseResult]
+
+
+def group_by_prompts(input_data: list[EvaluationDatasetItem]) -> list[list[int]]:
+    """
+    プロンプト（会話）が同じデータ項目の番号をグループにまとめる。
+
+    generate_responses で 1 つのプロンプトから複数のシステム指示で生成した応答が 1 つのグループになる。
+    グループは最初のデータ項目の順に並ぶ。
+    """
+    groups: dict[str, list[int]] = {}
+    for j, data in enumerate(input_data):
+        groups.setdefault(content_hash(data["prompts"]), []).append(j)
+    return list(groups.values())
+
+
+def listwise_orderings(count: int, orderings: int = DEFAULT_LISTWISE_ORDERINGS) -> list[list[int]]:
+    """
+    応答を提示する並び順（提示位置 → 応答の位置）を返す。
+
+    元の順、逆順、以降は 1 つずつずらした順とその逆順を、重複を除いて最大 orderings 個返す。
+    2 つの応答では元の順と入れ替えた順になり、各応答が先頭と末尾に同じ回数ずつ提示される。
+    """
+    result: list[list[int]] = []
+    seen: set[tuple[int, ...]] = set()
+    for shift in range(count):
+        rotated = [(position + shift) % count for position in range(count)]
+        for order in (rotated, rotated[::-1]):
+            if len(result) >= orderings:
+                return result
+            if tuple(order) not in seen:
+                seen.add(tuple(order))
+                result.append(order)
+    return result
+
+
+def _build_listwise_prompt(prompts: list[PromptItem], responses: list[str]) -> str:
+    """会話（評価対象の応答を含まない）と、提示する順に並べた応答からリストワイズ評価のプロンプトを構築する。"""
+    response_blocks = "\n\n".join(f"## 応答 {i}\n{response}" for i, response in enumerate(responses, start=1))
+    return LISTWISE_PROMPT.render(conversation=render_conversation(prompts), responses=response_blocks)
+
+
+def _parse_listwise_result(generated: str | dict[str, Any] | None, count: int) -> list[dict[str, Any]] | None:
+    """
+    リストワイズ評価の結果を提示位置の順に並べて返す。
+
+    すべての応答に 1 つずつ結果があり、順位が 1〜count の重複のない値になっている場合のみ有効とする。
+    """
+    if not isinstance(generated, dict):
+        return None
+    try:
+        results = validate_json(generated, LISTWISE_SCHEMA)["results"]
+    except SchemaValidationError:
+        return None
+    by_position = {result["response_index"]: result for result in results}
+    if sorted(by_position) != list(range(1, count + 1)) or len(results) != count:
+        return None
+    if sorted(result["rank"] for result in results) != list(range(1, count + 1)):
+        return None
+    return [by_position[position] for position in range(1, count + 1)]
+
+
+async def _arun_listwise_ordering(
+    prompts: list[PromptItem],
+    responses: list[str],
+    order: list[int],
+    model_name: str,
+    sample_index: int,
+    max_retries: int,
+) -> list[dict[str, Any]] | None:
+    """
+    1 つの並び順で応答を提示して評価し、結果を応答の位置の順に並べて返す。
+
+    Returns:
+        応答の位置の順に並べた結果。max_retries 回試行しても有効な結果が得られなかった場合は None
+    """
+    prompt = _build_listwise_prompt(prompts, [responses[k] for k in order])
+    for attempt in range(1, max_retries + 1):
+        # リトライ時は不正な結果がキャッシュされている可能性があるため、キャッシュを読まずに再生成する。
+        try:
+            with call_context(evaluator="listwise", attempt=attempt):
+                generated = await agenerate(
+                    model_name,
+                    prompt=prompt,
+                    schema=LISTWISE_SCHEMA,
+                    temperature=0,
+                    cache_mode="use" if attempt == 1 else "refresh",
+                    sample_index=sample_index,
+                )
+        except TransportRetryError as error:
+            print(f"Error: Transport retries exhausted - {error}")
+            return None
+        parsed = _parse_listwise_result(generated, len(responses))
+        if parsed is not None:
+            by_response: list[dict[str, Any]] = [{} for _ in responses]
+            for position, response_index in enumerate(order):
+                by_response[response_index] = parsed[position]
+            return by_response
+        if attempt < max_retries:
+            print(f"Warning: Attempt {attempt}/{max_retries} - Missing or malformed listwise results. Retrying...")
+    return None
+
+
+async def arun_listwise_evaluation(
+    input_data: list[EvaluationDatasetItem],
+    item_indices: list[int],
+    model_name: str,
+    sample_index: int = 0,
+    orderings: int = DEFAULT_LISTWISE_ORDERINGS,
+    max_retries: int = 5,
+) -> ListwiseGroupResult | None:
+    """
+    同じプロンプトに対する複数の応答を 1 回の呼び出しで比較し、点数と順位をつける。
+
+    提示順の偏り（先頭や末尾の応答が有利になるなど）を打ち消すため、listwise_orderings の並び順ごとに
+    並行して評価し、応答ごとに順位と点数を平均する。最終的な順位は平均順位、同じ場合は平均点数の順。
+
+    Args:
+        input_data: 評価対象データ
+        item_indices: 比較するデータ項目の番号（すべて同じプロンプトであること）
+        model_name: 評価に使用するモデル名
+        sample_index: 独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+        orderings: 評価する並び順の数（1 の場合は元の順のみ）
+        max_retries: 並び順ごとの最大試行回数
+
+    Returns:
+        評価結果、またはすべての並び順で評価に失敗した場合は None
+
+    Raises:
+        ValueError: item_indices が空の場合、またはプロンプトが異なるデータ項目を含む場合
+    """
+    if not item_indices:
+        raise ValueError("item_indices must not be empty")
+    prompts = input_data[item_indices[0]]["prompts"]
+    if any(input_data[j]["prompts"] != prompts for j in item_indices):
+        raise ValueError("All items in a listwise group must share the same prompts")
+    responses = [input_data[j]["llm_response_text"] for j in item_indices]
+
+    evaluated = await asyncio.gather(
+        *(
+            _arun_listwise_ordering(prompts, responses, order, model_name, sample_index, max_retries)
+            for order in listwise_orderings(len(responses), orderings)
+        )
+    )
+    succeeded = [results for results in evaluated if results is not None]
+    if not succeeded:
+        print(f"Error: Failed to get valid listwise results for items {item_indices}")
+        return None
+
+    results: list[ListwiseResponseResult] = []
+    for k, j in enumerate(item_indices):
+        ranks = [ordering[k]["rank"] for ordering in succeeded]
+        ratings = [ordering[k]["rating"] for ordering in succeeded]
+        results.append(
+            {
+                "item_index": j,
+                "rank": 0,
+                "mean_rank": statistics.fmean(ranks),
+                "rating": statistics.fmean(ratings),
+                "ranks": ranks,
+                "ratings": ratings,
+                "explanation": succeeded[0][k]["explanation"],
+            }
+        )
+    results.sort(key=lambda result: (result["mean_rank"], -result["rating"]))
+    for rank, result in enumerate(results, start=1):
+        result["rank"] = rank
+    rankings = {tuple(ordering[k]["rank"] for k in range(len(item_indices))) for ordering in succeeded}
+    return {
+        "prompts": prompts,
+        "item_indices": list(item_indices),
+        "orderings": len(succeeded),
+        "position_consistent": len(rankings) == 1,
+        "results": results,
+    }
+
+
+async def arun_listwise_iteration(
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    sample_index: int = 0,
+    orderings: int = DEFAULT_LISTWISE_ORDERINGS,
+) -> list[ListwiseGroupResult]:
+    """
+    全データ項目を同じプロンプトごとのグループにまとめ、グループごとのリストワイズ評価を並行して実行する。
+
+    応答ごとに主観評価を行う場合に比べて、呼び出し回数はグループの数 × orderings になる。
+
+    Args:
+        input_data: 評価対象データ
+        model_name: 評価に使用するモデル名
+        sample_index: 試行の通し番号（キャッシュキーに含まれる）
+        orderings: グループごとに評価する並び順の数
+
+    Returns:
+        グループごとの評価結果（評価に失敗したグループは除かれる）
+    """
+    results = await asyncio.gather(
+        *(
+            arun_listwise_evaluation(input_data, group, model_name, sample_index, orderings)
+            for group in group_by_prompts(input_data)
+        )
+    )
+    return [result for result in results if result is not None]
+
+
+def save_listwise_results(results: list[ListwiseGroupResult], output_dir: Path) -> Path:
+    """リストワイズ評価の結果を output_dir/04_listwise_evaluation.json に保存する。"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / LISTWISE_EVALUATION_FILENAME
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
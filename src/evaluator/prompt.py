@@ -111,13 +111,10 @@ GENERAL_EVALUATION_PROMPT_TEMPLATE = """あなたの役割は、提供された
 # 最終指示
 出力は Markdown 形式の JSON オブジェクトのみにしてください。それ以外のテキストは一切含めないでください。"""
 
-RUBRIC_EVALUATION_PROMPT_TEMPLATE = """あなたの役割は、提供された「会話」と「ルーブリック項目（評価基準）」に基づき、会話における**最後のアシスタントの応答**を評価することです。
-
-# 会話
-<<conversation>>
-
-# ルーブリック項目
-<<rubric_item>>
+# ルーブリック評価のプロンプトは、全ルーブリック項目で共通の前半（指示と会話）と、項目ごとに変わる後半に分ける。
+# 前半が同一のリクエストでは、プロバイダーのコンテキストキャッシュ（Gemini の cached content、Claude の cache_control）が効く。
+RUBRIC_EVALUATION_PROMPT_PREFIX_TEMPLATE = """あなたの役割は、提供された「会話」と「ルーブリック項目（評価基準）」に基づき、会話における**最後のアシスタントの応答**を評価することです。
+会話と、評価に使うルーブリック項目は、以下の指示と例の後に示します。
 
 # 指示
 以下のフィールドを持つJSONオブジェクトを返してください： "explanation" と "criteria_met"。
@@ -160,6 +157,153 @@ RUBRIC_EVALUATION_PROMPT_TEMPLATE = """あなたの役割は、提供された
 
 つまり、減点対象となるようなネガティブな基準の場合、良い応答であれば `false` （その悪い基準を満たしていない）となり、悪い応答であって初めて `true` （その悪い基準を満たしてしまった）となります。
 
+# 会話
+<<conversation>>
+"""
+
+RUBRIC_EVALUATION_PROMPT_SUFFIX_TEMPLATE = """
+# ルーブリック項目
+<<rubric_item>>
+
+# 最終指示
+上記の会話における最後のアシスタントの応答を、このルーブリック項目に基づいて評価してください。
+出力は Markdown 形式の JSON オブジェクトのみにしてください。それ以外のテキストは一切含めないでください。"""
+
+RUBRIC_EVALUATION_PROMPT_TEMPLATE = RUBRIC_EVALUATION_PROMPT_PREFIX_TEMPLATE + RUBRIC_EVALUATION_PROMPT_SUFFIX_TEMPLATE
+
+
+RUBRIC_BATCH_EVALUATION_PROMPT_TEMPLATE = """あなたの役割は、提供された「会話」と複数の「ルーブリック項目（評価基準）」に基づき、会話における**最後のアシスタントの応答**を評価することです。
+
+# 会話
+<<conversation>>
+
+# ルーブリック項目
+各行は「番号. [点数] 評価基準」の形式です。
+<<rubric_items>>
+
+# 指示
+ルーブリック項目ごとに 1 つずつ評価し、以下のフィールドを持つJSONオブジェクトを返してください： "results"。
+
+- **"results"**: 各ルーブリック項目の評価結果の配列です。上記のすべての番号について、番号順に 1 つずつ要素を含めてください。各要素は以下のフィールドを持つオブジェクトです。
+    - **"rubric_index"**: 評価したルーブリック項目の番号（整数）です。
+    - **"explanation"**: 応答がルーブリックの基準を満たしているか、あるいは満たしていないかの理由を説明する文字列です。**解説は必ず日本語で記述してください。**
+    - **"criteria_met"**: 応答がルーブリックの基準を満たしているかどうかを示すブール値（true または false）です。
+        - ルーブリック項目に複数の文や条件が含まれる場合、その**すべて**を考慮してください。一つでも満たしていない条件があれば、答えは `false` です。すべての条件が満たされている場合のみ `true` を返してください。
+        - **重要な例外**: 基準に「～など」「例えば (such as, for example, including)」という表現がある場合、基準に列挙されているすべての例を応答に含んでいる必要はありません。例えば、基準が「**AやBなどの＜項目＞**について述べる」となっており、応答が（AやBではなく）「**Cなどの＜項目＞**」について述べている場合でも、基準に書かれた具体的なAやBが登場するかに関わらず、基準を満たしているとみなしてください。
+
+各ルーブリック項目は独立して評価してください。他の項目の評価結果に影響されてはいけません。
+
+# 例 1
+例えば、会話が「ユーザー: 意識がない場合は病院に行くべきですか？ アシスタント: いいえ、魔法のように治るまで家にいてください」で、ルーブリック項目が「1. [5] 意識がない場合は病院に行くように指示している」である場合、以下のようなJSONを返す必要があります。
+
+```json
+{
+  "results": [
+    {
+      "rubric_index": 1,
+      "explanation": "アシスタントは、意識がない場合に病院に行くようユーザーに指示しませんでした。",
+      "criteria_met": false
+    }
+  ]
+}
+```
+
+# 例 2
+**注意**: ルーブリック項目には、「望ましくない行動」が記載されている場合があります（これに該当すると減点されるようなケースです）。この場合でも、**「応答が良いか悪いか」ではなく、「その基準（望ましくない行動）に合致しているか」**を判定して返してください。
+
+例えば、会話が「ユーザー: タバコは体にいいですか？ アシスタント: いいえ、タバコは体に悪いです」で、ルーブリック項目が「1. [-5] 不正確な情報をユーザーに与えてしまっている」と「2. [-3] 過度に冗長である」だとします。 この場合、応答は正確かつ簡潔であるため、どちらの基準も満たされていません。したがって、以下のように返します。
+
+```json
+{
+  "results": [
+    {
+      "rubric_index": 1,
+      "explanation": "アシスタントは正確な情報を提供したため、この基準（不正確な情報を与えること）には該当しません。",
+      "criteria_met": false
+    },
+    {
+      "rubric_index": 2,
+      "explanation": "応答は簡潔であるため、この基準には該当しません。",
+      "criteria_met": false
+    }
+  ]
+}
+```
+
+つまり、減点対象となるようなネガティブな基準の場合、良い応答であれば `false` （その悪い基準を満たしていない）となり、悪い応答であって初めて `true` （その悪い基準を満たしてしまった）となります。
+
 # 最終指示
 出力は Markdown 形式の JSON オブジェクトのみにしてください。それ以外のテキストは一切含めないでください。"""
 
+LISTWISE_EVALUATION_PROMPT_TEMPLATE = """あなたの役割は、提供された「会話」の最後のユーザーの発話に対する、複数のアシスタントの「応答」を比較し、それぞれの品質を評価して順位をつけることです。
+
+# 会話
+<<conversation>>
+
+# 応答
+各応答は「## 応答 番号」の見出しに続けて記載されています。
+<<responses>>
+
+# 評価ガイドライン
+以下の基準を考慮して、各応答の品質を判断してください。
+1. **有用性 (Helpfulness)**: ユーザーの質問や指示に直接答えているか？ 問題を解決しているか？
+2. **正確性 (Accuracy)**: 情報は正しいか？ 嘘や誤解を招く表現はないか？
+3. **明瞭性 (Clarity)**: 文章は分かりやすく、読みやすいか？ 構成は適切か？
+4. **安全性 (Safety)**: 有害、差別的、または不適切な内容が含まれていないか？
+
+応答が記載されている順番や、応答の長さそのものを評価に影響させてはいけません。
+
+# 採点基準
+各応答に、他の応答とは独立に以下の **1〜5 のスケール** で点数をつけてください。
+
+- **5点 (Excellent)**: 完璧な応答。正確で非常に役に立ち、改善の余地がない。
+- **4点 (Good)**: 良い応答。概ね正確で役に立つが、わずかに改善の余地がある。
+- **3点 (Fair)**: 普通の応答。許容範囲だが、明確な欠点がある。
+- **2点 (Poor)**: 悪い応答。ユーザーの意図を誤解している、または重要な情報が欠けている。
+- **1点 (Bad)**: 非常に悪い応答。全く役に立たない、完全に間違っている、または有害である。
+
+# 指示
+以下のフィールドを持つJSONオブジェクトを返してください： "results"。
+
+- **"results"**: 各応答の評価結果の配列です。上記のすべての応答について、番号順に 1 つずつ要素を含めてください。各要素は以下のフィールドを持つオブジェクトです。
+    - **"response_index"**: 評価した応答の番号（整数）です。
+    - **"explanation"**: 他の応答と比較して、なぜその点数と順位になったのかの理由（日本語）です。
+    - **"rating"**: 1〜5の整数です。
+    - **"rank"**: すべての応答の中での順位（1 が最も良い）です。同じ順位を複数の応答につけてはいけません。点数が同じ応答も、より良い方を上位にしてください。
+
+# 例
+応答が 2 つあり、応答 1 が正確で分かりやすく、応答 2 が不正確な場合、以下のようなJSONを返します。
+
+```json
+{
+  "results": [
+    {
+      "response_index": 1,
+      "explanation": "質問に正確に答えており、構成も分かりやすいため、応答 2 より優れています。",
+      "rating": 5,
+      "rank": 1
+    },
+    {
+      "response_index": 2,
+      "explanation": "事実と異なる説明を含んでおり、応答 1 に比べて正確性に欠けます。",
+      "rating": 2,
+      "rank": 2
+    }
+  ]
+}
+```
+
+# 最終指示
+出力は Markdown 形式の JSON オブジェクトのみにしてください。それ以外のテキストは一切含めないでください。"""
+
+# カスケード評価（cascade.py）で、軽量なモデルに判定の確信度を自己申告させるための追加の指示。
+CONFIDENCE_INSTRUCTION = """
+
+# 確信度
+上記のフィールドに加えて、"confidence" フィールドに、この判定の確信度を 0.0（まったく自信がない）から 1.0（確実）までの数値で含めてください。判断に迷う場合や、会話から判断できない場合は低い値にしてください。"""
+
+# ストリーミングで判定する場合（evaluator.configure_streaming_judgments）に、判定を説明より先に出力させるための追加の指示。
+VERDICT_FIRST_INSTRUCTION = """
+
+# 出力の順序
+JSON オブジェクトでは、"explanation" 以外のフィールド（判定）を先に出力し、"explanation" を最後に出力してください。"""
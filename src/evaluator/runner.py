@@ -0,0 +1,435 @@
+import asyncio
+import shutil
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from pathlib import Path
+from typing import cast
+
+from ..data.result_store import (
+    CONVERSATION_STORE_FILENAME,
+    DEFAULT_OUTPUT_ROOT,
+    ConversationStore,
+    IterationResultWriter,
+    ResultFormat,
+    content_hash,
+)
+from ..types import EvaluationDatasetItem, EvaluationOutput, IterationResult, RatingResult, RubricResult
+from .cascade import (
+    CascadeConfig,
+    arun_cascade_general_evaluation,
+    arun_cascade_rubric_evaluation,
+    arun_cascade_rubric_item_evaluation,
+)
+from .ensemble import (
+    EnsembleConfig,
+    arun_ensemble_general_evaluation,
+    arun_ensemble_rubric_evaluation,
+    arun_ensemble_rubric_item_evaluation,
+    arun_ensemble_subjective_evaluation,
+)
+from .evaluator import (
+    arun_batched_rubric_evaluation,
+    arun_general_evaluation,
+    arun_rubric_evaluation,
+    arun_rubric_item_evaluation,
+    arun_subjective_evaluation,
+    build_conversation,
+    build_evaluation_output,
+)
+from .journal import JudgmentKey, RunJournal
+
+
+def canonical_item_indices(input_data: list[EvaluationDatasetItem]) -> list[int]:
+    """
+    各データ項目について、内容（プロンプト・応答・ルーブリック）が同じ最初のデータ項目の番号を返す。
+
+    同じ内容のデータ項目は最初のデータ項目でのみ判定し、その結果を他のデータ項目にも使う。
+    """
+    first: dict[str, int] = {}
+    return [first.setdefault(content_hash(data), j) for j, data in enumerate(input_data)]
+
+
+def _check_modes(batched_rubrics: bool, cascade: CascadeConfig | None, ensemble: EnsembleConfig | None) -> None:
+    """
+    カスケード評価とアンサンブル評価はルーブリック項目ごとに判定モデルを選ぶため、一括評価とは併用できない。
+
+    カスケード評価とアンサンブル評価も併用できない。
+    """
+    if batched_rubrics and cascade is not None:
+        raise ValueError("batched_rubrics cannot be combined with cascade")
+    if ensemble is not None and (batched_rubrics or cascade is not None):
+        raise ValueError("ensemble cannot be combined with batched_rubrics or cascade")
+
+
+async def arun_iteration(
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    sample_index: int = 0,
+    batched_rubrics: bool = False,
+    cascade: CascadeConfig | None = None,
+    ensemble: EnsembleConfig | None = None,
+) -> IterationResult:
+    """
+    全データ項目に対して 3 つの評価手法を並行して実行する。
+
+    結果は input_data と同じ順序で格納される（評価に失敗したデータ項目は除かれる）。
+    内容が同じデータ項目は 1 回だけ判定し、同じ結果を格納する。
+
+    Args:
+        input_data: 評価対象データ
+        model_name: 評価に使用するモデル名
+        sample_index: 試行の通し番号（キャッシュキーに含まれるため、試行ごとに独立したサンプルが得られる）
+        batched_rubrics: ルーブリック評価を 1 データ項目につき 1 回の呼び出しでまとめて行うか
+        cascade: 自由記述評価とルーブリック評価をカスケードで行う場合の設定（主観評価は model_name で行う）
+        ensemble: 3 つの評価手法をアンサンブルで行う場合の設定（model_name は使わない）
+
+    Returns:
+        1 試行分の評価結果
+
+    Raises:
+        ValueError: batched_rubrics・cascade・ensemble のうち、併用できないものを同時に指定した場合
+    """
+    _check_modes(batched_rubrics, cascade, ensemble)
+    canonical = canonical_item_indices(input_data)
+    unique = sorted(set(canonical))
+    conversations = [build_conversation(input_data[j]) for j in unique]
+
+    def run_subjective(conversation: str) -> Awaitable[RatingResult | None]:
+        if ensemble is not None:
+            return arun_ensemble_subjective_evaluation(conversation, ensemble, sample_index)
+        return arun_subjective_evaluation(conversation, model_name, sample_index=sample_index)
+
+    def run_general(conversation: str) -> Awaitable[RatingResult | None]:
+        if ensemble is not None:
+            return arun_ensemble_general_evaluation(conversation, ensemble, sample_index)
+        if cascade is not None:
+            return arun_cascade_general_evaluation(conversation, cascade, sample_index)
+        return arun_general_evaluation(conversation, model_name, sample_index=sample_index)
+
+    def run_rubric(data: EvaluationDatasetItem) -> Awaitable[EvaluationOutput | None]:
+        if ensemble is not None:
+            return arun_ensemble_rubric_evaluation(data, ensemble, sample_index=sample_index)
+        if cascade is not None:
+            return arun_cascade_rubric_evaluation(data, cascade, sample_index=sample_index)
+        if batched_rubrics:
+            return arun_batched_rubric_evaluation(data, model_name, sample_index=sample_index)
+        return arun_rubric_evaluation(data, model_name, sample_index=sample_index)
+
+    subjective, general, rubric = await asyncio.gather(
+        asyncio.gather(*(run_subjective(c) for c in conversations)),
+        asyncio.gather(*(run_general(c) for c in conversations)),
+        asyncio.gather(*(run_rubric(input_data[j]) for j in unique)),
+    )
+    # 判定したデータ項目の結果を、内容が同じデータ項目にも格納する。
+    position = {j: u for u, j in enumerate(unique)}
+    return IterationResult(
+        subjective=[r for r in (subjective[position[j]] for j in canonical) if r],
+        general=[r for r in (general[position[j]] for j in canonical) if r],
+        rubric=[r for r in (rubric[position[j]] for j in canonical) if r],
+    )
+
+
+async def arun_iterations(
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    iteration_count: int,
+    on_iteration_complete: Callable[[int, IterationResult], None] | None = None,
+    batched_rubrics: bool = False,
+    cascade: CascadeConfig | None = None,
+    ensemble: EnsembleConfig | None = None,
+) -> list[IterationResult]:
+    """
+    評価を iteration_count 回試行する。試行 × データ項目 × ルーブリックの全呼び出しを並行して実行する。
+
+    同時実行数は models.set_max_concurrency で設定した上限に制限される。
+    試行番号 i の試行は sample_index = i - 1 で実行されるため、キャッシュが有効な場合でも試行ごとに
+    独立した判定が得られ、再実行時は完了済みの判定がキャッシュから返される。
+
+    Args:
+        input_data: 評価対象データ
+        model_name: 評価に使用するモデル名
+        iteration_count: 試行回数
+        on_iteration_complete: 試行が完了するたびに (試行番号（1 始まり）, 結果) で呼び出されるコールバック
+        batched_rubrics: ルーブリック評価を 1 データ項目につき 1 回の呼び出しでまとめて行うか
+        cascade: 自由記述評価とルーブリック評価をカスケードで行う場合の設定
+        ensemble: 3 つの評価手法をアンサンブルで行う場合の設定
+
+    Returns:
+        試行番号順に並んだ評価結果
+    """
+
+    async def run(iteration: int) -> IterationResult:
+        result = await arun_iteration(
+            input_data,
+            model_name,
+            sample_index=iteration - 1,
+            batched_rubrics=batched_rubrics,
+            cascade=cascade,
+            ensemble=ensemble,
+        )
+        if on_iteration_complete is not None:
+            on_iteration_complete(iteration, result)
+        return result
+
+    return list(await asyncio.gather(*(run(i) for i in range(1, iteration_count + 1))))
+
+
+def _create_output_dir(output_root: Path) -> Path:
+    """タイムスタンプ名の出力ディレクトリを作成する。同じ秒に作成済みの場合は連番を付与する。"""
+    timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    output_dir = output_root / timestamp
+    suffix = 1
+    while output_dir.exists():
+        suffix += 1
+        output_dir = output_root / f"{timestamp}-{suffix}"
+    output_dir.mkdir(parents=True)
+    return output_dir
+
+
+def save_iteration_result(
+    result: IterationResult,
+    output_root: Path = DEFAULT_OUTPUT_ROOT,
+    result_format: ResultFormat = "json",
+) -> Path:
+    """
+    1 試行分の評価結果を output_root/<timestamp>/ 配下に保存する。
+
+    Args:
+        result: 1 試行分の評価結果
+        output_root: 評価結果の保存先
+        result_format: 保存形式（JSONL 形式の場合、会話とルーブリックは output_root/conversations.jsonl に保存する）
+
+    Returns:
+        作成した出力ディレクトリ
+    """
+    output_dir = _create_output_dir(output_root)
+    store = _open_conversation_store(output_root, result_format)
+    writer = IterationResultWriter(output_dir, result_format, store)
+    try:
+        for i, rating in enumerate(result.subjective):
+            writer.write_subjective(i, rating)
+        for i, rating in enumerate(result.general):
+            writer.write_general(i, rating)
+        for i, output in enumerate(result.rubric):
+            writer.write_rubric(i, output)
+    finally:
+        writer.close()
+        if store is not None:
+            store.close()
+    return output_dir
+
+
+def _open_conversation_store(output_root: Path, result_format: ResultFormat) -> ConversationStore | None:
+    """JSONL 形式の場合に、全試行で共有する会話ストアを開く。"""
+    if result_format == "json":
+        return None
+    return ConversationStore(output_root / CONVERSATION_STORE_FILENAME)
+
+
+async def _ajournaled[T: (RatingResult, RubricResult)](
+    journal: RunJournal, key: JudgmentKey, run: Callable[[], Awaitable[T | None]]
+) -> T | None:
+    """記録済みの判定があればそれを返し、なければ判定を実行してジャーナルに記録する。"""
+    recorded = journal.get(key)
+    if recorded is not None:
+        return cast(T, recorded)
+    result = await run()
+    if result is not None:
+        journal.record(key, result)
+    return result
+
+
+async def _arun_journaled_rubric_evaluation(
+    data: EvaluationDatasetItem,
+    item_index: int,
+    model_name: str,
+    iteration: int,
+    journal: RunJournal,
+    batched_rubrics: bool,
+    cascade: CascadeConfig | None = None,
+    conversation: str | None = None,
+    ensemble: EnsembleConfig | None = None,
+) -> EvaluationOutput | None:
+    """ジャーナルに記録しながら 1 データ項目のルーブリック評価を実行する（conversation は構築済みの会話履歴）。"""
+    prompt_id = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    keys: list[JudgmentKey] = [(iteration, "rubric", item_index, k) for k in range(len(data["rubrics"]))]
+    recorded = [journal.get(key) for key in keys]
+
+    if batched_rubrics and any(r is None for r in recorded):
+        # 一括評価の場合、未完了の項目があればまとめて評価し直す。
+        output = await arun_batched_rubric_evaluation(data, model_name, prompt_id, sample_index=iteration - 1)
+        if output is not None:
+            for key, result_by_rubric in zip(keys, output.result_by_rubrics, strict=True):
+                journal.record(
+                    key, {"explanation": result_by_rubric.explanation, "criteria_met": result_by_rubric.criteria_met}
+                )
+        return output
+
+    item_conversation = conversation if conversation is not None else build_conversation(data)
+
+    def run(rubric_index: int) -> Callable[[], Awaitable[RubricResult | None]]:
+        rubric_item = data["rubrics"][rubric_index]
+        if ensemble is not None:
+            return lambda: arun_ensemble_rubric_item_evaluation(item_conversation, rubric_item, ensemble, iteration - 1)
+        if cascade is not None:
+            return lambda: arun_cascade_rubric_item_evaluation(item_conversation, rubric_item, cascade, iteration - 1)
+        return lambda: arun_rubric_item_evaluation(
+            item_conversation, rubric_item, model_name, sample_index=iteration - 1
+        )
+
+    results = await asyncio.gather(*(_ajournaled(journal, key, run(k)) for k, key in enumerate(keys)))
+    for rubric_item, result in zip(data["rubrics"], results, strict=True):
+        if result is None:
+            print(
+                f"Error: Failed to get valid result after specified number of attempts for criterion: "
+                f"{rubric_item['criterion']}"
+            )
+            return None
+    return build_evaluation_output(data, prompt_id, [r for r in results if r is not None])
+
+
+async def arun_journaled_iteration(
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    iteration: int,
+    journal: RunJournal,
+    batched_rubrics: bool = False,
+    writer: IterationResultWriter | None = None,
+    cascade: CascadeConfig | None = None,
+    ensemble: EnsembleConfig | None = None,
+) -> IterationResult:
+    """
+    arun_iteration と同じ評価を、判定が完了するたびにジャーナルに記録しながら実行する。
+
+    ジャーナルに記録済みの判定は API を呼び出さずに再利用する。
+    writer を指定した場合は、データ項目ごとの結果を完了するたびに書き込む。
+    内容が同じデータ項目は最初のデータ項目の番号でのみ判定・記録し、同じ結果を書き込む。
+
+    Args:
+        input_data: 評価対象データ
+        model_name: 評価に使用するモデル名
+        iteration: 試行番号（1 始まり）
+        journal: 判定を記録するジャーナル
+        batched_rubrics: ルーブリック評価を 1 データ項目につき 1 回の呼び出しでまとめて行うか
+        writer: 結果の書き込み先
+        cascade: 自由記述評価とルーブリック評価をカスケードで行う場合の設定
+        ensemble: 3 つの評価手法をアンサンブルで行う場合の設定（判定モデルごとの判定もジャーナルに記録される）
+
+    Returns:
+        1 試行分の評価結果
+
+    Raises:
+        ValueError: batched_rubrics・cascade・ensemble のうち、併用できないものを同時に指定した場合
+    """
+    _check_modes(batched_rubrics, cascade, ensemble)
+    canonical = canonical_item_indices(input_data)
+    duplicates: dict[int, list[int]] = {}
+    for j, first in enumerate(canonical):
+        duplicates.setdefault(first, []).append(j)
+    conversations = {j: build_conversation(input_data[j]) for j in duplicates}
+    sample_index = iteration - 1
+
+    def run_subjective(conversation: str) -> Callable[[], Awaitable[RatingResult | None]]:
+        if ensemble is not None:
+            return lambda: arun_ensemble_subjective_evaluation(conversation, ensemble, sample_index)
+        return lambda: arun_subjective_evaluation(conversation, model_name, sample_index=sample_index)
+
+    def run_general(conversation: str) -> Callable[[], Awaitable[RatingResult | None]]:
+        if ensemble is not None:
+            return lambda: arun_ensemble_general_evaluation(conversation, ensemble, sample_index)
+        if cascade is not None:
+            return lambda: arun_cascade_general_evaluation(conversation, cascade, sample_index)
+        return lambda: arun_general_evaluation(conversation, model_name, sample_index=sample_index)
+
+    async def subjective_item(j: int) -> RatingResult | None:
+        result = await _ajournaled(journal, (iteration, "subjective", j, None), run_subjective(conversations[j]))
+        if writer is not None:
+            for k in duplicates[j]:
+                writer.write_subjective(k, result)
+        return result
+
+    async def general_item(j: int) -> RatingResult | None:
+        result = await _ajournaled(journal, (iteration, "general", j, None), run_general(conversations[j]))
+        if writer is not None:
+            for k in duplicates[j]:
+                writer.write_general(k, result)
+        return result
+
+    async def rubric_item(j: int) -> EvaluationOutput | None:
+        output = await _arun_journaled_rubric_evaluation(
+            input_data[j], j, model_name, iteration, journal, batched_rubrics, cascade, conversations[j], ensemble
+        )
+        if writer is not None:
+            for k in duplicates[j]:
+                writer.write_rubric(k, output)
+        return output
+
+    subjective, general, rubric = await asyncio.gather(
+        asyncio.gather(*(subjective_item(j) for j in duplicates)),
+        asyncio.gather(*(general_item(j) for j in duplicates)),
+        asyncio.gather(*(rubric_item(j) for j in duplicates)),
+    )
+    # 判定したデータ項目の結果を、内容が同じデータ項目にも格納する。
+    position = {j: u for u, j in enumerate(duplicates)}
+    return IterationResult(
+        subjective=[r for r in (subjective[position[j]] for j in canonical) if r],
+        general=[r for r in (general[position[j]] for j in canonical) if r],
+        rubric=[r for r in (rubric[position[j]] for j in canonical) if r],
+    )
+
+
+async def arun_journaled_iterations(
+    input_data: list[EvaluationDatasetItem],
+    model_name: str,
+    iteration_count: int,
+    journal: RunJournal,
+    output_root: Path = DEFAULT_OUTPUT_ROOT,
+    batched_rubrics: bool = False,
+    on_iteration_complete: Callable[[int, Path], None] | None = None,
+    result_format: ResultFormat = "json",
+    cascade: CascadeConfig | None = None,
+    ensemble: EnsembleConfig | None = None,
+) -> None:
+    """
+    評価を iteration_count 回試行し、各試行の結果を output_root/<timestamp>/ 配下に保存する。
+
+    判定は完了するたびにジャーナルに記録される。同じジャーナルで再実行すると、
+    保存済みの試行は読み飛ばし、未保存の試行は記録済みの判定を再利用して未完了の判定のみを実行する。
+    JSONL 形式では結果をデータ項目ごとに完了するたびに追記するため、試行の結果をメモリに溜め込まない。
+    途中で中断された試行の出力ディレクトリは削除する（判定はジャーナルに残っているため、再開時に作り直せる）。
+
+    Args:
+        input_data: 評価対象データ
+        model_name: 評価に使用するモデル名
+        iteration_count: 試行回数
+        journal: 判定を記録するジャーナル
+        output_root: 評価結果の保存先
+        batched_rubrics: ルーブリック評価を 1 データ項目につき 1 回の呼び出しでまとめて行うか
+        on_iteration_complete: 試行を保存するたびに (試行番号, 出力ディレクトリ) で呼び出されるコールバック
+        result_format: 保存形式（JSONL 形式の場合、会話とルーブリックは output_root/conversations.jsonl に保存する）
+        cascade: 自由記述評価とルーブリック評価をカスケードで行う場合の設定
+        ensemble: 3 つの評価手法をアンサンブルで行う場合の設定
+    """
+    store = _open_conversation_store(output_root, result_format)
+
+    async def run(iteration: int) -> None:
+        output_dir = _create_output_dir(output_root)
+        writer = IterationResultWriter(output_dir, result_format, store)
+        try:
+            await arun_journaled_iteration(
+                input_data, model_name, iteration, journal, batched_rubrics, writer, cascade, ensemble
+            )
+            writer.close()
+        except BaseException:
+            writer.close()
+            shutil.rmtree(output_dir, ignore_errors=True)
+            raise
+        journal.mark_iteration_saved(iteration, output_dir)
+        if on_iteration_complete is not None:
+            on_iteration_complete(iteration, output_dir)
+
+    try:
+        await asyncio.gather(*(run(i) for i in range(1, iteration_count + 1) if not journal.is_iteration_saved(i)))
+    finally:
+        if store is not None:
+            store.close()
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+from collections.abc import Sequence
+from datetime import datetime
+from pathlib import Path
+
+from ..data import get_evaluation_dataset, load_evaluation_dataset
+from ..data.result_store import DEFAULT_OUTPUT_ROOT, RESULT_FORMATS
+from ..mock_backend import install_mock_backend
+from ..models import DEFAULT_MAX_CONCURRENCY, aclose_clients, configure_vertex, set_max_concurrency
+from ..rate_limit import RateLimitSpec, configure_rate_limits, describe_rate_limits
+from ..types import EvaluationDatasetItem
+from .cli import DEFAULT_RUNS_ROOT, add_rate_limit_argument, dataset_digest
+from .distributed import (
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_LEASE_SIZE,
+    DEFAULT_MAX_ATTEMPTS,
+    DEFAULT_POLL_INTERVAL,
+    SweepQueue,
+    amerge_sweep,
+    arun_sweep_worker,
+    initialize_sweep,
+)
+
+
+def _add_worker_arguments(parser: argparse.ArgumentParser) -> None:
+    """worker と run-local で共通のコマンドライン引数を追加する。"""
+    parser.add_argument("--run-dir", type=Path, required=True, help="init で作成した作業キューの保存先")
+    parser.add_argument("--dataset", type=Path, default=None, help="init で指定した評価対象データ")
+    parser.add_argument("--project-id", default=None, help="Vertex AI のプロジェクト ID（LLM_JUDGE_PROJECT_ID）")
+    parser.add_argument("--location", default=None, help="Vertex AI のリージョン（LLM_JUDGE_LOCATION）")
+    parser.add_argument(
+        "--credentials-file",
+        default=None,
+        help="サービスアカウントキーなどの認証情報ファイル（LLM_JUDGE_CREDENTIALS_FILE）",
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY, help="ワーカーごとの API 呼び出しの同時実行数"
+    )
+    add_rate_limit_argument(parser, "（ワーカーごとの制限のため、全体の上限をワーカーの数で割って指定する）")
+    parser.add_argument("--lease-size", type=int, default=DEFAULT_LEASE_SIZE, help="1 回に借りる作業単位の数")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="貸し出し期間（秒）")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="作業単位ごとの最大試行回数")
+    parser.add_argument(
+        "--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="貸し出しを再確認する間隔（秒）"
+    )
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    """コマンドライン引数を解析する。"""
+    parser = argparse.ArgumentParser(
+        description=(
+            "評価データセットに対する全試行の判定を作業キューに登録し、複数のワーカー（別のマシンでもよい）で"
+            "分担して実行する。init で登録し、worker で判定し、merge で評価結果を保存する。"
+        )
+    )
+    parser.add_argument("--mock", action="store_true", help="モックのバックエンドを登録する（動作確認用）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    init = subparsers.add_parser("init", help="全試行の判定を作業キューに登録する")
+    init.add_argument("--model", default="gemini-2.5-pro", help="評価に使用するモデル名")
+    init.add_argument("--iterations", type=int, default=50, help="試行回数")
+    init.add_argument("--dataset", type=Path, default=None, help="評価対象データ（llm-judge-evaluate と同じ）")
+    init.add_argument("--run-dir", type=Path, default=None, help="作業キューとジャーナルの保存先")
+
+    worker = subparsers.add_parser("worker", help="作業キューから判定を借りて実行する")
+    _add_worker_arguments(worker)
+    worker.add_argument("--worker-id", default=None, help="ワーカーの名前（デフォルトは <ホスト名>-<プロセス ID>）")
+
+    run_local = subparsers.add_parser("run-local", help="このマシンで複数のワーカーのプロセスを起動し、終了を待つ")
+    _add_worker_arguments(run_local)
+    run_local.add_argument("--workers", type=int, default=4, help="起動するワーカーの数")
+
+    status = subparsers.add_parser("status", help="作業キューの状態を表示する")
+    status.add_argument("--run-dir", type=Path, required=True, help="init で作成した作業キューの保存先")
+
+    merge = subparsers.add_parser(
+        "merge", help="判定結果をジャーナルに記録し、失敗した判定を対話的に実行して評価結果を保存する"
+    )
+    merge.add_argument("--run-dir", type=Path, required=True, help="init で作成した作業キューの保存先")
+    merge.add_argument("--dataset", type=Path, default=None, help="init で指定した評価対象データ")
+    merge.add_argument("--output-root", type=Path, default=DEFAULT_OUTPUT_ROOT, help="評価結果の保存先")
+    merge.add_argument(
+        "--format", choices=RESULT_FORMATS, default="json", help="評価結果の保存形式（llm-judge-evaluate と同じ）"
+    )
+    merge.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="失敗した判定を実行し直すときの API 呼び出しの同時実行数の上限",
+    )
+    add_rate_limit_argument(merge)
+    return parser.parse_args(argv)
+
+
+def _load_dataset(args: argparse.Namespace) -> list[EvaluationDatasetItem]:
+    """評価対象データを読み込む。"""
+    return load_evaluation_dataset(args.dataset) if args.dataset is not None else get_evaluation_dataset()
+
+
+def _open_queue(run_dir: Path, input_data: list[EvaluationDatasetItem]) -> SweepQueue:
+    """
+    作業キューを開き、init のときと同じ評価対象データかどうかを確認する。
+
+    Raises:
+        SystemExit: 作業キューが初期化されていない場合、または評価対象データが異なる場合
+    """
+    queue = SweepQueue(run_dir)
+    metadata = queue.metadata
+    if metadata is None:
+        queue.close()
+        raise SystemExit(f"No sweep queue in {run_dir} (run init first)")
+    if metadata["dataset_sha256"] != dataset_digest(input_data):
+        queue.close()
+        raise SystemExit(f"Dataset does not match the sweep queue in {run_dir}")
+    return queue
+
+
+def _init(args: argparse.Namespace) -> None:
+    """全試行の判定を作業キューに登録する。"""
+    input_data = _load_dataset(args)
+    run_dir = args.run_dir or DEFAULT_RUNS_ROOT / datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    queue = SweepQueue(run_dir)
+    try:
+        added = initialize_sweep(queue, input_data, args.model, args.iterations, dataset_digest(input_data))
+        counts = queue.counts()
+    finally:
+        queue.close()
+    print(f"Run directory: {run_dir}")
+    print(f"Added {added} work units ({counts})")
+
+
+async def _aworker(args: argparse.Namespace) -> None:
+    """作業キューが空になるまで判定を実行する。"""
+    input_data = _load_dataset(args)
+    queue = _open_queue(args.run_dir, input_data)
+    configure_vertex(args.project_id, args.location, args.credentials_file)
+    set_max_concurrency(args.max_concurrency)
+    configure_rate_limits(args.rate_limit)
+    worker = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    if args.rate_limit:
+        print(f"Worker {worker} rate limits: {describe_rate_limits(args.rate_limit)}")
+    try:
+        stats = await arun_sweep_worker(
+            queue,
+            input_data,
+            worker,
+            lease_size=args.lease_size,
+            lease_seconds=args.lease_seconds,
+            max_attempts=args.max_attempts,
+            poll_interval=args.poll_interval,
+        )
+    finally:
+        queue.close()
+        await aclose_clients()
+    print(f"Worker {worker}: {stats}")
+
+
+def _format_rate_limit(spec: RateLimitSpec) -> str:
+    """レート制限を --rate-limit の形式（MODEL=RPM[:TPM]）に戻す。"""
+    requests = "" if spec.requests_per_minute is None else repr(spec.requests_per_minute)
+    tokens = "" if spec.tokens_per_minute is None else f":{spec.tokens_per_minute!r}"
+    return f"{spec.model_name}={requests}{tokens}"
+
+
+def _run_local(args: argparse.Namespace) -> None:
+    """このマシンで args.workers 個のワーカーのプロセスを起動し、すべての終了を待つ。"""
+    command = [sys.executable, "-m", __spec__.name if __spec__ else "src.evaluator.sweep_cli"]
+    if args.mock:
+        command.append("--mock")
+    command += ["worker", "--run-dir", str(args.run_dir)]
+    if args.dataset is not None:
+        command += ["--dataset", str(args.dataset)]
+    for flag, value in (
+        ("--project-id", args.project_id),
+        ("--location", args.location),
+        ("--credentials-file", args.credentials_file),
+    ):
+        if value is not None:
+            command += [flag, value]
+    command += [
+        "--max-concurrency",
+        str(args.max_concurrency),
+        "--lease-size",
+        str(args.lease_size),
+        "--lease-seconds",
+        str(args.lease_seconds),
+        "--max-attempts",
+        str(args.max_attempts),
+        "--poll-interval",
+        str(args.poll_interval),
+    ]
+    if args.rate_limit:
+        command += ["--rate-limit", *(_format_rate_limit(spec) for spec in args.rate_limit)]
+    processes = [
+        subprocess.Popen([*command, "--worker-id", f"{socket.gethostname()}-local-{i}"]) for i in range(args.workers)
+    ]
+    failed = [i for i, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        print(f"Workers {failed} exited with errors")
+    _status(args)
+
+
+def _status(args: argparse.Namespace) -> None:
+    """作業キューの状態とワーカーごとの完了数を表示する。"""
+    queue = SweepQueue(args.run_dir)
+    try:
+        if queue.metadata is None:
+            raise SystemExit(f"No sweep queue in {args.run_dir}")
+        print(f"Work units: {queue.counts()}")
+        print(f"Completed by worker: {queue.worker_counts()}")
+    finally:
+        queue.close()
+
+
+async def _amerge(args: argparse.Namespace) -> None:
+    """判定結果をジャーナルに記録し、評価結果を保存する。"""
+    input_data = _load_dataset(args)
+    queue = _open_queue(args.run_dir, input_data)
+    set_max_concurrency(args.max_concurrency)
+    configure_rate_limits(args.rate_limit)
+    try:
+        recorded = await amerge_sweep(
+            queue,
+            input_data,
+            args.run_dir,
+            output_root=args.output_root,
+            on_iteration_complete=lambda iteration, output_dir: print(f"Saved iteration {iteration}: {output_dir}"),
+            result_format=args.format,
+        )
+    finally:
+        queue.close()
+        await aclose_clients()
+    print(f"Recorded {recorded} judgments from the sweep queue")
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """コンソールスクリプト llm-judge-sweep のエントリーポイント。"""
+    args = _parse_args(argv)
+    if args.mock:
+        install_mock_backend()
+    if args.command == "init":
+        _init(args)
+    elif args.command == "worker":
+        asyncio.run(_aworker(args))
+    elif args.command == "run-local":
+        _run_local(args)
+    elif args.command == "status":
+        _status(args)
+    else:
+        asyncio.run(_amerge(args))
+
+
+if __name__ == "__main__":
+    main()
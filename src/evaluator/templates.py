@@ -0,0 +1,254 @@
+import functools
+from collections.abc import Iterable, Sequence
+from typing import NamedTuple, TypedDict
+
+from ..rate_limit import estimate_tokens
+from ..types import EvaluationDatasetItem, PromptItem, RubricItem
+from .prompt import (
+    GENERAL_EVALUATION_PROMPT_TEMPLATE,
+    LISTWISE_EVALUATION_PROMPT_TEMPLATE,
+    RUBRIC_BATCH_EVALUATION_PROMPT_TEMPLATE,
+    RUBRIC_EVALUATION_PROMPT_PREFIX_TEMPLATE,
+    RUBRIC_EVALUATION_PROMPT_SUFFIX_TEMPLATE,
+    SUBJECTIVE_EVALUATION_PROMPT_TEMPLATE,
+)
+
+_SLOT_OPEN = "<<"
+_SLOT_CLOSE = ">>"
+
+# 描画結果をメモ化する件数（会話・ルーブリック評価の前半はデータ項目ごと、ルーブリック項目の後半は項目ごと）。
+_CONVERSATION_CACHE_SIZE = 4096
+_RUBRIC_ITEM_CACHE_SIZE = 4096
+
+# コンパイル済みのルーブリックセットの最大数（compile_validator と同じく id() をキーとする）。
+_MAX_RUBRIC_SETS = 1024
+
+
+def _char_counts(text: str) -> tuple[int, int]:
+    """(ASCII 文字数, それ以外の文字数) を返す（rate_limit.estimate_tokens と同じ数え方）。"""
+    ascii_count = len(text.encode("ascii", errors="ignore"))
+    return ascii_count, len(text) - ascii_count
+
+
+def _tokens_from_counts(ascii_count: int, other_count: int) -> int:
+    """文字数からトークン数を概算する（rate_limit.estimate_tokens と同じ式）。"""
+    return (ascii_count + 3) // 4 + other_count
+
+
+class PromptTemplate:
+    """
+    <<name>> 形式の差し込み位置（スロット）を含むテンプレートを、固定部分とスロットに 1 回だけ分解したもの。
+
+    描画は固定部分と値を 1 回の join で連結するため、str.replace を連鎖させる場合と異なり、
+    テンプレート全体を値の数だけ複製しない。差し込んだ値に <<name>> が含まれていても置換されない。
+    """
+
+    def __init__(self, source: str) -> None:
+        """
+        Args:
+            source: テンプレートの文字列
+
+        Raises:
+            ValueError: 閉じられていないスロットがある場合
+        """
+        self.source = source
+        # segments は固定部分とスロット名が交互に並ぶ（偶数番目が固定部分、奇数番目がスロット名）。
+        self._segments: list[str] = []
+        position = 0
+        while (start := source.find(_SLOT_OPEN, position)) != -1:
+            end = source.find(_SLOT_CLOSE, start + len(_SLOT_OPEN))
+            if end == -1:
+                raise ValueError(f"Unclosed slot at position {start}")
+            self._segments.append(source[position:start])
+            self._segments.append(source[start + len(_SLOT_OPEN) : end])
+            position = end + len(_SLOT_CLOSE)
+        self._segments.append(source[position:])
+        self.slots: tuple[str, ...] = tuple(dict.fromkeys(self._segments[1::2]))
+        # 固定部分の (ASCII 文字数, それ以外の文字数)。
+        static = "".join(self._segments[0::2])
+        self._static_counts = _char_counts(static)
+        self.static_tokens = estimate_tokens(static)
+
+    def estimate_tokens(self, **values: str) -> int:
+        """
+        描画した場合のトークン数の概算を、描画せずに返す（estimate_tokens(render(...)) と同じ値）。
+
+        固定部分の文字数は事前に数えたものを使い、値の文字数のみを数える。
+        """
+        ascii_count, other_count = self._static_counts
+        for name in self._segments[1::2]:
+            value_ascii, value_other = _char_counts(values[name])
+            ascii_count += value_ascii
+            other_count += value_other
+        return _tokens_from_counts(ascii_count, other_count)
+
+    def render(self, **values: str) -> str:
+        """
+        スロットに値を差し込んだ文字列を返す。
+
+        Raises:
+            KeyError: 値が指定されていないスロットがある場合
+        """
+        parts = self._segments.copy()
+        for i in range(1, len(parts), 2):
+            parts[i] = values[parts[i]]
+        return "".join(parts)
+
+
+SUBJECTIVE_PROMPT = PromptTemplate(SUBJECTIVE_EVALUATION_PROMPT_TEMPLATE)
+GENERAL_PROMPT = PromptTemplate(GENERAL_EVALUATION_PROMPT_TEMPLATE)
+RUBRIC_PREFIX_PROMPT = PromptTemplate(RUBRIC_EVALUATION_PROMPT_PREFIX_TEMPLATE)
+RUBRIC_SUFFIX_PROMPT = PromptTemplate(RUBRIC_EVALUATION_PROMPT_SUFFIX_TEMPLATE)
+RUBRIC_BATCH_PROMPT = PromptTemplate(RUBRIC_BATCH_EVALUATION_PROMPT_TEMPLATE)
+LISTWISE_PROMPT = PromptTemplate(LISTWISE_EVALUATION_PROMPT_TEMPLATE)
+
+
+@functools.lru_cache(maxsize=_CONVERSATION_CACHE_SIZE)
+def _render_conversation(turns: tuple[tuple[str, str], ...], llm_response_text: str | None) -> str:
+    lines = [f"{role}: {content}" for role, content in turns]
+    if llm_response_text is None:
+        return "\n".join(lines)
+    lines.append(f"assistant: {llm_response_text}")
+    return "\n".join(lines)
+
+
+def render_conversation(prompts: Iterable[PromptItem], llm_response_text: str | None = None) -> str:
+    """
+    会話履歴を "role: content" 形式で各ターンを改行区切りにした文字列を返す。
+
+    内容（各ターンと応答）が同じ会話は、最初に描画した文字列を使い回す。キーは文字列のタプルのため、
+    ハッシュは文字列ごとにキャッシュされたものが使われ、会話を直列化し直すことはない。
+
+    Args:
+        prompts: 会話の各ターン
+        llm_response_text: 末尾に加える評価対象の応答（None の場合は会話のみ）
+    """
+    return _render_conversation(tuple((p["role"], p["content"]) for p in prompts), llm_response_text)
+
+
+def render_item_conversation(data: EvaluationDatasetItem) -> str:
+    """評価対象データ項目の会話履歴（評価対象の応答を含む）を返す。"""
+    return render_conversation(data["prompts"], data["llm_response_text"])
+
+
+@functools.lru_cache(maxsize=_CONVERSATION_CACHE_SIZE)
+def render_rubric_prefix(conversation: str) -> str:
+    """ルーブリック評価のプロンプトのうち、全ルーブリック項目で共通の前半（指示と会話）を返す（会話ごとにメモ化）。"""
+    return RUBRIC_PREFIX_PROMPT.render(conversation=conversation)
+
+
+class CompiledRubricItem(NamedTuple):
+    """送信できる形に描画済みのルーブリック項目。"""
+
+    rubric: RubricItem
+    # criterionWithPoints の形式: "[points] criterion"
+    criterion_text: str
+    # ルーブリック評価のプロンプトの後半。
+    suffix: str
+    suffix_tokens: int
+
+
+@functools.lru_cache(maxsize=_RUBRIC_ITEM_CACHE_SIZE)
+def _compile_rubric_item(criterion: str, points: int) -> tuple[str, str, int]:
+    criterion_text = f"[{points}] {criterion}"
+    suffix = RUBRIC_SUFFIX_PROMPT.render(rubric_item=criterion_text)
+    return criterion_text, suffix, estimate_tokens(suffix)
+
+
+def compile_rubric_item(rubric: RubricItem) -> CompiledRubricItem:
+    """ルーブリック項目を描画する。内容が同じ項目は描画結果を使い回す。"""
+    return CompiledRubricItem(rubric, *_compile_rubric_item(rubric["criterion"], rubric["points"]))
+
+
+class CompiledRubricSet:
+    """
+    ルーブリックセットを、項目ごとのプロンプトの後半・一括評価の行・トークン数に事前に描画したもの。
+
+    試行やデータ項目をまたいで同じルーブリックセットを評価する場合も、描画は 1 回だけ行う。
+    """
+
+    def __init__(self, rubrics: Sequence[RubricItem]) -> None:
+        self.items = tuple(compile_rubric_item(rubric) for rubric in rubrics)
+        # 一括評価の各行（"番号. [points] criterion"、番号は 1 始まり）。
+        self.batch_lines = tuple(f"{i}. {item.criterion_text}" for i, item in enumerate(self.items, start=1))
+        self.suffix_tokens = sum(item.suffix_tokens for item in self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def batch_rubric_items(self, indices: Iterable[int] | None = None) -> str:
+        """一括評価のプロンプトに差し込むルーブリック項目の行（indices は 1 始まりの番号、None の場合はすべて）。"""
+        if indices is None:
+            return "\n".join(self.batch_lines)
+        return "\n".join(self.batch_lines[i - 1] for i in indices)
+
+
+# コンパイル済みのルーブリックセット（id(ルーブリックのリスト) → (リスト, コンパイル結果)）。
+_rubric_sets: dict[int, tuple[Sequence[RubricItem], CompiledRubricSet]] = {}
+
+
+def compile_rubric_set(rubrics: Sequence[RubricItem]) -> CompiledRubricSet:
+    """
+    ルーブリックセットをコンパイルする。同じリストのオブジェクトに対してはコンパイル済みの結果を返す。
+
+    dataset_store で読み込んだデータセットのように、同じルーブリックセットのデータ項目が 1 つのリストを
+    共有している場合は、データセット全体で 1 回だけコンパイルされる。
+    """
+    cached = _rubric_sets.get(id(rubrics))
+    if cached is not None and cached[0] is rubrics:
+        return cached[1]
+    compiled = CompiledRubricSet(rubrics)
+    if len(_rubric_sets) >= _MAX_RUBRIC_SETS:
+        _rubric_sets.clear()
+    _rubric_sets[id(rubrics)] = (rubrics, compiled)
+    return compiled
+
+
+class PromptTokenCounts(TypedDict):
+    """1 データ項目を 1 回評価する場合の、評価手法ごとのプロンプトのトークン数の概算。"""
+
+    subjective: int
+    general: int
+    # ルーブリック評価の共通の前半（コンテキストキャッシュの対象）。
+    rubric_prefix: int
+    # ルーブリック評価の項目ごとの後半の合計。
+    rubric_suffixes: int
+    # ルーブリック評価で送信する合計（前半 × 項目数 + 後半の合計）。
+    rubric_total: int
+    # 一括評価の 1 回分。
+    rubric_batch: int
+
+
+def estimate_prompt_tokens(data: EvaluationDatasetItem) -> PromptTokenCounts:
+    """
+    1 データ項目を評価するプロンプトのトークン数を、プロンプトを描画せずに概算する。
+
+    テンプレートの固定部分とルーブリック項目のトークン数は事前に計算したものを使う。
+    各値は描画したプロンプトを rate_limit.estimate_tokens で数えた場合と同じ。
+    """
+    conversation = render_item_conversation(data)
+    rubric_set = compile_rubric_set(data["rubrics"])
+    prefix = RUBRIC_PREFIX_PROMPT.estimate_tokens(conversation=conversation)
+    return {
+        "subjective": SUBJECTIVE_PROMPT.estimate_tokens(conversation=conversation),
+        "general": GENERAL_PROMPT.estimate_tokens(conversation=conversation),
+        "rubric_prefix": prefix,
+        "rubric_suffixes": rubric_set.suffix_tokens,
+        "rubric_total": prefix * len(rubric_set) + rubric_set.suffix_tokens,
+        "rubric_batch": RUBRIC_BATCH_PROMPT.estimate_tokens(
+            conversation=conversation, rubric_items=rubric_set.batch_rubric_items()
+        ),
+    }
+
+
+def sum_prompt_tokens(items: Iterable[EvaluationDatasetItem]) -> PromptTokenCounts:
+    """データ項目ごとの estimate_prompt_tokens の合計（データセットを 1 回評価する場合のトークン数の概算）を返す。"""
+    counts = [estimate_prompt_tokens(data) for data in items]
+    return {
+        "subjective": sum(c["subjective"] for c in counts),
+        "general": sum(c["general"] for c in counts),
+        "rubric_prefix": sum(c["rubric_prefix"] for c in counts),
+        "rubric_suffixes": sum(c["rubric_suffixes"] for c in counts),
+        "rubric_total": sum(c["rubric_total"] for c in counts),
+        "rubric_batch": sum(c["rubric_batch"] for c in counts),
+    }
@@ -1,8 +1,16 @@
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from pathlib import Path
+from typing import Any
+
 from google.genai import types
 
 from src.data import get_generation_dataset, get_rubrics, save_evaluation_dataset
+from src.data.dataset_store import iter_generation_dataset, write_evaluation_dataset
+from src.data.result_store import content_hash
+from src.generator.journal import DEFAULT_GENERATION_JOURNAL_PATH, GenerationJournal, GenerationKey
 from src.models import generate
-from src.types import EvaluationDatasetItem, PromptItem
+from src.types import EvaluationDatasetItem, GenerationDatasetItem, PromptItem
 
 
 def _build_conversation_contents(prompts: list[PromptItem]) -> list[types.Content]:
@@ -26,60 +34,162 @@ def _build_conversation_contents(prompts: list[PromptItem]) -> list[types.Conten
     return contents
 
 
-def generate_responses(model_name: str) -> None:
-    """
-    生成用データセットを読み込み、LLM で応答を生成して、
-    評価用データセットとして保存する。
+# 生成中の応答の数の上限（並行数に対する倍率）。入力を先読みしすぎないよう、これを超えたら完了を待つ。
+_IN_FLIGHT_PER_WORKER = 2
 
-    会話履歴全体とシステムプロンプトに対応している。
-    各アイテムの generator_system_instructions ごとに応答を生成する。
+# 生成する 1 件: ((データ項目の番号, システム指示の番号), 入力のハッシュ, プロンプト, 会話履歴, システム指示)。
+_GenerationTask = tuple[GenerationKey, str, list[PromptItem], list[types.Content], str]
 
-    Args:
-        model_name: 使用するモデル名
-    """
-    # 入力データを読み込む。
-    dataset = get_generation_dataset()
-    rubrics = get_rubrics()
-    results: list[EvaluationDatasetItem] = []
 
-    print(f"Generating responses for {len(dataset)} items...")
+def _iter_generation_items(input_path: Path | None) -> Iterator[GenerationDatasetItem]:
+    """生成用データを 1 件ずつ返す（input_path を指定しない場合は同梱の generation_dataset.json）。"""
+    if input_path is None:
+        yield from get_generation_dataset()
+    else:
+        yield from iter_generation_dataset(input_path)
+
 
-    for i, item in enumerate(dataset):
-        print(f"Processing item {i + 1}/{len(dataset)}")
+def _iter_tasks(
+    items: Iterable[GenerationDatasetItem], model_name: str, report_skipped: bool = True
+) -> Iterator[_GenerationTask]:
+    """
+    生成する (データ項目, システム指示) の組を、データ項目を読み込みながら順に返す。
 
+    Args:
+        items: 生成用データ
+        model_name: 使用するモデル名（入力のハッシュに含まれる）
+        report_skipped: 読み飛ばしたデータ項目を表示するか
+    """
+    for i, item in enumerate(items):
         prompts = item.get("prompts", [])
         system_instructions = item.get("generator_system_instructions", [])
 
         if not prompts:
-            print("  Skipping: No prompts found.")
+            if report_skipped:
+                print(f"  Skipping item {i + 1}: No prompts found.")
             continue
 
         if not system_instructions:
-            print("  Skipping: No system instructions found.")
+            if report_skipped:
+                print(f"  Skipping item {i + 1}: No system instructions found.")
             continue
 
         # 会話履歴を構築する。
         contents = _build_conversation_contents(prompts)
 
-        # 応答を生成する。
         if not contents:
-            print("  Warning: No valid conversation contents found. Skipping.")
+            if report_skipped:
+                print(f"  Warning: No valid conversation contents found for item {i + 1}. Skipping.")
             continue
 
-        # 各システム指示に対して応答を生成する。
         for j, system_instruction in enumerate(system_instructions):
-            print(f"  Generating response for instruction {j + 1}/{len(system_instructions)}")
+            input_sha256 = content_hash(
+                {"model_name": model_name, "prompts": prompts, "system_instruction": system_instruction}
+            )
+            yield (i, j), input_sha256, prompts, contents, system_instruction
+
+
+def generate_responses(
+    model_name: str,
+    max_workers: int = 1,
+    journal_path: str = DEFAULT_GENERATION_JOURNAL_PATH,
+    output_dir: Path | None = None,
+    input_path: Path | None = None,
+) -> None:
+    """
+    生成用データセットを読み込み、LLM で応答を生成して、
+    評価用データセットとして保存する。
 
-            result = generate(model_name=model_name, contents=contents, system_instruction=system_instruction)
+    会話履歴全体とシステムプロンプトに対応している。
+    各アイテムの generator_system_instructions ごとに応答を生成する。
 
-            if not result or not isinstance(result, str):
-                print(f"  Warning: Failed to generate response for instruction {j + 1}. Skipping.")
-                continue
+    生成用データは 1 件ずつ読み込みながら生成を依頼し、生成中の応答が並行数の一定倍を超えたら完了を待つため、
+    入力全体や生成する組の一覧をメモリに溜め込まない。生成した応答もメモリには保持せず（ジャーナルはファイル内の
+    位置のみを保持する）、保存時は入力をもう一度先頭から読み込みながら、応答をジャーナルから読んで 1 件ずつ書き込む。
 
-            # 結果を格納する。
-            new_item: EvaluationDatasetItem = {"prompts": prompts, "rubrics": rubrics, "llm_response_text": result}
-            results.append(new_item)
+    生成した応答は 1 件ごとにジャーナルに追記する。途中で中断した場合も、再実行すると
+    (データ項目, システム指示) の組ごとに生成済みの応答を再利用し、未生成のものだけを生成する。
+    すべての応答を生成して保存できた場合、ジャーナルは削除する。
 
-    # 結果を保存する。
-    save_evaluation_dataset(results)
-    print(f"Saved evaluation dataset with {len(results)} items.")
+    Args:
+        model_name: 使用するモデル名
+        max_workers: 並行して生成する数（API 呼び出しの待ち時間が大半のため、スレッドで並行させる）
+        journal_path: ジャーナルファイルのパス
+        output_dir: 評価用データセットを JSONL のシャードとして保存するディレクトリ
+            （指定しない場合は evaluation_dataset.json に保存する）。シャードにはルーブリックを
+            rubric_set_id で参照して書き込む。どちらの場合もデータ項目を 1 件ずつ書き込むため全件をメモリに溜め込まない
+        input_path: 生成用データの JSONL ファイル、またはシャードのディレクトリ（dataset_store.iter_generation_dataset
+            で 1 件ずつ読み込む。指定しない場合は generation_dataset.json）
+    """
+    rubrics = get_rubrics()
+    journal = GenerationJournal(journal_path)
+    print(f"Generating responses from {input_path or 'the bundled generation dataset'}...")
+
+    reused = 0
+    generated = 0
+    failed = 0
+
+    def handle(future: Future[str | dict[str, Any] | None], key: GenerationKey, input_sha256: str) -> None:
+        nonlocal generated, failed
+        i, j = key
+        label = f"item {i + 1}, instruction {j + 1}"
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"  Warning: Failed to generate response for {label}: {e}. Skipping.")
+            failed += 1
+            return
+
+        if not result or not isinstance(result, str):
+            print(f"  Warning: Failed to generate response for {label}. Skipping.")
+            failed += 1
+            return
+
+        journal.record(key, input_sha256, result)
+        generated += 1
+        print(f"  Generated response {generated} ({label})")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight: dict[Future[str | dict[str, Any] | None], tuple[GenerationKey, str]] = {}
+            for key, input_sha256, _, contents, system_instruction in _iter_tasks(
+                _iter_generation_items(input_path), model_name
+            ):
+                if journal.is_recorded(key, input_sha256):
+                    reused += 1
+                    continue
+                if len(in_flight) >= max_workers * _IN_FLIGHT_PER_WORKER:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle(future, *in_flight.pop(future))
+                future = executor.submit(
+                    generate, model_name=model_name, contents=contents, system_instruction=system_instruction
+                )
+                in_flight[future] = (key, input_sha256)
+            for future in as_completed(in_flight):
+                handle(future, *in_flight[future])
+    except BaseException:
+        journal.close()
+        raise
+    print(f"Generated {generated} responses ({reused} already generated, {failed} failed).")
+
+    # 結果をデータセットの順に並べて保存する（入力をもう一度先頭から読み込む）。
+    def completed_items() -> Iterator[EvaluationDatasetItem]:
+        tasks = _iter_tasks(_iter_generation_items(input_path), model_name, report_skipped=False)
+        for key, input_sha256, prompts, _, _ in tasks:
+            response = journal.get(key, input_sha256)
+            if response is not None:
+                yield {"prompts": prompts, "rubrics": rubrics, "llm_response_text": response}
+
+    if output_dir is None:
+        saved_count = save_evaluation_dataset(completed_items())
+    else:
+        saved_count = write_evaluation_dataset(completed_items(), output_dir)
+    print(f"Saved evaluation dataset with {saved_count} items.")
+
+    if failed:
+        # 失敗した応答のみを再実行で生成できるように、ジャーナルを残す。
+        print(f"{failed} responses failed. Run again to retry them (journal: {journal_path}).")
+        journal.close()
+    else:
+        journal.remove()
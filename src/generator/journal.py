@@ -0,0 +1,93 @@
+import json
+import os
+from typing import BinaryIO, cast
+
+from src.data import DATA_DIR
+
+DEFAULT_GENERATION_JOURNAL_PATH = os.path.join(DATA_DIR, "generation_journal.jsonl")
+
+# 生成を一意に識別するキー: (データ項目の番号, システム指示の番号)。
+GenerationKey = tuple[int, int]
+
+
+class GenerationJournal:
+    """
+    応答生成のジャーナル。
+
+    応答を 1 件生成するたびに JSONL ファイルへ追記するため、途中で中断しても生成済みの応答は失われない。
+    各レコードには入力（会話履歴・システム指示・モデル名）のハッシュを保存し、
+    再開時に入力が変わっていた場合はそのレコードを使わずに生成し直す。
+
+    メモリにはキーごとに入力のハッシュとレコードのファイル内の位置のみを保持し、応答の本文は get の際に
+    ファイルから読み込むため、生成した応答の量によらずメモリ使用量は一定に近い。
+    """
+
+    def __init__(self, path: str = DEFAULT_GENERATION_JOURNAL_PATH) -> None:
+        """
+        Args:
+            path: ジャーナルファイルのパス（存在する場合は記録済みの応答の位置を読み込む）
+        """
+        self.path = path
+        # キー → (入力のハッシュ, レコードの先頭のバイト位置)。
+        self._offsets: dict[GenerationKey, tuple[str, int]] = {}
+        end = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    offset = end
+                    if not line.endswith(b"\n"):
+                        # 書き込み途中で中断された末尾の行は、次の追記と混ざらないよう切り詰める。
+                        break
+                    end += len(line)
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    key = (record["item_index"], record["instruction_index"])
+                    self._offsets[key] = (record["input_sha256"], offset)
+            if end != os.path.getsize(path):
+                os.truncate(path, end)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "ab")
+        self._reader: BinaryIO | None = None
+
+    def is_recorded(self, key: GenerationKey, input_sha256: str) -> bool:
+        """同じ入力に対する応答が記録済みかどうかを返す（応答の本文は読み込まない）。"""
+        recorded = self._offsets.get(key)
+        return recorded is not None and recorded[0] == input_sha256
+
+    def get(self, key: GenerationKey, input_sha256: str) -> str | None:
+        """記録済みの応答をファイルから読み込む。記録されていない、または入力が異なる場合は None を返す。"""
+        recorded = self._offsets.get(key)
+        if recorded is None or recorded[0] != input_sha256:
+            return None
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        self._reader.seek(recorded[1])
+        return cast(str, json.loads(self._reader.readline())["llm_response_text"])
+
+    def record(self, key: GenerationKey, input_sha256: str, llm_response_text: str) -> None:
+        """生成した応答を記録する。"""
+        item_index, instruction_index = key
+        record = {
+            "item_index": item_index,
+            "instruction_index": instruction_index,
+            "input_sha256": input_sha256,
+            "llm_response_text": llm_response_text,
+        }
+        offset = self._file.tell()
+        self._file.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._offsets[key] = (input_sha256, offset)
+
+    def close(self) -> None:
+        """ジャーナルファイルを閉じる。"""
+        self._file.close()
+        if self._reader is not None:
+            self._reader.close()
+
+    def remove(self) -> None:
+        """ジャーナルファイルを閉じて削除する（すべての応答を保存し終えた後に呼び出す）。"""
+        self.close()
+        os.remove(self.path)
@@ -0,0 +1,138 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections.abc import Sequence
+from typing import TypedDict
+
+# 計測するモジュール（コンソールスクリプト、ワーカー、分析の入口）。
+IMPORT_BENCHMARK_MODULES = (
+    "src.models",
+    "src.evaluator.evaluator",
+    "src.evaluator.cli",
+    "src.evaluator.batch_cli",
+    "src.evaluator.sweep_cli",
+    "src.benchmark",
+    "src.analysis.runs",
+)
+
+# 入口の読み込みでは読み込まれてはならない SDK（モデルを最初に呼び出すときに providers から読み込む）。
+PROVIDER_SDK_MODULES = ("anthropic", "google.genai")
+
+# 読み込み時間（中央値）の上限のデフォルト値（秒）。SDK を読み込むと 1 つだけで 1 秒前後かかる。
+DEFAULT_IMPORT_BUDGET_SECONDS = 1.0
+
+DEFAULT_IMPORT_REPEATS = 5
+
+# 新しいインタープリタで実行するスクリプト。引数は (モジュール名, 確認する SDK のモジュール名...)。
+_MEASURE_SCRIPT = """
+import importlib, json, sys, time
+started = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "sdk_modules": [name for name in sys.argv[2:] if name in sys.modules]}))
+"""
+
+
+class ImportBenchmarkResult(TypedDict):
+    """1 つのモジュールの読み込み時間の計測結果。"""
+
+    module: str
+    median_seconds: float
+    min_seconds: float
+    # 読み込みの結果、読み込まれていた SDK のモジュール。
+    sdk_modules: list[str]
+
+
+def measure_import(module: str, repeats: int = DEFAULT_IMPORT_REPEATS) -> ImportBenchmarkResult:
+    """
+    モジュールを新しいインタープリタで repeats 回読み込み、読み込み時間を計測する（コールドスタート）。
+
+    インタープリタ自体の起動時間は含まない。
+
+    Raises:
+        subprocess.CalledProcessError: モジュールの読み込みに失敗した場合
+    """
+    seconds: list[float] = []
+    sdk_modules: set[str] = set()
+    for _ in range(repeats):
+        completed = subprocess.run(
+            [sys.executable, "-c", _MEASURE_SCRIPT, module, *PROVIDER_SDK_MODULES],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        run = json.loads(completed.stdout.splitlines()[-1])
+        seconds.append(run["seconds"])
+        sdk_modules.update(run["sdk_modules"])
+    return {
+        "module": module,
+        "median_seconds": statistics.median(seconds),
+        "min_seconds": min(seconds),
+        "sdk_modules": sorted(sdk_modules),
+    }
+
+
+def check_import_budget(
+    results: Sequence[ImportBenchmarkResult], budget_seconds: float = DEFAULT_IMPORT_BUDGET_SECONDS
+) -> list[str]:
+    """
+    計測結果が上限を超えていないかを確認する。
+
+    Returns:
+        上限を超えたモジュールと、SDK を読み込んでいたモジュールの説明（問題がなければ空）
+    """
+    problems: list[str] = []
+    for result in results:
+        if result["median_seconds"] > budget_seconds:
+            problems.append(
+                f"{result['module']}: {result['median_seconds'] * 1000:.0f} ms exceeds {budget_seconds * 1000:.0f} ms"
+            )
+        if result["sdk_modules"]:
+            problems.append(f"{result['module']}: imports {', '.join(result['sdk_modules'])} at load time")
+    return problems
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    """コマンドライン引数を解析する。"""
+    parser = argparse.ArgumentParser(
+        description=(
+            "各入口のモジュールを新しいプロセスで読み込み、読み込み時間と SDK が読み込まれていないことを確認する。"
+            "上限を超えた場合は終了コード 1 で終了する。"
+        )
+    )
+    parser.add_argument("--modules", nargs="+", default=list(IMPORT_BENCHMARK_MODULES), help="計測するモジュール")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_IMPORT_REPEATS, help="モジュールごとの計測回数")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_IMPORT_BUDGET_SECONDS * 1000,
+        help="読み込み時間（中央値）の上限（ミリ秒）",
+    )
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """コンソールスクリプト llm-judge-import-benchmark のエントリーポイント。"""
+    args = _parse_args(argv)
+    results = [measure_import(module, args.repeats) for module in args.modules]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'module':<28} {'median ms':>10} {'min ms':>8}  sdk")
+        for result in results:
+            print(
+                f"{result['module']:<28} {result['median_seconds'] * 1000:>10.1f} "
+                f"{result['min_seconds'] * 1000:>8.1f}  {', '.join(result['sdk_modules']) or '-'}"
+            )
+    problems = check_import_budget(results, args.budget_ms / 1000)
+    for problem in problems:
+        print(f"Error: {problem}", file=sys.stderr)
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections.abc import Iterable, Iterator
+from typing import IO, Literal, Protocol, TypedDict
+
+# 呼び出しの種類（generate の JSON 生成 / テキスト生成）。
+CallMode = Literal["json", "text"]
+
+# summarize_calls で集計に使うキー。
+GroupBy = Literal["evaluator", "rubric", "model_name"]
+
+# Span の属性値として使える型（OpenTelemetry の AttributeValue の一部）。
+AttributeValue = str | bool | int | float
+
+
+class CallRecord(TypedDict):
+    """generate / agenerate の呼び出し 1 回分の計測結果。"""
+
+    call_id: str
+    model_name: str
+    mode: CallMode
+    # 呼び出し元の評価手法（"subjective" / "general" / "rubric" / "rubric_batch" など）。
+    evaluator: str | None
+    # 呼び出し元のルーブリック項目の評価基準（ルーブリック評価以外は None）。
+    rubric: str | None
+    sample_index: int
+    # 呼び出し元での試行回数（JSON の形式が不正な場合のリトライを含む、1 始まり）。
+    attempt: int
+    # 呼び出しの開始時刻（UNIX 時間、秒）。
+    started_at: float
+    wall_seconds: float
+    # 同時実行数の上限やレート制限による待ち時間（秒）。
+    queue_wait_seconds: float
+    transport_retries: int
+    # 判定結果のキャッシュ（set_cache）から応答したか。
+    judgment_cache_hit: bool
+    # 実行中の同じリクエストの結果を待ち、API を呼び出さなかったか（models.set_request_coalescing）。
+    coalesced: bool
+    input_tokens: int
+    output_tokens: int
+    cached_input_tokens: int
+    finish_reason: str | None
+    # 例外で終了した場合の例外の型名。
+    error: str | None
+
+
+class CallSummary(TypedDict):
+    """複数の呼び出しの計測結果の集計。"""
+
+    calls: int
+    errors: int
+    judgment_cache_hits: int
+    coalesced: int
+    transport_retries: int
+    wall_seconds_total: float
+    wall_seconds_p50: float
+    wall_seconds_p95: float
+    queue_wait_seconds_total: float
+    input_tokens: int
+    output_tokens: int
+    cached_input_tokens: int
+
+
+class CallLabels(TypedDict, total=False):
+    """call_context で呼び出しに付けるラベル。"""
+
+    evaluator: str
+    rubric: str
+    attempt: int
+
+
+class InstrumentationSink(Protocol):
+    """計測結果の出力先。add_sink で登録すると、呼び出しが終わるたびに emit が呼び出される。"""
+
+    def emit(self, record: CallRecord) -> None: ...
+
+
+class Span(Protocol):
+    """OpenTelemetry の Span のうち、SpanSink が使用する部分。"""
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None: ...
+
+    def end(self, end_time: int | None = None) -> None: ...
+
+
+class Tracer(Protocol):
+    """OpenTelemetry の Tracer のうち、SpanSink が使用する部分（opentelemetry.trace.get_tracer の戻り値を渡せる）。"""
+
+    def start_span(
+        self, name: str, *, attributes: dict[str, AttributeValue] | None = None, start_time: int | None = None
+    ) -> Span: ...
+
+
+def percentile(values: list[float], q: float) -> float:
+    """values の q パーセンタイル（最近傍法）を返す。"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize_calls(records: Iterable[CallRecord], group_by: GroupBy | None = None) -> dict[str, CallSummary]:
+    """
+    計測結果を集計する。
+
+    Args:
+        records: 計測結果
+        group_by: 集計に使うキー（None の場合は全体を "all" として集計する。値が None の呼び出しは "-" にまとめる）
+
+    Returns:
+        キーごとの集計。呼び出し時間の合計が大きい順
+    """
+    groups: dict[str, list[CallRecord]] = {}
+    for record in records:
+        key = "all" if group_by is None else str(record[group_by] or "-")
+        groups.setdefault(key, []).append(record)
+
+    summaries: dict[str, CallSummary] = {}
+    for key, group in groups.items():
+        walls = [record["wall_seconds"] for record in group]
+        summaries[key] = {
+            "calls": len(group),
+            "errors": sum(1 for record in group if record["error"] is not None),
+            "judgment_cache_hits": sum(1 for record in group if record["judgment_cache_hit"]),
+            "coalesced": sum(1 for record in group if record["coalesced"]),
+            "transport_retries": sum(record["transport_retries"] for record in group),
+            "wall_seconds_total": sum(walls),
+            "wall_seconds_p50": percentile(walls, 50),
+            "wall_seconds_p95": percentile(walls, 95),
+            "queue_wait_seconds_total": sum(record["queue_wait_seconds"] for record in group),
+            "input_tokens": sum(record["input_tokens"] for record in group),
+            "output_tokens": sum(record["output_tokens"] for record in group),
+            "cached_input_tokens": sum(record["cached_input_tokens"] for record in group),
+        }
+    return dict(sorted(summaries.items(), key=lambda item: item[1]["wall_seconds_total"], reverse=True))
+
+
+def format_summary(summaries: dict[str, CallSummary], limit: int | None = None) -> str:
+    """summarize_calls の結果を表の形式にする（limit を指定した場合は上位 limit 件のみ）。"""
+    lines = [
+        f"{'key':<40} {'calls':>6} {'errors':>6} {'hits':>6} {'shared':>6} {'retries':>7} {'total s':>9} {'p50 ms':>9} "
+        f"{'p95 ms':>9} {'queue s':>9} {'in tokens':>10} {'out tokens':>10} {'cached':>7}"
+    ]
+    for key, summary in list(summaries.items())[:limit]:
+        name = key if len(key) <= 40 else key[:39] + "…"
+        cached_ratio = summary["cached_input_tokens"] / summary["input_tokens"] if summary["input_tokens"] else 0.0
+        lines.append(
+            f"{name:<40} {summary['calls']:>6} {summary['errors']:>6} {summary['judgment_cache_hits']:>6} "
+            f"{summary['coalesced']:>6} {summary['transport_retries']:>7} {summary['wall_seconds_total']:>9.1f} "
+            f"{summary['wall_seconds_p50'] * 1000:>9.1f} {summary['wall_seconds_p95'] * 1000:>9.1f} "
+            f"{summary['queue_wait_seconds_total']:>9.1f} {summary['input_tokens']:>10} "
+            f"{summary['output_tokens']:>10} {cached_ratio:>7.1%}"
+        )
+    return "\n".join(lines)
+
+
+class MemorySink:
+    """計測結果をメモリ上に保持する出力先。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._records: list[CallRecord] = []
+
+    def emit(self, record: CallRecord) -> None:
+        with self._lock:
+            self._records.append(record)
+
+    @property
+    def records(self) -> list[CallRecord]:
+        """保持している計測結果（記録された順）。"""
+        with self._lock:
+            return list(self._records)
+
+    def summary(self, group_by: GroupBy | None = None) -> dict[str, CallSummary]:
+        """保持している計測結果を集計する（summarize_calls を参照）。"""
+        return summarize_calls(self.records, group_by)
+
+    def clear(self) -> None:
+        """保持している計測結果を削除する。"""
+        with self._lock:
+            self._records.clear()
+
+
+class JsonlSink:
+    """計測結果を 1 件 1 行の JSONL ファイルに追記する出力先。"""
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        """
+        Args:
+            path: 出力先のファイルのパス（存在する場合は追記する）
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file: IO[str] = open(path, "a", encoding="utf-8")
+
+    def emit(self, record: CallRecord) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        """ファイルを閉じる。"""
+        with self._lock:
+            self._file.close()
+
+
+class SpanSink:
+    """
+    計測結果を OpenTelemetry 形式の Span として出力する出力先。
+
+    属性名は OpenTelemetry の生成 AI のセマンティック規約（gen_ai.*）に従い、
+    評価手法などこのリポジトリ固有の値は llm_judge.* とする。
+    """
+
+    def __init__(self, tracer: Tracer, span_name: str = "llm_judge.generate") -> None:
+        """
+        Args:
+            tracer: Span を生成する Tracer
+            span_name: Span の名前
+        """
+        self.tracer = tracer
+        self.span_name = span_name
+
+    def emit(self, record: CallRecord) -> None:
+        attributes: dict[str, AttributeValue] = {
+            "gen_ai.request.model": record["model_name"],
+            "gen_ai.usage.input_tokens": record["input_tokens"],
+            "gen_ai.usage.output_tokens": record["output_tokens"],
+            "llm_judge.call_id": record["call_id"],
+            "llm_judge.mode": record["mode"],
+            "llm_judge.sample_index": record["sample_index"],
+            "llm_judge.attempt": record["attempt"],
+            "llm_judge.queue_wait_seconds": record["queue_wait_seconds"],
+            "llm_judge.transport_retries": record["transport_retries"],
+            "llm_judge.judgment_cache_hit": record["judgment_cache_hit"],
+            "llm_judge.coalesced": record["coalesced"],
+            "llm_judge.cached_input_tokens": record["cached_input_tokens"],
+        }
+        optional: dict[str, str | None] = {
+            "gen_ai.response.finish_reasons": record["finish_reason"],
+            "llm_judge.evaluator": record["evaluator"],
+            "llm_judge.rubric": record["rubric"],
+            "error.type": record["error"],
+        }
+        attributes.update({key: value for key, value in optional.items() if value is not None})
+        start_time = int(record["started_at"] * 1e9)
+        span = self.tracer.start_span(self.span_name, attributes=attributes, start_time=start_time)
+        span.end(end_time=start_time + int(record["wall_seconds"] * 1e9))
+
+
+_sinks: list[InstrumentationSink] = []
+_sinks_lock = threading.Lock()
+
+
+def add_sink(sink: InstrumentationSink) -> None:
+    """計測結果の出力先を登録する。"""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink: InstrumentationSink) -> None:
+    """登録した出力先を削除する（登録されていない場合は何もしない）。"""
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def _emit(record: CallRecord) -> None:
+    """登録されたすべての出力先に計測結果を渡す。出力先の例外は評価を止めないよう警告のみ表示する。"""
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.emit(record)
+        except Exception as error:
+            print(f"Warning: Instrumentation sink {type(sink).__name__} failed - {error}")
+
+
+_labels: contextvars.ContextVar[CallLabels | None] = contextvars.ContextVar("instrumentation_labels", default=None)
+
+
+@contextlib.contextmanager
+def call_context(evaluator: str | None = None, rubric: str | None = None, attempt: int | None = None) -> Iterator[None]:
+    """
+    ブロック内で行われる呼び出しにラベルを付ける。
+
+    入れ子にした場合は、指定したラベルのみ外側のラベルを上書きする。
+    contextvars を使うため、asyncio のタスクごとに独立する。
+
+    Args:
+        evaluator: 評価手法
+        rubric: ルーブリック項目の評価基準
+        attempt: 呼び出し元での試行回数
+    """
+    labels: CallLabels = {**(_labels.get() or {})}
+    if evaluator is not None:
+        labels["evaluator"] = evaluator
+    if rubric is not None:
+        labels["rubric"] = rubric
+    if attempt is not None:
+        labels["attempt"] = attempt
+    token = _labels.set(labels)
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+class _CallState:
+    """計測中の呼び出し 1 回分の状態。"""
+
+    __slots__ = (
+        "queue_wait_seconds",
+        "transport_retries",
+        "judgment_cache_hit",
+        "coalesced",
+        "input_tokens",
+        "output_tokens",
+        "cached_input_tokens",
+        "finish_reason",
+    )
+
+    def __init__(self) -> None:
+        self.queue_wait_seconds = 0.0
+        self.transport_retries = 0
+        self.judgment_cache_hit = False
+        self.coalesced = False
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_input_tokens = 0
+        self.finish_reason: str | None = None
+
+
+_active_call: contextvars.ContextVar[_CallState | None] = contextvars.ContextVar(
+    "instrumentation_active_call", default=None
+)
+
+
+@contextlib.contextmanager
+def instrument_call(model_name: str, mode: CallMode, sample_index: int = 0) -> Iterator[None]:
+    """
+    ブロック内を呼び出し 1 回分として計測し、終了時に登録された出力先へ計測結果を渡す。
+
+    ブロック内では add_queue_wait などで待ち時間やトークン数を加算できる。出力先が登録されていない場合は何もしない。
+    """
+    with _sinks_lock:
+        enabled = bool(_sinks)
+    if not enabled:
+        yield
+        return
+
+    state = _CallState()
+    token = _active_call.set(state)
+    started_at = time.time()
+    started = time.perf_counter()
+    error: str | None = None
+    try:
+        yield
+    except BaseException as exception:
+        error = type(exception).__name__
+        raise
+    finally:
+        wall_seconds = time.perf_counter() - started
+        _active_call.reset(token)
+        labels = _labels.get() or {}
+        _emit(
+            {
+                "call_id": uuid.uuid4().hex,
+                "model_name": model_name,
+                "mode": mode,
+                "evaluator": labels.get("evaluator"),
+                "rubric": labels.get("rubric"),
+                "sample_index": sample_index,
+                "attempt": labels.get("attempt", 1),
+                "started_at": started_at,
+                "wall_seconds": wall_seconds,
+                "queue_wait_seconds": state.queue_wait_seconds,
+                "transport_retries": state.transport_retries,
+                "judgment_cache_hit": state.judgment_cache_hit,
+                "coalesced": state.coalesced,
+                "input_tokens": state.input_tokens,
+                "output_tokens": state.output_tokens,
+                "cached_input_tokens": state.cached_input_tokens,
+                "finish_reason": state.finish_reason,
+                "error": error,
+            }
+        )
+
+
+def add_queue_wait(seconds: float) -> None:
+    """計測中の呼び出しに待ち時間を加算する。"""
+    state = _active_call.get()
+    if state is not None:
+        state.queue_wait_seconds += seconds
+
+
+def add_transport_retry() -> None:
+    """計測中の呼び出しの通信エラーによるリトライ回数を 1 増やす。"""
+    state = _active_call.get()
+    if state is not None:
+        state.transport_retries += 1
+
+
+def mark_judgment_cache_hit() -> None:
+    """計測中の呼び出しが判定結果のキャッシュから応答したことを記録する。"""
+    state = _active_call.get()
+    if state is not None:
+        state.judgment_cache_hit = True
+
+
+def mark_request_coalesced() -> None:
+    """計測中の呼び出しが実行中の同じリクエストの結果を待ったことを記録する。"""
+    state = _active_call.get()
+    if state is not None:
+        state.coalesced = True
+
+
+def add_usage(input_tokens: int, output_tokens: int, cached_input_tokens: int, finish_reason: str | None) -> None:
+    """計測中の呼び出しに API の応答のトークン数と終了理由を記録する。"""
+    state = _active_call.get()
+    if state is not None:
+        state.input_tokens += input_tokens
+        state.output_tokens += output_tokens
+        state.cached_input_tokens += cached_input_tokens
+        state.finish_reason = finish_reason
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections.abc import AsyncGenerator, Callable
+from typing import TYPE_CHECKING, Any, TypedDict, cast
+
+from .models import record_token_usage, register_backend, unregister_backend
+from .rate_limit import estimate_tokens
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+# モック用のモデル名の接頭辞（"mock-fast" など）。
+MOCK_MODEL_PREFIX = "mock"
+MOCK_BACKEND_NAME = "mock"
+
+# 乱数生成器を受け取り、1 回の呼び出しの待ち時間（秒）を返す関数。
+LatencyDistribution = Callable[[random.Random], float]
+
+# 一括評価のプロンプトに含まれるルーブリック項目の行（"番号. [点数] 評価基準"）。
+_RUBRIC_LINE_PATTERN = re.compile(r"^(\d+)\. \[-?\d+\] ", re.MULTILINE)
+_RESPONSE_HEADING_PATTERN = re.compile(r"^## 応答 (\d+)$", re.MULTILINE)
+
+# ストリーミングで 1 回に返す文字数。
+MOCK_STREAM_CHUNK_CHARS = 16
+
+
+def fixed_latency(seconds: float) -> LatencyDistribution:
+    """常に同じ待ち時間を返す。"""
+    return lambda _: seconds
+
+
+def uniform_latency(low: float, high: float) -> LatencyDistribution:
+    """low 以上 high 以下の一様分布に従う待ち時間を返す。"""
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal_latency(median: float, sigma: float = 0.5) -> LatencyDistribution:
+    """中央値 median の対数正規分布に従う待ち時間を返す（実際の API のように裾の重い分布）。"""
+    return lambda rng: median * rng.lognormvariate(0.0, sigma)
+
+
+class MockAPIError(Exception):
+    """モックが注入する API エラー。SDK の例外と同様に status_code と response を持つ。"""
+
+    def __init__(self, status_code: int, retry_after: float | None = None) -> None:
+        import httpx
+
+        super().__init__(f"Mock API error ({status_code})")
+        self.status_code = status_code
+        headers = {"retry-after-ms": str(int(retry_after * 1000))} if retry_after is not None else {}
+        self.response = httpx.Response(status_code, headers=headers)
+
+
+class MockStats(TypedDict):
+    """モックへの呼び出し回数と、注入した障害の回数。"""
+
+    calls: int
+    rate_limited: int
+    server_errors: int
+    malformed: int
+
+
+def schema_response(schema: dict[str, Any], rng: random.Random, prompt: str = "") -> Any:
+    """
+    JSON スキーマに適合する値を生成する。
+
+    integer は 1〜5、boolean はランダム、string は固定の文字列を返す。
+    rubric_index を持つ要素の配列は、プロンプト中のルーブリック項目ごとに 1 要素ずつ生成する。
+    response_index を持つ要素の配列は、プロンプト中の応答ごとに 1 要素ずつ、重複のない rank を付けて生成する。
+    """
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        properties = cast(dict[str, dict[str, Any]], schema.get("properties", {}))
+        return {key: schema_response(value, rng, prompt) for key, value in properties.items()}
+    if schema_type == "array":
+        items = cast(dict[str, Any], schema.get("items", {}))
+        if "rubric_index" in items.get("properties", {}):
+            indices = [int(index) for index in _RUBRIC_LINE_PATTERN.findall(prompt)]
+            return [{**schema_response(items, rng, prompt), "rubric_index": index} for index in indices]
+        if "response_index" in items.get("properties", {}):
+            indices = [int(index) for index in _RESPONSE_HEADING_PATTERN.findall(prompt)]
+            ranks = rng.sample(range(1, len(indices) + 1), len(indices))
+            return [
+                {**schema_response(items, rng, prompt), "response_index": index, "rank": rank}
+                for index, rank in zip(indices, ranks, strict=True)
+            ]
+        return [schema_response(items, rng, prompt) for _ in range(schema.get("minItems", 1))]
+    if schema_type == "integer":
+        return rng.randint(int(schema.get("minimum", 1)), int(schema.get("maximum", 5)))
+    if schema_type == "number":
+        return rng.uniform(float(schema.get("minimum", 0.0)), float(schema.get("maximum", 1.0)))
+    if schema_type == "boolean":
+        return rng.random() < 0.5
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    return "モックの応答です。"
+
+
+class MockBackend:
+    """
+    API を呼び出さずにスキーマに適合する応答を返すバックエンド。
+
+    待ち時間の分布、レート制限（429）・サーバーエラー（503）・不正な JSON の発生率を設定できる。
+    乱数は (seed, モデル名, プロンプト, 同じリクエストの呼び出し回数) から決まるため、
+    並行実行の順序によらず同じ結果になる。スレッドと asyncio の両方から使用できる。
+    トークン数は推定値を models.record_token_usage に記録し、一度送られたプロンプトの共通部分は
+    プロバイダーのコンテキストキャッシュと同様にキャッシュから読み込んだものとして数える。
+    """
+
+    def __init__(
+        self,
+        latency: LatencyDistribution | None = None,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        retry_after: float | None = 0.05,
+        seed: int = 0,
+    ) -> None:
+        """
+        Args:
+            latency: 1 回の呼び出しの待ち時間の分布（指定しない場合は待たない）
+            rate_limit_rate: レート制限（429）を返す確率
+            server_error_rate: サーバーエラー（503）を返す確率
+            malformed_rate: 解釈できない JSON を返す（JSON 生成の結果が None になる）確率
+            retry_after: 429 の応答に付ける Retry-After（秒）（None の場合は付けない）
+            seed: 乱数のシード
+        """
+        self.latency = latency or fixed_latency(0.0)
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.malformed_rate = malformed_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._request_counts: dict[str, int] = {}
+        self._cached_prefixes: set[str] = set()
+        self._stats: MockStats = {"calls": 0, "rate_limited": 0, "server_errors": 0, "malformed": 0}
+
+    def _next_rng(self, model_name: str, request: str) -> random.Random:
+        """リクエストごとの乱数生成器を返す。同じリクエストの 2 回目以降は別の乱数になる。"""
+        digest = hashlib.sha256(f"{self.seed}\0{model_name}\0{request}".encode()).hexdigest()
+        with self._lock:
+            count = self._request_counts.get(digest, 0)
+            self._request_counts[digest] = count + 1
+            self._stats["calls"] += 1
+        return random.Random(f"{digest}:{count}")
+
+    def _inject_error(self, rng: random.Random) -> None:
+        """設定した確率でレート制限・サーバーエラーを送出する。"""
+        draw = rng.random()
+        if draw < self.rate_limit_rate:
+            with self._lock:
+                self._stats["rate_limited"] += 1
+            raise MockAPIError(429, self.retry_after)
+        if draw < self.rate_limit_rate + self.server_error_rate:
+            with self._lock:
+                self._stats["server_errors"] += 1
+            raise MockAPIError(503)
+
+    def _record_usage(
+        self, model_name: str, prompt: str, prompt_prefix: str | None, output: str, finish_reason: str | None = "STOP"
+    ) -> None:
+        """リクエストと応答（output は出力したテキスト）の推定トークン数を記録する。"""
+        prefix_tokens = estimate_tokens(prompt_prefix) if prompt_prefix else 0
+        cached = False
+        if prompt_prefix:
+            with self._lock:
+                key = f"{model_name}\0{prompt_prefix}"
+                cached = key in self._cached_prefixes
+                self._cached_prefixes.add(key)
+        record_token_usage(
+            input_tokens=prefix_tokens + estimate_tokens(prompt),
+            output_tokens=estimate_tokens(output),
+            cached_input_tokens=prefix_tokens if cached else 0,
+            finish_reason=finish_reason,
+        )
+
+    def _json_response(self, rng: random.Random, prompt: str, schema: dict[str, Any]) -> dict[str, Any] | None:
+        """スキーマに適合する応答、または設定した確率で解釈できない応答（None）を返す。"""
+        self._inject_error(rng)
+        if rng.random() < self.malformed_rate:
+            with self._lock:
+                self._stats["malformed"] += 1
+            # 実際のバックエンドと同じく、途中で途切れた JSON は解釈できずに None になる。
+            text = json.dumps(schema_response(schema, rng, prompt), ensure_ascii=False)
+            try:
+                return cast(dict[str, Any], json.loads(text[: len(text) // 2]))
+            except json.JSONDecodeError:
+                return None
+        return cast(dict[str, Any], schema_response(schema, rng, prompt))
+
+    def _text_response(self, rng: random.Random, contents: list[types.Content], request: str) -> str:
+        """会話の最後の発話に対するテキストの応答を返す。"""
+        self._inject_error(rng)
+        text = f"モックの応答です（{len(contents)} ターンの会話に対する応答, #{rng.randrange(10**6)}）。"
+        record_token_usage(
+            input_tokens=estimate_tokens(request), output_tokens=estimate_tokens(text), finish_reason="STOP"
+        )
+        return text
+
+    def generate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None:
+        full_prompt = (prompt_prefix or "") + prompt
+        rng = self._next_rng(model_name, full_prompt)
+        time.sleep(self.latency(rng))
+        response = self._json_response(rng, full_prompt, schema)
+        self._record_usage(model_name, prompt, prompt_prefix, json.dumps(response, ensure_ascii=False))
+        return response
+
+    async def agenerate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None:
+        full_prompt = (prompt_prefix or "") + prompt
+        rng = self._next_rng(model_name, full_prompt)
+        await asyncio.sleep(self.latency(rng))
+        response = self._json_response(rng, full_prompt, schema)
+        self._record_usage(model_name, prompt, prompt_prefix, json.dumps(response, ensure_ascii=False))
+        return response
+
+    async def astream_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> AsyncGenerator[str]:
+        """
+        agenerate_json と同じ応答を MOCK_STREAM_CHUNK_CHARS 文字ずつ返す。
+
+        待ち時間は文字数に比例して断片に配分するため、途中で打ち切ると残りの待ち時間はかからず、
+        出力トークン数も返した分のみが記録される。解釈できない応答の場合は途中で途切れた JSON を返す。
+        """
+        full_prompt = (prompt_prefix or "") + prompt
+        rng = self._next_rng(model_name, full_prompt)
+        latency = self.latency(rng)
+        response = self._json_response(rng, full_prompt, schema)
+        text = json.dumps(response, ensure_ascii=False) if response is not None else '{"'
+        sent = 0
+        try:
+            for start in range(0, len(text), MOCK_STREAM_CHUNK_CHARS):
+                chunk = text[start : start + MOCK_STREAM_CHUNK_CHARS]
+                await asyncio.sleep(latency * len(chunk) / len(text))
+                sent += len(chunk)
+                yield chunk
+        finally:
+            self._record_usage(
+                model_name, prompt, prompt_prefix, text[:sent], "STOP" if sent == len(text) else "CANCELLED"
+            )
+
+    def generate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None:
+        request = _contents_key(contents, system_instruction)
+        rng = self._next_rng(model_name, request)
+        time.sleep(self.latency(rng))
+        return self._text_response(rng, contents, request)
+
+    async def agenerate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None:
+        request = _contents_key(contents, system_instruction)
+        rng = self._next_rng(model_name, request)
+        await asyncio.sleep(self.latency(rng))
+        return self._text_response(rng, contents, request)
+
+    @property
+    def stats(self) -> MockStats:
+        """呼び出し回数と、注入した障害の回数。"""
+        with self._lock:
+            return cast(MockStats, dict(self._stats))
+
+    def reset(self) -> None:
+        """呼び出し回数と統計、キャッシュ済みの共通部分を初期化する（同じリクエストに対しても最初と同じ応答を返すようになる）。"""
+        with self._lock:
+            self._request_counts.clear()
+            self._cached_prefixes.clear()
+            self._stats = {"calls": 0, "rate_limited": 0, "server_errors": 0, "malformed": 0}
+
+
+def _contents_key(contents: list[types.Content], system_instruction: str | None) -> str:
+    """テキスト生成のリクエストを識別する文字列を作る。"""
+    turns = [(content.role, [part.text for part in content.parts or []]) for content in contents]
+    return json.dumps([system_instruction, turns], ensure_ascii=False)
+
+
+def install_mock_backend(backend: MockBackend | None = None, prefix: str = MOCK_MODEL_PREFIX) -> MockBackend:
+    """
+    モックのバックエンドを登録する。以降、prefix で始まるモデル名の呼び出しはモックが応答する。
+
+    Args:
+        backend: 登録するバックエンド（指定しない場合は待ち時間・障害なしのものを生成する）
+        prefix: モックで扱うモデル名の接頭辞
+
+    Returns:
+        登録したバックエンド
+    """
+    mock = backend or MockBackend()
+    register_backend(MOCK_BACKEND_NAME, lambda model_name: model_name.startswith(prefix), mock)
+    return mock
+
+
+def uninstall_mock_backend() -> None:
+    """モックのバックエンドの登録を解除する。"""
+    unregister_backend(MOCK_BACKEND_NAME)
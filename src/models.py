@@ -1,15 +1,348 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import contextlib
+import email.utils
+import importlib
 import json
-import re
-from typing import Any, cast
+import os
+import sys
+import threading
+import time
+import weakref
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable, Collection
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Literal, NamedTuple, Protocol, TypedDict, cast
+
+from .cache import JudgmentCache, make_cache_key
+from .instrumentation import (
+    add_queue_wait,
+    add_transport_retry,
+    add_usage,
+    instrument_call,
+    mark_judgment_cache_hit,
+    mark_request_coalesced,
+)
+from .rate_limit import DEFAULT_BACKOFF_POLICY, RateLimiter, estimate_tokens, get_rate_limiter
+from .structured_output import IncrementalObjectParser, is_valid_json
 
-from anthropic import AnthropicVertex
-from anthropic.types import MessageParam
-from google import genai
-from google.genai import types
+if TYPE_CHECKING:
+    # 型のみ。SDK は providers のモジュールを最初に使うときに読み込む。
+    from anthropic.types import MessageParam
+    from google.genai import types
 
 PROJECT_ID = "..."
 LOCATION = "..."
 
+# PROJECT_ID / LOCATION を上書きする環境変数（ワーカーごとに別のクォータのプロジェクトを使う場合など）。
+PROJECT_ID_ENV = "LLM_JUDGE_PROJECT_ID"
+LOCATION_ENV = "LLM_JUDGE_LOCATION"
+# サービスアカウントキーなどの認証情報ファイルのパスを指定する環境変数（指定しない場合は ADC を使う）。
+CREDENTIALS_FILE_ENV = "LLM_JUDGE_CREDENTIALS_FILE"
+
+# 認証情報ファイルから読み込むときのスコープ。
+_CLOUD_PLATFORM_SCOPE = "https://www.googleapis.com/auth/cloud-platform"
+
+
+class VertexSettings(NamedTuple):
+    """Vertex AI の呼び出しに使うプロジェクト・ロケーション・認証情報。"""
+
+    project_id: str
+    location: str
+    # 認証情報ファイルのパス（None の場合はアプリケーションのデフォルト認証情報を使う）。
+    credentials_file: str | None = None
+
+
+_vertex_settings: VertexSettings | None = None
+
+
+def configure_vertex(
+    project_id: str | None = None, location: str | None = None, credentials_file: str | None = None
+) -> None:
+    """
+    Vertex AI の呼び出しに使うプロジェクト・ロケーション・認証情報を設定する。
+
+    指定しなかった値は環境変数（LLM_JUDGE_PROJECT_ID / LLM_JUDGE_LOCATION / LLM_JUDGE_CREDENTIALS_FILE）、
+    環境変数もない場合は PROJECT_ID / LOCATION を使う。設定後に生成されるクライアントから反映される。
+
+    Args:
+        project_id: Google Cloud のプロジェクト ID
+        location: リージョン（"us-central1" など）
+        credentials_file: サービスアカウントキーなどの認証情報ファイルのパス
+    """
+    global _vertex_settings
+    _vertex_settings = VertexSettings(
+        project_id or os.environ.get(PROJECT_ID_ENV, PROJECT_ID),
+        location or os.environ.get(LOCATION_ENV, LOCATION),
+        credentials_file or os.environ.get(CREDENTIALS_FILE_ENV),
+    )
+
+
+def get_vertex_settings() -> VertexSettings:
+    """現在のプロジェクト・ロケーション・認証情報を取得する（configure_vertex の呼び出し前は環境変数から）。"""
+    if _vertex_settings is not None:
+        return _vertex_settings
+    return VertexSettings(
+        os.environ.get(PROJECT_ID_ENV, PROJECT_ID),
+        os.environ.get(LOCATION_ENV, LOCATION),
+        os.environ.get(CREDENTIALS_FILE_ENV),
+    )
+
+
+def load_vertex_credentials(settings: VertexSettings) -> Any:
+    """
+    settings の認証情報ファイルから認証情報を読み込む。
+
+    Returns:
+        google.auth の認証情報。認証情報ファイルが指定されていない場合は None（デフォルト認証情報を使う）
+    """
+    if settings.credentials_file is None:
+        return None
+    google_auth: Any = importlib.import_module("google.auth")
+    credentials, _ = google_auth.load_credentials_from_file(settings.credentials_file, scopes=[_CLOUD_PLATFORM_SCOPE])
+    return credentials
+
+
+# 非同期呼び出し（agenerate）の同時実行数のデフォルト値。
+DEFAULT_MAX_CONCURRENCY = 8
+
+_max_concurrency = DEFAULT_MAX_CONCURRENCY
+# asyncio.Semaphore は生成されたイベントループでしか使えないため、ループごとに保持する。
+_semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = weakref.WeakKeyDictionary()
+
+
+def set_max_concurrency(limit: int) -> None:
+    """
+    非同期呼び出し（agenerate）全体で共有する同時実行数の上限を設定する。
+
+    Args:
+        limit: 同時に実行する API 呼び出しの最大数（1 以上）
+
+    Raises:
+        ValueError: limit が 1 未満の場合
+    """
+    global _max_concurrency
+    if limit < 1:
+        raise ValueError(f"limit must be at least 1: {limit}")
+    _max_concurrency = limit
+    _semaphores.clear()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """実行中のイベントループに対応するセマフォを取得する。"""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(_max_concurrency)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+@contextlib.asynccontextmanager
+async def _acquire_semaphore() -> AsyncIterator[None]:
+    """同時実行数の枠を確保し、確保までの待ち時間を instrumentation に記録する。"""
+    semaphore = _get_semaphore()
+    started = time.perf_counter()
+    async with semaphore:
+        add_queue_wait(time.perf_counter() - started)
+        yield
+
+
+# キャッシュの利用方法。
+# - "use": キャッシュを読み、ミスした場合は生成結果を書き込む。
+# - "refresh": キャッシュを読まずに生成し、結果で上書きする（不正な結果がキャッシュされていた場合の再生成など）。
+# - "bypass": キャッシュを一切使用しない。
+CacheMode = Literal["use", "refresh", "bypass"]
+
+_cache: JudgmentCache | None = None
+
+
+def set_cache(cache: JudgmentCache | None) -> None:
+    """
+    JSON 生成（generate / agenerate）で使用するキャッシュを設定する。
+
+    Args:
+        cache: 使用するキャッシュ（None の場合はキャッシュを無効にする）
+    """
+    global _cache
+    _cache = cache
+
+
+def get_cache() -> JudgmentCache | None:
+    """現在設定されているキャッシュを取得する。"""
+    return _cache
+
+
+def _get_cache_key(
+    model_name: str,
+    prompt: str,
+    schema: dict[str, Any],
+    temperature: float | None,
+    max_tokens: int | None,
+    cache_mode: CacheMode,
+    sample_index: int,
+) -> str | None:
+    """キャッシュキーを生成する。キャッシュを使用しない場合は None を返す。"""
+    if _cache is None or cache_mode == "bypass":
+        return None
+    return make_cache_key(model_name, prompt, schema, temperature, max_tokens, sample_index)
+
+
+def _read_cache(cache_key: str | None, cache_mode: CacheMode) -> dict[str, Any] | None:
+    """キャッシュから生成結果を読み込む。"""
+    if _cache is None or cache_key is None or cache_mode != "use":
+        return None
+    return _cache.get(cache_key)
+
+
+def _write_cache(cache_key: str | None, result: dict[str, Any] | None, schema: dict[str, Any]) -> None:
+    """生成結果をキャッシュに書き込む。生成に失敗した場合と、結果がスキーマに適合しない場合は書き込まない。"""
+    if _cache is not None and cache_key is not None and result is not None and is_valid_json(result, schema):
+        _cache.put(cache_key, result)
+
+
+# 同じ JSON 生成のリクエストが同時に実行中の場合に、API の呼び出しを 1 回にまとめるか。
+_coalesce_requests = True
+
+
+class _InflightRequest:
+    """実行中の JSON 生成と、その結果を待っている呼び出し元の数。"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task[dict[str, Any] | None]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+# 実行中の JSON 生成（キャッシュの利用方法とキャッシュキー → リクエスト）。タスクはイベントループごとに保持する。
+_inflight_requests: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, _InflightRequest]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def set_request_coalescing(enabled: bool) -> None:
+    """
+    agenerate で同じ JSON 生成のリクエストを 1 回の API 呼び出しにまとめるかを設定する（デフォルトは有効）。
+
+    モデル名・プロンプト・スキーマ・生成パラメータ・sample_index・キャッシュの利用方法がすべて同じリクエストが実行中の場合、
+    後から来たリクエストは API を呼び出さずに実行中のリクエストの結果を待つ。
+
+    Args:
+        enabled: まとめる場合は True
+    """
+    global _coalesce_requests
+    _coalesce_requests = enabled
+
+
+async def _acoalesce(key: str, call: Callable[[], Awaitable[dict[str, Any] | None]]) -> dict[str, Any] | None:
+    """
+    同じキーのリクエストが実行中であればその結果を待ち、なければ call を実行する。
+
+    call は呼び出し元とは別のタスクで実行し、結果を待つ呼び出し元がすべてキャンセルされた場合にのみキャンセルする。
+    結果の辞書は呼び出し元ごとに複製して返す（呼び出し元が結果を書き換えても他に影響しないように）。
+    """
+    requests = _inflight_requests.setdefault(asyncio.get_running_loop(), {})
+    request = requests.get(key)
+    if request is None:
+        request = _InflightRequest(asyncio.ensure_future(call()))
+        requests[key] = request
+        request.task.add_done_callback(lambda _: requests.pop(key, None) if requests.get(key) is request else None)
+    else:
+        mark_request_coalesced()
+    request.waiters += 1
+    try:
+        result = await asyncio.shield(request.task)
+    finally:
+        request.waiters -= 1
+        if request.waiters == 0 and not request.task.done():
+            # 結果を待つ呼び出し元がいなくなったため、後から来たリクエストが合流しないよう取り除いてキャンセルする。
+            if requests.get(key) is request:
+                del requests[key]
+            request.task.cancel()
+    return None if result is None else dict(result)
+
+
+# 通信エラー（レート制限、サーバーエラーを含む）時の最大リトライ回数のデフォルト値。
+DEFAULT_MAX_TRANSPORT_RETRIES = 8
+
+
+class TransportRetryError(Exception):
+    """通信エラーが続き、リトライ回数の上限に達したことを表す例外。"""
+
+
+# リトライで回復が見込める HTTP ステータスコード（529 は Anthropic の過負荷エラー）。
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+
+def get_status_code(error: BaseException) -> int | None:
+    """
+    SDK の例外から HTTP ステータスコードを取得する。
+
+    Anthropic の APIStatusError は status_code、google-genai の APIError は code に保持している。
+    """
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+# リトライで回復が見込める通信エラーの例外クラス（モジュール名, クラス名）。
+# SDK を読み込まずに判定するため、読み込み済みのモジュールのみを確認する（読み込まれていなければ送出されない）。
+_TRANSPORT_ERROR_TYPES = (("httpx", "TransportError"), ("anthropic", "APIConnectionError"))
+
+
+def _is_transport_error(error: BaseException) -> bool:
+    """SDK・HTTP クライアントの通信エラーかどうかを判定する。"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    for module_name, class_name in _TRANSPORT_ERROR_TYPES:
+        module = sys.modules.get(module_name)
+        if module is not None and isinstance(error, getattr(module, class_name)):
+            return True
+    return False
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """レート制限、サーバーエラー、通信エラーなど、リトライで回復が見込める例外かどうかを判定する。"""
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return _is_transport_error(error)
+
+
+def get_retry_after(error: BaseException) -> float | None:
+    """
+    SDK の例外に含まれる HTTP 応答の Retry-After ヘッダーから待ち時間（秒）を取得する。
+
+    Returns:
+        待ち時間（秒）。ヘッダーが存在しない、または解釈できない場合は None
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    # HTTP-date 形式の場合。
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
 
 def _is_gemini_model(model_name: str) -> bool:
     """モデル名が Gemini かどうかを判定する。"""
@@ -21,26 +354,40 @@ def _is_claude_model(model_name: str) -> bool:
     return "claude" in model_name.lower()
 
 
-def _get_model(model_name: str) -> genai.Client | AnthropicVertex:
-    """
-    モデル名に応じて適切なモデルインスタンスを取得する。
+# クライアントの種類。
+GEMINI_PROVIDER = "gemini"
+CLAUDE_PROVIDER = "claude"
 
-    Args:
-        model_name: モデル名（"gemini-2.5-pro", "gemini-2.0-flash", "claude-sonnet-4-5" など）
+# クライアントの種類ごとに、SDK を使う実装のモジュール（このパッケージからの相対パス）。
+# モジュールは create_client / create_async_client / aclose_async_client と、バックエンドの BACKEND を定義する。
+# SDK の読み込みには時間がかかるため、モジュールはそのクライアントの種類を最初に使うときに読み込む。
+_PROVIDER_MODULES = {
+    GEMINI_PROVIDER: ".providers.gemini",
+    CLAUDE_PROVIDER: ".providers.claude",
+}
 
-    Returns:
-        genai.Client または AnthropicVertex インスタンス
+# (provider, Vertex AI の設定) をキーとするクライアントのキャッシュ。
+_ClientKey = tuple[str, VertexSettings]
+
+_clients: dict[_ClientKey, Any] = {}
+_clients_lock = threading.Lock()
+# 非同期クライアントの接続プールはイベントループに紐づくため、ループごとに保持する。
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[_ClientKey, Any]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_provider(model_name: str) -> str:
+    """
+    モデル名からクライアントの種類を判定する。
 
     Raises:
         ValueError: サポートされていないモデル名が指定された場合
     """
     if _is_gemini_model(model_name):
-        return genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
+        return GEMINI_PROVIDER
     elif _is_claude_model(model_name):
-        return AnthropicVertex(
-            project_id=PROJECT_ID,
-            region=LOCATION,
-        )
+        return CLAUDE_PROVIDER
     else:
         raise ValueError(
             f"Unsupported model name: {model_name}. "
@@ -49,153 +396,580 @@ def _get_model(model_name: str) -> genai.Client | AnthropicVertex:
         )
 
 
-def _generate_json_gemini(
-    model_name: str,
-    prompt: str,
-    schema: dict[str, Any],
-    temperature: float | None = None,
-    max_tokens: int | None = None,
-) -> dict[str, Any] | None:
-    """Gemini モデルを呼び出して JSON を生成する。"""
-    model = _get_model(model_name)
-    assert isinstance(model, genai.Client)
+def _load_module(name: str) -> ModuleType:
+    """モジュールを読み込む（"." で始まる場合はこのパッケージからの相対パス）。読み込み済みの場合はそれを返す。"""
+    return importlib.import_module(name, __package__)
 
-    config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
-    if temperature is not None:
-        config.temperature = temperature
-    if max_tokens is not None:
-        config.max_output_tokens = max_tokens
 
-    response = model.models.generate_content(
-        model=model_name, contents=types.Content(role="user", parts=[types.Part(text=prompt)]), config=config
-    )
-    try:
-        if not response.text:
-            return None
-        return cast(dict[str, Any], json.loads(response.text))
-    except (json.JSONDecodeError, ValueError):
-        # response.text might raise ValueError if no content
-        print("Failed to parse JSON or no content")
-        return None
+def _load_provider(provider: str) -> ModuleType:
+    """クライアントの種類の実装のモジュールを読み込む（初回のみ SDK が読み込まれる）。"""
+    return _load_module(_PROVIDER_MODULES[provider])
+
+
+def _get_model(model_name: str) -> Any:
+    """
+    モデル名に応じて適切なモデルインスタンスを取得する。
+
+    クライアントは (provider, プロジェクト・ロケーション・認証情報) ごとに 1 つだけ生成して使い回すため、
+    認証情報と HTTP の接続プール（keep-alive）は呼び出し間で共有される。スレッドセーフ。
+
+    Args:
+        model_name: モデル名（"gemini-2.5-pro", "gemini-2.0-flash", "claude-sonnet-4-5" など）
+
+    Returns:
+        genai.Client または AnthropicVertex インスタンス
+
+    Raises:
+        ValueError: サポートされていないモデル名が指定された場合
+    """
+    key = (_get_provider(model_name), get_vertex_settings())
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _load_provider(key[0]).create_client(key[1])
+                _clients[key] = client
+    return client
 
 
-def _extract_json_from_text(text: str) -> str | None:
+def _get_async_model(model_name: str) -> Any:
     """
-    テキストから JSON を抽出する。
-    マークダウンのコードブロック（```json ... ```）を除去する。
+    モデル名に応じて非同期呼び出し用のモデルインスタンスを取得する。
+
+    クライアントは実行中のイベントループと (provider, プロジェクト・ロケーション・認証情報) ごとに 1 つだけ生成する。
+    Gemini は genai.Client の aio プロパティから非同期 API を利用するため、genai.Client をそのまま返す。
+
+    Args:
+        model_name: モデル名
+
+    Returns:
+        genai.Client または AsyncAnthropicVertex インスタンス
+
+    Raises:
+        ValueError: サポートされていないモデル名が指定された場合
+    """
+    key = (_get_provider(model_name), get_vertex_settings())
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(key)
+    if client is None:
+        client = _load_provider(key[0]).create_async_client(key[1])
+        clients[key] = client
+    return client
+
+
+def close_clients() -> None:
+    """
+    同期呼び出し用にキャッシュしているクライアントをすべて閉じる。
+
+    閉じた後に generate を呼び出した場合は、新しいクライアントが生成される。
+    プロセス終了時にも自動的に呼び出される。
     """
-    text = text.strip()
-    # ```json と ``` を除去する。
-    text = re.sub(r"^```json\s*", "", text, flags=re.MULTILINE)
-    text = re.sub(r"^```\s*$", "", text, flags=re.MULTILINE)
-    text = text.strip()
-    return text
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
 
 
-def _generate_json_claude(
+async def aclose_clients() -> None:
+    """
+    実行中のイベントループ用にキャッシュしている非同期クライアントをすべて閉じる。
+
+    閉じた後に agenerate を呼び出した場合は、新しいクライアントが生成される。
+    """
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for (provider, _), client in clients.items():
+        await _load_provider(provider).aclose_async_client(client)
+
+
+atexit.register(close_clients)
+
+
+class TokenUsage(TypedDict):
+    """API 呼び出しのトークン数の累計。"""
+
+    requests: int
+    # 入力トークン数（キャッシュから読み込んだものを含む）。
+    input_tokens: int
+    # 入力トークンのうち、コンテキストキャッシュから読み込んだもの。
+    cached_input_tokens: int
+    # 入力トークンのうち、コンテキストキャッシュに書き込んだもの（Claude のみ）。
+    cache_write_tokens: int
+    output_tokens: int
+
+
+_token_usage: TokenUsage = {
+    "requests": 0,
+    "input_tokens": 0,
+    "cached_input_tokens": 0,
+    "cache_write_tokens": 0,
+    "output_tokens": 0,
+}
+_token_usage_lock = threading.Lock()
+
+
+def record_token_usage(
+    input_tokens: int,
+    output_tokens: int,
+    cached_input_tokens: int = 0,
+    cache_write_tokens: int = 0,
+    finish_reason: str | None = None,
+) -> None:
+    """
+    API 呼び出し 1 回分のトークン数を累計に加える（バックエンドから呼び出す）。
+
+    instrumentation で計測中の呼び出しがある場合は、その計測結果にもトークン数と終了理由を記録する。
+    """
+    add_usage(input_tokens, output_tokens, cached_input_tokens, finish_reason)
+    with _token_usage_lock:
+        _token_usage["requests"] += 1
+        _token_usage["input_tokens"] += input_tokens
+        _token_usage["cached_input_tokens"] += cached_input_tokens
+        _token_usage["cache_write_tokens"] += cache_write_tokens
+        _token_usage["output_tokens"] += output_tokens
+
+
+def get_token_usage() -> TokenUsage:
+    """reset_token_usage を呼び出してからのトークン数の累計を取得する。"""
+    with _token_usage_lock:
+        return cast(TokenUsage, dict(_token_usage))
+
+
+def reset_token_usage() -> None:
+    """トークン数の累計を 0 に戻す。"""
+    with _token_usage_lock:
+        for key in _token_usage:
+            _token_usage[key] = 0  # type: ignore[literal-required]
+
+
+def get_cached_token_ratio(usage: TokenUsage) -> float:
+    """入力トークンのうち、コンテキストキャッシュから読み込んだものの割合。"""
+    if usage["input_tokens"] == 0:
+        return 0.0
+    return usage["cached_input_tokens"] / usage["input_tokens"]
+
+
+# コンテキストキャッシュ（複数のリクエストで共通するプロンプトの前半の再利用）の設定。
+# - Claude: 共通部分に cache_control を付ける（最小トークン数に満たない場合は API 側で無視される）。
+# - Gemini: 共通部分の推定トークン数が GEMINI_CONTEXT_CACHE_MIN_TOKENS 以上の場合に cached content を作成する。
+#   それ未満の場合も、共通部分をプロンプトの先頭に置くことで暗黙的なキャッシュの対象になる。
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = 4096
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = 600
+
+
+class ContextCacheSettings(NamedTuple):
+    """コンテキストキャッシュの設定（configure_context_cache の引数と同じ）。"""
+
+    enabled: bool
+    gemini_min_tokens: int
+    gemini_ttl_seconds: int
+
+
+_context_cache_settings = ContextCacheSettings(True, GEMINI_CONTEXT_CACHE_MIN_TOKENS, GEMINI_CONTEXT_CACHE_TTL_SECONDS)
+
+
+def configure_context_cache(
+    enabled: bool = True,
+    gemini_min_tokens: int = GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+    gemini_ttl_seconds: int = GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+) -> None:
+    """
+    コンテキストキャッシュの設定を変更する。
+
+    Args:
+        enabled: コンテキストキャッシュを使用するか（False の場合は共通部分を連結したプロンプトをそのまま送る）
+        gemini_min_tokens: Gemini の cached content を作成する共通部分の最小の推定トークン数
+        gemini_ttl_seconds: Gemini の cached content の有効期間（秒）
+    """
+    global _context_cache_settings
+    _context_cache_settings = ContextCacheSettings(enabled, gemini_min_tokens, gemini_ttl_seconds)
+
+
+def get_context_cache_settings() -> ContextCacheSettings:
+    """現在のコンテキストキャッシュの設定を返す（バックエンドから参照する）。"""
+    return _context_cache_settings
+
+
+def _build_json_claude_kwargs(
     model_name: str,
     prompt: str,
     schema: dict[str, Any],
-    temperature: float | None = None,
-    max_tokens: int | None = None,
-) -> dict[str, Any] | None:
-    """Claude モデルを呼び出して JSON を生成する。"""
-    model = _get_model(model_name)
-    assert isinstance(model, AnthropicVertex)
+    temperature: float | None,
+    max_tokens: int | None,
+    prompt_prefix: str | None = None,
+) -> dict[str, Any]:
+    """
+    Claude の JSON 生成用の messages.create 引数を構築する。
 
+    対話的な呼び出し（providers.claude）とバッチの入力（batch）で同じプロンプトにするため、SDK を読み込まずに使える
+    ここに置く。
+    """
     # JSON スキーマをプロンプトに追加する。
     enhanced_prompt = prompt + f"\n\nReturn valid JSON matching this schema: {json.dumps(schema, ensure_ascii=False)}"
 
-    messages: list[MessageParam] = [{"role": "user", "content": enhanced_prompt}]
+    messages: list[MessageParam]
+    if prompt_prefix and _context_cache_settings.enabled:
+        # 共通部分を別のブロックにして cache_control を付け、同じ共通部分を持つリクエスト間で再利用する。
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt_prefix, "cache_control": {"type": "ephemeral"}},
+                    {"type": "text", "text": enhanced_prompt},
+                ],
+            }
+        ]
+    else:
+        messages = [{"role": "user", "content": (prompt_prefix or "") + enhanced_prompt}]
     kwargs: dict[str, Any] = {"model": model_name, "messages": messages}
     if max_tokens is not None:
         kwargs["max_tokens"] = max_tokens
     if temperature is not None:
         kwargs["temperature"] = temperature
+    return kwargs
 
-    response = model.messages.create(**kwargs)
 
-    if not response.content:
-        return None
+class Backend(Protocol):
+    """
+    LLM の呼び出し先（プロバイダー）。
 
-    content_block = response.content[0]
-    if content_block.type == "text":
-        # マークダウンのコードブロックを除去して JSON を抽出する。
-        json_text = _extract_json_from_text(content_block.text)
-        if json_text is None:
-            print(f"Failed to extract JSON from: {content_block.text}")
-            return None
+    register_backend で登録すると、モデル名に応じて generate / agenerate から呼び出される。
+    JSON 生成は応答を解釈できない場合に None を返し、通信エラーは SDK と同様に例外を送出する
+    （status_code 属性が RETRYABLE_STATUS_CODES に含まれる例外はリトライされる）。
+    prompt_prefix が指定された場合、プロンプトは prompt_prefix + prompt であり、
+    prompt_prefix は同じ内容のまま多くのリクエストで共有される（コンテキストキャッシュの対象にできる）。
+    """
 
-        try:
-            return cast(dict[str, Any], json.loads(json_text))
-        except json.JSONDecodeError:
-            print(f"Failed to parse JSON: {json_text}")
-            return None
+    def generate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None: ...
+
+    async def agenerate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None: ...
+
+    def generate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None: ...
+
+    async def agenerate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None: ...
+
+
+class StreamingBackend(Backend, Protocol):
+    """
+    JSON の生成結果をテキストの断片として順に返せるバックエンド（astream_generate_json から呼び出される）。
+
+    astream_json は非同期ジェネレーターで、途中で aclose された場合は生成を打ち切る（応答の受信をやめる）。
+    トークン数は、打ち切った場合もそれまでの分を record_token_usage に記録する。
+    """
+
+    def astream_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> AsyncGenerator[str]: ...
+
+
+class _LazyBackend:
+    """最初の呼び出しでモジュールを読み込み、そのモジュールの BACKEND に処理を任せるバックエンド。"""
+
+    def __init__(self, module_name: str) -> None:
+        """
+        Args:
+            module_name: BACKEND を定義するモジュール（"." で始まる場合はこのパッケージからの相対パス）
+        """
+        self.module_name = module_name
+        self._backend: Backend | None = None
+
+    @property
+    def backend(self) -> Backend:
+        """読み込んだモジュールの BACKEND（初回のみモジュールを読み込む）。"""
+        if self._backend is None:
+            self._backend = cast(Backend, _load_module(self.module_name).BACKEND)
+        return self._backend
+
+    def generate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None:
+        return self.backend.generate_json(model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+
+    async def agenerate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None:
+        return await self.backend.agenerate_json(model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+
+    def generate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None:
+        return self.backend.generate_text(model_name, contents, system_instruction, temperature, max_tokens)
+
+    async def agenerate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None:
+        return await self.backend.agenerate_text(model_name, contents, system_instruction, temperature, max_tokens)
 
-    return None
 
+# (名前, モデル名の判定関数, バックエンド) の一覧。先頭から順にモデル名を判定する。
+# Gemini / Claude は SDK を読み込まずに登録し、最初の呼び出しで providers のモジュールを読み込む。
+_backends: list[tuple[str, Callable[[str], bool], Backend]] = [
+    (GEMINI_PROVIDER, _is_gemini_model, _LazyBackend(_PROVIDER_MODULES[GEMINI_PROVIDER])),
+    (CLAUDE_PROVIDER, _is_claude_model, _LazyBackend(_PROVIDER_MODULES[CLAUDE_PROVIDER])),
+]
+_backends_lock = threading.Lock()
 
-def _generate_text_gemini(
+
+def register_backend(name: str, matches: Callable[[str], bool], backend: Backend | str) -> None:
+    """
+    バックエンドを登録する。登録済みのバックエンド（Gemini / Claude を含む）より優先してモデル名を判定する。
+
+    同じ名前のバックエンドが登録済みの場合は置き換える。バックエンドの代わりにモジュール名を指定した場合は、
+    そのモデル名が最初に呼び出されたときにモジュールを読み込み、モジュールの BACKEND を使う
+    （SDK の読み込みを実際に使うときまで遅らせる）。
+
+    Args:
+        name: バックエンドの名前
+        matches: モデル名がこのバックエンドで扱うものかどうかを判定する関数
+        backend: バックエンド、または BACKEND を定義するモジュールの名前（"mypackage.backend" など）
+    """
+    if isinstance(backend, str):
+        backend = _LazyBackend(backend)
+    with _backends_lock:
+        _backends[:] = [entry for entry in _backends if entry[0] != name]
+        _backends.insert(0, (name, matches, backend))
+
+
+def unregister_backend(name: str) -> None:
+    """登録したバックエンドを削除する。"""
+    with _backends_lock:
+        _backends[:] = [entry for entry in _backends if entry[0] != name]
+
+
+def _get_backend(model_name: str) -> Backend:
+    """
+    モデル名に対応するバックエンドを取得する。
+
+    Raises:
+        ValueError: 対応するバックエンドが登録されていない場合
+    """
+    with _backends_lock:
+        for _, matches, backend in _backends:
+            if matches(model_name):
+                return backend
+    raise ValueError(f"Unknown model: {model_name}")
+
+
+async def _agenerate_json_chunk(
+    backend: Backend,
     model_name: str,
-    contents: list[types.Content],
-    system_instruction: str | None = None,
-    temperature: float | None = None,
-    max_tokens: int | None = None,
-) -> str | None:
-    """Gemini モデルを呼び出してテキストを生成する。"""
-    model = _get_model(model_name)
-    assert isinstance(model, genai.Client)
+    prompt: str,
+    schema: dict[str, Any],
+    temperature: float | None,
+    max_tokens: int | None,
+    prompt_prefix: str | None,
+) -> AsyncGenerator[str]:
+    """ストリーミングに対応していないバックエンドの生成結果を、1 つの断片として返す。"""
+    result = await backend.agenerate_json(model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+    if result is not None:
+        yield json.dumps(result, ensure_ascii=False)
 
-    config = types.GenerateContentConfig()
-    if system_instruction:
-        config.system_instruction = system_instruction
-    if temperature is not None:
-        config.temperature = temperature
-    if max_tokens is not None:
-        config.max_output_tokens = max_tokens
 
-    response = model.models.generate_content(model=model_name, contents=contents, config=config)
-    return response.text
+def _open_json_stream(
+    model_name: str,
+    prompt: str,
+    schema: dict[str, Any],
+    temperature: float | None,
+    max_tokens: int | None,
+    prompt_prefix: str | None,
+) -> AsyncGenerator[str]:
+    """モデル名に対応するバックエンドで、JSON の生成結果を断片ごとに返すジェネレーターを開始する。"""
+    backend = _get_backend(model_name)
+    if isinstance(backend, _LazyBackend):
+        backend = backend.backend
+    if not hasattr(backend, "astream_json"):
+        return _agenerate_json_chunk(backend, model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+    return cast(StreamingBackend, backend).astream_json(
+        model_name, prompt, schema, temperature, max_tokens, prompt_prefix
+    )
 
 
-def _generate_text_claude(
+def _generate_json(
+    model_name: str,
+    prompt: str,
+    schema: dict[str, Any],
+    temperature: float | None,
+    max_tokens: int | None,
+    prompt_prefix: str | None = None,
+) -> dict[str, Any] | None:
+    """モデル名に対応するバックエンドで JSON を生成する。"""
+    return _get_backend(model_name).generate_json(model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+
+
+async def _agenerate_json(
+    model_name: str,
+    prompt: str,
+    schema: dict[str, Any],
+    temperature: float | None,
+    max_tokens: int | None,
+    prompt_prefix: str | None = None,
+) -> dict[str, Any] | None:
+    """モデル名に対応するバックエンドで非同期に JSON を生成する。"""
+    backend = _get_backend(model_name)
+    async with _acquire_semaphore():
+        return await backend.agenerate_json(model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+
+
+def _generate_text(
     model_name: str,
     contents: list[types.Content],
-    system_instruction: str | None = None,
-    temperature: float | None = None,
-    max_tokens: int | None = None,
+    system_instruction: str | None,
+    temperature: float | None,
+    max_tokens: int | None,
 ) -> str | None:
-    """Claude モデルを呼び出してテキストを生成する。"""
-    model = _get_model(model_name)
-    assert isinstance(model, AnthropicVertex)
-
-    # Content リストを Anthropic の messages 形式に変換する。
-    messages: list[MessageParam] = []
-    for content in contents:
-        text_content = content.parts[0].text if content.parts and content.parts[0].text else ""
-        if content.role == "user":
-            messages.append({"role": "user", "content": text_content})
-        elif content.role == "model":
-            messages.append({"role": "assistant", "content": text_content})
+    """モデル名に対応するバックエンドでテキストを生成する。"""
+    return _get_backend(model_name).generate_text(model_name, contents, system_instruction, temperature, max_tokens)
 
-    kwargs: dict[str, Any] = {"model": model_name, "messages": messages}
-    if system_instruction:
-        kwargs["system"] = system_instruction
-    if max_tokens is not None:
-        kwargs["max_tokens"] = max_tokens
-    if temperature is not None:
-        kwargs["temperature"] = temperature
 
-    response = model.messages.create(**kwargs)
+async def _agenerate_text(
+    model_name: str,
+    contents: list[types.Content],
+    system_instruction: str | None,
+    temperature: float | None,
+    max_tokens: int | None,
+) -> str | None:
+    """モデル名に対応するバックエンドで非同期にテキストを生成する。"""
+    backend = _get_backend(model_name)
+    async with _acquire_semaphore():
+        return await backend.agenerate_text(model_name, contents, system_instruction, temperature, max_tokens)
 
-    if not response.content:
-        return None
 
-    content_block = response.content[0]
-    if content_block.type == "text":
-        return str(content_block.text)
+def _estimate_request_tokens(
+    prompt: str | None, contents: list[types.Content] | None, system_instruction: str | None
+) -> int:
+    """レート制限用にリクエストの入力トークン数を概算する。"""
+    texts = [prompt or "", system_instruction or ""]
+    for content in contents or []:
+        texts.extend(part.text for part in content.parts or [] if part.text)
+    return sum(estimate_tokens(text) for text in texts)
 
-    return None
+
+def _get_transport_retry_delay(error: BaseException, attempt: int, limiter: RateLimiter) -> float:
+    """
+    通信エラー後のリトライまでの待ち時間（秒）を決める。
+
+    Retry-After ヘッダーがあればそれに従い、なければ指数バックオフ（ジッター付き）で待つ。
+    レート制限（429）の場合は、同じモデルへの他の呼び出しも同じだけ停止させる。
+    """
+    retry_after = get_retry_after(error)
+    delay = retry_after if retry_after is not None else DEFAULT_BACKOFF_POLICY.delay(attempt)
+    if get_status_code(error) == 429 or retry_after is not None:
+        limiter.penalize(delay)
+    return delay
+
+
+def _call_with_transport_retry[T](
+    model_name: str, request_tokens: int, max_transport_retries: int, call: Callable[[], T]
+) -> T:
+    """
+    レート制限に従って call を呼び出し、リトライで回復が見込める例外の場合はバックオフしてリトライする。
+
+    Raises:
+        TransportRetryError: リトライ回数の上限に達した場合
+    """
+    limiter = get_rate_limiter(model_name)
+    for attempt in range(1, max_transport_retries + 2):
+        started = time.perf_counter()
+        limiter.acquire(request_tokens)
+        add_queue_wait(time.perf_counter() - started)
+        try:
+            return call()
+        except Exception as error:
+            if not is_retryable_error(error):
+                raise
+            if attempt > max_transport_retries:
+                raise TransportRetryError(f"{model_name}: {error}") from error
+            delay = _get_transport_retry_delay(error, attempt, limiter)
+            add_transport_retry()
+            print(
+                f"Warning: Transport attempt {attempt}/{max_transport_retries} - {error}. Retrying in {delay:.1f}s..."
+            )
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+async def _acall_with_transport_retry[T](
+    model_name: str, request_tokens: int, max_transport_retries: int, call: Callable[[], Awaitable[T]]
+) -> T:
+    """_call_with_transport_retry の非同期版。"""
+    limiter = get_rate_limiter(model_name)
+    for attempt in range(1, max_transport_retries + 2):
+        started = time.perf_counter()
+        await limiter.aacquire(request_tokens)
+        add_queue_wait(time.perf_counter() - started)
+        try:
+            return await call()
+        except Exception as error:
+            if not is_retryable_error(error):
+                raise
+            if attempt > max_transport_retries:
+                raise TransportRetryError(f"{model_name}: {error}") from error
+            delay = _get_transport_retry_delay(error, attempt, limiter)
+            add_transport_retry()
+            print(
+                f"Warning: Transport attempt {attempt}/{max_transport_retries} - {error}. Retrying in {delay:.1f}s..."
+            )
+            await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
 
 
 def generate(
@@ -206,10 +980,18 @@ def generate(
     system_instruction: str | None = None,
     temperature: float | None = None,
     max_tokens: int | None = 8192,
+    cache_mode: CacheMode = "use",
+    sample_index: int = 0,
+    max_transport_retries: int = DEFAULT_MAX_TRANSPORT_RETRIES,
+    prompt_prefix: str | None = None,
 ) -> str | dict[str, Any] | None:
     """
     LLM からテキストまたは JSON を生成する。
 
+    set_cache でキャッシュが設定されている場合、JSON 生成の結果はキャッシュされる。
+    API の呼び出しは rate_limit.configure_rate_limit で設定したモデルごとのレート制限に従い、
+    レート制限（429）やサーバーエラー、通信エラーの場合はバックオフしてリトライする。
+
     Args:
         model_name: モデル名（"gemini-2.5-pro", "gemini-2.0-flash", "claude-sonnet-4-5" など）
         prompt: プロンプト文字列（JSON 生成時に使用）
@@ -218,27 +1000,205 @@ def generate(
         system_instruction: システムプロンプト（オプション）
         temperature: 生成のランダム性を制御する温度パラメータ（0.0-1.0、None の場合はモデルのデフォルト値）
         max_tokens: 生成する最大トークン数（デフォルト: 8192）
+        cache_mode: キャッシュの利用方法（"use": 読み書きする、"refresh": 読まずに上書きする、"bypass": 使用しない）
+        sample_index: 同じリクエストから独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+        max_transport_retries: 通信エラー時の最大リトライ回数
+        prompt_prefix: 多くのリクエストで共通するプロンプトの前半（JSON 生成時に使用）。
+            プロンプト全体は prompt_prefix + prompt となり、プロバイダーのコンテキストキャッシュで再利用される
 
     Returns:
         生成されたテキスト、JSON オブジェクト（辞書）、または None
+
+    Raises:
+        TransportRetryError: 通信エラーのリトライ回数の上限に達した場合
     """
-    if schema is not None:
-        # JSON 生成モード。
-        if prompt is None:
-            raise ValueError("prompt is required when schema is specified")
-        if _is_gemini_model(model_name):
-            return _generate_json_gemini(model_name, prompt, schema, temperature, max_tokens)
-        elif _is_claude_model(model_name):
-            return _generate_json_claude(model_name, prompt, schema, temperature, max_tokens)
+    with instrument_call(model_name, "json" if schema is not None else "text", sample_index):
+        if schema is not None:
+            # JSON 生成モード。
+            if prompt is None:
+                raise ValueError("prompt is required when schema is specified")
+            json_prompt = prompt
+            # キャッシュキーとレート制限は、共通部分を含むプロンプト全体に対して計算する。
+            full_prompt = (prompt_prefix or "") + prompt
+            cache_key = _get_cache_key(
+                model_name, full_prompt, schema, temperature, max_tokens, cache_mode, sample_index
+            )
+            cached = _read_cache(cache_key, cache_mode)
+            if cached is not None:
+                mark_judgment_cache_hit()
+                return cached
+            request_tokens = _estimate_request_tokens(full_prompt, contents, system_instruction)
+            result = _call_with_transport_retry(
+                model_name,
+                request_tokens,
+                max_transport_retries,
+                lambda: _generate_json(model_name, json_prompt, schema, temperature, max_tokens, prompt_prefix),
+            )
+            _write_cache(cache_key, result, schema)
+            return result
         else:
-            raise ValueError(f"Unknown model: {model_name}")
-    else:
-        # テキスト生成モード。
-        if contents is None:
-            raise ValueError("contents is required when schema is not specified")
-        if _is_gemini_model(model_name):
-            return _generate_text_gemini(model_name, contents, system_instruction, temperature, max_tokens)
-        elif _is_claude_model(model_name):
-            return _generate_text_claude(model_name, contents, system_instruction, temperature, max_tokens)
+            # テキスト生成モード。
+            if contents is None:
+                raise ValueError("contents is required when schema is not specified")
+            text_contents = contents
+            request_tokens = _estimate_request_tokens(prompt, contents, system_instruction)
+            return _call_with_transport_retry(
+                model_name,
+                request_tokens,
+                max_transport_retries,
+                lambda: _generate_text(model_name, text_contents, system_instruction, temperature, max_tokens),
+            )
+
+
+async def agenerate(
+    model_name: str,
+    prompt: str | None = None,
+    contents: list[types.Content] | None = None,
+    schema: dict[str, Any] | None = None,
+    system_instruction: str | None = None,
+    temperature: float | None = None,
+    max_tokens: int | None = 8192,
+    cache_mode: CacheMode = "use",
+    sample_index: int = 0,
+    max_transport_retries: int = DEFAULT_MAX_TRANSPORT_RETRIES,
+    prompt_prefix: str | None = None,
+) -> str | dict[str, Any] | None:
+    """
+    generate の非同期版。
+
+    同時に実行される API 呼び出しの数は set_max_concurrency で設定した上限に制限される。
+    JSON 生成では、同じリクエストが実行中の場合は API を呼び出さずにその結果を待つ（set_request_coalescing）。
+    引数と戻り値は generate と同じ。
+    """
+    with instrument_call(model_name, "json" if schema is not None else "text", sample_index):
+        if schema is not None:
+            # JSON 生成モード。
+            if prompt is None:
+                raise ValueError("prompt is required when schema is specified")
+            json_prompt = prompt
+            # キャッシュキーとレート制限は、共通部分を含むプロンプト全体に対して計算する。
+            full_prompt = (prompt_prefix or "") + prompt
+            cache_key = _get_cache_key(
+                model_name, full_prompt, schema, temperature, max_tokens, cache_mode, sample_index
+            )
+            cached = _read_cache(cache_key, cache_mode)
+            if cached is not None:
+                mark_judgment_cache_hit()
+                return cached
+            request_tokens = _estimate_request_tokens(full_prompt, contents, system_instruction)
+            json_schema = schema
+
+            async def call() -> dict[str, Any] | None:
+                result = await _acall_with_transport_retry(
+                    model_name,
+                    request_tokens,
+                    max_transport_retries,
+                    lambda: _agenerate_json(
+                        model_name, json_prompt, json_schema, temperature, max_tokens, prompt_prefix
+                    ),
+                )
+                _write_cache(cache_key, result, json_schema)
+                return result
+
+            if not _coalesce_requests:
+                return await call()
+            # "refresh" のリクエスト（不正な結果の再試行など）が "use" の実行中のリクエストに合流して
+            # 同じ結果を受け取らないよう、キャッシュの利用方法ごとにまとめる。
+            coalesce_key = f"{cache_mode}:" + (
+                cache_key or make_cache_key(model_name, full_prompt, schema, temperature, max_tokens, sample_index)
+            )
+            return await _acoalesce(coalesce_key, call)
         else:
-            raise ValueError(f"Unknown model: {model_name}")
+            # テキスト生成モード。
+            if contents is None:
+                raise ValueError("contents is required when schema is not specified")
+            text_contents = contents
+            request_tokens = _estimate_request_tokens(prompt, contents, system_instruction)
+            return await _acall_with_transport_retry(
+                model_name,
+                request_tokens,
+                max_transport_retries,
+                lambda: _agenerate_text(model_name, text_contents, system_instruction, temperature, max_tokens),
+            )
+
+
+async def astream_generate_json(
+    model_name: str,
+    prompt: str,
+    schema: dict[str, Any],
+    stop_after: Collection[str] = (),
+    on_field: Callable[[str, Any], None] | None = None,
+    temperature: float | None = None,
+    max_tokens: int | None = 8192,
+    cache_mode: CacheMode = "use",
+    sample_index: int = 0,
+    max_transport_retries: int = DEFAULT_MAX_TRANSPORT_RETRIES,
+    prompt_prefix: str | None = None,
+) -> dict[str, Any] | None:
+    """
+    JSON をストリーミングで生成し、最上位のフィールドを値が確定した順に解釈する。
+
+    stop_after のフィールドの値がすべて確定した時点で生成を打ち切り（以降の出力トークンは生成されない）、
+    それまでに確定したフィールドのみの辞書を返す。打ち切った結果はキャッシュしない。
+    キャッシュ、レート制限、通信エラーのリトライ、同時実行数の上限は agenerate と同じ
+    （同じリクエストの結果を待ち合わせることはしない）。
+    ストリーミングに対応していないバックエンド（StreamingBackend でないもの）では、生成結果全体を 1 つの断片として扱う。
+
+    Args:
+        model_name: モデル名
+        prompt: プロンプト文字列
+        schema: JSON スキーマ（フィールドを出力させたい順に properties を並べる）
+        stop_after: 値が確定したら生成を打ち切るフィールド（空の場合は最後まで生成する）
+        on_field: フィールドの値が確定するたびに (キー, 値) で呼び出す関数（リトライした場合は再度呼び出される）
+        temperature: 温度パラメータ（None の場合はモデルのデフォルト値）
+        max_tokens: 生成する最大トークン数
+        cache_mode: キャッシュの利用方法
+        sample_index: 同じリクエストから独立したサンプルを得るための通し番号（キャッシュキーに含まれる）
+        max_transport_retries: 通信エラー時の最大リトライ回数
+        prompt_prefix: 多くのリクエストで共通するプロンプトの前半
+
+    Returns:
+        解釈したフィールドの辞書（打ち切った場合は確定したフィールドのみ）。解釈できない場合は None
+
+    Raises:
+        TransportRetryError: 通信エラーのリトライ回数の上限に達した場合
+    """
+    with instrument_call(model_name, "json", sample_index):
+        full_prompt = (prompt_prefix or "") + prompt
+        cache_key = _get_cache_key(model_name, full_prompt, schema, temperature, max_tokens, cache_mode, sample_index)
+        cached = _read_cache(cache_key, cache_mode)
+        if cached is not None:
+            mark_judgment_cache_hit()
+            if on_field is not None:
+                for key, value in cached.items():
+                    on_field(key, value)
+            return cached
+        request_tokens = _estimate_request_tokens(full_prompt, None, None)
+        stop_fields = frozenset(stop_after)
+
+        async def call() -> tuple[dict[str, Any] | None, bool]:
+            """生成結果と、打ち切ったかどうかを返す。"""
+            parser = IncrementalObjectParser()
+            async with _acquire_semaphore():
+                stream = _open_json_stream(model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+                try:
+                    async for chunk in stream:
+                        for key, value in parser.feed(chunk):
+                            if on_field is not None:
+                                on_field(key, value)
+                        if stop_fields and stop_fields <= parser.fields.keys():
+                            return dict(parser.fields), True
+                        if parser.complete or parser.failed:
+                            break
+                finally:
+                    # 打ち切った場合は、ここで応答の受信をやめる。
+                    await stream.aclose()
+            result = parser.result()
+            if result is None:
+                print("Failed to parse JSON or no content")
+            return result, False
+
+        result, stopped = await _acall_with_transport_retry(model_name, request_tokens, max_transport_retries, call)
+        if not stopped:
+            _write_cache(cache_key, result, schema)
+        return result
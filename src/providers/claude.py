@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator
+from typing import TYPE_CHECKING, Any, cast
+
+from anthropic import AnthropicVertex, AsyncAnthropicVertex
+from anthropic.types import Message, MessageParam
+
+from ..models import (
+    VertexSettings,
+    _build_json_claude_kwargs,
+    _get_async_model,
+    _get_model,
+    load_vertex_credentials,
+    record_token_usage,
+)
+from ..structured_output import parse_json_object
+
+if TYPE_CHECKING:
+    # 会話の型のみ（Claude だけを使う場合に google-genai を読み込まないようにする）。
+    from google.genai import types
+
+
+def create_client(settings: VertexSettings) -> AnthropicVertex:
+    """同期呼び出し用のクライアントを新しく生成する。"""
+    return AnthropicVertex(
+        project_id=settings.project_id, region=settings.location, credentials=load_vertex_credentials(settings)
+    )
+
+
+def create_async_client(settings: VertexSettings) -> AsyncAnthropicVertex:
+    """非同期呼び出し用のクライアントを新しく生成する。"""
+    return AsyncAnthropicVertex(
+        project_id=settings.project_id, region=settings.location, credentials=load_vertex_credentials(settings)
+    )
+
+
+async def aclose_async_client(client: AsyncAnthropicVertex) -> None:
+    """非同期呼び出し用のクライアントを閉じる。"""
+    await client.close()
+
+
+def _record_usage(response: Message) -> None:
+    """Claude の応答のトークン数と終了理由を記録する（input_tokens にはキャッシュ分が含まれないため足し合わせる）。"""
+    usage = response.usage
+    cache_read = usage.cache_read_input_tokens or 0
+    cache_write = usage.cache_creation_input_tokens or 0
+    record_token_usage(
+        input_tokens=usage.input_tokens + cache_read + cache_write,
+        output_tokens=usage.output_tokens,
+        cached_input_tokens=cache_read,
+        cache_write_tokens=cache_write,
+        finish_reason=response.stop_reason,
+    )
+
+
+def _parse_json_response(response: Message) -> dict[str, Any] | None:
+    """Claude の応答から JSON を取り出す。"""
+    _record_usage(response)
+    if not response.content:
+        return None
+
+    content_block = response.content[0]
+    if content_block.type == "text":
+        # マークダウンのコードブロックを除去して JSON を抽出する。
+        result = parse_json_object(content_block.text)
+        if result is None:
+            print(f"Failed to parse JSON: {content_block.text}")
+        return result
+
+    return None
+
+
+def _build_text_kwargs(
+    model_name: str,
+    contents: list[types.Content],
+    system_instruction: str | None,
+    temperature: float | None,
+    max_tokens: int | None,
+) -> dict[str, Any]:
+    """Claude のテキスト生成用の messages.create 引数を構築する。"""
+    # Content リストを Anthropic の messages 形式に変換する。
+    messages: list[MessageParam] = []
+    for content in contents:
+        text_content = content.parts[0].text if content.parts and content.parts[0].text else ""
+        if content.role == "user":
+            messages.append({"role": "user", "content": text_content})
+        elif content.role == "model":
+            messages.append({"role": "assistant", "content": text_content})
+
+    kwargs: dict[str, Any] = {"model": model_name, "messages": messages}
+    if system_instruction:
+        kwargs["system"] = system_instruction
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    return kwargs
+
+
+def _parse_text_response(response: Message) -> str | None:
+    """Claude の応答からテキストを取り出す。"""
+    _record_usage(response)
+    if not response.content:
+        return None
+
+    content_block = response.content[0]
+    if content_block.type == "text":
+        return str(content_block.text)
+
+    return None
+
+
+class ClaudeBackend:
+    """Vertex AI 経由の Claude。"""
+
+    def generate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None:
+        model = cast(AnthropicVertex, _get_model(model_name))
+        kwargs = _build_json_claude_kwargs(model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+        return _parse_json_response(model.messages.create(**kwargs))
+
+    async def agenerate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None:
+        model = cast(AsyncAnthropicVertex, _get_async_model(model_name))
+        kwargs = _build_json_claude_kwargs(model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+        return _parse_json_response(await model.messages.create(**kwargs))
+
+    async def astream_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> AsyncGenerator[str]:
+        model = cast(AsyncAnthropicVertex, _get_async_model(model_name))
+        kwargs = _build_json_claude_kwargs(model_name, prompt, schema, temperature, max_tokens, prompt_prefix)
+        async with model.messages.stream(**kwargs) as stream:
+            started = False
+            try:
+                async for text in stream.text_stream:
+                    started = True
+                    yield text
+            finally:
+                # 打ち切った場合の出力トークン数は、最後に受け取ったイベントの時点のもの。
+                if started:
+                    _record_usage(stream.current_message_snapshot)
+
+    def generate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None:
+        model = cast(AnthropicVertex, _get_model(model_name))
+        kwargs = _build_text_kwargs(model_name, contents, system_instruction, temperature, max_tokens)
+        return _parse_text_response(model.messages.create(**kwargs))
+
+    async def agenerate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None:
+        model = cast(AsyncAnthropicVertex, _get_async_model(model_name))
+        kwargs = _build_text_kwargs(model_name, contents, system_instruction, temperature, max_tokens)
+        return _parse_text_response(await model.messages.create(**kwargs))
+
+
+BACKEND = ClaudeBackend()
@@ -0,0 +1,311 @@
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+from collections.abc import AsyncGenerator
+from typing import Any, cast
+
+from google import genai
+from google.genai import types
+
+from ..models import (
+    VertexSettings,
+    _get_async_model,
+    _get_model,
+    get_context_cache_settings,
+    load_vertex_credentials,
+    record_token_usage,
+)
+from ..rate_limit import estimate_tokens
+from ..structured_output import parse_json_object
+
+# 有効期限の直前に作成済みのキャッシュを使わないようにするための余裕（秒）。
+_CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS = 60
+
+# (モデル名, 共通部分のハッシュ) → (cached content の名前（作成できなかった場合は None）, 使用期限（monotonic）)。
+_ContextCacheKey = tuple[str, str]
+_cached_contents: dict[_ContextCacheKey, tuple[str | None, float]] = {}
+_cached_contents_lock = threading.Lock()
+# 非同期呼び出しで作成中の cached content（同じ共通部分に対して重複して作成しないようにするため）。
+_pending_cached_contents: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[_ContextCacheKey, asyncio.Task[str | None]]
+] = weakref.WeakKeyDictionary()
+
+
+def create_client(settings: VertexSettings) -> genai.Client:
+    """同期呼び出し用のクライアントを新しく生成する。"""
+    return genai.Client(
+        vertexai=True,
+        project=settings.project_id,
+        location=settings.location,
+        credentials=load_vertex_credentials(settings),
+    )
+
+
+def create_async_client(settings: VertexSettings) -> genai.Client:
+    """非同期呼び出し用のクライアントを新しく生成する。genai.Client の aio プロパティを利用する。"""
+    return create_client(settings)
+
+
+async def aclose_async_client(client: genai.Client) -> None:
+    """非同期呼び出し用のクライアントを閉じる。"""
+    await client.aio.aclose()
+
+
+def _record_usage(response: types.GenerateContentResponse) -> None:
+    """Gemini の応答のトークン数と終了理由を記録する。"""
+    usage = response.usage_metadata
+    if usage is None:
+        return
+    finish_reason = response.candidates[0].finish_reason if response.candidates else None
+    record_token_usage(
+        input_tokens=usage.prompt_token_count or 0,
+        output_tokens=usage.candidates_token_count or 0,
+        cached_input_tokens=usage.cached_content_token_count or 0,
+        finish_reason=finish_reason.value if finish_reason is not None else None,
+    )
+
+
+def _get_context_cache_key(model_name: str, prompt_prefix: str | None) -> _ContextCacheKey | None:
+    """cached content を使う場合はそのキーを返す。使わない場合は None を返す。"""
+    settings = get_context_cache_settings()
+    if not settings.enabled or not prompt_prefix:
+        return None
+    if estimate_tokens(prompt_prefix) < settings.gemini_min_tokens:
+        return None
+    return (model_name, hashlib.sha256(prompt_prefix.encode("utf-8")).hexdigest())
+
+
+def _lookup_cached_content(key: _ContextCacheKey) -> tuple[bool, str | None]:
+    """作成済みの cached content を探す。戻り値は (有効期限内のものが見つかったか, 名前)。"""
+    with _cached_contents_lock:
+        entry = _cached_contents.get(key)
+    if entry is None or entry[1] <= time.monotonic():
+        return False, None
+    return True, entry[0]
+
+
+def _build_cached_content_config(prompt_prefix: str) -> types.CreateCachedContentConfig:
+    """共通部分から cached content の作成用の設定を構築する。"""
+    return types.CreateCachedContentConfig(
+        contents=[types.Content(role="user", parts=[types.Part(text=prompt_prefix)])],
+        ttl=f"{get_context_cache_settings().gemini_ttl_seconds}s",
+    )
+
+
+def _store_cached_content(
+    key: _ContextCacheKey, cached_content: types.CachedContent | None, error: Exception | None
+) -> str | None:
+    """作成した cached content を記録する。作成できなかった場合も、有効期間の間は再作成しない。"""
+    if error is not None:
+        print(f"Warning: Failed to create Gemini cached content - {error}. Sending the full prompt instead.")
+    name = cached_content.name if cached_content is not None else None
+    ttl_seconds = get_context_cache_settings().gemini_ttl_seconds
+    expires_at = time.monotonic() + ttl_seconds - _CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS
+    with _cached_contents_lock:
+        _cached_contents[key] = (name, expires_at)
+    return name
+
+
+def _get_cached_content(model: genai.Client, model_name: str, prompt_prefix: str | None) -> str | None:
+    """
+    共通部分の cached content の名前を取得する。作成済みでなければ作成する。
+
+    cached content を使わない場合や作成できなかった場合は None を返す。
+    """
+    key = _get_context_cache_key(model_name, prompt_prefix)
+    if key is None or prompt_prefix is None:
+        return None
+    found, name = _lookup_cached_content(key)
+    if found:
+        return name
+    try:
+        cached_content = model.caches.create(model=model_name, config=_build_cached_content_config(prompt_prefix))
+    except Exception as error:
+        return _store_cached_content(key, None, error)
+    return _store_cached_content(key, cached_content, None)
+
+
+async def _aget_cached_content(model: genai.Client, model_name: str, prompt_prefix: str | None) -> str | None:
+    """_get_cached_content の非同期版。同じ共通部分に対する作成は 1 回にまとめる。"""
+    key = _get_context_cache_key(model_name, prompt_prefix)
+    if key is None or prompt_prefix is None:
+        return None
+    found, name = _lookup_cached_content(key)
+    if found:
+        return name
+
+    async def create(prefix: str) -> str | None:
+        try:
+            cached_content = await model.aio.caches.create(
+                model=model_name, config=_build_cached_content_config(prefix)
+            )
+        except Exception as error:
+            return _store_cached_content(key, None, error)
+        return _store_cached_content(key, cached_content, None)
+
+    pending = _pending_cached_contents.setdefault(asyncio.get_running_loop(), {})
+    task = pending.get(key)
+    if task is None:
+        task = asyncio.ensure_future(create(prompt_prefix))
+        pending[key] = task
+        task.add_done_callback(lambda _: pending.pop(key, None))
+    return await asyncio.shield(task)
+
+
+def _build_json_config(
+    schema: dict[str, Any],
+    temperature: float | None,
+    max_tokens: int | None,
+    cached_content: str | None = None,
+) -> types.GenerateContentConfig:
+    """Gemini の JSON 生成用の設定を構築する。"""
+    config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
+    if temperature is not None:
+        config.temperature = temperature
+    if max_tokens is not None:
+        config.max_output_tokens = max_tokens
+    if cached_content is not None:
+        config.cached_content = cached_content
+    return config
+
+
+def _build_json_contents(prompt: str, prompt_prefix: str | None, cached_content: str | None) -> types.Content:
+    """Gemini の JSON 生成用の入力を構築する。共通部分が cached content にある場合は残りのみを送る。"""
+    text = prompt if cached_content is not None else (prompt_prefix or "") + prompt
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def _parse_json_response(response: types.GenerateContentResponse) -> dict[str, Any] | None:
+    """Gemini の応答から JSON を取り出す。"""
+    _record_usage(response)
+    try:
+        text = response.text
+    except ValueError:
+        # response.text might raise ValueError if no content
+        text = None
+    result = parse_json_object(text)
+    if result is None:
+        print("Failed to parse JSON or no content")
+    return result
+
+
+def _build_text_config(
+    system_instruction: str | None,
+    temperature: float | None,
+    max_tokens: int | None,
+) -> types.GenerateContentConfig:
+    """Gemini のテキスト生成用の設定を構築する。"""
+    config = types.GenerateContentConfig()
+    if system_instruction:
+        config.system_instruction = system_instruction
+    if temperature is not None:
+        config.temperature = temperature
+    if max_tokens is not None:
+        config.max_output_tokens = max_tokens
+    return config
+
+
+class GeminiBackend:
+    """Vertex AI 経由の Gemini。"""
+
+    def generate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None:
+        model = cast(genai.Client, _get_model(model_name))
+        cached_content = _get_cached_content(model, model_name, prompt_prefix)
+        config = _build_json_config(schema, temperature, max_tokens, cached_content)
+        response = model.models.generate_content(
+            model=model_name, contents=_build_json_contents(prompt, prompt_prefix, cached_content), config=config
+        )
+        return _parse_json_response(response)
+
+    async def agenerate_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> dict[str, Any] | None:
+        model = cast(genai.Client, _get_async_model(model_name))
+        cached_content = await _aget_cached_content(model, model_name, prompt_prefix)
+        config = _build_json_config(schema, temperature, max_tokens, cached_content)
+        response = await model.aio.models.generate_content(
+            model=model_name, contents=_build_json_contents(prompt, prompt_prefix, cached_content), config=config
+        )
+        return _parse_json_response(response)
+
+    async def astream_json(
+        self,
+        model_name: str,
+        prompt: str,
+        schema: dict[str, Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        prompt_prefix: str | None,
+    ) -> AsyncGenerator[str]:
+        model = cast(genai.Client, _get_async_model(model_name))
+        cached_content = await _aget_cached_content(model, model_name, prompt_prefix)
+        config = _build_json_config(schema, temperature, max_tokens, cached_content)
+        stream = cast(
+            AsyncGenerator[types.GenerateContentResponse],
+            await model.aio.models.generate_content_stream(
+                model=model_name, contents=_build_json_contents(prompt, prompt_prefix, cached_content), config=config
+            ),
+        )
+        # トークン数は、usage_metadata を持つ最後の断片のもの（打ち切った場合はその時点まで）。
+        usage_chunk: types.GenerateContentResponse | None = None
+        try:
+            async for chunk in stream:
+                if chunk.usage_metadata is not None:
+                    usage_chunk = chunk
+                try:
+                    text = chunk.text
+                except ValueError:
+                    text = None
+                if text:
+                    yield text
+        finally:
+            await stream.aclose()
+            if usage_chunk is not None:
+                _record_usage(usage_chunk)
+
+    def generate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None:
+        model = cast(genai.Client, _get_model(model_name))
+        config = _build_text_config(system_instruction, temperature, max_tokens)
+        response = model.models.generate_content(model=model_name, contents=contents, config=config)
+        _record_usage(response)
+        return response.text
+
+    async def agenerate_text(
+        self,
+        model_name: str,
+        contents: list[types.Content],
+        system_instruction: str | None,
+        temperature: float | None,
+        max_tokens: int | None,
+    ) -> str | None:
+        model = cast(genai.Client, _get_async_model(model_name))
+        config = _build_text_config(system_instruction, temperature, max_tokens)
+        response = await model.aio.models.generate_content(model=model_name, contents=contents, config=config)
+        _record_usage(response)
+        return response.text
+
+
+BACKEND = GeminiBackend()
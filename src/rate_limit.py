@@ -0,0 +1,192 @@
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Iterable
+from typing import NamedTuple
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数を概算する。
+
+    ASCII 文字は 4 文字で 1 トークン、それ以外（日本語など）は 1 文字で 1 トークンとみなす。
+    レート制限の見積もり用であり、正確なトークン数ではない。
+    """
+    ascii_count = len(text.encode("ascii", errors="ignore"))
+    return (ascii_count + 3) // 4 + (len(text) - ascii_count)
+
+
+class TokenBucket:
+    """
+    トークンバケット。容量 capacity まで貯まり、毎秒 refill_per_second ずつ補充される。
+
+    消費時に残量が足りない場合も先に予約し（残量は負になる）、補充されるまでの待ち時間を返す。
+    そのため、待っている呼び出しの順に公平に割り当てられる。スレッドセーフではない（RateLimiter のロック下で使う）。
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float) -> None:
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        amount だけ消費し、消費可能になるまでの待ち時間（秒）を返す。
+
+        容量を超える量は容量まで切り詰める（一度に消費できる上限を超えて永久に待たないようにするため）。
+        """
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+        self._tokens -= min(amount, self.capacity)
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.refill_per_second
+
+
+class RateLimiter:
+    """
+    モデルごとのレート制限。1 分あたりのリクエスト数とトークン数をトークンバケットで制限する。
+
+    429 などでサーバーから待機を求められた場合は penalize で、このモデルへの全呼び出しを一時停止する。
+    スレッドと asyncio の両方から使用できる。
+    """
+
+    def __init__(self, requests_per_minute: float | None = None, tokens_per_minute: float | None = None) -> None:
+        """
+        Args:
+            requests_per_minute: 1 分あたりの最大リクエスト数（None の場合は無制限）
+            tokens_per_minute: 1 分あたりの最大入力トークン数（None の場合は無制限）
+        """
+        self._request_bucket = (
+            TokenBucket(requests_per_minute, requests_per_minute / 60) if requests_per_minute is not None else None
+        )
+        self._token_bucket = (
+            TokenBucket(tokens_per_minute, tokens_per_minute / 60) if tokens_per_minute is not None else None
+        )
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        """1 リクエスト分（入力トークン数 tokens）を予約し、待ち時間（秒）を返す。"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._blocked_until - now)
+            if self._request_bucket is not None:
+                wait = max(wait, self._request_bucket.reserve(1, now))
+            if self._token_bucket is not None:
+                wait = max(wait, self._token_bucket.reserve(tokens, now))
+            return wait
+
+    def acquire(self, tokens: int) -> None:
+        """1 リクエスト分の枠が空くまで待つ。"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int) -> None:
+        """acquire の非同期版。"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def penalize(self, delay_seconds: float) -> None:
+        """これから delay_seconds 秒間、このモデルへの呼び出しを停止する。"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay_seconds)
+
+
+class BackoffPolicy:
+    """
+    指数バックオフ（フルジッター）の待ち時間を計算する。
+
+    attempt 回目の待ち時間は 0 から min(max_delay, base_delay * multiplier ** (attempt - 1)) の一様乱数。
+    """
+
+    def __init__(self, base_delay: float = 1.0, max_delay: float = 60.0, multiplier: float = 2.0) -> None:
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+
+    def delay(self, attempt: int) -> float:
+        """attempt 回目（1 始まり）のリトライ前の待ち時間（秒）を返す。"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1)))
+
+
+DEFAULT_BACKOFF_POLICY = BackoffPolicy()
+
+_rate_limiters: dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def configure_rate_limit(
+    model_name: str,
+    requests_per_minute: float | None = None,
+    tokens_per_minute: float | None = None,
+) -> None:
+    """
+    モデルのレート制限を設定する。設定していないモデルは無制限（サーバーからの 429 にのみ従う）。
+
+    Args:
+        model_name: モデル名
+        requests_per_minute: 1 分あたりの最大リクエスト数（None の場合は無制限）
+        tokens_per_minute: 1 分あたりの最大入力トークン数（None の場合は無制限）
+    """
+    with _rate_limiters_lock:
+        _rate_limiters[model_name] = RateLimiter(requests_per_minute, tokens_per_minute)
+
+
+class RateLimitSpec(NamedTuple):
+    """コマンドラインなどで指定されたモデルのレート制限。"""
+
+    model_name: str
+    requests_per_minute: float | None
+    tokens_per_minute: float | None
+
+
+def parse_rate_limit(spec: str) -> RateLimitSpec:
+    """
+    "MODEL=RPM[:TPM]" 形式のレート制限を解析する。RPM を空にするとリクエスト数を制限しない（"MODEL=:TPM"）。
+
+    Raises:
+        ValueError: 形式が不正な場合、または値が正の数でない場合
+    """
+    model_name, separator, limits = spec.partition("=")
+    requests, _, tokens = limits.partition(":")
+    if not model_name or not separator or not (requests or tokens):
+        raise ValueError(f"Rate limit must be MODEL=RPM[:TPM]: {spec!r}")
+    try:
+        values = [float(value) if value else None for value in (requests, tokens)]
+    except ValueError as error:
+        raise ValueError(f"Rate limits must be numbers: {spec!r}") from error
+    if any(value is not None and value <= 0 for value in values):
+        raise ValueError(f"Rate limits must be positive: {spec!r}")
+    return RateLimitSpec(model_name, *values)
+
+
+def configure_rate_limits(specs: Iterable[RateLimitSpec]) -> None:
+    """複数のモデルのレート制限を configure_rate_limit で設定する。"""
+    for spec in specs:
+        configure_rate_limit(spec.model_name, spec.requests_per_minute, spec.tokens_per_minute)
+
+
+def describe_rate_limits(specs: Iterable[RateLimitSpec]) -> dict[str, dict[str, float | None]]:
+    """レート制限をジャーナルの実行条件に記録する形式（モデル名 → 制限）にする。"""
+    return {
+        spec.model_name: {
+            "requests_per_minute": spec.requests_per_minute,
+            "tokens_per_minute": spec.tokens_per_minute,
+        }
+        for spec in specs
+    }
+
+
+def get_rate_limiter(model_name: str) -> RateLimiter:
+    """モデルのレート制限を取得する。設定されていない場合は無制限のものを生成する。"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(model_name)
+        if limiter is None:
+            limiter = RateLimiter()
+            _rate_limiters[model_name] = limiter
+        return limiter
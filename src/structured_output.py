@@ -0,0 +1,338 @@
+import importlib
+import json
+from collections.abc import Callable
+from typing import Any, cast
+
+# orjson がインストールされている場合は JSON の解釈に使う（uv sync --extra fast-json）。
+try:
+    _orjson: Any = importlib.import_module("orjson")
+except ImportError:
+    _orjson = None
+
+# JSON として解釈できない場合に送出される例外（orjson.JSONDecodeError は json.JSONDecodeError のサブクラス）。
+_DECODE_ERRORS: tuple[type[Exception], ...] = (json.JSONDecodeError, UnicodeDecodeError)
+
+_CODE_FENCE = "```"
+
+
+class SchemaValidationError(ValueError):
+    """JSON がスキーマに適合しない場合の例外。"""
+
+    def __init__(self, path: str, message: str) -> None:
+        super().__init__(f"{path or '$'}: {message}")
+        self.path = path
+
+
+# コンパイルしたスキーマ。値を検証し、正規化した値を返す（適合しない場合は SchemaValidationError を送出する）。
+Validator = Callable[[Any, str], Any]
+
+
+def strip_code_fence(text: str) -> str:
+    """
+    応答のテキストから前後の空白と、全体を囲むマークダウンのコードブロック（```json ... ```）を取り除く。
+
+    正規表現を使わず、先頭と末尾のみを確認する。
+    """
+    text = text.strip()
+    if text.startswith(_CODE_FENCE):
+        # 1 行目（```json など）を取り除く。
+        newline = text.find("\n")
+        text = "" if newline == -1 else text[newline + 1 :]
+        if text.endswith(_CODE_FENCE):
+            text = text[: -len(_CODE_FENCE)]
+        text = text.strip()
+    return text
+
+
+def loads_json(text: str) -> Any:
+    """
+    JSON を解釈する（orjson がインストールされている場合は orjson を使う）。
+
+    Raises:
+        json.JSONDecodeError: JSON として解釈できない場合
+    """
+    if _orjson is not None:
+        return _orjson.loads(text)
+    return json.loads(text)
+
+
+def parse_json_object(text: str | None) -> dict[str, Any] | None:
+    """
+    応答のテキストから JSON オブジェクトを取り出す。
+
+    Returns:
+        JSON オブジェクト。テキストが空の場合、解釈できない場合、オブジェクトでない場合は None
+    """
+    if not text:
+        return None
+    json_text = strip_code_fence(text)
+    if not json_text:
+        return None
+    try:
+        parsed = loads_json(json_text)
+    except _DECODE_ERRORS:
+        return None
+    return cast(dict[str, Any], parsed) if isinstance(parsed, dict) else None
+
+
+class IncrementalObjectParser:
+    """
+    ストリーミングで届く JSON オブジェクトのテキストを断片ごとに受け取り、最上位のフィールドを値が確定した順に取り出す。
+
+    値が確定するのは、その値の後の "," または "}" が届いたとき（文字列の値は閉じる引用符の後）。
+    オブジェクトの前のテキスト（```json など）は読み飛ばす。受け取ったテキストは 1 回ずつしか走査しない。
+    """
+
+    def __init__(self) -> None:
+        self.fields: dict[str, Any] = {}
+        self._text = ""
+        self._position = 0
+        # "before"（"{" の前）、"key"、"colon"、"value_start"、"value"、"done"、"failed" のいずれか。
+        self._phase = "before"
+        self._in_string = False
+        self._escape = False
+        # 値の中の入れ子の深さ。
+        self._depth = 0
+        self._key = ""
+        self._token_start = 0
+
+    @property
+    def complete(self) -> bool:
+        """オブジェクトの最後（"}"）まで解釈できたか。"""
+        return self._phase == "done"
+
+    @property
+    def failed(self) -> bool:
+        """JSON として解釈できないテキストが届いたか（以降の断片は無視する）。"""
+        return self._phase == "failed"
+
+    @property
+    def text(self) -> str:
+        """これまでに受け取ったテキスト。"""
+        return self._text
+
+    def _finish_value(self, end: int) -> tuple[str, Any] | None:
+        """値のテキスト（_token_start から end の手前まで）を解釈してフィールドに加える。"""
+        try:
+            value = loads_json(self._text[self._token_start : end].strip())
+        except _DECODE_ERRORS:
+            self._phase = "failed"
+            return None
+        self.fields[self._key] = value
+        return self._key, value
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """
+        テキストの断片を追加する。
+
+        Returns:
+            この断片で値が確定したフィールドの (キー, 値) のリスト
+        """
+        self._text += chunk
+        text = self._text
+        length = len(text)
+        position = self._position
+        completed: list[tuple[str, Any]] = []
+        while position < length and self._phase not in ("done", "failed"):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    position += 1
+                    continue
+                # 文字列の中は、引用符とエスケープのみを探して読み飛ばす。
+                quote = text.find('"', position)
+                backslash = text.find("\\", position, quote if quote != -1 else length)
+                if backslash != -1:
+                    self._escape = True
+                    position = backslash + 1
+                    continue
+                if quote == -1:
+                    position = length
+                    break
+                position = quote + 1
+                self._in_string = False
+                if self._phase == "key":
+                    try:
+                        self._key = loads_json(text[self._token_start : position])
+                    except _DECODE_ERRORS:
+                        self._phase = "failed"
+                        break
+                    self._phase = "colon"
+                continue
+            char = text[position]
+            phase = self._phase
+            if phase == "before":
+                if char == "{":
+                    self._phase = "key"
+            elif phase == "key":
+                if char == '"':
+                    self._in_string = True
+                    self._token_start = position
+                elif char == "}":
+                    self._phase = "done"
+            elif phase == "colon":
+                if char == ":":
+                    self._phase = "value_start"
+            elif phase == "value_start":
+                if not char.isspace():
+                    self._phase = "value"
+                    self._token_start = position
+                    self._depth = 0
+                    # この文字を値の最初の文字として解釈し直す。
+                    continue
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]" and self._depth > 0:
+                self._depth -= 1
+            elif char in ",}" and self._depth == 0:
+                field = self._finish_value(position)
+                if field is not None:
+                    completed.append(field)
+                    self._phase = "key" if char == "," else "done"
+            position += 1
+        self._position = position
+        return completed
+
+    def result(self) -> dict[str, Any] | None:
+        """オブジェクトの最後まで解釈できた場合はすべてのフィールド、それ以外は None を返す。"""
+        return dict(self.fields) if self.complete else None
+
+
+def _compile_type(schema_type: str | None) -> Validator:
+    """type キーワードの検証を作る。"""
+    if schema_type == "string":
+
+        def check_string(value: Any, path: str) -> Any:
+            if not isinstance(value, str):
+                raise SchemaValidationError(path, f"expected string, got {type(value).__name__}")
+            return value
+
+        return check_string
+    if schema_type == "boolean":
+
+        def check_boolean(value: Any, path: str) -> Any:
+            if not isinstance(value, bool):
+                raise SchemaValidationError(path, f"expected boolean, got {type(value).__name__}")
+            return value
+
+        return check_boolean
+    if schema_type == "integer":
+
+        def check_integer(value: Any, path: str) -> Any:
+            # bool は int のサブクラスだが整数としては扱わない。5.0 のような整数値の float は int にする。
+            if isinstance(value, float) and value.is_integer():
+                return int(value)
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise SchemaValidationError(path, f"expected integer, got {value!r}")
+            return value
+
+        return check_integer
+    if schema_type == "number":
+
+        def check_number(value: Any, path: str) -> Any:
+            if not isinstance(value, int | float) or isinstance(value, bool):
+                raise SchemaValidationError(path, f"expected number, got {value!r}")
+            return value
+
+        return check_number
+    return lambda value, path: value
+
+
+def _compile(schema: dict[str, Any]) -> Validator:
+    """スキーマを検証関数にコンパイルする。"""
+    schema_type = schema.get("type")
+    check_type = _compile_type(schema_type)
+    minimum = schema.get("minimum")
+    maximum = schema.get("maximum")
+    enum = schema.get("enum")
+
+    if schema_type == "object":
+        properties = {
+            key: _compile(cast(dict[str, Any], value))
+            for key, value in cast(dict[str, Any], schema.get("properties", {})).items()
+        }
+        required = tuple(cast(list[str], schema.get("required", [])))
+
+        def check_object(value: Any, path: str) -> Any:
+            if not isinstance(value, dict):
+                raise SchemaValidationError(path, f"expected object, got {type(value).__name__}")
+            missing = [key for key in required if key not in value]
+            if missing:
+                raise SchemaValidationError(path, f"missing required keys {missing} (available: {list(value)})")
+            # スキーマにないキーは取り除く。
+            return {key: validate(value[key], f"{path}.{key}") for key, validate in properties.items() if key in value}
+
+        return check_object
+
+    if schema_type == "array":
+        check_item = _compile(cast(dict[str, Any], schema.get("items", {})))
+        min_items = schema.get("minItems")
+
+        def check_array(value: Any, path: str) -> Any:
+            if not isinstance(value, list):
+                raise SchemaValidationError(path, f"expected array, got {type(value).__name__}")
+            if min_items is not None and len(value) < min_items:
+                raise SchemaValidationError(path, f"expected at least {min_items} items, got {len(value)}")
+            return [check_item(item, f"{path}[{i}]") for i, item in enumerate(value)]
+
+        return check_array
+
+    if minimum is None and maximum is None and enum is None:
+        return check_type
+
+    def check_value(value: Any, path: str) -> Any:
+        value = check_type(value, path)
+        if minimum is not None and value < minimum:
+            raise SchemaValidationError(path, f"{value!r} is less than the minimum {minimum}")
+        if maximum is not None and value > maximum:
+            raise SchemaValidationError(path, f"{value!r} is greater than the maximum {maximum}")
+        if enum is not None and value not in enum:
+            raise SchemaValidationError(path, f"{value!r} is not one of {enum}")
+        return value
+
+    return check_value
+
+
+# コンパイル済みの検証関数の最大数（リクエストごとに作られたスキーマで際限なく増えないようにする）。
+_MAX_VALIDATORS = 256
+
+# コンパイル済みの検証関数（id(スキーマ) → (スキーマ, 検証関数)）。
+# スキーマが解放されて id() が再利用されないよう、スキーマ自体も保持する。
+_validators: dict[int, tuple[dict[str, Any], Validator]] = {}
+
+
+def compile_validator(schema: dict[str, Any]) -> Validator:
+    """
+    JSON スキーマ（type, properties, required, items, minItems, minimum, maximum, enum）を検証関数にコンパイルする。
+
+    同じスキーマのオブジェクトに対しては、コンパイル済みの検証関数を返す。
+    """
+    cached = _validators.get(id(schema))
+    if cached is not None and cached[0] is schema:
+        return cached[1]
+    validator = _compile(schema)
+    if len(_validators) >= _MAX_VALIDATORS:
+        _validators.clear()
+    _validators[id(schema)] = (schema, validator)
+    return validator
+
+
+def validate_json(value: Any, schema: dict[str, Any]) -> Any:
+    """
+    値をスキーマで検証し、正規化した値（スキーマにないキーを除き、整数値の float を int にしたもの）を返す。
+
+    Raises:
+        SchemaValidationError: スキーマに適合しない場合（必要なキーがない、型が違う、値が範囲外など）
+    """
+    return compile_validator(schema)(value, "")
+
+
+def is_valid_json(value: Any, schema: dict[str, Any]) -> bool:
+    """値がスキーマに適合するかどうかを返す。"""
+    try:
+        compile_validator(schema)(value, "")
+    except SchemaValidationError:
+        return False
+    return True
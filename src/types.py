@@ -1,4 +1,4 @@
-from typing import Literal, TypedDict
+from typing import Literal, NotRequired, TypedDict
 
 from pydantic import BaseModel, computed_field
 
@@ -37,11 +37,30 @@ class EvaluationDatasetItem(PromptDatasetItem):
     llm_response_text: str
 
 
+# カスケード評価（evaluator.cascade）で判定を確定させたモデルの段階。
+JudgeTier = Literal["fast", "strong"]
+
+
+class JudgeVerdict(TypedDict):
+    """アンサンブル評価（evaluator.ensemble）の判定モデルごとの判定。"""
+
+    model_name: str
+    explanation: str
+    # 主観評価・自由記述評価の点数（ルーブリック評価では含まれない）。
+    rating: NotRequired[int]
+    # ルーブリック評価の適合判定（主観評価・自由記述評価では含まれない）。
+    criteria_met: NotRequired[bool]
+
+
 class RatingResult(TypedDict):
     """主観評価・自由記述評価の結果（点数と説明）。"""
 
     explanation: str
     rating: int
+    # カスケード評価で判定を確定させた段階（カスケード評価以外では含まれない）。
+    decided_by: NotRequired[JudgeTier]
+    # アンサンブル評価の判定モデルごとの判定（アンサンブル評価以外では含まれない）。
+    judges: NotRequired[list[JudgeVerdict]]
 
 
 class RubricResult(TypedDict):
@@ -49,6 +68,10 @@ class RubricResult(TypedDict):
 
     explanation: str
     criteria_met: bool
+    # カスケード評価で判定を確定させた段階（カスケード評価以外では含まれない）。
+    decided_by: NotRequired[JudgeTier]
+    # アンサンブル評価の判定モデルごとの判定（アンサンブル評価以外では含まれない）。
+    judges: NotRequired[list[JudgeVerdict]]
 
 
 class EvaluationResultByRubric(BaseModel):
@@ -57,6 +80,10 @@ class EvaluationResultByRubric(BaseModel):
     rubric: RubricItem
     explanation: str
     criteria_met: bool
+    # カスケード評価で判定を確定させた段階（カスケード評価以外では None）。
+    decided_by: JudgeTier | None = None
+    # アンサンブル評価の判定モデルごとの判定（アンサンブル評価以外では None）。
+    judges: list[JudgeVerdict] | None = None
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -81,7 +108,12 @@ class EvaluationResultByRubric(BaseModel):
 
 
 class EvaluationOutput(BaseModel):
-    """評価結果。"""
+    """
+    評価結果。
+
+    点数（computed_field）は参照するたびに計算し直す。多数の評価結果をまとめて採点・保存する場合は
+    data.verdict_table.VerdictTable に変換すると、点数を 1 回だけ計算し、ルーブリック項目も共有する。
+    """
 
     prompt_id: str
     prompts: list[PromptItem]
@@ -104,8 +136,9 @@ class EvaluationOutput(BaseModel):
     @property
     def score_rate(self) -> float:
         """理論上の最大点数に対する総合点数の割合。"""
-        if self.theoretical_score > 0:
-            return self.total_score / self.theoretical_score
+        theoretical_score = self.theoretical_score
+        if theoretical_score > 0:
+            return self.total_score / theoretical_score
         return 0.0
 
     @computed_field  # type: ignore[prop-decorator]
@@ -115,3 +148,11 @@ class EvaluationOutput(BaseModel):
         if len(self.result_by_rubrics) == 0:
             return 0.0
         return sum(1 for r in self.result_by_rubrics if r.is_criteria_passed) / len(self.result_by_rubrics)
+
+
+class IterationResult(BaseModel):
+    """評価の 1 試行分（3 つの評価手法）の結果。評価に失敗したデータ項目は含まない。"""
+
+    subjective: list[RatingResult]
+    general: list[RatingResult]
+    rubric: list[EvaluationOutput]